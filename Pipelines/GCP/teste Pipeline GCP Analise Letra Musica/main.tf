@@ -40,6 +40,36 @@ variable "environment" {
   default     = "dev"
 }
 
+variable "etl_task_count" {
+  description = "Número de tarefas paralelas do Cloud Run job (cada uma processa um shard dos arquivos)"
+  type        = number
+  default     = 1
+}
+
+variable "load_mode" {
+  description = "Carga no BigQuery: append ou merge (staging + MERGE idempotente)"
+  type        = string
+  default     = "append"
+}
+
+variable "analysis_profile" {
+  description = "Perfil de análise do ETL: full, standard, sentiment-only ou stats-only"
+  type        = string
+  default     = "full"
+}
+
+variable "event_max_wait_seconds" {
+  description = "Janela dos micro-lotes da ingestão por eventos (segundos)"
+  type        = number
+  default     = 30
+}
+
+variable "array_column_mode" {
+  description = "Armazenamento das colunas de array: json (STRING) ou repeated (ARRAY<STRING>)"
+  type        = string
+  default     = "json"
+}
+
 # Locals
 locals {
   project_id = var.project_id
@@ -81,6 +111,7 @@ resource "google_project_service" "required_apis" {
     "logging.googleapis.com",
     "scheduler.googleapis.com",
     "artifactregistry.googleapis.com",
+    "pubsub.googleapis.com",
     "iam.googleapis.com"
   ])
   
@@ -185,8 +216,8 @@ resource "google_bigquery_table" "raw_lyrics" {
     field = "created_at"
   }
   
-  # Clustering
-  clustering = ["artist", "genre"]
+  # Clustering (artist_key: nome normalizado usado nas buscas por artista)
+  clustering = ["artist_key", "genre"]
   
   schema = jsonencode([
     {
@@ -204,6 +235,11 @@ resource "google_bigquery_table" "raw_lyrics" {
       type = "STRING"
       mode = "NULLABLE"
     },
+    {
+      name = "artist_key"
+      type = "STRING"
+      mode = "NULLABLE"
+    },
     {
       name = "album"
       type = "STRING"
@@ -434,6 +470,258 @@ resource "google_bigquery_table" "sentiment_analysis" {
   labels = local.common_labels
 }
 
+# Rollups mantidos pelo ETL: as linhas das chaves de cada lote são
+# recalculadas a partir das tabelas base (ver scripts/py/rollups.py)
+resource "google_bigquery_table" "sentiment_rollup" {
+  dataset_id = google_bigquery_dataset.lyrics_analysis.dataset_id
+  table_id   = "sentiment_rollup"
+  project    = local.project_id
+  
+  description = "Rollup de sentimento por ano e gênero (mantido pelo ETL)"
+  
+  clustering = ["year", "genre"]
+  
+  schema = jsonencode([
+    {
+      name = "year"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "genre"
+      type = "STRING"
+      mode = "NULLABLE"
+    },
+    {
+      name = "song_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "sentiment_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "sentiment_sum"
+      type = "FLOAT"
+      mode = "NULLABLE"
+    },
+    {
+      name = "sentiment_sq_sum"
+      type = "FLOAT"
+      mode = "NULLABLE"
+    },
+    {
+      name = "positive_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "negative_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "neutral_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "confidence_sum"
+      type = "FLOAT"
+      mode = "NULLABLE"
+    },
+    {
+      name = "processed_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "word_count_sum"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "unique_words_sum"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "readability_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "readability_sum"
+      type = "FLOAT"
+      mode = "NULLABLE"
+    },
+    {
+      name = "updated_at"
+      type = "TIMESTAMP"
+      mode = "NULLABLE"
+    }
+  ])
+  
+  labels = local.common_labels
+}
+
+resource "google_bigquery_table" "word_rollup" {
+  dataset_id = google_bigquery_dataset.lyrics_analysis.dataset_id
+  table_id   = "word_rollup"
+  project    = local.project_id
+  
+  description = "Rollup de palavras (sem stopwords, 3+ letras) por ano e sentimento (mantido pelo ETL)"
+  
+  clustering = ["word", "sentiment_label", "year"]
+  
+  schema = jsonencode([
+    {
+      name = "year"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "sentiment_label"
+      type = "STRING"
+      mode = "NULLABLE"
+    },
+    {
+      name = "word"
+      type = "STRING"
+      mode = "REQUIRED"
+    },
+    {
+      name = "frequency_sum"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "song_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "tfidf_sum"
+      type = "FLOAT"
+      mode = "NULLABLE"
+    },
+    {
+      name = "tfidf_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "updated_at"
+      type = "TIMESTAMP"
+      mode = "NULLABLE"
+    }
+  ])
+  
+  labels = local.common_labels
+}
+
+resource "google_bigquery_table" "artist_rollup" {
+  dataset_id = google_bigquery_dataset.lyrics_analysis.dataset_id
+  table_id   = "artist_rollup"
+  project    = local.project_id
+  
+  description = "Rollup por artista e gênero (mantido pelo ETL)"
+  
+  clustering = ["artist", "genre"]
+  
+  schema = jsonencode([
+    {
+      name = "artist"
+      type = "STRING"
+      mode = "NULLABLE"
+    },
+    {
+      name = "genre"
+      type = "STRING"
+      mode = "NULLABLE"
+    },
+    {
+      name = "song_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "first_year"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "last_year"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "sentiment_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "sentiment_sum"
+      type = "FLOAT"
+      mode = "NULLABLE"
+    },
+    {
+      name = "positive_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "negative_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "neutral_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "processed_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "word_count_sum"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "unique_words_sum"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "avg_word_length_sum"
+      type = "FLOAT"
+      mode = "NULLABLE"
+    },
+    {
+      name = "readability_count"
+      type = "INTEGER"
+      mode = "NULLABLE"
+    },
+    {
+      name = "readability_sum"
+      type = "FLOAT"
+      mode = "NULLABLE"
+    },
+    {
+      name = "updated_at"
+      type = "TIMESTAMP"
+      mode = "NULLABLE"
+    }
+  ])
+  
+  labels = local.common_labels
+}
+
 # Service Account para ETL
 resource "google_service_account" "etl_service_account" {
   account_id   = "lyrics-etl-sa-${var.environment}"
@@ -489,6 +777,10 @@ resource "google_cloud_run_v2_job" "lyrics_etl_job" {
   project  = local.project_id
   
   template {
+    # Cada tarefa lê CLOUD_RUN_TASK_INDEX/CLOUD_RUN_TASK_COUNT e processa seu shard
+    task_count  = var.etl_task_count
+    parallelism = var.etl_task_count
+    
     template {
       service_account = google_service_account.etl_service_account.email
       
@@ -521,6 +813,36 @@ resource "google_cloud_run_v2_job" "lyrics_etl_job" {
           value = var.environment
         }
         
+        env {
+          name  = "ARRAY_COLUMN_MODE"
+          value = var.array_column_mode
+        }
+        
+        env {
+          name  = "LOAD_MODE"
+          value = var.load_mode
+        }
+        
+        env {
+          name  = "ANALYSIS_PROFILE"
+          value = var.analysis_profile
+        }
+        
+        env {
+          name  = "CHECKPOINT_PATH"
+          value = "gs://${local.bucket_name}/etl-state/checkpoint.jsonl"
+        }
+        
+        env {
+          name  = "DEAD_LETTER_PATH"
+          value = "gs://${local.bucket_name}/etl-state/dead_letter.jsonl"
+        }
+        
+        env {
+          name  = "SHARD_MANIFEST_PATH"
+          value = "gs://${local.bucket_name}/etl-state/shard_manifests"
+        }
+        
         resources {
           limits = {
             cpu    = "1"
@@ -530,8 +852,6 @@ resource "google_cloud_run_v2_job" "lyrics_etl_job" {
       }
       
       max_retries = 3
-      task_count  = 1
-      parallelism = 1
       
       task_timeout = "3600s"
     }
@@ -551,6 +871,221 @@ resource "google_cloud_run_v2_job" "lyrics_etl_job" {
   }
 }
 
+# Cloud Run Service - análise sob demanda (modelos carregados no start)
+resource "google_cloud_run_v2_service" "lyrics_analysis_service" {
+  name     = "lyrics-analysis-${var.environment}"
+  location = local.region
+  project  = local.project_id
+  
+  template {
+    service_account = google_service_account.etl_service_account.email
+    
+    scaling {
+      # Uma instância quente evita cold start (download NLTK + modelo TF-IDF)
+      min_instance_count = 1
+      max_instance_count = 5
+    }
+    
+    containers {
+      image   = "${local.region}-docker.pkg.dev/${local.project_id}/${google_artifact_registry_repository.lyrics_etl_repo.repository_id}/lyrics-etl:latest"
+      command = ["python", "src/analysis_service.py"]
+      args    = ["serve"]
+      
+      env {
+        name  = "ENVIRONMENT"
+        value = var.environment
+      }
+      
+      env {
+        name  = "ANALYSIS_PROFILE"
+        value = var.analysis_profile
+      }
+      
+      env {
+        name  = "TFIDF_MODEL_PATH"
+        value = "gs://${local.bucket_name}/models/tfidf.json"
+      }
+      
+      resources {
+        limits = {
+          cpu    = "1"
+          memory = "2Gi"
+        }
+        cpu_idle = false
+      }
+      
+      startup_probe {
+        http_get {
+          path = "/healthz"
+        }
+        initial_delay_seconds = 5
+        period_seconds        = 5
+        failure_threshold     = 12
+      }
+    }
+  }
+  
+  labels = local.common_labels
+  
+  depends_on = [
+    google_project_service.required_apis,
+    google_artifact_registry_repository.lyrics_etl_repo
+  ]
+  
+  lifecycle {
+    ignore_changes = [
+      template[0].containers[0].image
+    ]
+  }
+}
+
+# Ingestão por eventos: OBJECT_FINALIZE em raw-data/ -> Pub/Sub -> Cloud Run (push)
+data "google_storage_project_service_account" "gcs_account" {
+  project = local.project_id
+}
+
+resource "google_pubsub_topic" "raw_data_events" {
+  name    = "lyrics-raw-data-events-${var.environment}"
+  project = local.project_id
+  labels  = local.common_labels
+  
+  depends_on = [google_project_service.required_apis]
+}
+
+resource "google_pubsub_topic_iam_member" "gcs_publisher" {
+  topic  = google_pubsub_topic.raw_data_events.id
+  role   = "roles/pubsub.publisher"
+  member = "serviceAccount:${data.google_storage_project_service_account.gcs_account.email_address}"
+}
+
+resource "google_storage_notification" "raw_data_finalize" {
+  bucket             = google_storage_bucket.lyrics_data.name
+  topic              = google_pubsub_topic.raw_data_events.id
+  payload_format     = "JSON_API_V1"
+  event_types        = ["OBJECT_FINALIZE"]
+  object_name_prefix = "raw-data/"
+  
+  depends_on = [google_pubsub_topic_iam_member.gcs_publisher]
+}
+
+resource "google_cloud_run_v2_service" "lyrics_event_ingestion" {
+  name     = "lyrics-event-ingestion-${var.environment}"
+  location = local.region
+  project  = local.project_id
+  
+  template {
+    service_account = google_service_account.etl_service_account.email
+    # A requisição fica aberta até a carga do micro-lote (ack após a carga)
+    timeout                          = "600s"
+    max_instance_request_concurrency = 100
+    
+    scaling {
+      # Uma instância concentra as notificações em micro-lotes maiores
+      min_instance_count = 0
+      max_instance_count = 1
+    }
+    
+    containers {
+      image   = "${local.region}-docker.pkg.dev/${local.project_id}/${google_artifact_registry_repository.lyrics_etl_repo.repository_id}/lyrics-etl:latest"
+      command = ["python", "src/event_ingestion.py"]
+      args = [
+        "serve",
+        "--project-id=${local.project_id}",
+        "--dataset-id=${local.dataset_id}",
+        "--bucket-name=${local.bucket_name}",
+        "--load-mode=merge"
+      ]
+      
+      env {
+        name  = "ENVIRONMENT"
+        value = var.environment
+      }
+      
+      env {
+        name  = "ANALYSIS_PROFILE"
+        value = var.analysis_profile
+      }
+      
+      env {
+        name  = "ARRAY_COLUMN_MODE"
+        value = var.array_column_mode
+      }
+      
+      env {
+        name  = "EVENT_MAX_WAIT_SECONDS"
+        value = tostring(var.event_max_wait_seconds)
+      }
+      
+      env {
+        name  = "TFIDF_MODEL_PATH"
+        value = "gs://${local.bucket_name}/models/tfidf.json"
+      }
+      
+      env {
+        name  = "EVENT_CHECKPOINT_PATH"
+        value = "gs://${local.bucket_name}/etl-state/event_checkpoint.jsonl"
+      }
+      
+      env {
+        name  = "DEAD_LETTER_PATH"
+        value = "gs://${local.bucket_name}/etl-state/event_dead_letter.jsonl"
+      }
+      
+      resources {
+        limits = {
+          cpu    = "1"
+          memory = "2Gi"
+        }
+      }
+    }
+  }
+  
+  labels = local.common_labels
+  
+  depends_on = [
+    google_project_service.required_apis,
+    google_artifact_registry_repository.lyrics_etl_repo
+  ]
+  
+  lifecycle {
+    ignore_changes = [
+      template[0].containers[0].image
+    ]
+  }
+}
+
+resource "google_cloud_run_v2_service_iam_member" "event_ingestion_invoker" {
+  project  = local.project_id
+  location = local.region
+  name     = google_cloud_run_v2_service.lyrics_event_ingestion.name
+  role     = "roles/run.invoker"
+  member   = "serviceAccount:${google_service_account.etl_service_account.email}"
+}
+
+resource "google_pubsub_subscription" "raw_data_events_push" {
+  name    = "lyrics-raw-data-events-push-${var.environment}"
+  project = local.project_id
+  topic   = google_pubsub_topic.raw_data_events.id
+  
+  # Maior que a janela do micro-lote somada ao tempo de carga
+  ack_deadline_seconds = 600
+  
+  push_config {
+    push_endpoint = "${google_cloud_run_v2_service.lyrics_event_ingestion.uri}/"
+    
+    oidc_token {
+      service_account_email = google_service_account.etl_service_account.email
+    }
+  }
+  
+  retry_policy {
+    minimum_backoff = "10s"
+    maximum_backoff = "600s"
+  }
+  
+  labels = local.common_labels
+}
+
 # Cloud Scheduler Job
 resource "google_cloud_scheduler_job" "etl_daily_schedule" {
   name     = "lyrics-etl-daily-${var.environment}"
@@ -671,6 +1206,16 @@ output "cloud_run_job_name" {
   value       = google_cloud_run_v2_job.lyrics_etl_job.name
 }
 
+output "analysis_service_url" {
+  description = "URL do serviço de análise sob demanda"
+  value       = google_cloud_run_v2_service.lyrics_analysis_service.uri
+}
+
+output "event_ingestion_url" {
+  description = "Endpoint de push da ingestão por eventos"
+  value       = google_cloud_run_v2_service.lyrics_event_ingestion.uri
+}
+
 output "scheduler_job_name" {
   description = "Nome do Cloud Scheduler Job"
   value       = google_cloud_scheduler_job.etl_daily_schedule.name
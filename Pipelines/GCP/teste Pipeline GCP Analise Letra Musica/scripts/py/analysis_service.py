@@ -0,0 +1,379 @@
+"""
+Serviço HTTP de análise de letras sob demanda
+
+Mantém NLTK, VADER e o modelo TF-IDF persistido carregados em memória e
+agrupa requisições concorrentes em micro-lotes para o transform do
+LyricsETLProcessor.
+
+Endpoints:
+    GET  /healthz          estado do serviço
+    POST /analyze          {"title": ..., "artist": ..., "lyrics": ...}
+    POST /analyze/batch    {"songs": [{...}, ...]}
+
+Uso:
+    python analysis_service.py serve --tfidf-model gs://bucket/models/tfidf.json
+    python analysis_service.py fit-model --input-prefix raw-data/ --output gs://bucket/models/tfidf.json
+"""
+
+import json
+import logging
+import math
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+from etl_processor import LyricsETLProcessor
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Palavras mais relevantes devolvidas por música
+TOP_WORDS = 10
+
+_WARM_UP_SONG = {
+    'title': 'Warm up',
+    'artist': 'Service',
+    'lyrics': 'I love the sunshine in the morning.\nBut I hate the rain at night.'
+}
+
+
+class MicroBatcher:
+    """
+    Agrupa itens enviados por várias threads em lotes processados por uma única thread
+
+    Um lote é fechado ao atingir max_batch_size ou max_wait segundos após a
+    chegada do primeiro item, o que limita a latência extra por requisição.
+    """
+
+    def __init__(self, handler: Callable[[List], List], max_batch_size: int = 32,
+                 max_wait: float = 0.01):
+        """
+        Args:
+            handler: Função que recebe a lista de itens e devolve os resultados na mesma ordem
+            max_batch_size: Itens por lote
+            max_wait: Espera máxima pelo preenchimento do lote em segundos
+        """
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        """Enfileira um item e retorna o Future com o seu resultado"""
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self) -> Optional[List]:
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                # Reenfileira o sinal de parada para depois deste lote
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            self.batches += 1
+            self.items += len(items)
+            try:
+                results = self.handler(items)
+            except Exception as e:
+                logger.error(f"Erro no micro-lote de {len(items)} itens: {str(e)}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+def _clean_value(value):
+    """Converte NaN/numpy para tipos serializáveis em JSON"""
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class LyricsAnalysisService:
+    """
+    Análise de músicas individuais sobre um LyricsETLProcessor aquecido
+    """
+
+    def __init__(self, processor: LyricsETLProcessor, max_batch_size: int = None,
+                 max_wait_ms: float = None, request_timeout: float = None):
+        """
+        Args:
+            processor: Processador com recursos NLP (e modelo TF-IDF) carregados
+            max_batch_size: Músicas por micro-lote (padrão: Config.SERVICE_MAX_BATCH_SIZE)
+            max_wait_ms: Espera máxima do micro-lote (padrão: Config.SERVICE_MAX_WAIT_MS)
+            request_timeout: Tempo máximo por requisição (padrão: Config.SERVICE_REQUEST_TIMEOUT)
+        """
+        self.processor = processor
+        self.request_timeout = request_timeout or Config.SERVICE_REQUEST_TIMEOUT
+        self.batcher = MicroBatcher(
+            self._analyze_batch,
+            max_batch_size=max_batch_size or Config.SERVICE_MAX_BATCH_SIZE,
+            max_wait=(Config.SERVICE_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        )
+
+    def warm_up(self):
+        """Executa uma análise para carregar tokenizadores, tagger e léxico VADER"""
+        start = time.perf_counter()
+        self.analyze(_WARM_UP_SONG)
+        logger.info(f"Serviço aquecido em {time.perf_counter() - start:.2f}s")
+
+    def _normalize(self, song: Dict) -> Dict:
+        if not isinstance(song, dict):
+            raise ValueError("Cada música deve ser um objeto JSON")
+        lyrics = song.get('lyrics', song.get('text'))
+        if not isinstance(lyrics, str) or not lyrics.strip():
+            raise ValueError("Campo 'lyrics' obrigatório")
+        return self.processor._normalize_lyrics_data(song, 'api')
+
+    def analyze(self, song: Dict) -> Dict:
+        """
+        Analisa uma música
+
+        Args:
+            song: Dicionário com title, artist e lyrics (id opcional)
+
+        Returns:
+            Estatísticas, sentimento e palavras mais relevantes
+        """
+        future = self.batcher.submit(self._normalize(song))
+        return future.result(timeout=self.request_timeout)
+
+    def analyze_many(self, songs: List[Dict]) -> List[Dict]:
+        """Analisa várias músicas (compartilhando micro-lotes com outras requisições)"""
+        futures = [self.batcher.submit(self._normalize(song)) for song in songs]
+        return [future.result(timeout=self.request_timeout) for future in futures]
+
+    def _analyze_batch(self, records: List[Dict]) -> List[Dict]:
+        """Executa o transform em um micro-lote e monta a resposta de cada música"""
+        # Métricas por micro-lote: o processador vive enquanto o serviço estiver no ar
+        self.processor.metrics.reset()
+        # O id do cliente (ou o hash de título/artista) pode se repetir no lote:
+        # cada submissão recebe um id interno único e a resposta devolve o original
+        client_ids = [record['id'] for record in records]
+        records = [{**record, 'id': uuid.uuid4().hex} for record in records]
+        processed_df, word_freq_df, sentiment_df = self.processor.transform_lyrics(records)
+        failures = {
+            (failure.get('record') or {}).get('id'): failure['reason']
+            for failure in self.processor.dead_letter.drain()
+        }
+
+        processed = {row['id']: row for row in processed_df.to_dict('records')}
+        sentiments = {row['lyrics_id']: row for row in sentiment_df.to_dict('records')}
+        words: Dict[str, List[Dict]] = {}
+        if not word_freq_df.empty:
+            ranked = word_freq_df.assign(_score=word_freq_df['tf_idf'].fillna(0.0)).sort_values(
+                ['_score', 'frequency'], ascending=False
+            )
+            for row in ranked.to_dict('records'):
+                song_words = words.setdefault(row['lyrics_id'], [])
+                if len(song_words) < TOP_WORDS:
+                    song_words.append({
+                        key: _clean_value(row[key]) for key in ('word', 'frequency', 'tf_idf', 'pos_tag')
+                    })
+
+        results = []
+        for record, client_id in zip(records, client_ids):
+            song_id = record['id']
+            if song_id not in processed:
+                results.append({'id': client_id, 'error': failures.get(song_id, 'Falha na análise')})
+                continue
+
+            row = processed[song_id]
+            sentiment = sentiments.get(song_id)
+            results.append({
+                'id': client_id,
+                'title': record['title'],
+                'artist': record['artist'],
+                'statistics': {
+                    key: _clean_value(row[key])
+                    for key in ('word_count', 'unique_words', 'avg_word_length', 'readability_score')
+                },
+                'sentiment': {
+                    key: _clean_value(value) for key, value in sentiment.items()
+                    if key not in ('lyrics_id', 'analyzed_at')
+                } if sentiment else None,
+                'top_words': words.get(song_id) if 'word_frequency' in self.processor.analyzers else None
+            })
+        return results
+
+    def health(self) -> Dict:
+        return {
+            'status': 'ok',
+            'analysis_profile': self.processor.analysis_profile,
+            'tfidf_model': self.processor.tfidf_frozen,
+            'batches': self.batcher.batches,
+            'songs': self.batcher.items
+        }
+
+    def close(self):
+        self.batcher.close()
+
+
+def make_handler(service: LyricsAnalysisService):
+    """Cria a classe de handler HTTP ligada ao serviço"""
+
+    class AnalysisRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send_json(self, status: int, payload: Dict):
+            body = json.dumps(payload, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > Config.SERVICE_MAX_BODY_BYTES:
+                raise OverflowError(f"Corpo acima de {Config.SERVICE_MAX_BODY_BYTES} bytes")
+            return json.loads(self.rfile.read(length) or b'null')
+
+        def do_GET(self):
+            if self.path == '/healthz':
+                self._send_json(200, service.health())
+            else:
+                self._send_json(404, {'error': 'Rota não encontrada'})
+
+        def do_POST(self):
+            try:
+                payload = self._read_json()
+                if self.path == '/analyze':
+                    self._send_json(200, service.analyze(payload))
+                elif self.path == '/analyze/batch':
+                    songs = payload.get('songs') if isinstance(payload, dict) else None
+                    if not isinstance(songs, list):
+                        raise ValueError("Campo 'songs' deve ser uma lista")
+                    self._send_json(200, {'results': service.analyze_many(songs)})
+                else:
+                    self._send_json(404, {'error': 'Rota não encontrada'})
+            except OverflowError as e:
+                self._send_json(413, {'error': str(e)})
+            except (ValueError, json.JSONDecodeError) as e:
+                self._send_json(400, {'error': str(e)})
+            except TimeoutError:
+                self._send_json(504, {'error': 'Tempo limite da análise excedido'})
+            except Exception as e:
+                logger.error(f"Erro na requisição {self.path}: {str(e)}")
+                self._send_json(500, {'error': 'Erro interno'})
+
+        def log_message(self, format, *args):
+            # Sem uma linha de log por requisição no caminho quente
+            logger.debug(format, *args)
+
+    return AnalysisRequestHandler
+
+
+def create_server(service: LyricsAnalysisService, host: str = '0.0.0.0',
+                  port: int = None) -> ThreadingHTTPServer:
+    """Cria o servidor HTTP (porta 0 = porta livre escolhida pelo sistema)"""
+    return ThreadingHTTPServer((host, Config.SERVICE_PORT if port is None else port),
+                               make_handler(service))
+
+
+def main():
+    """Função principal do serviço"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serviço de análise de letras sob demanda')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Iniciar o serviço HTTP')
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    serve_parser.add_argument('--port', type=int, default=Config.SERVICE_PORT)
+    serve_parser.add_argument('--tfidf-model', default=Config.TFIDF_MODEL_PATH,
+                              help='Modelo TF-IDF persistido (local ou gs://)')
+    serve_parser.add_argument('--analysis-profile', choices=list(Config.ANALYSIS_PROFILES),
+                              default=Config.ANALYSIS_PROFILE)
+    serve_parser.add_argument('--max-batch-size', type=int, default=Config.SERVICE_MAX_BATCH_SIZE)
+    serve_parser.add_argument('--max-wait-ms', type=float, default=Config.SERVICE_MAX_WAIT_MS)
+
+    fit_parser = subparsers.add_parser('fit-model', help='Ajustar e gravar o modelo TF-IDF')
+    fit_parser.add_argument('--project-id', default=Config.PROJECT_ID)
+    fit_parser.add_argument('--dataset-id', default=Config.DATASET_ID)
+    fit_parser.add_argument('--bucket-name', default=Config.BUCKET_NAME)
+    fit_parser.add_argument('--input-prefix', default=Config.INPUT_PREFIX)
+    fit_parser.add_argument('--input-dir', help='Diretório local usado no lugar do bucket')
+    fit_parser.add_argument('--output', default=Config.TFIDF_MODEL_PATH, required=not Config.TFIDF_MODEL_PATH,
+                            help='Destino do modelo (local ou gs://)')
+
+    args = parser.parse_args()
+
+    if args.command == 'fit-model':
+        from output_sinks import ParquetSink
+        processor = LyricsETLProcessor(
+            args.project_id, args.dataset_id, args.bucket_name,
+            input_dir=args.input_dir,
+            sink=ParquetSink(Config.LOCAL_OUTPUT_DIR)
+        )
+        records = processor.extract_from_storage(args.input_prefix)
+        processor.fit_tfidf_model([record['lyrics'] for record in records if record['lyrics']])
+        processor.save_tfidf_model(args.output)
+        return
+
+    processor = LyricsETLProcessor.offline(analysis_profile=args.analysis_profile)
+    if args.tfidf_model:
+        processor.load_tfidf_model(args.tfidf_model)
+    else:
+        logger.warning("Sem modelo TF-IDF: tf_idf calculado apenas dentro de cada micro-lote")
+
+    service = LyricsAnalysisService(processor, args.max_batch_size, args.max_wait_ms)
+    service.warm_up()
+
+    server = create_server(service, args.host, args.port)
+    logger.info(f"Serviço de análise ouvindo em {args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
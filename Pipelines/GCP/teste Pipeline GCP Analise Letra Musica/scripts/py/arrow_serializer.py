@@ -0,0 +1,158 @@
+"""
+Serialização tipada das tabelas do pipeline
+Constrói tabelas Arrow a partir de Config.SCHEMAS e grava Parquet comprimido
+"""
+
+import io
+from typing import Dict, List, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from config import Config
+
+# Mapeamento de tipos BigQuery -> Arrow
+BQ_TO_ARROW_TYPES = {
+    'STRING': pa.string(),
+    'INTEGER': pa.int64(),
+    'FLOAT': pa.float64(),
+    'BOOLEAN': pa.bool_(),
+    'TIMESTAMP': pa.timestamp('us', tz='UTC'),
+}
+
+# Caracteres que precisam de escape ao montar arrays JSON de forma vetorizada
+_JSON_ESCAPES = [('\\', '\\\\'), ('"', '\\"'), ('\n', '\\n'), ('\r', '\\r'), ('\t', '\\t')]
+
+# Demais caracteres de controle (< U+0020): raros, escapados como \u00XX só quando presentes
+_OTHER_CONTROL_CODES = [code for code in range(0x20) if chr(code) not in '\n\r\t']
+_OTHER_CONTROL_PATTERN = r'[\x00-\x08\x0b\x0c\x0e-\x1f]'
+
+
+def _arrow_field(column: Dict) -> pa.Field:
+    """Converte uma definição de coluna BigQuery em campo Arrow"""
+    arrow_type = BQ_TO_ARROW_TYPES[column['type']]
+    if column['mode'] == 'REPEATED':
+        # Arrays BigQuery não aceitam NULL: lista vazia no lugar
+        element = pa.field('element', arrow_type, nullable=False)
+        return pa.field(column['name'], pa.list_(element), nullable=False)
+    return pa.field(column['name'], arrow_type, nullable=column['mode'] != 'REQUIRED')
+
+
+def arrow_schema_for(table_name: str, array_mode: str = None) -> pa.Schema:
+    """
+    Monta o schema Arrow equivalente ao schema BigQuery da tabela
+
+    Args:
+        table_name: Nome da tabela em Config.SCHEMAS
+        array_mode: 'json' ou 'repeated' (padrão: Config.ARRAY_COLUMN_MODE)
+
+    Returns:
+        Schema Arrow com tipos e nulabilidade declarados
+    """
+    schema = Config.get_table_schema(table_name, array_mode)
+    if not schema:
+        raise ValueError(f"Tabela sem schema declarado: {table_name}")
+
+    return pa.schema([_arrow_field(column) for column in schema])
+
+
+def to_arrow_table(data: Union[pd.DataFrame, List[Dict]], table_name: str,
+                   array_mode: str = None) -> pa.Table:
+    """
+    Converte dados em tabela Arrow tipada segundo Config.SCHEMAS
+
+    O DataFrame de entrada não é modificado. Colunas ausentes viram nulos e
+    colunas fora do schema são descartadas.
+
+    Args:
+        data: DataFrame ou lista de dicionários com as linhas da tabela
+        table_name: Nome da tabela em Config.SCHEMAS
+        array_mode: 'json' ou 'repeated' (padrão: Config.ARRAY_COLUMN_MODE)
+
+    Returns:
+        Tabela Arrow pronta para gravação em Parquet
+    """
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+    schema = arrow_schema_for(table_name, array_mode)
+    json_columns = set(Config.JSON_ARRAY_COLUMNS.get(table_name, []))
+
+    arrays = []
+    for field in schema:
+        if field.name not in df.columns:
+            if pa.types.is_list(field.type):
+                arrays.append(pa.array([[]] * len(df), type=field.type))
+                continue
+            if not field.nullable:
+                raise ValueError(f"Coluna obrigatória ausente em {table_name}: {field.name}")
+            arrays.append(pa.nulls(len(df), type=field.type))
+            continue
+
+        series = df[field.name]
+        if pa.types.is_list(field.type):
+            arrays.append(_repeated_column(series, field.type))
+        elif field.name in json_columns:
+            arrays.append(_json_array_column(series))
+        elif pa.types.is_timestamp(field.type):
+            arrays.append(pa.array(pd.to_datetime(series, utc=True), type=field.type))
+        else:
+            arrays.append(pa.array(series, from_pandas=True).cast(field.type))
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _repeated_column(series: pd.Series, list_type: pa.DataType) -> pa.Array:
+    """Converte uma coluna de listas em array Arrow nativo (nulos viram listas vazias)"""
+    values = pa.array(series, type=pa.list_(pa.string()), from_pandas=True)
+    values = pc.if_else(values.is_null(), pa.scalar([], type=values.type), values)
+    return values.cast(list_type)
+
+
+def _json_array_column(series: pd.Series) -> pa.Array:
+    """Codifica uma coluna de listas de strings como texto JSON sem laço por célula"""
+    values = pa.array(series, type=pa.list_(pa.string()), from_pandas=True)
+
+    flat = values.flatten()
+    for raw, escaped in _JSON_ESCAPES:
+        flat = pc.replace_substring(flat, raw, escaped)
+    if pc.any(pc.match_substring_regex(flat, _OTHER_CONTROL_PATTERN)).as_py():
+        for code in _OTHER_CONTROL_CODES:
+            flat = pc.replace_substring(flat, chr(code), f'\\u{code:04x}')
+    escaped_lists = pa.ListArray.from_arrays(values.offsets, flat, mask=values.is_null())
+
+    joined = pc.binary_join_element_wise(
+        '["', pc.binary_join(escaped_lists, '", "'), '"]', ''
+    )
+    return pc.if_else(pc.equal(pc.list_value_length(values), 0), pa.scalar('[]'), joined)
+
+
+def write_parquet(table: pa.Table, sink, compression: str = None):
+    """
+    Grava tabela Arrow em Parquet comprimido
+
+    Args:
+        table: Tabela Arrow
+        sink: Caminho ou objeto file-like de destino
+        compression: Codec Parquet (padrão: Config.PARQUET_COMPRESSION)
+    """
+    pq.write_table(table, sink, compression=compression or Config.PARQUET_COMPRESSION)
+
+
+def to_parquet_buffer(data: Union[pd.DataFrame, List[Dict]], table_name: str,
+                      array_mode: str = None) -> io.BytesIO:
+    """
+    Serializa os dados da tabela em um buffer Parquet em memória
+
+    Args:
+        data: DataFrame ou lista de dicionários
+        table_name: Nome da tabela em Config.SCHEMAS
+        array_mode: 'json' ou 'repeated' (padrão: Config.ARRAY_COLUMN_MODE)
+
+    Returns:
+        Buffer posicionado no início, pronto para upload
+    """
+    buffer = io.BytesIO()
+    write_parquet(to_arrow_table(data, table_name, array_mode), buffer)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,44 @@
+"""
+Chave normalizada de artista
+
+raw_lyrics guarda, além do nome como veio da fonte, a coluna artist_key
+(NFKC, espaços colapsados, minúsculas) e é clusterizada por ela: buscas por
+artista filtram artist_key com igualdade e o BigQuery poda os blocos do
+cluster, o que não acontece com LOWER(artist) = LOWER(...). A mesma
+normalização existe em SQL (ARTIST_KEY_SQL e a função normalize_artist em
+sql/create_tables.sql) para backfill e para agrupar o artist_rollup.
+"""
+
+import re
+import unicodedata
+from typing import Optional
+
+import pandas as pd
+
+# Mesma classe de espaços do \s do RE2 (BigQuery), para as duas versões coincidirem
+_WHITESPACE = re.compile(r'[ \t\n\r\f]+')
+
+# Expressão SQL equivalente a artist_key(); {column} é a coluna ou expressão de origem
+ARTIST_KEY_SQL = "LOWER(TRIM(REGEXP_REPLACE(NORMALIZE({column}, NFKC), r'[ \\t\\n\\r\\f]+', ' ')))"
+
+
+def artist_key(artist: Optional[str]) -> Optional[str]:
+    """
+    Chave normalizada de um nome de artista
+
+    Args:
+        artist: Nome como veio da fonte
+
+    Returns:
+        Nome em NFKC, sem espaços nas pontas, espaços internos colapsados e em
+        minúsculas (None para nome ausente)
+    """
+    if artist is None or (not isinstance(artist, str) and pd.isna(artist)):
+        return None
+    normalized = unicodedata.normalize('NFKC', str(artist))
+    return _WHITESPACE.sub(' ', normalized).strip(' \t\n\r\f').lower()
+
+
+def artist_key_series(artists: pd.Series) -> pd.Series:
+    """artist_key() aplicado a uma coluna (cada nome distinto é normalizado uma vez)"""
+    return artists.map({name: artist_key(name) for name in artists.dropna().unique()})
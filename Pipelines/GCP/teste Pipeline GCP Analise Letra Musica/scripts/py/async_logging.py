@@ -0,0 +1,270 @@
+"""
+Logging assíncrono, em lotes e amostrado para o caminho quente do pipeline
+
+O envio ao Cloud Logging sai da thread de processamento: os registros entram
+em uma fila limitada e uma thread de fundo os entrega em lotes. Mensagens por
+item (um arquivo, uma letra) são amostradas e resumidas por lote.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Loggers do próprio transporte não são reenviados ao Cloud Logging (evita laço)
+EXCLUDED_LOGGERS = ('google.cloud', 'google.auth', 'google_auth_httplib2',
+                    'google.api_core.bidi', 'urllib3')
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional['NonBlockingQueueHandler'] = None
+_setup_lock = threading.Lock()
+_sigterm_installed = False
+
+# Espera máxima pela entrega dos logs pendentes no desligamento (o Cloud Run
+# concede 10 s entre o SIGTERM e o SIGKILL)
+STOP_TIMEOUT = 5.0
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler que descarta registros quando a fila está cheia em vez de bloquear"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _BoundedQueueListener(QueueListener):
+    """QueueListener cuja parada espera no máximo STOP_TIMEOUT pela thread de fundo"""
+
+    def stop(self) -> bool:
+        """
+        Envia o sentinela e aguarda a thread de fundo esvaziar a fila
+
+        O QueueListener padrão usa put_nowait (queue.Full com a fila cheia) e
+        join sem limite (trava com o destino travado).
+
+        Returns:
+            False se a fila ou a thread não liberaram dentro do prazo
+        """
+        if self._thread is None:
+            return True
+        deadline = time.monotonic() + STOP_TIMEOUT
+        try:
+            self.queue.put(self._sentinel, timeout=STOP_TIMEOUT)
+        except queue.Full:
+            return False
+        self._thread.join(max(deadline - time.monotonic(), 0))
+        if self._thread.is_alive():
+            return False
+        self._thread = None
+        return True
+
+
+class BatchingHandler(MemoryHandler):
+    """
+    Acumula registros e os entrega ao handler de destino em lotes
+
+    O lote é entregue ao atingir a capacidade, imediatamente para registros de
+    nível ERROR ou acima e, mesmo sem novos registros, por um timer a cada
+    flush_interval: um serviço ocioso não retém logs até ser desligado.
+    """
+
+    def __init__(self, target: logging.Handler, capacity: int = 100,
+                 flush_interval: float = 5.0):
+        """
+        Args:
+            target: Handler que recebe os registros (ex.: Cloud Logging)
+            capacity: Registros por lote
+            flush_interval: Intervalo máximo entre entregas em segundos (0 = sem timer)
+        """
+        super().__init__(capacity, flushLevel=logging.ERROR, target=target,
+                         flushOnClose=True)
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self._closed = threading.Event()
+        self._timer = None
+        if flush_interval > 0:
+            self._timer = threading.Thread(target=self._flush_periodically,
+                                           name='log-batch-flush', daemon=True)
+            self._timer.start()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            if self.buffer:
+                self.flush()
+
+    def shouldFlush(self, record: logging.LogRecord) -> bool:
+        return (
+            super().shouldFlush(record)
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        )
+
+    def flush(self):
+        super().flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self._closed.set()
+        if self._timer is not None and self._timer is not threading.current_thread():
+            self._timer.join()
+        super().close()
+
+
+def setup_async_logging(target: logging.Handler, queue_size: int = 10000,
+                        batch_size: int = 100, flush_interval: float = 5.0) -> QueueListener:
+    """
+    Instala no logger raiz um handler não bloqueante que encaminha para target
+
+    Chamadas repetidas reutilizam o listener já instalado.
+
+    Args:
+        target: Handler de destino (executado na thread de fundo)
+        queue_size: Capacidade da fila; registros excedentes são descartados
+        batch_size: Registros por lote entregue ao destino
+        flush_interval: Intervalo máximo entre entregas em segundos
+
+    Returns:
+        QueueListener em execução
+    """
+    global _listener, _queue_handler
+
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+
+        log_queue = queue.Queue(maxsize=queue_size)
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+        _queue_handler.addFilter(lambda record: not record.name.startswith(EXCLUDED_LOGGERS))
+        batching = BatchingHandler(target, capacity=batch_size, flush_interval=flush_interval)
+        _listener = _BoundedQueueListener(log_queue, batching)
+        _listener.start()
+
+        logging.getLogger().addHandler(_queue_handler)
+        atexit.register(shutdown_async_logging)
+        _install_sigterm_flush()
+        return _listener
+
+
+def _install_sigterm_flush():
+    """
+    Entrega os logs pendentes ao receber SIGTERM (desligamento do Cloud Run)
+
+    Por padrão o SIGTERM encerra o processo sem executar o atexit. O handler
+    anterior é preservado: depois da entrega ele é chamado ou, se era o
+    padrão, o sinal é reenviado com o comportamento padrão.
+    """
+    global _sigterm_installed
+
+    # signal.signal só pode ser chamado na thread principal
+    if _sigterm_installed or threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def on_sigterm(signum, frame):
+        # Sem bloquear: o sinal pode interromper a thread principal dentro do setup
+        try:
+            if _setup_lock.acquire(blocking=False):
+                try:
+                    _shutdown()
+                finally:
+                    _setup_lock.release()
+        finally:
+            # Falhas na entrega não impedem o encerramento
+            if callable(previous):
+                previous(signum, frame)
+            elif previous != signal.SIG_IGN:
+                signal.signal(signum, signal.SIG_DFL)
+                os.kill(os.getpid(), signum)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+    _sigterm_installed = True
+
+
+def shutdown_async_logging():
+    """Esvazia a fila, entrega o último lote e remove o handler"""
+    with _setup_lock:
+        _shutdown()
+
+
+def _shutdown():
+    global _listener, _queue_handler
+
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    if _listener.stop():
+        for handler in _listener.handlers:
+            handler.close()
+    else:
+        # Destino travado: a thread de fundo (daemon) segue com os handlers,
+        # que não são fechados sob ela; os registros ainda na fila se perdem
+        logger.warning(f"Logs não entregues em {STOP_TIMEOUT}s no desligamento; "
+                       f"{_listener.queue.qsize()} registros ainda na fila")
+    if _queue_handler.dropped:
+        logger.warning(f"{_queue_handler.dropped} registros de log descartados (fila cheia)")
+    _listener = None
+    _queue_handler = None
+
+
+class ItemLogSampler:
+    """
+    Amostragem de mensagens por item com resumo por lote
+
+    Em cada lote registra as primeiras `first` mensagens e depois uma a cada
+    `every`; as demais são apenas contadas e aparecem no resumo. Assim o
+    volume de log por lote é constante, qualquer que seja o número de itens.
+    """
+
+    def __init__(self, target_logger: logging.Logger, first: int = 5, every: int = 1000):
+        """
+        Args:
+            target_logger: Logger que recebe as mensagens amostradas
+            first: Mensagens registradas no início de cada lote
+            every: Intervalo de amostragem após as primeiras (0 = nenhuma)
+        """
+        self.logger = target_logger
+        self.first = first
+        self.every = every
+        self.count = 0
+        self.suppressed = 0
+
+    def info(self, msg: str, *args):
+        """Registra (ou conta) uma mensagem por item; a formatação só ocorre se amostrada"""
+        self.count += 1
+        sampled = self.count <= self.first or (self.every and self.count % self.every == 0)
+        if sampled and self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(msg, *args)
+        else:
+            self.suppressed += 1
+
+    def summarize(self, description: str) -> int:
+        """
+        Registra o resumo do lote e reinicia os contadores
+
+        Args:
+            description: Descrição dos itens (ex.: 'arquivos processados')
+
+        Returns:
+            Quantidade de itens do lote
+        """
+        count = self.count
+        if count:
+            self.logger.info(
+                f"{count} {description} ({self.suppressed} mensagens por item suprimidas)"
+            )
+        self.count = 0
+        self.suppressed = 0
+        return count
@@ -0,0 +1,342 @@
+"""
+Benchmark do transform do pipeline ETL sobre um corpus sintético determinístico
+
+Uso:
+    python benchmark_etl.py run --sizes 1000 10000 100000 --output benchmarks/baseline.json
+    python benchmark_etl.py compare benchmarks/baseline.json benchmarks/current.json
+"""
+
+import hashlib
+import json
+import logging
+import platform
+import random
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from metrics import PipelineMetrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+# Sílabas usadas para formar as palavras sintéticas do vocabulário
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ne', 'so', 'tu', 'vi', 'de', 'ba', 'shi', 'mor', 'tan', 'gle']
+
+# Palavras reais com polaridade no VADER, para exercitar a análise de sentimento
+SENTIMENT_WORDS = [
+    'love', 'happy', 'sunshine', 'smile', 'dream', 'hope', 'kiss', 'free', 'beautiful',
+    'hate', 'sad', 'pain', 'cry', 'lonely', 'broken', 'fear', 'lost', 'tears',
+    'night', 'road', 'heart', 'time', 'fire', 'rain', 'city', 'dance', 'home'
+]
+
+GENRES = ['Pop', 'Rock', 'Hip Hop', 'Country', 'R&B', 'Jazz', 'Metal', 'Folk']
+
+
+def generate_corpus(songs: int, lines_per_song: int = 20, words_per_line: int = 8,
+                    vocabulary_size: int = 5000, duplicate_ratio: float = 0.0,
+                    seed: int = 42) -> List[Dict]:
+    """
+    Gera um corpus sintético de letras, idêntico para a mesma combinação de parâmetros
+
+    As palavras seguem uma distribuição de Zipf sobre o vocabulário, como em
+    texto real. Uma fração duplicate_ratio das músicas repete a letra de uma
+    música anterior (relançamentos, versões ao vivo).
+
+    Args:
+        songs: Quantidade de músicas
+        lines_per_song: Linhas por letra
+        words_per_line: Palavras por linha
+        vocabulary_size: Palavras sintéticas distintas (além das de sentimento)
+        duplicate_ratio: Fração de músicas com letra duplicada (0 a 1)
+        seed: Semente do gerador
+
+    Returns:
+        Registros no formato normalizado de extract_from_storage
+    """
+    if not 0 <= duplicate_ratio < 1:
+        raise ValueError(f"duplicate_ratio deve estar em [0, 1): {duplicate_ratio}")
+
+    rng = random.Random(seed)
+
+    vocabulary = set()
+    while len(vocabulary) < vocabulary_size:
+        vocabulary.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(vocabulary) + SENTIMENT_WORDS
+    rng.shuffle(words)
+    cum_weights = []
+    total = 0.0
+    for rank in range(len(words)):
+        total += 1.0 / (rank + 1)
+        cum_weights.append(total)
+
+    artists = [f"Artist {index:04d}" for index in range(max(1, songs // 10))]
+    corpus = []
+    for index in range(songs):
+        if corpus and rng.random() < duplicate_ratio:
+            lyrics = corpus[rng.randrange(len(corpus))]['lyrics']
+        else:
+            lines = []
+            for _ in range(lines_per_song):
+                line = rng.choices(words, cum_weights=cum_weights, k=words_per_line)
+                lines.append(' '.join(line).capitalize() + rng.choice(['.', ',', '!', '?']))
+            lyrics = '\n'.join(lines)
+
+        title = f"Song {index:06d}"
+        artist = rng.choice(artists)
+        corpus.append({
+            'id': hashlib.md5(f"{title}_{artist}_synthetic".encode()).hexdigest(),
+            'title': title,
+            'artist': artist,
+            'album': f"Album {index // 12:05d}",
+            'genre': rng.choice(GENRES),
+            'year': rng.randint(1960, 2023),
+            'lyrics': lyrics,
+            'source': 'synthetic',
+            'created_at': '2024-01-01T00:00:00',
+            'file_path': 'synthetic'
+        })
+
+    return corpus
+
+
+class TransformBenchmark:
+    """
+    Mede transform_lyrics e cada componente NLP em corpora de tamanhos crescentes
+
+    Cada tamanho é executado em duas passagens: uma de tempo, sem rastrear
+    memória, e outra com tracemalloc para o pico de memória por estágio.
+    """
+
+    def __init__(self, processor=None, track_memory: bool = True, repeat: int = 1,
+                 **corpus_options):
+        """
+        Args:
+            processor: LyricsETLProcessor (padrão: processador offline sem GCP)
+            track_memory: Executar a passagem de memória
+            repeat: Repetições da passagem de tempo (vale a mais rápida)
+            **corpus_options: Parâmetros de generate_corpus
+        """
+        self.processor = processor or self._offline_processor()
+        self.track_memory = track_memory
+        self.repeat = max(1, repeat)
+        self.corpus_options = corpus_options
+
+    @staticmethod
+    def _offline_processor():
+        from etl_processor import LyricsETLProcessor
+        return LyricsETLProcessor.offline()
+
+    def _transform(self, corpus: List[Dict], track_memory: bool) -> Dict:
+        # PipelineMetrics liga o tracemalloc só na passagem de memória
+        self.processor.metrics = PipelineMetrics(track_memory=track_memory)
+        self.processor.metrics.start()
+        if track_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        self.processor.transform_lyrics(corpus)
+        elapsed = time.perf_counter() - start
+
+        peak_memory = tracemalloc.get_traced_memory()[1] - baseline if track_memory else 0
+        self.processor.metrics.stop()
+        return {
+            'seconds': elapsed,
+            'peak_memory_bytes': peak_memory,
+            'stages': self.processor.metrics.to_dict()
+        }
+
+    def run_size(self, songs: int) -> Dict:
+        """
+        Executa o benchmark para um tamanho de corpus
+
+        Args:
+            songs: Quantidade de músicas
+
+        Returns:
+            Tempo, throughput, pico de memória e métricas por estágio
+        """
+        corpus = generate_corpus(songs, **self.corpus_options)
+        logger.info(f"Benchmark com {songs} músicas")
+
+        timing = min(
+            (self._transform(corpus, track_memory=False) for _ in range(self.repeat)),
+            key=lambda run: run['seconds']
+        )
+        result = {
+            'songs': songs,
+            'transform_seconds': round(timing['seconds'], 6),
+            'songs_per_second': round(songs / timing['seconds'], 3) if timing['seconds'] else 0.0,
+            'peak_memory_bytes': 0,
+            'stages': timing['stages']
+        }
+
+        if self.track_memory:
+            memory = self._transform(corpus, track_memory=True)
+            result['peak_memory_bytes'] = memory['peak_memory_bytes']
+            for name, stage in memory['stages'].items():
+                if name in result['stages']:
+                    result['stages'][name]['peak_memory_bytes'] = stage['peak_memory_bytes']
+
+        logger.info(
+            f"{songs} músicas: {result['transform_seconds']:.2f}s "
+            f"({result['songs_per_second']:.1f} músicas/s)"
+        )
+        return result
+
+    def run(self, sizes: Sequence[int] = DEFAULT_SIZES) -> Dict:
+        """
+        Executa o benchmark para todos os tamanhos
+
+        Returns:
+            Relatório com ambiente, parâmetros do corpus e resultados por tamanho
+        """
+        results = {str(songs): self.run_size(songs) for songs in sizes}
+
+        return {
+            'created_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'corpus': self.corpus_options,
+            'repeat': self.repeat,
+            'results': results
+        }
+
+
+def compare_reports(baseline: Dict, current: Dict, throughput_tolerance: float = 0.10,
+                    memory_tolerance: float = 0.20) -> List[str]:
+    """
+    Compara dois relatórios e lista as regressões
+
+    Compara, para cada tamanho presente nos dois relatórios, o throughput do
+    transform e de cada estágio e o pico de memória.
+
+    Args:
+        baseline: Relatório de referência
+        current: Relatório atual
+        throughput_tolerance: Queda relativa de throughput tolerada
+        memory_tolerance: Aumento relativo de pico de memória tolerado
+
+    Returns:
+        Descrições das regressões encontradas (lista vazia = sem regressão)
+    """
+    regressions = []
+
+    def check_throughput(label: str, before: float, after: float):
+        if before > 0 and after < before * (1 - throughput_tolerance):
+            regressions.append(
+                f"{label}: throughput caiu {1 - after / before:.1%} ({before:.1f} -> {after:.1f}/s)"
+            )
+
+    def check_memory(label: str, before: int, after: int):
+        if before > 0 and after > before * (1 + memory_tolerance):
+            regressions.append(
+                f"{label}: pico de memória subiu {after / before - 1:.1%} ({before} -> {after} bytes)"
+            )
+
+    for size, before in baseline.get('results', {}).items():
+        after = current.get('results', {}).get(size)
+        if after is None:
+            continue
+
+        check_throughput(f"{size} músicas", before['songs_per_second'], after['songs_per_second'])
+        check_memory(f"{size} músicas", before['peak_memory_bytes'], after['peak_memory_bytes'])
+
+        for stage, stage_before in before.get('stages', {}).items():
+            stage_after = after.get('stages', {}).get(stage)
+            if stage_after is None:
+                continue
+            label = f"{size} músicas [{stage}]"
+            check_throughput(label, stage_before['records_per_second'],
+                             stage_after['records_per_second'])
+            check_memory(label, stage_before['peak_memory_bytes'],
+                         stage_after['peak_memory_bytes'])
+
+    return regressions
+
+
+def _load_report(path: str) -> Dict:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    """Função principal do benchmark"""
+    import argparse
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description='Benchmark do transform do pipeline ETL')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Executar o benchmark')
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                            help='Quantidades de músicas')
+    run_parser.add_argument('--lines-per-song', type=int, default=20)
+    run_parser.add_argument('--words-per-line', type=int, default=8)
+    run_parser.add_argument('--vocabulary-size', type=int, default=5000)
+    run_parser.add_argument('--duplicate-ratio', type=float, default=0.0)
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--repeat', type=int, default=1,
+                            help='Repetições da passagem de tempo (vale a mais rápida)')
+    run_parser.add_argument('--no-memory', action='store_true',
+                            help='Não executar a passagem de pico de memória')
+    run_parser.add_argument('--output', default='benchmarks/benchmark.json',
+                            help='Arquivo JSON do relatório')
+    run_parser.add_argument('--baseline', help='Comparar o resultado com este relatório')
+
+    compare_parser = subparsers.add_parser('compare', help='Comparar dois relatórios')
+    compare_parser.add_argument('baseline', help='Relatório de referência')
+    compare_parser.add_argument('current', help='Relatório atual')
+
+    for sub in (run_parser, compare_parser):
+        sub.add_argument('--throughput-tolerance', type=float, default=0.10,
+                         help='Queda de throughput tolerada (fração)')
+        sub.add_argument('--memory-tolerance', type=float, default=0.20,
+                         help='Aumento de pico de memória tolerado (fração)')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        benchmark = TransformBenchmark(
+            track_memory=not args.no_memory,
+            repeat=args.repeat,
+            lines_per_song=args.lines_per_song,
+            words_per_line=args.words_per_line,
+            vocabulary_size=args.vocabulary_size,
+            duplicate_ratio=args.duplicate_ratio,
+            seed=args.seed
+        )
+        current = benchmark.run(args.sizes)
+
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(current, indent=2), encoding='utf-8')
+        print(f"Relatório gravado em {output}")
+
+        if not args.baseline:
+            return
+        baseline = _load_report(args.baseline)
+    else:
+        baseline = _load_report(args.baseline)
+        current = _load_report(args.current)
+
+    regressions = compare_reports(baseline, current, args.throughput_tolerance,
+                                  args.memory_tolerance)
+    for regression in regressions:
+        print(f"REGRESSÃO: {regression}")
+    if not regressions:
+        print("Nenhuma regressão encontrada")
+
+    exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
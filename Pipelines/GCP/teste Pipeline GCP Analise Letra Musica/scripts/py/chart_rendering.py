@@ -0,0 +1,170 @@
+"""
+Renderização headless dos gráficos do relatório
+
+Funções de módulo (serializáveis) executadas no pool de processos do
+relatório: nuvens de palavras desenhadas com a API orientada a objetos do
+matplotlib (Figure + canvas Agg, sem pyplot nem janela) e gravação dos HTML
+do plotly. Módulo leve de propósito: é o que os processos filhos importam.
+
+No modo leve do relatório os HTML referenciam um único plotly.min.js no
+diretório de saída (ou na CDN), o JSON da figura leva só a parte do template
+usada pelos traces e scatters grandes viram Scattergl (WebGL).
+"""
+
+import os
+from typing import Dict
+
+import plotly.io as pio
+from matplotlib.figure import Figure
+from plotly.offline import get_plotlyjs
+from wordcloud import WordCloud
+
+WORDCLOUD_FIGSIZE = (15, 10)
+PLOTLYJS_BUNDLE = 'plotly.min.js'
+
+# Propriedades de scatter sem equivalente no Scattergl
+_SVG_ONLY_LINE_SHAPES = {'spline'}
+
+
+def build_wordcloud(frequencies: Dict[str, float]) -> WordCloud:
+    """Layout da nuvem de palavras (etapa mais cara da renderização)"""
+    return WordCloud(
+        width=1200,
+        height=800,
+        background_color='white',
+        max_words=100,
+        colormap='viridis',
+        relative_scaling=0.5,
+        random_state=42
+    ).generate_from_frequencies(frequencies)
+
+
+def draw_wordcloud(wordcloud: WordCloud, title: str, figure: Figure = None) -> Figure:
+    """
+    Desenha a nuvem com título
+
+    Args:
+        wordcloud: Nuvem já calculada
+        title: Título do gráfico
+        figure: Figura de destino (padrão: nova Figure sem pyplot)
+    """
+    figure = figure or Figure(figsize=WORDCLOUD_FIGSIZE)
+    ax = figure.add_subplot()
+    ax.imshow(wordcloud, interpolation='bilinear')
+    ax.axis('off')
+    ax.set_title(title, fontsize=20, fontweight='bold', pad=20)
+    return figure
+
+
+def save_figure(figure: Figure, save_path: str, dpi: int,
+                preview_path: str = None, preview_dpi: int = None):
+    """Grava a imagem final e, opcionalmente, a prévia em baixa resolução"""
+    figure.savefig(save_path, dpi=dpi, bbox_inches='tight')
+    if preview_path:
+        figure.savefig(preview_path, dpi=preview_dpi, bbox_inches='tight')
+
+
+def render_wordcloud_file(frequencies: Dict[str, float], title: str, save_path: str,
+                          dpi: int, preview_path: str = None, preview_dpi: int = None) -> str:
+    """
+    Calcula, desenha e grava uma nuvem de palavras (tarefa do pool de processos)
+
+    Returns:
+        Caminho da imagem final
+    """
+    figure = draw_wordcloud(build_wordcloud(frequencies), title)
+    save_figure(figure, save_path, dpi, preview_path, preview_dpi)
+    return save_path
+
+
+def ensure_plotlyjs_bundle(directory: str) -> str:
+    """
+    Grava o plotly.min.js no diretório, se ainda não existir
+
+    A escrita é atômica: processos do pool que gravam HTML no mesmo
+    diretório nunca enxergam um bundle pela metade.
+
+    Returns:
+        Caminho do bundle
+    """
+    bundle_path = os.path.join(directory or '.', PLOTLYJS_BUNDLE)
+    if not os.path.exists(bundle_path):
+        tmp_path = f"{bundle_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+        os.replace(tmp_path, bundle_path)
+    return bundle_path
+
+
+def _point_count(trace: Dict) -> int:
+    counts = [0]
+    for axis in ('x', 'y'):
+        values = trace.get(axis)
+        if values is not None and not isinstance(values, (str, dict)):
+            counts.append(len(values))
+    return max(counts)
+
+
+def _supports_webgl(trace: Dict) -> bool:
+    line = trace.get('line') or {}
+    return not trace.get('stackgroup') and line.get('shape') not in _SVG_ONLY_LINE_SHAPES
+
+
+def lightweight_figure(fig, webgl_threshold: int = 0) -> Dict:
+    """
+    Figura plotly como dicionário enxuto para o HTML do relatório
+
+    Args:
+        fig: Figura plotly
+        webgl_threshold: Traces scatter com mais pontos que isso viram
+            Scattergl (0 = nunca)
+
+    Returns:
+        Dicionário da figura (data e layout)
+    """
+    figure = fig.to_dict()
+    used_types = set()
+    for trace in figure.get('data', []):
+        if (webgl_threshold and trace.get('type', 'scatter') == 'scatter'
+                and _point_count(trace) > webgl_threshold and _supports_webgl(trace)):
+            trace['type'] = 'scattergl'
+        used_types.add(trace.get('type', 'scatter'))
+
+    # O template traz padrões de todos os tipos de trace (a maior parte do JSON)
+    template = figure.get('layout', {}).get('template')
+    if template and template.get('data'):
+        template['data'] = {
+            trace_type: defaults for trace_type, defaults in template['data'].items()
+            if trace_type in used_types
+        }
+    return figure
+
+
+def write_figure_html(fig, save_path: str, include_plotlyjs='directory',
+                      lightweight: bool = False, webgl_threshold: int = 0) -> str:
+    """
+    Grava uma figura plotly em HTML (tarefa do pool de processos)
+
+    Args:
+        fig: Figura plotly
+        save_path: Arquivo HTML de destino
+        include_plotlyjs: Só no modo leve: 'directory' (plotly.min.js compartilhado
+            ao lado do HTML), 'cdn' ou True (bundle embutido)
+        lightweight: Modo leve do relatório; False grava como fig.write_html
+        webgl_threshold: Pontos a partir dos quais scatters viram Scattergl
+    """
+    if not lightweight:
+        fig.write_html(save_path)
+        return save_path
+
+    if include_plotlyjs == 'directory':
+        ensure_plotlyjs_bundle(os.path.dirname(save_path))
+    html = pio.to_html(
+        lightweight_figure(fig, webgl_threshold),
+        include_plotlyjs=include_plotlyjs,
+        full_html=True,
+        validate=False
+    )
+    with open(save_path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    return save_path
@@ -0,0 +1,269 @@
+"""
+Checkpoint de lotes e fila de mensagens mortas (dead-letter) do pipeline ETL
+Os registros ficam em arquivos JSON Lines locais ou em objetos gs://
+"""
+
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from google.api_core.exceptions import NotFound
+
+logger = logging.getLogger(__name__)
+
+# Janela relida a cada read_new() no GCS (tolerância a relógios de escritores diferentes)
+PARTS_LOOKBACK = timedelta(minutes=10)
+
+
+class JsonLinesFile:
+    """
+    Arquivo JSON Lines em disco local ou no Cloud Storage (gs://bucket/objeto)
+
+    Localmente as entradas são acrescentadas ao arquivo. No Cloud Storage os
+    objetos são imutáveis: cada append grava um objeto próprio
+    (<objeto>/<momento>-<id>.jsonl) com precondição de criação, sem reler nem
+    reescrever as entradas anteriores, e escritores concorrentes (tarefas,
+    instâncias do serviço) não perdem entradas uns dos outros.
+    """
+
+    def __init__(self, location: str, storage_client=None):
+        """
+        Args:
+            location: Caminho local ou URI gs://
+            storage_client: Cliente Cloud Storage (obrigatório para gs://)
+        """
+        self.location = location
+        self._bucket = None
+        # Estado de read_new(): posição no arquivo local ou partes já lidas no GCS
+        self._offset = 0
+        self._seen_parts: Set[str] = set()
+        self._listed_at: Optional[datetime] = None
+
+        if location.startswith('gs://'):
+            if storage_client is None:
+                from google.cloud import storage
+                storage_client = storage.Client()
+            bucket_name, _, self._object_name = location[len('gs://'):].partition('/')
+            self._bucket = storage_client.bucket(bucket_name)
+            self._parts_prefix = f"{self._object_name}/"
+        else:
+            self._path = Path(location)
+
+    def _list_parts(self, start_offset: str = None) -> List:
+        parts = self._bucket.list_blobs(prefix=self._parts_prefix, start_offset=start_offset)
+        return sorted(parts, key=lambda part: part.name)
+
+    def read(self) -> List[Dict]:
+        """Lê todas as entradas (arquivo inexistente = lista vazia)"""
+        if self._bucket is not None:
+            # Objeto único das versões anteriores, seguido das partes
+            try:
+                content = self._bucket.blob(self._object_name).download_as_text()
+            except NotFound:
+                content = ''
+            entries = _parse_lines(content)
+            for part in self._list_parts():
+                entries.extend(_parse_lines(part.download_as_text()))
+            return entries
+
+        if not self._path.exists():
+            return []
+        return _parse_lines(self._path.read_text(encoding='utf-8'))
+
+    def read_new(self) -> List[Dict]:
+        """
+        Entradas gravadas desde a chamada anterior (por qualquer escritor)
+
+        O custo depende só do que foi gravado desde então, não do tamanho do
+        arquivo. No GCS a listagem recomeça PARTS_LOOKBACK antes da anterior,
+        o que cobre partes de escritores com relógio um pouco atrasado.
+        """
+        if self._bucket is not None:
+            start_offset = None
+            if self._listed_at is not None:
+                start_offset = self._parts_prefix + _part_stamp(self._listed_at - PARTS_LOOKBACK)
+                # Partes anteriores à janela não voltam a ser listadas
+                self._seen_parts = {name for name in self._seen_parts if name >= start_offset}
+            self._listed_at = datetime.now(timezone.utc)
+
+            entries = []
+            for part in self._list_parts(start_offset):
+                if part.name in self._seen_parts:
+                    continue
+                self._seen_parts.add(part.name)
+                entries.extend(_parse_lines(part.download_as_text()))
+            return entries
+
+        if not self._path.exists():
+            self._offset = 0
+            return []
+        with open(self._path, 'rb') as f:
+            f.seek(0, 2)
+            if f.tell() < self._offset:
+                # Arquivo recriado por outro processo
+                self._offset = 0
+            f.seek(self._offset)
+            data = f.read()
+        # Só linhas completas; uma linha em gravação fica para a próxima leitura
+        complete = data[:data.rfind(b'\n') + 1]
+        self._offset += len(complete)
+        return _parse_lines(complete.decode('utf-8'))
+
+    def append(self, entries: Iterable[Dict]):
+        """Acrescenta entradas ao final do arquivo"""
+        lines = ''.join(json.dumps(entry, default=str) + '\n' for entry in entries)
+        if not lines:
+            return
+
+        if self._bucket is not None:
+            name = (f"{self._parts_prefix}{_part_stamp(datetime.now(timezone.utc))}"
+                    f"-{uuid.uuid4().hex[:12]}.jsonl")
+            # if_generation_match=0: só cria, nunca sobrescreve uma parte existente
+            self._bucket.blob(name).upload_from_string(
+                lines, content_type='application/x-ndjson', if_generation_match=0
+            )
+        else:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+
+    def reset(self):
+        """Remove o arquivo (não cria nada se ele não existir)"""
+        self._offset = 0
+        self._seen_parts = set()
+        self._listed_at = None
+        if self._bucket is not None:
+            for blob in [self._bucket.blob(self._object_name)] + self._list_parts():
+                try:
+                    blob.delete()
+                except NotFound:
+                    pass
+        elif self._path.exists():
+            self._path.unlink()
+
+
+def _parse_lines(content: str) -> List[Dict]:
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def _part_stamp(moment: datetime) -> str:
+    """Prefixo ordenável do nome das partes no GCS"""
+    return moment.strftime('%Y%m%dT%H%M%S.%fZ')
+
+
+class CheckpointStore:
+    """
+    Registro dos lotes já carregados no destino
+
+    Cada lote confirmado gera uma entrada com os arquivos que o compõem.
+    Um arquivo é identificado por nome e geração: um objeto regravado, mesmo
+    com o mesmo tamanho, volta a ser processado. As chaves confirmadas ficam
+    em memória e cada consulta lê apenas os lotes gravados desde a anterior.
+    """
+
+    def __init__(self, location: str, storage_client=None):
+        self.file = JsonLinesFile(location, storage_client)
+        self._keys: Set[str] = set()
+        self._batches = 0
+
+    @staticmethod
+    def blob_key(blob) -> str:
+        return f"{blob.name}#{blob.generation}"
+
+    def _refresh(self):
+        for entry in self.file.read_new():
+            self._keys.update(entry.get('blobs', []))
+            self._batches += 1
+
+    def committed_keys(self) -> Set[str]:
+        """Chaves dos arquivos que pertencem a lotes confirmados (não modificar)"""
+        self._refresh()
+        return self._keys
+
+    def committed_batches(self) -> int:
+        self._refresh()
+        return self._batches
+
+    def record_batch(self, batch_number: int, blobs: List, records: int,
+                     rows_written: Dict[str, int] = None):
+        """
+        Registra um lote como confirmado
+
+        Args:
+            batch_number: Número sequencial do lote na execução
+            blobs: Arquivos do lote
+            records: Quantidade de letras extraídas do lote
+            rows_written: Linhas gravadas por tabela
+        """
+        self.file.append([{
+            'batch_number': batch_number,
+            'blobs': [self.blob_key(blob) for blob in blobs],
+            'records': records,
+            'rows_written': rows_written or {},
+            'committed_at': datetime.utcnow().isoformat()
+        }])
+
+    def reset(self):
+        self.file.reset()
+        self._keys = set()
+        self._batches = 0
+
+
+class DeadLetterQueue:
+    """
+    Registros que falharam em algum estágio, para reprocessamento isolado
+
+    Entradas de extração guardam o arquivo de origem; entradas de
+    transformação guardam o registro bruto completo.
+    """
+
+    def __init__(self, location: str, storage_client=None):
+        self.file = JsonLinesFile(location, storage_client)
+        self._pending: List[Dict] = []
+
+    @property
+    def location(self) -> str:
+        return self.file.location
+
+    def add(self, stage: str, error: Exception, file_path: str = None,
+            record: Optional[Dict] = None):
+        """
+        Adiciona uma falha (gravada no próximo flush)
+
+        Args:
+            stage: Estágio em que a falha ocorreu (extract, transform, ...)
+            error: Exceção ou motivo da falha
+            file_path: Arquivo de origem
+            record: Registro bruto, quando disponível
+        """
+        self._pending.append({
+            'stage': stage,
+            'reason': str(error),
+            'file_path': file_path or (record or {}).get('file_path'),
+            'record': record,
+            'failed_at': datetime.utcnow().isoformat()
+        })
+
+    def flush(self) -> int:
+        """Grava as falhas pendentes e retorna quantas foram gravadas"""
+        count = len(self._pending)
+        if count:
+            self.file.append(self._pending)
+            logger.warning(f"{count} falhas enviadas para {self.location}")
+            self._pending = []
+        return count
+
+    def drain(self) -> List[Dict]:
+        """Retorna e descarta as falhas pendentes sem gravá-las"""
+        pending, self._pending = self._pending, []
+        return pending
+
+    def read(self) -> List[Dict]:
+        return self.file.read()
+
+    def reset(self):
+        self._pending = []
+        self.file.reset()
@@ -3,7 +3,12 @@ Configurações do pipeline ETL
 """
 
 import os
-from typing import Dict, Any
+import logging
+from typing import Dict, Any, List, Tuple
+
+from resources import ResourceLimits, tune_batch_size, tune_workers
+
+logger = logging.getLogger(__name__)
 
 class Config:
     """Classe de configuração centralizada"""
@@ -21,9 +26,183 @@ class Config:
     BATCH_SIZE = int(os.getenv('BATCH_SIZE', '100'))
     MAX_WORKERS = int(os.getenv('MAX_WORKERS', '4'))
     
+    # Ajuste automático de BATCH_SIZE/MAX_WORKERS pelos limites de CPU e memória
+    # do container (valores definidos explicitamente por variável de ambiente prevalecem)
+    AUTO_TUNE = os.getenv('AUTO_TUNE', 'true').lower() == 'true'
+    MEMORY_PER_FILE_MB = float(os.getenv('MEMORY_PER_FILE_MB', '4'))
+    MEMORY_BUDGET_FRACTION = float(os.getenv('MEMORY_BUDGET_FRACTION', '0.5'))
+    MIN_BATCH_SIZE = int(os.getenv('MIN_BATCH_SIZE', '10'))
+    MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '1000'))
+    MEMORY_HIGH_WATERMARK = float(os.getenv('MEMORY_HIGH_WATERMARK', '0.85'))
+    MEMORY_LOW_WATERMARK = float(os.getenv('MEMORY_LOW_WATERMARK', '0.5'))
+    RESOURCE_LIMITS = None
+    
+    # Checkpoint e dead-letter (arquivo local ou gs://bucket/objeto)
+    CHECKPOINT_PATH = os.getenv('CHECKPOINT_PATH', 'checkpoints/etl_checkpoint.jsonl')
+    DEAD_LETTER_PATH = os.getenv('DEAD_LETTER_PATH', 'checkpoints/dead_letter.jsonl')
+    # Diretório dos manifestos de shards (listagem congelada por execução do job)
+    SHARD_MANIFEST_PATH = os.getenv('SHARD_MANIFEST_PATH', 'checkpoints/shard_manifests')
+    
+    # Logging assíncrono para o Cloud Logging e amostragem de mensagens por item
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', '100'))
+    LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', '5'))
+    LOG_SAMPLE_FIRST = int(os.getenv('LOG_SAMPLE_FIRST', '5'))
+    LOG_SAMPLE_EVERY = int(os.getenv('LOG_SAMPLE_EVERY', '1000'))
+    
+    # Métricas por estágio (relatório .json ou .prom; vazio = não grava arquivo)
+    METRICS_PATH = os.getenv('METRICS_PATH', '')
+    METRICS_TRACK_MEMORY = os.getenv('METRICS_TRACK_MEMORY', 'false').lower() == 'true'
+    
     # NLP Configuration
     TFIDF_MAX_FEATURES = int(os.getenv('TFIDF_MAX_FEATURES', '5000'))
+    TFIDF_MIN_DF = int(os.getenv('TFIDF_MIN_DF', '2'))
+    TFIDF_MAX_DF = float(os.getenv('TFIDF_MAX_DF', '0.95'))
     MIN_WORD_LENGTH = int(os.getenv('MIN_WORD_LENGTH', '3'))
+    # Limites por letra (0 = sem limite): registros fora deles vão para a quarentena
+    RECORD_MAX_BYTES = int(os.getenv('RECORD_MAX_BYTES', str(200 * 1024)))
+    RECORD_MAX_BINARY_FRACTION = float(os.getenv('RECORD_MAX_BINARY_FRACTION', '0.05'))
+    RECORD_TIMEOUT_SECONDS = float(os.getenv('RECORD_TIMEOUT_SECONDS', '30'))
+    # Letras acima deste tempo entram no relatório de registros lentos
+    RECORD_SLOW_SECONDS = float(os.getenv('RECORD_SLOW_SECONDS', '2'))
+    SLOW_RECORD_REPORT_SIZE = int(os.getenv('SLOW_RECORD_REPORT_SIZE', '20'))
+    # Modelo TF-IDF persistido (local ou gs://); vazio = ajuste por lote
+    TFIDF_MODEL_PATH = os.getenv('TFIDF_MODEL_PATH', '')
+    
+    # Serviço de análise sob demanda (analysis_service.py)
+    SERVICE_PORT = int(os.getenv('PORT', '8080'))
+    SERVICE_MAX_BATCH_SIZE = int(os.getenv('SERVICE_MAX_BATCH_SIZE', '32'))
+    SERVICE_MAX_WAIT_MS = float(os.getenv('SERVICE_MAX_WAIT_MS', '10'))
+    SERVICE_REQUEST_TIMEOUT = float(os.getenv('SERVICE_REQUEST_TIMEOUT', '30'))
+    SERVICE_MAX_BODY_BYTES = int(os.getenv('SERVICE_MAX_BODY_BYTES', str(8 * 2**20)))
+    
+    # Ingestão por eventos (event_ingestion.py): notificações de objeto finalizado
+    # agrupadas em micro-lotes por quantidade, bytes ou janela de tempo
+    EVENT_MAX_BATCH_FILES = int(os.getenv('EVENT_MAX_BATCH_FILES', '50'))
+    EVENT_MAX_BATCH_BYTES = int(os.getenv('EVENT_MAX_BATCH_BYTES', str(64 * 2**20)))
+    EVENT_MAX_WAIT_SECONDS = float(os.getenv('EVENT_MAX_WAIT_SECONDS', '30'))
+    # Deve ficar abaixo do ack deadline da assinatura push (máximo 600s)
+    EVENT_ACK_TIMEOUT = float(os.getenv('EVENT_ACK_TIMEOUT', '540'))
+    EVENT_CHECKPOINT_PATH = os.getenv('EVENT_CHECKPOINT_PATH', 'checkpoints/event_checkpoint.jsonl')
+    WATCH_POLL_INTERVAL = float(os.getenv('WATCH_POLL_INTERVAL', '2'))
+    
+    # Backend de consulta das visualizações: 'bigquery' ou 'duckdb' (Parquet local
+    # em VIZ_LOCAL_DATA_DIR, no layout do ParquetSink ou <tabela>.parquet)
+    VIZ_BACKEND = os.getenv('VIZ_BACKEND', 'bigquery')
+    VIZ_BACKENDS = ('bigquery', 'duckdb')
+    VIZ_LOCAL_DATA_DIR = os.getenv('VIZ_LOCAL_DATA_DIR', os.getenv('LOCAL_OUTPUT_DIR', './output'))
+    
+    # Cache em disco das queries das visualizações (vazio = desligado)
+    VIZ_CACHE_DIR = os.getenv('VIZ_CACHE_DIR', '.query_cache')
+    VIZ_CACHE_TTL_SECONDS = float(os.getenv('VIZ_CACHE_TTL_SECONDS', str(6 * 3600)))
+    VIZ_CACHE_MAX_BYTES = int(os.getenv('VIZ_CACHE_MAX_BYTES', str(512 * 2**20)))
+    # Queries simultâneas do relatório de visualizações
+    VIZ_QUERY_WORKERS = int(os.getenv('VIZ_QUERY_WORKERS', '8'))
+    # Renderização: backend Agg sem plt.show(), pool de processos (0 = processo atual)
+    # e prévias em baixa resolução opcionais ao lado das imagens finais
+    VIZ_HEADLESS = os.getenv('VIZ_HEADLESS', 'true').lower() == 'true'
+    VIZ_RENDER_WORKERS = int(os.getenv('VIZ_RENDER_WORKERS', str(min(4, os.cpu_count() or 1))))
+    VIZ_FINAL_DPI = int(os.getenv('VIZ_FINAL_DPI', '300'))
+    VIZ_PREVIEW_DPI = int(os.getenv('VIZ_PREVIEW_DPI', '40'))
+    # HTML leve no relatório: plotly.js compartilhado ('directory' grava um
+    # plotly.min.js no diretório de saída, 'cdn' referencia a CDN), JSON enxuto
+    # e scatters acima do limite de pontos em WebGL (0 = nunca)
+    VIZ_LIGHTWEIGHT_HTML = os.getenv('VIZ_LIGHTWEIGHT_HTML', 'true').lower() == 'true'
+    VIZ_PLOTLYJS = os.getenv('VIZ_PLOTLYJS', 'directory')
+    VIZ_WEBGL_THRESHOLD = int(os.getenv('VIZ_WEBGL_THRESHOLD', '1000'))
+    # Relatório incremental: gráficos sem mudança nas tabelas de origem não são refeitos
+    VIZ_INCREMENTAL_REPORT = os.getenv('VIZ_INCREMENTAL_REPORT', 'true').lower() == 'true'
+    
+    # Perfis de análise: cada perfil liga um conjunto de analisadores do transform.
+    # Saídas de analisadores desligados ficam NULL (ou a tabela não recebe linhas).
+    ANALYZERS = (
+        'text_stats',       # limpeza, tokens e contagens de palavras
+        'readability',      # score de legibilidade
+        'word_frequency',   # tabela word_frequency
+        'tfidf',            # tf_idf em word_frequency
+        'bigrams',          # bigramas no vocabulário TF-IDF
+        'pos',              # pos_tag em word_frequency
+        'sentiment',        # tabela sentiment_analysis (score VADER da letra)
+        'sentiment_words'   # classificação VADER palavra por palavra
+    )
+    ANALYSIS_PROFILES = {
+        'full': ANALYZERS,
+        'standard': ('text_stats', 'readability', 'word_frequency', 'tfidf', 'pos', 'sentiment'),
+        'sentiment-only': ('sentiment',),
+        'stats-only': ('text_stats', 'readability', 'word_frequency')
+    }
+    ANALYSIS_PROFILE = os.getenv('ANALYSIS_PROFILE', 'full')
+    
+    # Colunas preenchidas por analisadores que os perfis podem desligar. No
+    # modo 'merge' elas só são atualizadas quando o perfil ativo liga o
+    # analisador, para que um perfil parcial não grave NULL sobre o valor
+    # de uma execução completa.
+    ANALYZER_COLUMNS = {
+        'text_stats': {
+            'processed_lyrics': ['word_count', 'unique_words', 'avg_word_length',
+                                 'processed_text', 'tokens']
+        },
+        'readability': {'processed_lyrics': ['readability_score']},
+        'tfidf': {'word_frequency': ['tf_idf']},
+        'pos': {'word_frequency': ['pos_tag']},
+        'sentiment_words': {
+            'sentiment_analysis': ['positive_words', 'negative_words', 'neutral_words']
+        }
+    }
+    
+    # Load Configuration
+    PARQUET_COMPRESSION = os.getenv('PARQUET_COMPRESSION', 'zstd')
+    OUTPUT_SINK = os.getenv('OUTPUT_SINK', 'bigquery')
+    OUTPUT_SINKS = ('bigquery', 'parquet', 'duckdb')
+    LOCAL_OUTPUT_DIR = os.getenv('LOCAL_OUTPUT_DIR', './output')
+    
+    # Modo de carga no BigQuery: 'append' (WRITE_APPEND) ou 'merge' (staging + MERGE idempotente)
+    LOAD_MODE = os.getenv('LOAD_MODE', 'append')
+    LOAD_MODES = ('append', 'merge')
+    STAGING_TABLE_TTL_HOURS = int(os.getenv('STAGING_TABLE_TTL_HOURS', '6'))
+    
+    # Tabelas de rollup atualizadas a cada lote (lidas pelas visualizações e views)
+    ROLLUPS_ENABLED = os.getenv('ROLLUPS_ENABLED', 'true').lower() == 'true'
+    
+    # Chaves de deduplicação de cada tabela no modo 'merge'
+    MERGE_KEYS = {
+        'raw_lyrics': ['id'],
+        'processed_lyrics': ['id'],
+        'word_frequency': ['lyrics_id', 'word'],
+        'sentiment_analysis': ['lyrics_id']
+    }
+    
+    # Coluna de carga de cada tabela: entre linhas repetidas de uma chave vale a mais recente
+    LOAD_TIMESTAMP_COLUMNS = {
+        'raw_lyrics': 'created_at',
+        'processed_lyrics': 'processed_at',
+        'word_frequency': 'created_at',
+        'sentiment_analysis': 'analyzed_at'
+    }
+    
+    # Tabelas substituídas por música no modo 'merge': as linhas de cada
+    # lyrics_id do lote são apagadas e regravadas em uma transação, para que
+    # palavras que saíram da letra não fiquem para trás
+    REPLACE_KEYS = {
+        'word_frequency': 'lyrics_id'
+    }
+    
+    # Chaves das tabelas de rollup (as demais colunas são somas e contagens por chave)
+    ROLLUP_KEYS = {
+        'sentiment_rollup': ['year', 'genre'],
+        'word_rollup': ['year', 'sentiment_label', 'word'],
+        'artist_rollup': ['artist', 'genre']
+    }
+    
+    # Modo das colunas de array: 'json' (STRING com JSON) ou 'repeated' (ARRAY<STRING>)
+    ARRAY_COLUMN_MODE = os.getenv('ARRAY_COLUMN_MODE', 'json')
+    ARRAY_COLUMN_MODES = ('json', 'repeated')
+    
+    # Colunas que armazenam arrays (JSON em modo 'json', REPEATED em modo 'repeated')
+    JSON_ARRAY_COLUMNS = {
+        'processed_lyrics': ['tokens'],
+        'sentiment_analysis': ['positive_words', 'negative_words', 'neutral_words']
+    }
     
     # BigQuery Table Schemas
     SCHEMAS = {
@@ -31,6 +210,7 @@ class Config:
             {'name': 'id', 'type': 'STRING', 'mode': 'REQUIRED'},
             {'name': 'title', 'type': 'STRING', 'mode': 'NULLABLE'},
             {'name': 'artist', 'type': 'STRING', 'mode': 'NULLABLE'},
+            {'name': 'artist_key', 'type': 'STRING', 'mode': 'NULLABLE'},
             {'name': 'album', 'type': 'STRING', 'mode': 'NULLABLE'},
             {'name': 'genre', 'type': 'STRING', 'mode': 'NULLABLE'},
             {'name': 'year', 'type': 'INTEGER', 'mode': 'NULLABLE'},
@@ -73,13 +253,141 @@ class Config:
             {'name': 'negative_words', 'type': 'STRING', 'mode': 'NULLABLE'},  # JSON array
             {'name': 'neutral_words', 'type': 'STRING', 'mode': 'NULLABLE'},   # JSON array
             {'name': 'analyzed_at', 'type': 'TIMESTAMP', 'mode': 'NULLABLE'}
+        ],
+        
+        # Rollups: somas e contagens aditivas (médias e desvios são calculados na leitura)
+        'sentiment_rollup': [
+            {'name': 'year', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'genre', 'type': 'STRING', 'mode': 'NULLABLE'},
+            {'name': 'song_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'sentiment_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'sentiment_sum', 'type': 'FLOAT', 'mode': 'NULLABLE'},
+            {'name': 'sentiment_sq_sum', 'type': 'FLOAT', 'mode': 'NULLABLE'},
+            {'name': 'positive_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'negative_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'neutral_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'confidence_sum', 'type': 'FLOAT', 'mode': 'NULLABLE'},
+            {'name': 'processed_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'word_count_sum', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'unique_words_sum', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'readability_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'readability_sum', 'type': 'FLOAT', 'mode': 'NULLABLE'},
+            {'name': 'updated_at', 'type': 'TIMESTAMP', 'mode': 'NULLABLE'}
+        ],
+        
+        'word_rollup': [
+            {'name': 'year', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'sentiment_label', 'type': 'STRING', 'mode': 'NULLABLE'},
+            {'name': 'word', 'type': 'STRING', 'mode': 'REQUIRED'},
+            {'name': 'frequency_sum', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'song_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'tfidf_sum', 'type': 'FLOAT', 'mode': 'NULLABLE'},
+            {'name': 'tfidf_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'updated_at', 'type': 'TIMESTAMP', 'mode': 'NULLABLE'}
+        ],
+        
+        'artist_rollup': [
+            {'name': 'artist', 'type': 'STRING', 'mode': 'NULLABLE'},
+            {'name': 'genre', 'type': 'STRING', 'mode': 'NULLABLE'},
+            {'name': 'song_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'first_year', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'last_year', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'sentiment_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'sentiment_sum', 'type': 'FLOAT', 'mode': 'NULLABLE'},
+            {'name': 'positive_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'negative_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'neutral_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'processed_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'word_count_sum', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'unique_words_sum', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'avg_word_length_sum', 'type': 'FLOAT', 'mode': 'NULLABLE'},
+            {'name': 'readability_count', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+            {'name': 'readability_sum', 'type': 'FLOAT', 'mode': 'NULLABLE'},
+            {'name': 'updated_at', 'type': 'TIMESTAMP', 'mode': 'NULLABLE'}
         ]
     }
     
     @classmethod
-    def get_table_schema(cls, table_name: str) -> list:
-        """Retorna schema da tabela especificada"""
-        return cls.SCHEMAS.get(table_name, [])
+    def get_table_schema(cls, table_name: str, array_mode: str = None) -> list:
+        """
+        Retorna schema da tabela especificada
+        
+        Args:
+            table_name: Nome da tabela
+            array_mode: 'json' ou 'repeated' (padrão: ARRAY_COLUMN_MODE)
+            
+        Returns:
+            Lista de definições de colunas
+        """
+        array_mode = array_mode or cls.ARRAY_COLUMN_MODE
+        if array_mode not in cls.ARRAY_COLUMN_MODES:
+            raise ValueError(f"Modo de array inválido: {array_mode}")
+        
+        schema = cls.SCHEMAS.get(table_name, [])
+        if array_mode == 'json':
+            return schema
+        
+        array_columns = cls.JSON_ARRAY_COLUMNS.get(table_name, [])
+        return [
+            {**column, 'mode': 'REPEATED'} if column['name'] in array_columns else column
+            for column in schema
+        ]
+    
+    @classmethod
+    def get_analyzers(cls, profile: str = None) -> frozenset:
+        """
+        Retorna os analisadores ligados no perfil
+        
+        Args:
+            profile: Nome do perfil (padrão: ANALYSIS_PROFILE)
+            
+        Returns:
+            Conjunto de nomes de analisadores
+        """
+        profile = profile or cls.ANALYSIS_PROFILE
+        if profile not in cls.ANALYSIS_PROFILES:
+            raise ValueError(f"Perfil de análise inválido: {profile}")
+        return frozenset(cls.ANALYSIS_PROFILES[profile])
+    
+    @classmethod
+    def get_skipped_columns(cls, table_name: str, analyzers: frozenset) -> List[str]:
+        """
+        Retorna as colunas da tabela que ficam sem valor com os analisadores informados
+        
+        Args:
+            table_name: Nome da tabela em SCHEMAS
+            analyzers: Analisadores ligados (ver get_analyzers)
+            
+        Returns:
+            Colunas de analisadores desligados
+        """
+        return [
+            column
+            for analyzer, tables in cls.ANALYZER_COLUMNS.items()
+            if analyzer not in analyzers
+            for column in tables.get(table_name, [])
+        ]
+    
+    @classmethod
+    def get_task_shard(cls) -> Tuple[int, int]:
+        """
+        Retorna (índice, total) de tarefas do Cloud Run job
+        
+        Lido no momento da chamada para permitir simular shards localmente
+        definindo CLOUD_RUN_TASK_INDEX / CLOUD_RUN_TASK_COUNT.
+        """
+        task_index = int(os.getenv('CLOUD_RUN_TASK_INDEX', '0'))
+        task_count = int(os.getenv('CLOUD_RUN_TASK_COUNT', '1'))
+        return task_index, task_count
+    
+    @classmethod
+    def get_execution_id(cls) -> str:
+        """
+        Retorna o nome da execução do Cloud Run job (None fora de um job)
+        
+        Igual em todas as tarefas e novas tentativas da mesma execução.
+        """
+        return os.getenv('CLOUD_RUN_EXECUTION')
     
     @classmethod
     def validate_config(cls) -> Dict[str, Any]:
@@ -106,33 +414,36 @@ class Config:
 
 # Environment-specific configurations
 class DevelopmentConfig(Config):
-    """Configuração para desenvolvimento"""
+    """Configuração para desenvolvimento (lotes pequenos para iteração rápida)"""
     DEBUG = True
-    BATCH_SIZE = 10
-    MAX_WORKERS = 2
+    MAX_BATCH_SIZE = min(Config.MAX_BATCH_SIZE, 50)
 
 
 class ProductionConfig(Config):
-    """Configuração para produção"""
+    """Configuração para produção (BATCH_SIZE/MAX_WORKERS ajustados aos limites do container)"""
     DEBUG = False
-    BATCH_SIZE = 100
-    MAX_WORKERS = 4
 
 
 class TestingConfig(Config):
-    """Configuração para testes"""
+    """Configuração para testes (valores fixos, sem ajuste automático)"""
     DEBUG = True
+    AUTO_TUNE = False
     BATCH_SIZE = 5
     MAX_WORKERS = 1
     DATASET_ID = 'lyrics_analysis_test'
 
 
-def get_config(environment: str = None) -> Config:
+def get_config(environment: str = None, limits: ResourceLimits = None) -> Config:
     """
     Retorna configuração baseada no ambiente
     
+    Com AUTO_TUNE, BATCH_SIZE e MAX_WORKERS da instância são calculados a
+    partir dos limites de CPU e memória do cgroup, exceto quando definidos
+    explicitamente por variável de ambiente.
+    
     Args:
         environment: 'development', 'production', 'testing'
+        limits: Limites de recursos (padrão: detectados do container)
         
     Returns:
         Instância da classe de configuração apropriada
@@ -146,5 +457,26 @@ def get_config(environment: str = None) -> Config:
         'testing': TestingConfig
     }
     
-    return config_map.get(environment, DevelopmentConfig)()
+    config = config_map.get(environment, DevelopmentConfig)()
+    
+    if config.AUTO_TUNE:
+        limits = limits or ResourceLimits.detect()
+        config.RESOURCE_LIMITS = limits
+        if 'MAX_WORKERS' not in os.environ:
+            config.MAX_WORKERS = tune_workers(limits)
+        if 'BATCH_SIZE' not in os.environ:
+            config.BATCH_SIZE = tune_batch_size(
+                limits,
+                memory_per_file_mb=config.MEMORY_PER_FILE_MB,
+                budget_fraction=config.MEMORY_BUDGET_FRACTION,
+                min_size=config.MIN_BATCH_SIZE,
+                max_size=config.MAX_BATCH_SIZE,
+                default=config.BATCH_SIZE
+            )
+        logger.info(
+            f"Configuração ajustada para {limits}: BATCH_SIZE={config.BATCH_SIZE}, "
+            f"MAX_WORKERS={config.MAX_WORKERS}"
+        )
+    
+    return config
 
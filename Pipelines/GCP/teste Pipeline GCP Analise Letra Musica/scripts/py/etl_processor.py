@@ -5,6 +5,9 @@ Módulo principal de processamento de dados
 
 import os
 import json
+import contextlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import pandas as pd
 import numpy as np
@@ -30,6 +33,19 @@ from google.cloud import storage
 from google.cloud import bigquery
 from google.cloud import logging as cloud_logging
 
+from config import Config, get_config
+from output_sinks import OutputSink, BigQuerySink, TABLE_NAMES, create_sink
+from rollups import ROLLUP_TABLE_NAMES, compute_rollups
+from artist_keys import artist_key_series
+from local_source import LocalBucket
+from sharding import ShardManifest, select_shard, shard_summary
+from checkpoint import CheckpointStore, DeadLetterQueue
+from metrics import PipelineMetrics
+from profiling import PipelineProfiler, PROFILE_MODES
+from resources import AdaptiveBatchSizer
+from async_logging import ItemLogSampler, setup_async_logging
+from record_guards import RecordGuard, RecordRejected
+
 # Configuração de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -37,12 +53,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Extensões de arquivo aceitas como entrada
+INPUT_EXTENSIONS = ('.txt', '.json', '.csv')
+
 class LyricsETLProcessor:
     """
     Classe principal para processamento ETL de letras de música
     """
     
-    def __init__(self, project_id: str, dataset_id: str, bucket_name: str):
+    def __init__(self, project_id: str, dataset_id: str, bucket_name: str,
+                 array_mode: str = None, sink: OutputSink = None,
+                 input_dir: str = None, task_index: int = None,
+                 task_count: int = None, checkpoint_path: str = None,
+                 dead_letter_path: str = None, track_memory: bool = None,
+                 analysis_profile: str = None, config: Config = None):
         """
         Inicializa o processador ETL
         
@@ -50,34 +74,137 @@ class LyricsETLProcessor:
             project_id: ID do projeto GCP
             dataset_id: ID do dataset BigQuery
             bucket_name: Nome do bucket Cloud Storage
+            array_mode: Armazenamento das colunas de array, 'json' ou 'repeated'
+                (padrão: Config.ARRAY_COLUMN_MODE)
+            sink: Destino de saída (padrão: BigQuery)
+            input_dir: Diretório local usado no lugar do bucket (execução offline)
+            task_index: Índice da tarefa do Cloud Run job (padrão: CLOUD_RUN_TASK_INDEX)
+            task_count: Total de tarefas do job (padrão: CLOUD_RUN_TASK_COUNT)
+            checkpoint_path: Arquivo local ou gs:// com os lotes confirmados
+                (padrão: Config.CHECKPOINT_PATH)
+            dead_letter_path: Arquivo local ou gs:// com os registros que falharam
+                (padrão: Config.DEAD_LETTER_PATH)
+            track_memory: Medir pico de memória por estágio com tracemalloc
+                (padrão: Config.METRICS_TRACK_MEMORY)
+            analysis_profile: Perfil de análise de Config.ANALYSIS_PROFILES
+                (padrão: Config.ANALYSIS_PROFILE)
+            config: Configuração com lote, workers e parâmetros NLP
+                (padrão: get_config(), ajustada aos limites do container)
         """
         self.project_id = project_id
         self.dataset_id = dataset_id
         self.bucket_name = bucket_name
+        self.config = config or get_config()
+        self.array_mode = array_mode or Config.ARRAY_COLUMN_MODE
+        self.analysis_profile = analysis_profile or Config.ANALYSIS_PROFILE
+        self.analyzers = Config.get_analyzers(self.analysis_profile)
+        
+        # Shard desta tarefa (execução paralela no Cloud Run job)
+        env_index, env_count = Config.get_task_shard()
+        self.task_index = env_index if task_index is None else task_index
+        self.task_count = env_count if task_count is None else task_count
+        
+        # Fonte de dados: bucket Cloud Storage ou diretório local
+        if input_dir:
+            self.storage_client = None
+            self.bucket = LocalBucket(input_dir)
+        else:
+            self.storage_client = storage.Client(project=project_id)
+            self.bucket = self.storage_client.bucket(bucket_name)
+        
+        # Destino de saída: BigQuery por padrão
+        if sink is None:
+            self.bq_client = bigquery.Client(project=project_id)
+            sink = BigQuerySink(self.bq_client, project_id, dataset_id, self.array_mode,
+                                analysis_profile=self.analysis_profile)
+        else:
+            self.bq_client = getattr(sink, 'client', None)
+        self.sink = sink
+        
+        # Checkpoint de lotes e dead-letter (um arquivo por tarefa quando há shards)
+        self.checkpoint = CheckpointStore(
+            self._task_location(checkpoint_path or Config.CHECKPOINT_PATH), self.storage_client
+        )
+        self.dead_letter = DeadLetterQueue(
+            self._task_location(dead_letter_path or Config.DEAD_LETTER_PATH), self.storage_client
+        )
+        
+        # Métricas por estágio (reiniciadas a cada execução)
+        self.metrics = PipelineMetrics(
+            Config.METRICS_TRACK_MEMORY if track_memory is None else track_memory
+        )
+        
+        # Configurar logging na nuvem (somente quando o pipeline usa o GCP),
+        # entregue em lotes por uma thread de fundo
+        if not input_dir or isinstance(sink, BigQuerySink):
+            cloud_logging_client = cloud_logging.Client(project=project_id)
+            setup_async_logging(
+                cloud_logging_client.get_default_handler(),
+                queue_size=self.config.LOG_QUEUE_SIZE,
+                batch_size=self.config.LOG_BATCH_SIZE,
+                flush_interval=self.config.LOG_FLUSH_INTERVAL
+            )
         
-        # Inicializar clientes GCP
-        self.storage_client = storage.Client(project=project_id)
-        self.bq_client = bigquery.Client(project=project_id)
-        self.bucket = self.storage_client.bucket(bucket_name)
+        # Mensagens por arquivo são amostradas e resumidas por lote
+        self.item_log = ItemLogSampler(
+            logger, first=self.config.LOG_SAMPLE_FIRST, every=self.config.LOG_SAMPLE_EVERY
+        )
         
-        # Configurar logging na nuvem
-        cloud_logging_client = cloud_logging.Client(project=project_id)
-        cloud_logging_client.setup_logging()
+        # Limites de tamanho e tempo por letra (entradas patológicas vão para a quarentena)
+        self.record_guard = RecordGuard(
+            max_bytes=self.config.RECORD_MAX_BYTES,
+            max_binary_fraction=self.config.RECORD_MAX_BINARY_FRACTION,
+            timeout=self.config.RECORD_TIMEOUT_SECONDS,
+            slow_seconds=self.config.RECORD_SLOW_SECONDS,
+            report_size=self.config.SLOW_RECORD_REPORT_SIZE
+        )
         
         # Inicializar componentes NLP
         self._setup_nltk()
         
         # Configurar TF-IDF
         self.tfidf_vectorizer = TfidfVectorizer(
-            max_features=5000,
+            max_features=self.config.TFIDF_MAX_FEATURES,
             stop_words='english',
-            ngram_range=(1, 2),
-            min_df=2,
-            max_df=0.95
+            ngram_range=(1, 2) if 'bigrams' in self.analyzers else (1, 1),
+            min_df=self.config.TFIDF_MIN_DF,
+            max_df=self.config.TFIDF_MAX_DF
         )
+        # Com um modelo persistido carregado, o vocabulário e o IDF ficam fixos
+        self.tfidf_frozen = False
         
         logger.info(f"ETL Processor inicializado para projeto {project_id}")
     
+    @classmethod
+    def offline(cls, work_dir: str = None, **kwargs) -> 'LyricsETLProcessor':
+        """
+        Cria um processador que não acessa o GCP (serviço de análise, benchmarks)
+        
+        Args:
+            work_dir: Diretório de trabalho (padrão: diretório temporário)
+            **kwargs: Demais argumentos do construtor
+            
+        Returns:
+            Processador com fonte local e saída Parquet em work_dir
+        """
+        from output_sinks import ParquetSink
+        
+        work_dir = Path(work_dir or tempfile.mkdtemp(prefix='lyrics-etl-'))
+        work_dir.mkdir(parents=True, exist_ok=True)
+        kwargs.setdefault('sink', ParquetSink(str(work_dir / 'output')))
+        kwargs.setdefault('checkpoint_path', str(work_dir / 'checkpoint.jsonl'))
+        kwargs.setdefault('dead_letter_path', str(work_dir / 'dead_letter.jsonl'))
+        return cls('offline', 'offline', 'offline', input_dir=str(work_dir), **kwargs)
+    
+    def _task_location(self, location: str) -> str:
+        """Acrescenta o índice da tarefa ao caminho quando o job tem várias tarefas"""
+        if self.task_count <= 1:
+            return location
+        stem, dot, extension = location.rpartition('.')
+        if not dot or '/' in extension:
+            return f"{location}.task{self.task_index}"
+        return f"{stem}.task{self.task_index}.{extension}"
+    
     def _setup_nltk(self):
         """Configura e baixa recursos necessários do NLTK"""
         try:
@@ -107,12 +234,50 @@ class LyricsETLProcessor:
         
         logger.info("Recursos NLTK configurados com sucesso")
     
-    def extract_from_storage(self, prefix: str = "raw-data/") -> List[Dict]:
+    def list_input_blobs(self, prefix: str = "raw-data/") -> List:
+        """
+        Lista os arquivos suportados do prefixo que pertencem ao shard desta tarefa
+        
+        Args:
+            prefix: Prefixo dos arquivos a serem processados
+            
+        Returns:
+            Lista de blobs atribuídos a esta tarefa
+        """
+        blobs = [
+            blob for blob in self.bucket.list_blobs(prefix=prefix)
+            if blob.name.endswith(INPUT_EXTENSIONS)
+        ]
+        
+        execution_id = Config.get_execution_id()
+        if self.task_count > 1 and execution_id:
+            # Balanceamento sobre a listagem congelada da execução: tarefas e
+            # novas tentativas escolhem os mesmos arquivos
+            manifest = ShardManifest(
+                ShardManifest.location_for(Config.SHARD_MANIFEST_PATH, execution_id, prefix),
+                self.storage_client
+            )
+            frozen = manifest.freeze(blobs)
+            names = {entry.name for entry in select_shard(frozen, self.task_index, self.task_count)}
+            shard = [blob for blob in sorted(blobs, key=lambda b: b.name) if blob.name in names]
+            if len(shard) < len(names):
+                logger.warning(f"{len(names) - len(shard)} arquivos do manifesto não existem mais")
+        else:
+            shard = select_shard(blobs, self.task_index, self.task_count)
+        file_count, total_bytes = shard_summary(shard)
+        logger.info(
+            f"Tarefa {self.task_index + 1}/{self.task_count}: {file_count} de "
+            f"{len(blobs)} arquivos ({total_bytes} bytes)"
+        )
+        return shard
+    
+    def extract_from_storage(self, prefix: str = "raw-data/", blobs: List = None) -> List[Dict]:
         """
         Extrai dados do Cloud Storage
         
         Args:
             prefix: Prefixo dos arquivos a serem processados
+            blobs: Blobs já listados (padrão: shard desta tarefa no prefixo)
             
         Returns:
             Lista de dicionários com dados das letras
@@ -120,22 +285,38 @@ class LyricsETLProcessor:
         logger.info(f"Iniciando extração de dados do bucket {self.bucket_name}")
         
         lyrics_data = []
-        blobs = self.bucket.list_blobs(prefix=prefix)
+        if blobs is None:
+            blobs = self.list_input_blobs(prefix)
         
-        for blob in blobs:
-            if blob.name.endswith(('.txt', '.json', '.csv')):
-                try:
-                    content = blob.download_as_text()
+        # Downloads em paralelo (I/O); a análise segue a ordem da listagem
+        with ThreadPoolExecutor(max_workers=max(1, self.config.MAX_WORKERS)) as pool:
+            downloads = [pool.submit(self._download_blob, blob) for blob in blobs]
+        
+        for blob, download in zip(blobs, downloads):
+            try:
+                content = download.result()
+                with self.metrics.stage('parse', bytes_in=_text_bytes(content)) as call:
                     file_data = self._parse_file_content(blob.name, content)
-                    if file_data:
-                        lyrics_data.extend(file_data)
-                        logger.info(f"Processado arquivo: {blob.name}")
-                except Exception as e:
-                    logger.error(f"Erro ao processar {blob.name}: {str(e)}")
+                    call.records = len(file_data or [])
+                
+                if file_data:
+                    lyrics_data.extend(file_data)
+                    self.item_log.info("Processado arquivo: %s", blob.name)
+            except Exception as e:
+                logger.error(f"Erro ao processar {blob.name}: {str(e)}")
+                self.dead_letter.add('extract', e, file_path=blob.name)
         
+        self.item_log.summarize('arquivos processados')
         logger.info(f"Extraídos {len(lyrics_data)} registros de letras")
         return lyrics_data
     
+    def _download_blob(self, blob) -> str:
+        """Baixa o conteúdo de um arquivo como texto"""
+        with self.metrics.stage('extract') as call:
+            content = blob.download_as_text()
+            call.bytes_in = call.bytes_out = _text_bytes(content)
+        return content
+    
     def _parse_file_content(self, filename: str, content: str) -> List[Dict]:
         """
         Analisa o conteúdo do arquivo baseado na extensão
@@ -158,6 +339,7 @@ class LyricsETLProcessor:
                 return self._parse_txt_content(content, filename)
         except Exception as e:
             logger.error(f"Erro ao analisar conteúdo de {filename}: {str(e)}")
+            self.dead_letter.add('extract', e, file_path=filename)
             return []
     
     def _parse_json_content(self, content: str, filename: str) -> List[Dict]:
@@ -253,71 +435,216 @@ class LyricsETLProcessor:
         Returns:
             Tupla com DataFrames (processed_lyrics, word_frequency, sentiment_analysis)
         """
-        logger.info("Iniciando transformações NLP")
+        logger.info(f"Iniciando transformações NLP (perfil {self.analysis_profile})")
+        analyzers = self.analyzers
+        
+        # Letras fora dos limites de tamanho não entram nem no corpus do TF-IDF
+        lyrics_data = self._admit_records(lyrics_data)
         
         processed_lyrics = []
         word_frequency_data = []
         sentiment_data = []
         
-        # Preparar corpus para TF-IDF
-        corpus = [data['lyrics'] for data in lyrics_data if data['lyrics']]
-        
-        if corpus:
-            tfidf_matrix = self.tfidf_vectorizer.fit_transform(corpus)
-            feature_names = self.tfidf_vectorizer.get_feature_names_out()
+        # Preparar corpus para TF-IDF (mapeando cada letra para sua linha na matriz)
+        corpus_indices = [i for i, data in enumerate(lyrics_data) if data['lyrics']]
+        corpus = [lyrics_data[i]['lyrics'] for i in corpus_indices]
+        tfidf_rows = {item_index: row for row, item_index in enumerate(corpus_indices)}
+        tfidf_matrix, feature_names = None, None
+        if {'word_frequency', 'tfidf'} <= analyzers:
+            with self.metrics.stage('tfidf', records=len(corpus),
+                                    bytes_in=sum(_text_bytes(text) for text in corpus)):
+                tfidf_matrix, feature_names = self._fit_tfidf(corpus)
         
         for i, lyrics_item in enumerate(lyrics_data):
             try:
-                # Processar texto
-                processed_text = self._clean_text(lyrics_item['lyrics'])
-                tokens = self._tokenize_text(processed_text)
-                
-                # Análise básica
-                word_count = len(tokens)
-                unique_words = len(set(tokens))
-                avg_word_length = np.mean([len(word) for word in tokens]) if tokens else 0
-                
-                # Análise de legibilidade (simplificada)
-                readability_score = self._calculate_readability(lyrics_item['lyrics'])
-                
-                # Dados processados
-                processed_lyrics.append({
-                    'id': lyrics_item['id'],
-                    'title': lyrics_item['title'],
-                    'artist': lyrics_item['artist'],
-                    'word_count': word_count,
-                    'unique_words': unique_words,
-                    'avg_word_length': avg_word_length,
-                    'readability_score': readability_score,
-                    'language': 'en',  # Assumindo inglês por simplicidade
-                    'processed_text': processed_text,
-                    'tokens': tokens,
-                    'processed_at': datetime.utcnow().isoformat()
-                })
-                
-                # Análise de frequência de palavras
-                if i < len(corpus) and corpus:
-                    word_freq = self._extract_word_frequency(
-                        lyrics_item['id'], tokens, tfidf_matrix[i], feature_names
+                with self.record_guard.track(lyrics_item) as timer:
+                    processed_row, word_freq, sentiment = self._transform_record(
+                        i, lyrics_item, tfidf_matrix, tfidf_rows, feature_names, timer
                     )
-                    word_frequency_data.extend(word_freq)
                 
-                # Análise de sentimentos
-                sentiment = self._analyze_sentiment(lyrics_item['lyrics'])
-                sentiment['lyrics_id'] = lyrics_item['id']
-                sentiment['analyzed_at'] = datetime.utcnow().isoformat()
-                sentiment_data.append(sentiment)
+                # Linhas só entram no resultado quando o registro inteiro foi processado
+                processed_lyrics.append(processed_row)
+                word_frequency_data.extend(word_freq)
+                if sentiment is not None:
+                    sentiment_data.append(sentiment)
                 
+            except RecordRejected as e:
+                self._quarantine(lyrics_item, e)
             except Exception as e:
                 logger.error(f"Erro ao processar letra {lyrics_item.get('id', 'unknown')}: {str(e)}")
+                self.dead_letter.add('transform', e, record=lyrics_item)
         
         logger.info(f"Processadas {len(processed_lyrics)} letras")
         
-        return (
-            pd.DataFrame(processed_lyrics),
-            pd.DataFrame(word_frequency_data),
-            pd.DataFrame(sentiment_data)
-        )
+        with self.metrics.stage('dataframe', records=len(processed_lyrics)) as call:
+            frames = (
+                pd.DataFrame(processed_lyrics),
+                pd.DataFrame(word_frequency_data),
+                pd.DataFrame(sentiment_data)
+            )
+            call.bytes_out = sum(int(df.memory_usage(deep=True).sum()) for df in frames)
+        
+        return frames
+    
+    def _admit_records(self, lyrics_data: List[Dict]) -> List[Dict]:
+        """Aplica os limites de entrada e envia para a quarentena o que os excede"""
+        admitted = []
+        for lyrics_item in lyrics_data:
+            try:
+                self.record_guard.check_input(lyrics_item)
+            except RecordRejected as e:
+                self._quarantine(lyrics_item, e)
+                continue
+            admitted.append(lyrics_item)
+        return admitted
+    
+    def _quarantine(self, lyrics_item: Dict, error: RecordRejected):
+        """Envia um registro fora dos limites para a dead-letter (estágio quarantine)"""
+        self.record_guard.quarantined += 1
+        logger.warning(f"Letra {lyrics_item.get('id', 'unknown')} em quarentena: {str(error)}")
+        self.dead_letter.add('quarantine', error, record=lyrics_item)
+    
+    def _transform_record(self, i: int, lyrics_item: Dict, tfidf_matrix, tfidf_rows: Dict,
+                          feature_names, timer) -> Tuple[Dict, List[Dict], Optional[Dict]]:
+        """
+        Aplica os analisadores do perfil a uma letra
+        
+        Args:
+            i: Posição da letra no lote (linha da matriz TF-IDF via tfidf_rows)
+            lyrics_item: Registro normalizado
+            tfidf_matrix: Matriz TF-IDF do lote (ou None)
+            tfidf_rows: Posição no lote -> linha da matriz
+            feature_names: Termos da matriz TF-IDF
+            timer: Cronômetro do registro (verifica o prazo entre estágios)
+            
+        Returns:
+            Tupla (linha processed_lyrics, linhas word_frequency, linha sentiment ou None)
+        """
+        analyzers = self.analyzers
+        lyrics_bytes = _text_bytes(lyrics_item['lyrics'])
+        
+        # Processar texto
+        processed_text, tokens = None, []
+        word_count = unique_words = avg_word_length = None
+        if 'text_stats' in analyzers:
+            with self.metrics.stage('clean', bytes_in=lyrics_bytes) as call:
+                processed_text = self._clean_text(lyrics_item['lyrics'])
+                call.bytes_out = _text_bytes(processed_text)
+            timer.checkpoint('clean')
+            
+            with self.metrics.stage('tokenize', bytes_in=call.bytes_out) as call:
+                tokens = self._tokenize_text(processed_text)
+                call.bytes_out = sum(len(token) for token in tokens)
+            timer.checkpoint('tokenize')
+            
+            # Análise básica
+            word_count = len(tokens)
+            unique_words = len(set(tokens))
+            avg_word_length = np.mean([len(word) for word in tokens]) if tokens else 0
+        
+        # Análise de legibilidade (simplificada)
+        readability_score = None
+        if 'readability' in analyzers:
+            with self.metrics.stage('readability', bytes_in=lyrics_bytes):
+                readability_score = self._calculate_readability(lyrics_item['lyrics'])
+            timer.checkpoint('readability')
+        
+        # Dados processados
+        processed_row = {
+            'id': lyrics_item['id'],
+            'title': lyrics_item['title'],
+            'artist': lyrics_item['artist'],
+            'word_count': word_count,
+            'unique_words': unique_words,
+            'avg_word_length': avg_word_length,
+            'readability_score': readability_score,
+            'language': 'en',  # Assumindo inglês por simplicidade
+            'processed_text': processed_text,
+            'tokens': tokens if 'text_stats' in analyzers else None,
+            'processed_at': datetime.utcnow().isoformat()
+        }
+        
+        # Análise de frequência de palavras
+        word_freq = []
+        if 'word_frequency' in analyzers:
+            tfidf_vector = None
+            if tfidf_matrix is not None and i in tfidf_rows:
+                tfidf_vector = tfidf_matrix[tfidf_rows[i]]
+            with self.metrics.stage('word_frequency'):
+                word_freq = self._extract_word_frequency(
+                    lyrics_item['id'], tokens, tfidf_vector, feature_names
+                )
+            timer.checkpoint('word_frequency')
+        
+        # Análise de sentimentos
+        sentiment = None
+        if 'sentiment' in analyzers:
+            with self.metrics.stage('sentiment', bytes_in=lyrics_bytes):
+                sentiment = self._analyze_sentiment(
+                    lyrics_item['lyrics'],
+                    include_words='sentiment_words' in analyzers
+                )
+            sentiment['lyrics_id'] = lyrics_item['id']
+            sentiment['analyzed_at'] = datetime.utcnow().isoformat()
+            timer.checkpoint('sentiment')
+        
+        return processed_row, word_freq, sentiment
+    
+    def _fit_tfidf(self, corpus: List[str]):
+        """
+        Ajusta o TF-IDF no corpus do lote
+        
+        Lotes pequenos podem não satisfazer min_df/max_df; nesse caso as
+        palavras são gravadas com tf_idf 0.0 em vez de falhar o lote inteiro.
+        
+        Returns:
+            Tupla (matriz TF-IDF, nomes das features) ou (None, None)
+        """
+        if not corpus:
+            return None, None
+        
+        if self.tfidf_frozen:
+            return self.tfidf_vectorizer.transform(corpus), self._tfidf_features
+        
+        try:
+            tfidf_matrix = self.tfidf_vectorizer.fit_transform(corpus)
+            return tfidf_matrix, self.tfidf_vectorizer.get_feature_names_out()
+        except ValueError as e:
+            logger.warning(f"TF-IDF ignorado para lote com {len(corpus)} letras: {str(e)}")
+            return None, None
+    
+    def fit_tfidf_model(self, corpus: List[str]):
+        """
+        Ajusta o TF-IDF em um corpus de referência e congela o modelo
+        
+        Args:
+            corpus: Letras usadas para o vocabulário e o IDF
+        """
+        self.tfidf_vectorizer.fit(corpus)
+        self._tfidf_features = self.tfidf_vectorizer.get_feature_names_out()
+        self.tfidf_frozen = True
+        logger.info(f"Modelo TF-IDF ajustado com {len(corpus)} letras "
+                    f"({len(self._tfidf_features)} termos)")
+    
+    def save_tfidf_model(self, location: str):
+        """Grava o modelo TF-IDF ajustado em arquivo local ou gs://"""
+        if not self.tfidf_frozen:
+            raise ValueError("Nenhum modelo TF-IDF ajustado para gravar")
+        _write_bytes(location, _tfidf_to_json(self.tfidf_vectorizer), self.storage_client)
+        logger.info(f"Modelo TF-IDF gravado em {location}")
+    
+    def load_tfidf_model(self, location: str):
+        """
+        Carrega um modelo TF-IDF persistido (arquivo local ou gs://)
+        
+        A partir daí o transform usa o vocabulário e o IDF do modelo em vez
+        de ajustar o TF-IDF em cada lote, e os scores ficam comparáveis entre lotes.
+        O modelo é JSON (parâmetros, vocabulário e IDF): carregá-lo não executa código.
+        """
+        self.tfidf_vectorizer = _tfidf_from_json(_read_bytes(location, self.storage_client))
+        self._tfidf_features = self.tfidf_vectorizer.get_feature_names_out()
+        self.tfidf_frozen = True
+        logger.info(f"Modelo TF-IDF carregado de {location} ({len(self._tfidf_features)} termos)")
     
     def _clean_text(self, text: str) -> str:
         """Limpa e normaliza texto"""
@@ -346,7 +673,8 @@ class LyricsETLProcessor:
         # Filtrar tokens válidos e remover stopwords
         filtered_tokens = [
             token for token in tokens 
-            if token.isalpha() and len(token) > 2 and token not in self.stop_words
+            if token.isalpha() and len(token) >= self.config.MIN_WORD_LENGTH
+            and token not in self.stop_words
         ]
         
         return filtered_tokens
@@ -395,7 +723,8 @@ class LyricsETLProcessor:
         from collections import Counter
         word_counts = Counter(tokens)
         
-        # Converter vetor TF-IDF para dicionário
+        # Converter vetor TF-IDF para dicionário (None = TF-IDF desligado no perfil)
+        with_tfidf = 'tfidf' in self.analyzers
         tfidf_scores = {}
         if hasattr(tfidf_vector, 'toarray'):
             tfidf_array = tfidf_vector.toarray()[0]
@@ -404,32 +733,42 @@ class LyricsETLProcessor:
                     tfidf_scores[feature_names[i]] = score
         
         # POS tagging para palavras mais frequentes
-        top_words = [word for word, _ in word_counts.most_common(50)]
-        pos_tags = dict(pos_tag(top_words)) if top_words else {}
+        pos_tags = None
+        if 'pos' in self.analyzers:
+            top_words = [word for word, _ in word_counts.most_common(50)]
+            with self.metrics.stage('pos', records=len(top_words)):
+                pos_tags = dict(pos_tag(top_words)) if top_words else {}
         
         for word, frequency in word_counts.items():
             word_freq_data.append({
                 'lyrics_id': lyrics_id,
                 'word': word,
                 'frequency': frequency,
-                'tf_idf': tfidf_scores.get(word, 0.0),
-                'pos_tag': pos_tags.get(word, 'UNKNOWN'),
+                'tf_idf': tfidf_scores.get(word, 0.0) if with_tfidf else None,
+                'pos_tag': pos_tags.get(word, 'UNKNOWN') if pos_tags is not None else None,
                 'is_stopword': word in self.stop_words,
                 'created_at': datetime.utcnow().isoformat()
             })
         
         return word_freq_data
     
-    def _analyze_sentiment(self, text: str) -> Dict:
-        """Analisa sentimento do texto"""
+    def _analyze_sentiment(self, text: str, include_words: bool = True) -> Dict:
+        """
+        Analisa sentimento do texto
+        
+        Args:
+            text: Letra original
+            include_words: Classificar palavra por palavra (listas ficam None se False)
+        """
+        empty_words = [] if include_words else None
         if not text:
             return {
                 'sentiment_score': 0.0,
                 'sentiment_label': 'neutral',
                 'confidence': 0.0,
-                'positive_words': [],
-                'negative_words': [],
-                'neutral_words': []
+                'positive_words': empty_words,
+                'negative_words': empty_words,
+                'neutral_words': empty_words
             }
         
         # Análise com VADER
@@ -444,6 +783,16 @@ class LyricsETLProcessor:
         else:
             sentiment_label = 'neutral'
         
+        if not include_words:
+            return {
+                'sentiment_score': compound_score,
+                'sentiment_label': sentiment_label,
+                'confidence': abs(compound_score),
+                'positive_words': None,
+                'negative_words': None,
+                'neutral_words': None
+            }
+        
         # Extrair palavras por sentimento (simplificado)
         tokens = word_tokenize(text.lower())
         positive_words = []
@@ -452,7 +801,7 @@ class LyricsETLProcessor:
         
         # Análise palavra por palavra (simplificada)
         for word in tokens:
-            if word.isalpha() and len(word) > 2:
+            if word.isalpha() and len(word) >= self.config.MIN_WORD_LENGTH:
                 word_scores = self.sentiment_analyzer.polarity_scores(word)
                 if word_scores['compound'] > 0.1:
                     positive_words.append(word)
@@ -471,71 +820,74 @@ class LyricsETLProcessor:
         }
     
     def load_to_bigquery(self, raw_data: List[Dict], processed_df: pd.DataFrame,
-                        word_freq_df: pd.DataFrame, sentiment_df: pd.DataFrame):
+                        word_freq_df: pd.DataFrame, sentiment_df: pd.DataFrame) -> Dict[str, int]:
         """
-        Carrega dados processados no BigQuery
+        Carrega dados processados no destino de saída (BigQuery por padrão)
+        
+        Depois das tabelas do lote, as chaves de rollup tocadas pelo lote são
+        atualizadas no destino (quando Config.ROLLUPS_ENABLED).
         
         Args:
             raw_data: Dados brutos originais
             processed_df: DataFrame com letras processadas
             word_freq_df: DataFrame com frequência de palavras
             sentiment_df: DataFrame com análise de sentimentos
+            
+        Returns:
+            Dicionário tabela -> linhas gravadas
         """
-        logger.info("Iniciando carregamento no BigQuery")
-        
-        # Configuração de job
-        job_config = bigquery.LoadJobConfig(
-            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-            create_disposition=bigquery.CreateDisposition.CREATE_IF_NEEDED
-        )
+        logger.info(f"Iniciando carregamento no destino {self.sink.name}")
         
         try:
-            # Carregar dados brutos
-            raw_df = pd.DataFrame(raw_data)
-            self._load_table(raw_df, 'raw_lyrics', job_config)
+            with self.metrics.stage('dataframe', records=len(raw_data)) as call:
+                raw_df = pd.DataFrame(raw_data)
+                if 'artist' in raw_df.columns:
+                    raw_df['artist_key'] = artist_key_series(raw_df['artist'])
+                call.bytes_out = int(raw_df.memory_usage(deep=True).sum())
             
-            # Carregar dados processados
-            self._load_table(processed_df, 'processed_lyrics', job_config)
+            rows_written = self.sink.write_tables({
+                'raw_lyrics': raw_df,
+                'processed_lyrics': processed_df,
+                'word_frequency': word_freq_df,
+                'sentiment_analysis': sentiment_df
+            }, metrics=self.metrics)
             
-            # Carregar frequência de palavras
-            self._load_table(word_freq_df, 'word_frequency', job_config)
+            if self.config.ROLLUPS_ENABLED:
+                with self.metrics.stage('rollups', records=len(raw_df)):
+                    rollups = compute_rollups(raw_df, processed_df, word_freq_df, sentiment_df)
+                rows_written.update(self.sink.write_rollups(rollups, metrics=self.metrics))
             
-            # Carregar análise de sentimentos
-            self._load_table(sentiment_df, 'sentiment_analysis', job_config)
-            
-            logger.info("Carregamento no BigQuery concluído com sucesso")
+            logger.info(f"Carregamento no destino {self.sink.name} concluído com sucesso")
+            return rows_written
             
         except Exception as e:
-            logger.error(f"Erro no carregamento BigQuery: {str(e)}")
+            logger.error(f"Erro no carregamento ({self.sink.name}): {str(e)}")
             raise
     
-    def _load_table(self, df: pd.DataFrame, table_name: str, job_config):
-        """Carrega DataFrame em tabela específica do BigQuery"""
-        if df.empty:
-            logger.warning(f"DataFrame vazio para tabela {table_name}")
-            return
-        
-        table_id = f"{self.project_id}.{self.dataset_id}.{table_name}"
+    def _process_records(self, raw_data: List[Dict]) -> Dict[str, int]:
+        """Transforma e carrega um conjunto de registros brutos"""
+        if not raw_data:
+            return {}
         
-        # Converter colunas de array para string JSON (BigQuery compatibility)
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                # Verificar se contém listas
-                sample_value = df[col].dropna().iloc[0] if not df[col].dropna().empty else None
-                if isinstance(sample_value, list):
-                    df[col] = df[col].apply(lambda x: json.dumps(x) if isinstance(x, list) else x)
-        
-        job = self.bq_client.load_table_from_dataframe(df, table_id, job_config=job_config)
-        job.result()  # Aguardar conclusão
-        
-        logger.info(f"Carregadas {len(df)} linhas na tabela {table_name}")
+        processed_df, word_freq_df, sentiment_df = self.transform_lyrics(raw_data)
+        return self.load_to_bigquery(raw_data, processed_df, word_freq_df, sentiment_df)
     
-    def run_etl_pipeline(self, input_prefix: str = "raw-data/") -> Dict:
+    def run_etl_pipeline(self, input_prefix: str = "raw-data/", resume: bool = False) -> Dict:
         """
-        Executa pipeline ETL completo
+        Executa pipeline ETL completo, em lotes de até config.BATCH_SIZE arquivos
+        
+        Cada lote carregado com sucesso é registrado no checkpoint. Com
+        resume=True os arquivos de lotes já confirmados são ignorados; sem
+        resume o checkpoint e a dead-letter são reiniciados.
+        
+        Sem modelo TF-IDF persistido (--tfidf-model) o TF-IDF é ajustado em
+        cada lote: o tf_idf das palavras depende dos arquivos do lote e difere
+        de um ajuste no corpus completo. Com o modelo carregado o vocabulário e
+        o IDF são os mesmos em todos os lotes.
         
         Args:
             input_prefix: Prefixo dos arquivos de entrada
+            resume: Retomar a partir do último checkpoint
             
         Returns:
             Dicionário com estatísticas da execução
@@ -543,31 +895,95 @@ class LyricsETLProcessor:
         start_time = datetime.utcnow()
         logger.info("Iniciando pipeline ETL completo")
         
+        self.metrics.reset()
+        self.metrics.start()
+        self.record_guard.reset()
+        
+        processed_count = 0
+        committed_batches = 0
+        skipped_files = 0
+        
         try:
-            # 1. Extração
-            raw_data = self.extract_from_storage(input_prefix)
+            # 1. Listagem do shard desta tarefa
+            blobs = self.list_input_blobs(input_prefix)
             
-            if not raw_data:
-                logger.warning("Nenhum dado encontrado para processamento")
-                return {'status': 'no_data', 'processed_count': 0}
+            if resume:
+                committed = self.checkpoint.committed_keys()
+                pending = [b for b in blobs if CheckpointStore.blob_key(b) not in committed]
+                skipped_files = len(blobs) - len(pending)
+                blobs = pending
+                logger.info(f"Retomando execução: {skipped_files} arquivos já confirmados")
+            else:
+                self.checkpoint.reset()
+                self.dead_letter.reset()
+            
+            if not self.tfidf_frozen and len(blobs) > self.config.BATCH_SIZE:
+                logger.warning("TF-IDF ajustado por lote (sem --tfidf-model): tf_idf não é "
+                               "comparável entre lotes")
             
-            # 2. Transformação
-            processed_df, word_freq_df, sentiment_df = self.transform_lyrics(raw_data)
+            # 2. Extração, transformação e carga por lote (lote reduz sob pressão de memória)
+            sizer = AdaptiveBatchSizer(
+                self.config.BATCH_SIZE,
+                self.config.MIN_BATCH_SIZE,
+                self.config.RESOURCE_LIMITS,
+                high_watermark=self.config.MEMORY_HIGH_WATERMARK,
+                low_watermark=self.config.MEMORY_LOW_WATERMARK
+            )
+            batch_start = 0
+            batch_number = 0
+            while batch_start < len(blobs):
+                batch_blobs = blobs[batch_start:batch_start + sizer.size]
+                
+                raw_data = self.extract_from_storage(blobs=batch_blobs)
+                rows_written = self._process_records(raw_data)
+                
+                # Falhas do lote vão para a dead-letter antes do checkpoint
+                self.dead_letter.flush()
+                self.checkpoint.record_batch(batch_number, batch_blobs, len(raw_data), rows_written)
+                
+                processed_count += len(raw_data)
+                committed_batches += 1
+                logger.info(f"Lote {batch_number} confirmado ({len(raw_data)} registros)")
+                
+                batch_start += len(batch_blobs)
+                batch_number += 1
+                sizer.adjust()
             
-            # 3. Carregamento
-            self.load_to_bigquery(raw_data, processed_df, word_freq_df, sentiment_df)
+            if processed_count == 0:
+                logger.warning("Nenhum dado encontrado para processamento")
+                self.metrics.stop()
+                return {
+                    'status': 'no_data',
+                    'processed_count': 0,
+                    'skipped_files': skipped_files,
+                    'task_index': self.task_index,
+                    'task_count': self.task_count
+                }
             
             # Estatísticas finais
+            self.metrics.stop()
             end_time = datetime.utcnow()
             duration = (end_time - start_time).total_seconds()
             
             stats = {
                 'status': 'success',
-                'processed_count': len(raw_data),
+                'processed_count': processed_count,
+                'committed_batches': committed_batches,
+                'skipped_files': skipped_files,
+                'dead_letter_path': self.dead_letter.location,
                 'duration_seconds': duration,
                 'start_time': start_time.isoformat(),
                 'end_time': end_time.isoformat(),
-                'tables_updated': ['raw_lyrics', 'processed_lyrics', 'word_frequency', 'sentiment_analysis']
+                'sink': self.sink.name,
+                'analysis_profile': self.analysis_profile,
+                'task_index': self.task_index,
+                'task_count': self.task_count,
+                'tables_updated': list(TABLE_NAMES) + (
+                    ROLLUP_TABLE_NAMES if self.config.ROLLUPS_ENABLED else []
+                ),
+                'quarantined_records': self.record_guard.quarantined,
+                'slow_records': self.record_guard.slow_report(),
+                'stage_metrics': self.metrics.to_dict()
             }
             
             logger.info(f"Pipeline ETL concluído: {stats}")
@@ -575,11 +991,164 @@ class LyricsETLProcessor:
             
         except Exception as e:
             logger.error(f"Erro no pipeline ETL: {str(e)}")
+            self.metrics.stop()
+            self.dead_letter.flush()
             return {
                 'status': 'error',
                 'error_message': str(e),
-                'processed_count': 0
+                'processed_count': processed_count,
+                'committed_batches': committed_batches,
+                'stage_metrics': self.metrics.to_dict()
             }
+    
+    def process_objects(self, object_names: List[str]) -> Dict:
+        """
+        Extrai, transforma e carrega somente os objetos informados
+        
+        Usado pela ingestão por eventos. Objetos removidos desde a notificação
+        e objetos já confirmados no checkpoint (notificação reentregue) são
+        ignorados; o lote processado é registrado no checkpoint.
+        
+        Args:
+            object_names: Nomes dos objetos no bucket (ou diretório local)
+            
+        Returns:
+            Dicionário com estatísticas do micro-lote
+        """
+        # Métricas por micro-lote: o serviço de eventos reutiliza o processador
+        self.metrics.reset()
+        blobs = [blob for blob in map(self.bucket.get_blob, object_names) if blob is not None]
+        missing = len(object_names) - len(blobs)
+        
+        committed = self.checkpoint.committed_keys()
+        pending = [blob for blob in blobs if CheckpointStore.blob_key(blob) not in committed]
+        duplicates = len(blobs) - len(pending)
+        
+        raw_data = self.extract_from_storage(blobs=pending) if pending else []
+        rows_written = self._process_records(raw_data)
+        
+        self.dead_letter.flush()
+        if pending:
+            self.checkpoint.record_batch(self.checkpoint.committed_batches(), pending,
+                                         len(raw_data), rows_written)
+        
+        logger.info(
+            f"Micro-lote de eventos: {len(pending)} arquivos, {len(raw_data)} registros "
+            f"({duplicates} já confirmados, {missing} removidos)"
+        )
+        return {
+            'status': 'success',
+            'files': len(pending),
+            'processed_count': len(raw_data),
+            'duplicate_files': duplicates,
+            'missing_files': missing,
+            'rows_written': rows_written
+        }
+    
+    def reprocess_dead_letter(self, dead_letter_path: str = None) -> Dict:
+        """
+        Reprocessa somente os registros da dead-letter
+        
+        Registros de transformação são reprocessados a partir do registro
+        bruto salvo; falhas de extração baixam o arquivo de origem novamente.
+        O que falhar outra vez volta para a dead-letter.
+        
+        Args:
+            dead_letter_path: Arquivo a reprocessar (padrão: dead-letter do processador)
+            
+        Returns:
+            Dicionário com estatísticas do reprocessamento
+        """
+        source = DeadLetterQueue(dead_letter_path, self.storage_client) if dead_letter_path else self.dead_letter
+        entries = source.read()
+        logger.info(f"Reprocessando {len(entries)} entradas de {source.location}")
+        
+        records = [entry['record'] for entry in entries if entry.get('record')]
+        file_paths = sorted({
+            entry['file_path'] for entry in entries
+            if not entry.get('record') and entry.get('file_path')
+        })
+        
+        raw_data = records + self.extract_from_storage(
+            blobs=[self.bucket.blob(path) for path in file_paths]
+        )
+        self._process_records(raw_data)
+        
+        # Só após a carga a dead-letter original é descartada; ficam apenas as novas falhas
+        source.file.reset()
+        still_failing = self.dead_letter.flush()
+        
+        return {
+            'status': 'success',
+            'reprocessed_entries': len(entries),
+            'processed_count': len(raw_data),
+            'still_failing': still_failing,
+            'dead_letter_path': self.dead_letter.location
+        }
+
+# Parâmetros do TfidfVectorizer que não são persistidos (tipo numpy e vocabulário de entrada)
+_TFIDF_SKIPPED_PARAMS = ('dtype', 'vocabulary')
+
+
+def _tfidf_to_json(vectorizer: TfidfVectorizer) -> bytes:
+    """Serializa um TfidfVectorizer ajustado em JSON (parâmetros, vocabulário e IDF)"""
+    params = {}
+    for name, value in vectorizer.get_params().items():
+        if name in _TFIDF_SKIPPED_PARAMS or value is None:
+            continue
+        if callable(value):
+            raise ValueError(f"Parâmetro do TF-IDF não serializável em JSON: {name}")
+        params[name] = list(value) if isinstance(value, (tuple, frozenset, set)) else value
+    
+    model = {
+        'format': 'tfidf-json',
+        'version': 1,
+        'params': params,
+        'vocabulary': {term: int(index) for term, index in vectorizer.vocabulary_.items()},
+        'idf': vectorizer.idf_.tolist()
+    }
+    return json.dumps(model).encode('utf-8')
+
+
+def _tfidf_from_json(data: bytes) -> TfidfVectorizer:
+    """Reconstrói o TfidfVectorizer gravado por _tfidf_to_json"""
+    model = json.loads(data)
+    if not isinstance(model, dict) or model.get('format') != 'tfidf-json':
+        raise ValueError("Modelo TF-IDF em formato desconhecido (esperado JSON tfidf-json)")
+    
+    params = dict(model['params'])
+    if 'ngram_range' in params:
+        params['ngram_range'] = tuple(params['ngram_range'])
+    vectorizer = TfidfVectorizer(**params)
+    vectorizer.vocabulary_ = model['vocabulary']
+    vectorizer.idf_ = np.asarray(model['idf'], dtype=np.float64)
+    return vectorizer
+
+
+def _read_bytes(location: str, storage_client=None) -> bytes:
+    """Lê um arquivo local ou objeto gs://"""
+    if not location.startswith('gs://'):
+        return Path(location).read_bytes()
+    bucket_name, _, object_name = location[len('gs://'):].partition('/')
+    client = storage_client or storage.Client()
+    return client.bucket(bucket_name).blob(object_name).download_as_bytes()
+
+
+def _write_bytes(location: str, data: bytes, storage_client=None):
+    """Grava um arquivo local ou objeto gs://"""
+    if not location.startswith('gs://'):
+        path = Path(location)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return
+    bucket_name, _, object_name = location[len('gs://'):].partition('/')
+    client = storage_client or storage.Client()
+    client.bucket(bucket_name).blob(object_name).upload_from_string(data)
+
+
+def _text_bytes(text: str) -> int:
+    """Tamanho do texto em bytes UTF-8"""
+    return len(text.encode('utf-8')) if text else 0
 
 
 def main():
@@ -587,26 +1156,102 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Pipeline ETL para Análise de Letras de Música')
-    parser.add_argument('--project-id', required=True, help='ID do projeto GCP')
-    parser.add_argument('--dataset-id', required=True, help='ID do dataset BigQuery')
-    parser.add_argument('--bucket-name', required=True, help='Nome do bucket Cloud Storage')
+    parser.add_argument('--project-id', default=Config.PROJECT_ID, help='ID do projeto GCP')
+    parser.add_argument('--dataset-id', default=Config.DATASET_ID, help='ID do dataset BigQuery')
+    parser.add_argument('--bucket-name', default=Config.BUCKET_NAME, help='Nome do bucket Cloud Storage')
     parser.add_argument('--input-prefix', default='raw-data/', help='Prefixo dos arquivos de entrada')
+    parser.add_argument('--input-dir', help='Diretório local usado no lugar do bucket (execução offline)')
+    parser.add_argument('--array-mode', choices=Config.ARRAY_COLUMN_MODES,
+                        default=Config.ARRAY_COLUMN_MODE,
+                        help='Armazenamento das colunas de array (JSON ou ARRAY<STRING>)')
+    parser.add_argument('--sink', choices=Config.OUTPUT_SINKS, default=Config.OUTPUT_SINK,
+                        help='Destino de saída das tabelas')
+    parser.add_argument('--output-path',
+                        help='Diretório (parquet) ou arquivo (duckdb) de saída local')
+    parser.add_argument('--load-mode', choices=Config.LOAD_MODES, default=Config.LOAD_MODE,
+                        help='Carga no BigQuery: append ou merge idempotente via staging')
+    parser.add_argument('--resume', action='store_true',
+                        help='Ignorar arquivos de lotes já confirmados no checkpoint')
+    parser.add_argument('--tfidf-model', default=Config.TFIDF_MODEL_PATH,
+                        help='Modelo TF-IDF persistido (local ou gs://) usado em todos os lotes')
+    parser.add_argument('--analysis-profile', choices=list(Config.ANALYSIS_PROFILES),
+                        default=Config.ANALYSIS_PROFILE,
+                        help='Perfil de análise (analisadores desligados geram NULL)')
+    parser.add_argument('--checkpoint-path', default=Config.CHECKPOINT_PATH,
+                        help='Checkpoint dos lotes (arquivo local ou gs://)')
+    parser.add_argument('--dead-letter-path', default=Config.DEAD_LETTER_PATH,
+                        help='Registros que falharam (arquivo local ou gs://)')
+    parser.add_argument('--reprocess-dead-letter', nargs='?', const='', metavar='PATH',
+                        help='Reprocessar apenas os registros da dead-letter')
+    parser.add_argument('--metrics-path', default=Config.METRICS_PATH,
+                        help='Relatório de métricas por estágio (.json ou .prom para Prometheus)')
+    parser.add_argument('--track-memory', action='store_true',
+                        default=Config.METRICS_TRACK_MEMORY,
+                        help='Medir pico de memória por estágio (tracemalloc, mais lento)')
+    parser.add_argument('--profile', nargs='?', const='sampling', choices=PROFILE_MODES,
+                        help='Executar sob profiler determinístico (thread principal) ou por '
+                             'amostragem (todas as threads)')
+    parser.add_argument('--profile-dir', default='profiles',
+                        help='Diretório dos relatórios de profiling')
     
     args = parser.parse_args()
     
+    # Destino de saída
+    sink = create_sink(
+        args.sink,
+        output_path=args.output_path,
+        project_id=args.project_id,
+        dataset_id=args.dataset_id,
+        array_mode=args.array_mode,
+        load_mode=args.load_mode,
+        analysis_profile=args.analysis_profile
+    )
+    
     # Inicializar e executar pipeline
     processor = LyricsETLProcessor(
         project_id=args.project_id,
         dataset_id=args.dataset_id,
-        bucket_name=args.bucket_name
+        bucket_name=args.bucket_name,
+        array_mode=args.array_mode,
+        sink=sink,
+        input_dir=args.input_dir,
+        checkpoint_path=args.checkpoint_path,
+        dead_letter_path=args.dead_letter_path,
+        track_memory=args.track_memory,
+        analysis_profile=args.analysis_profile
     )
     
-    result = processor.run_etl_pipeline(args.input_prefix)
+    if args.tfidf_model:
+        processor.load_tfidf_model(args.tfidf_model)
+    
+    # Novas tentativas de uma tarefa do Cloud Run retomam automaticamente
+    resume = args.resume or int(os.getenv('CLOUD_RUN_TASK_ATTEMPT', '0')) > 0
+    
+    profiler = PipelineProfiler(args.profile, args.profile_dir) if args.profile else None
+    
+    try:
+        with profiler or contextlib.nullcontext():
+            if args.reprocess_dead_letter is not None:
+                result = processor.reprocess_dead_letter(args.reprocess_dead_letter or None)
+            else:
+                result = processor.run_etl_pipeline(args.input_prefix, resume=resume)
+    finally:
+        processor.sink.close()
+    
+    if profiler:
+        profiler.write_reports()
+    
+    if args.metrics_path:
+        report_path = processor.metrics.write_report(args.metrics_path, extra={
+            key: value for key, value in result.items() if key != 'stage_metrics'
+        })
+        logger.info(f"Métricas por estágio gravadas em {report_path}")
     
     print(f"Pipeline executado: {result}")
     
-    # Exit code baseado no status
-    exit_code = 0 if result['status'] == 'success' else 1
+    # Exit code baseado no status (shard vazio não é falha em jobs com várias tarefas)
+    empty_shard = result['status'] == 'no_data' and processor.task_count > 1
+    exit_code = 0 if result['status'] == 'success' or empty_shard else 1
     exit(exit_code)
 
 
@@ -0,0 +1,518 @@
+"""
+Ingestão por eventos do pipeline ETL
+
+Recebe notificações de objeto finalizado (Cloud Storage -> Pub/Sub push) ou
+observa um diretório local, agrupa os objetos em micro-lotes por quantidade,
+bytes ou janela de tempo e executa extração, transformação e carga somente
+nesses objetos. Cada notificação só é confirmada (HTTP 204) depois que o
+micro-lote que a contém foi carregado; falhas devolvem 500 e o Pub/Sub
+reenvia a mensagem.
+
+Uso:
+    python event_ingestion.py serve --load-mode merge
+    python event_ingestion.py watch --input-dir ./dados --sink parquet --output-path output/
+"""
+
+import base64
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+from etl_processor import INPUT_EXTENSIONS, LyricsETLProcessor
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+FINALIZE_EVENT = 'OBJECT_FINALIZE'
+
+
+class ObjectEvent:
+    """Notificação de um objeto gravado no bucket (ou arquivo no diretório observado)"""
+
+    def __init__(self, name: str, size: int = 0, generation: str = None,
+                 bucket: str = None, created_at: datetime = None):
+        """
+        Args:
+            name: Nome do objeto (relativo à raiz, no caso local)
+            size: Tamanho em bytes
+            generation: Geração do objeto (reenvios da mesma geração são duplicatas)
+            bucket: Bucket de origem (None para o diretório local)
+            created_at: Momento da gravação, usado para medir o atraso da ingestão
+        """
+        self.name = name
+        self.size = size
+        self.generation = generation
+        self.bucket = bucket
+        self.created_at = created_at
+
+    def __repr__(self) -> str:
+        return f"ObjectEvent({self.name!r}, size={self.size}, generation={self.generation})"
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def parse_pubsub_push(envelope: Dict) -> Optional[ObjectEvent]:
+    """
+    Converte o corpo de uma entrega Pub/Sub push de notificação do Cloud Storage
+
+    Args:
+        envelope: JSON recebido ({"message": {"attributes": ..., "data": ...}})
+
+    Returns:
+        Evento do objeto, ou None para notificações que não são OBJECT_FINALIZE
+
+    Raises:
+        ValueError: Corpo sem os campos de uma notificação do Cloud Storage
+    """
+    message = envelope.get('message') if isinstance(envelope, dict) else None
+    if not isinstance(message, dict):
+        raise ValueError("Corpo sem o campo 'message' do Pub/Sub")
+
+    attributes = message.get('attributes') or {}
+    if attributes.get('eventType') != FINALIZE_EVENT:
+        return None
+
+    resource = {}
+    if message.get('data'):
+        try:
+            resource = json.loads(base64.b64decode(message['data']))
+        except ValueError:
+            # Notificações com payloadFormat NONE não trazem o recurso
+            resource = {}
+
+    name = attributes.get('objectId') or resource.get('name')
+    if not name:
+        raise ValueError("Notificação sem 'objectId'")
+
+    return ObjectEvent(
+        name=name,
+        size=int(resource.get('size') or 0),
+        generation=attributes.get('objectGeneration') or resource.get('generation'),
+        bucket=attributes.get('bucketId') or resource.get('bucket'),
+        created_at=_parse_timestamp(resource.get('updated') or resource.get('timeCreated'))
+    )
+
+
+class EventCoalescer:
+    """
+    Agrupa eventos de objetos em micro-lotes processados por uma única thread
+
+    Um micro-lote é fechado ao atingir max_files objetos, max_bytes bytes ou
+    max_wait segundos após o primeiro evento. Eventos repetidos de um mesmo
+    objeto dentro da janela são processados uma vez (prevalece a última geração).
+    """
+
+    def __init__(self, handler: Callable[[List[ObjectEvent]], Dict], max_files: int = 50,
+                 max_bytes: int = 64 * 2**20, max_wait: float = 30.0):
+        """
+        Args:
+            handler: Função que processa a lista de eventos do micro-lote
+            max_files: Objetos por micro-lote
+            max_bytes: Bytes por micro-lote
+            max_wait: Janela máxima em segundos a partir do primeiro evento
+        """
+        self.handler = handler
+        self.max_files = max(1, max_files)
+        self.max_bytes = max_bytes
+        self.max_wait = max_wait
+        self.batches = 0
+        self.events = 0
+        self._pending: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._ready: deque = deque()
+        self._bytes = 0
+        self._deadline = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='event-coalescer', daemon=True)
+        self._thread.start()
+
+    def submit(self, event: ObjectEvent) -> Future:
+        """Adiciona um evento à janela atual e retorna o Future do seu micro-lote"""
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Coalescedor encerrado")
+
+            previous = self._pending.get(event.name)
+            if previous is None:
+                self._pending[event.name] = (event, [future])
+                self._bytes += event.size
+                if self._deadline is None:
+                    # Primeiro evento da janela: a thread passa a esperar pelo prazo
+                    self._deadline = time.monotonic() + self.max_wait
+                    self._condition.notify()
+            else:
+                previous_event, futures = previous
+                futures.append(future)
+                self._bytes += event.size - previous_event.size
+                self._pending[event.name] = (event, futures)
+
+            # Janela cheia é fechada na hora; os próximos eventos abrem outra
+            if len(self._pending) >= self.max_files or self._bytes >= self.max_bytes:
+                self._seal()
+        return future
+
+    def _seal(self):
+        """Move a janela atual para a fila de micro-lotes prontos (com o lock adquirido)"""
+        self._ready.append(list(self._pending.values()))
+        self._pending = OrderedDict()
+        self._bytes = 0
+        self._deadline = None
+        self._condition.notify()
+
+    def _take(self) -> Optional[List[tuple]]:
+        with self._condition:
+            while True:
+                if not self._ready and self._pending and (
+                    self._closed or time.monotonic() >= self._deadline
+                ):
+                    self._seal()
+                if self._ready:
+                    return self._ready.popleft()
+                if self._closed:
+                    return None
+                timeout = self._deadline - time.monotonic() if self._pending else None
+                self._condition.wait(timeout)
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+
+            events = [event for event, _ in batch]
+            futures = [future for _, futures in batch for future in futures]
+            self.batches += 1
+            self.events += len(futures)
+            try:
+                result = self.handler(events)
+            except Exception as e:
+                logger.error(f"Erro no micro-lote de {len(events)} objetos: {str(e)}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future in futures:
+                future.set_result(result)
+
+    def close(self):
+        """Processa a janela pendente e encerra a thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+
+class EventIngestionService:
+    """
+    Ingestão de objetos notificados em micro-lotes sobre um LyricsETLProcessor
+    """
+
+    def __init__(self, processor: LyricsETLProcessor, prefix: str = None,
+                 max_files: int = None, max_bytes: int = None, max_wait: float = None,
+                 ack_timeout: float = None):
+        """
+        Args:
+            processor: Processador usado na extração, transformação e carga
+            prefix: Prefixo dos objetos aceitos (padrão: Config.INPUT_PREFIX)
+            max_files: Objetos por micro-lote (padrão: Config.EVENT_MAX_BATCH_FILES)
+            max_bytes: Bytes por micro-lote (padrão: Config.EVENT_MAX_BATCH_BYTES)
+            max_wait: Janela em segundos (padrão: Config.EVENT_MAX_WAIT_SECONDS)
+            ack_timeout: Espera máxima pelo micro-lote (padrão: Config.EVENT_ACK_TIMEOUT)
+        """
+        self.processor = processor
+        self.prefix = Config.INPUT_PREFIX if prefix is None else prefix
+        self.ack_timeout = ack_timeout or Config.EVENT_ACK_TIMEOUT
+        self.last_batch: Dict = {}
+        self.coalescer = EventCoalescer(
+            self._process_batch,
+            max_files=max_files or Config.EVENT_MAX_BATCH_FILES,
+            max_bytes=max_bytes or Config.EVENT_MAX_BATCH_BYTES,
+            max_wait=Config.EVENT_MAX_WAIT_SECONDS if max_wait is None else max_wait
+        )
+
+    def accepts(self, event: ObjectEvent) -> bool:
+        """Indica se o objeto é uma entrada do pipeline (bucket, prefixo e extensão)"""
+        if event.bucket and event.bucket != self.processor.bucket.name:
+            return False
+        return event.name.startswith(self.prefix) and event.name.endswith(INPUT_EXTENSIONS)
+
+    def submit(self, event: ObjectEvent) -> Optional[Future]:
+        """Enfileira o evento (None se o objeto não é entrada do pipeline)"""
+        if not self.accepts(event):
+            logger.debug(f"Evento ignorado: {event}")
+            return None
+        return self.coalescer.submit(event)
+
+    def handle(self, event: ObjectEvent) -> Optional[Dict]:
+        """Enfileira o evento e aguarda a carga do seu micro-lote"""
+        future = self.submit(event)
+        return future.result(timeout=self.ack_timeout) if future else None
+
+    def _process_batch(self, events: List[ObjectEvent]) -> Dict:
+        """Executa o ETL nos objetos do micro-lote e mede o atraso desde a gravação"""
+        start = datetime.now(timezone.utc)
+        result = self.processor.process_objects([event.name for event in events])
+
+        lags = [
+            (start - event.created_at).total_seconds()
+            for event in events if event.created_at is not None
+        ]
+        result['duration_seconds'] = (datetime.now(timezone.utc) - start).total_seconds()
+        if lags:
+            result['max_event_lag_seconds'] = round(max(lags) + result['duration_seconds'], 3)
+            logger.info(f"Atraso máximo gravação -> carga: {result['max_event_lag_seconds']:.1f}s")
+
+        self.last_batch = result
+        return result
+
+    def health(self) -> Dict:
+        return {
+            'status': 'ok',
+            'batches': self.coalescer.batches,
+            'events': self.coalescer.events,
+            'last_batch': self.last_batch
+        }
+
+    def close(self):
+        self.coalescer.close()
+
+
+class DirectoryWatcher:
+    """
+    Observa um diretório local e gera eventos de arquivos novos ou alterados
+
+    Substitui a notificação do Cloud Storage em execuções locais: um arquivo
+    só gera evento quando tamanho e data de modificação se repetem entre duas
+    varreduras, ou seja, quando a cópia terminou.
+    """
+
+    def __init__(self, root: str, prefix: str = '', include_existing: bool = False):
+        """
+        Args:
+            root: Diretório observado (o mesmo --input-dir do processador)
+            prefix: Prefixo dos caminhos relativos observados
+            include_existing: Gerar eventos para os arquivos já presentes no início
+        """
+        self.root = Path(root)
+        self.prefix = prefix
+        self._emitted: Dict[str, tuple] = {}
+        self._candidates: Dict[str, tuple] = {}
+        if not include_existing:
+            self._emitted = self._scan()
+
+    def _scan(self) -> Dict[str, tuple]:
+        signatures = {}
+        for path in self.root.rglob('*'):
+            name = path.relative_to(self.root).as_posix()
+            if not name.startswith(self.prefix) or not name.endswith(INPUT_EXTENSIONS):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if path.is_file():
+                signatures[name] = (stat.st_size, stat.st_mtime_ns)
+        return signatures
+
+    def poll(self) -> List[ObjectEvent]:
+        """Varre o diretório e retorna os arquivos que ficaram estáveis desde a última varredura"""
+        events = []
+        current = self._scan()
+        for name, signature in sorted(current.items()):
+            if self._emitted.get(name) == signature:
+                continue
+            if self._candidates.get(name) == signature:
+                size, mtime_ns = signature
+                events.append(ObjectEvent(
+                    name, size=size, generation=str(mtime_ns),
+                    created_at=datetime.fromtimestamp(mtime_ns / 1e9, timezone.utc)
+                ))
+                self._emitted[name] = signature
+        self._candidates = {
+            name: signature for name, signature in current.items()
+            if self._emitted.get(name) != signature
+        }
+        return events
+
+    def run(self, callback: Callable[[ObjectEvent], None], stop: threading.Event,
+            poll_interval: float = None):
+        """
+        Varre o diretório até stop ser sinalizado
+
+        Args:
+            callback: Função chamada para cada evento
+            stop: Evento de parada
+            poll_interval: Intervalo entre varreduras (padrão: Config.WATCH_POLL_INTERVAL)
+        """
+        interval = poll_interval or Config.WATCH_POLL_INTERVAL
+        logger.info(f"Observando {self.root} (prefixo '{self.prefix}') a cada {interval}s")
+        while not stop.is_set():
+            for event in self.poll():
+                callback(event)
+            stop.wait(interval)
+
+
+def make_handler(service: EventIngestionService):
+    """Cria a classe de handler HTTP (endpoint de push do Pub/Sub) ligada ao serviço"""
+
+    class PushRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send_json(self, status: int, payload: Dict = None):
+            body = json.dumps(payload, default=str).encode('utf-8') if payload is not None else b''
+            self.send_response(status)
+            if body:
+                self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/healthz':
+                self._send_json(200, service.health())
+            else:
+                self._send_json(404, {'error': 'Rota não encontrada'})
+
+        def do_POST(self):
+            if self.path != '/':
+                self._send_json(404, {'error': 'Rota não encontrada'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                event = parse_pubsub_push(json.loads(self.rfile.read(length) or b'null'))
+                if event is not None:
+                    service.handle(event)
+                # 204 confirma a mensagem (eventos ignorados também são confirmados)
+                self._send_json(204)
+            except (ValueError, json.JSONDecodeError) as e:
+                self._send_json(400, {'error': str(e)})
+            except TimeoutError:
+                self._send_json(504, {'error': 'Micro-lote não concluído no prazo'})
+            except Exception as e:
+                logger.error(f"Erro ao processar notificação: {str(e)}")
+                self._send_json(500, {'error': 'Erro interno'})
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    return PushRequestHandler
+
+
+def create_server(service: EventIngestionService, host: str = '0.0.0.0',
+                  port: int = None) -> ThreadingHTTPServer:
+    """Cria o servidor HTTP (porta 0 = porta livre escolhida pelo sistema)"""
+    return ThreadingHTTPServer((host, Config.SERVICE_PORT if port is None else port),
+                               make_handler(service))
+
+
+def main():
+    """Função principal da ingestão por eventos"""
+    import argparse
+    from output_sinks import create_sink
+
+    parser = argparse.ArgumentParser(description='Ingestão por eventos em micro-lotes')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--project-id', default=Config.PROJECT_ID)
+    common.add_argument('--dataset-id', default=Config.DATASET_ID)
+    common.add_argument('--bucket-name', default=Config.BUCKET_NAME)
+    common.add_argument('--input-prefix', default=Config.INPUT_PREFIX)
+    common.add_argument('--sink', choices=Config.OUTPUT_SINKS, default=Config.OUTPUT_SINK)
+    common.add_argument('--output-path', help='Diretório (parquet) ou arquivo (duckdb) de saída local')
+    common.add_argument('--load-mode', choices=Config.LOAD_MODES, default=Config.LOAD_MODE,
+                        help='Use merge para cargas idempotentes em reenvios')
+    common.add_argument('--tfidf-model', default=Config.TFIDF_MODEL_PATH,
+                        help='Modelo TF-IDF persistido (recomendado: micro-lotes são pequenos)')
+    common.add_argument('--analysis-profile', choices=list(Config.ANALYSIS_PROFILES),
+                        default=Config.ANALYSIS_PROFILE)
+    common.add_argument('--checkpoint-path', default=Config.EVENT_CHECKPOINT_PATH)
+    common.add_argument('--dead-letter-path', default=Config.DEAD_LETTER_PATH)
+    common.add_argument('--max-batch-files', type=int, default=Config.EVENT_MAX_BATCH_FILES)
+    common.add_argument('--max-batch-bytes', type=int, default=Config.EVENT_MAX_BATCH_BYTES)
+    common.add_argument('--max-wait', type=float, default=Config.EVENT_MAX_WAIT_SECONDS,
+                        help='Janela do micro-lote em segundos')
+
+    serve_parser = subparsers.add_parser('serve', parents=[common],
+                                         help='Endpoint de push do Pub/Sub')
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    serve_parser.add_argument('--port', type=int, default=Config.SERVICE_PORT)
+
+    watch_parser = subparsers.add_parser('watch', parents=[common],
+                                         help='Observar um diretório local')
+    watch_parser.add_argument('--input-dir', required=True)
+    watch_parser.add_argument('--poll-interval', type=float, default=Config.WATCH_POLL_INTERVAL)
+    watch_parser.add_argument('--include-existing', action='store_true',
+                              help='Processar também os arquivos já presentes')
+
+    args = parser.parse_args()
+
+    sink = create_sink(
+        args.sink,
+        output_path=args.output_path,
+        project_id=args.project_id,
+        dataset_id=args.dataset_id,
+        load_mode=args.load_mode,
+        analysis_profile=args.analysis_profile
+    )
+    processor = LyricsETLProcessor(
+        project_id=args.project_id,
+        dataset_id=args.dataset_id,
+        bucket_name=args.bucket_name,
+        sink=sink,
+        input_dir=getattr(args, 'input_dir', None),
+        task_index=0,
+        task_count=1,
+        checkpoint_path=args.checkpoint_path,
+        dead_letter_path=args.dead_letter_path,
+        analysis_profile=args.analysis_profile
+    )
+    if args.tfidf_model:
+        processor.load_tfidf_model(args.tfidf_model)
+
+    service = EventIngestionService(
+        processor, args.input_prefix,
+        max_files=args.max_batch_files,
+        max_bytes=args.max_batch_bytes,
+        max_wait=args.max_wait
+    )
+
+    try:
+        if args.command == 'watch':
+            watcher = DirectoryWatcher(args.input_dir, args.input_prefix, args.include_existing)
+            watcher.run(service.submit, threading.Event(), args.poll_interval)
+        else:
+            server = create_server(service, args.host, args.port)
+            logger.info(f"Ingestão por eventos ouvindo em {args.host}:{server.server_address[1]}")
+            try:
+                server.serve_forever()
+            finally:
+                server.server_close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        processor.sink.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Teste de carga local do serviço de análise (analysis_service.py)
+
+Envia requisições concorrentes com letras do corpus sintético e reporta
+latência p50/p90/p99 e throughput.
+
+Uso:
+    python load_test_service.py --url http://localhost:8080 --requests 1000 --concurrency 16
+"""
+
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+from benchmark_etl import generate_corpus
+
+
+def _post(url: str, payload: Dict, timeout: float) -> float:
+    """Envia uma requisição e retorna a latência em segundos"""
+    body = json.dumps(payload).encode('utf-8')
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def run_load_test(base_url: str, requests: int = 500, concurrency: int = 8,
+                  songs_per_request: int = 1, lines_per_song: int = 20,
+                  timeout: float = 30.0) -> Dict:
+    """
+    Executa o teste de carga
+
+    Args:
+        base_url: URL base do serviço
+        requests: Total de requisições
+        concurrency: Requisições simultâneas
+        songs_per_request: 1 usa /analyze; acima disso usa /analyze/batch
+        lines_per_song: Linhas por letra do corpus sintético
+        timeout: Tempo limite por requisição
+
+    Returns:
+        Latências (ms), throughput e erros
+    """
+    corpus = generate_corpus(max(100, songs_per_request), lines_per_song=lines_per_song,
+                             vocabulary_size=2000)
+    songs = [{'title': song['title'], 'artist': song['artist'], 'lyrics': song['lyrics']}
+             for song in corpus]
+
+    def payload(index: int) -> Dict:
+        if songs_per_request == 1:
+            return songs[index % len(songs)]
+        start = (index * songs_per_request) % len(songs)
+        return {'songs': [songs[(start + offset) % len(songs)] for offset in range(songs_per_request)]}
+
+    url = base_url.rstrip('/') + ('/analyze' if songs_per_request == 1 else '/analyze/batch')
+    latencies: List[float] = []
+    errors = 0
+
+    def send(index: int):
+        try:
+            return _post(url, payload(index), timeout)
+        except (urllib.error.URLError, TimeoutError, ConnectionError):
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency in pool.map(send, range(requests)):
+            if latency is None:
+                errors += 1
+            else:
+                latencies.append(latency)
+    elapsed = time.perf_counter() - start
+
+    values = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'concurrency': concurrency,
+        'songs_per_request': songs_per_request,
+        'elapsed_seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'songs_per_second': round(len(latencies) * songs_per_request / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(float(np.percentile(values, 50)), 2),
+            'p90': round(float(np.percentile(values, 90)), 2),
+            'p99': round(float(np.percentile(values, 99)), 2),
+            'max': round(float(values.max()), 2)
+        }
+    }
+
+
+def main():
+    """Função principal do teste de carga"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Teste de carga do serviço de análise')
+    parser.add_argument('--url', default='http://localhost:8080', help='URL base do serviço')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--songs-per-request', type=int, default=1)
+    parser.add_argument('--lines-per-song', type=int, default=20)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--output', help='Gravar o resultado em JSON')
+
+    args = parser.parse_args()
+
+    result = run_load_test(args.url, args.requests, args.concurrency,
+                           args.songs_per_request, args.lines_per_song, args.timeout)
+    print(json.dumps(result, indent=2))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+    exit(1 if result['errors'] else 0)
+
+
+if __name__ == "__main__":
+    main()
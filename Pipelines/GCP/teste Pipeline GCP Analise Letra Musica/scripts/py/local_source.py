@@ -0,0 +1,49 @@
+"""
+Fonte de dados local para execuções offline do pipeline
+Expõe um diretório com a mesma interface mínima de bucket/blob do Cloud Storage
+"""
+
+from pathlib import Path
+from typing import Iterator, Optional
+
+
+class LocalBlob:
+    """Arquivo local com a interface de blob usada pelo pipeline"""
+
+    def __init__(self, root: Path, path: Path):
+        self._path = path
+        self.name = path.relative_to(root).as_posix()
+        stat = path.stat()
+        self.size = stat.st_size
+        # Equivalente local da geração do objeto no GCS
+        self.generation = str(stat.st_mtime_ns)
+
+    def download_as_text(self, encoding: str = 'utf-8') -> str:
+        return self._path.read_text(encoding=encoding)
+
+
+class LocalBucket:
+    """Diretório local tratado como bucket (nomes de blob relativos à raiz)"""
+
+    def __init__(self, root_dir: str):
+        self.root = Path(root_dir)
+        self.name = str(self.root)
+        if not self.root.is_dir():
+            raise FileNotFoundError(f"Diretório de entrada não encontrado: {root_dir}")
+
+    def list_blobs(self, prefix: str = '') -> Iterator[LocalBlob]:
+        """Lista arquivos cujo caminho relativo começa com o prefixo, em ordem de nome"""
+        for path in sorted(self.root.rglob('*')):
+            if not path.is_file():
+                continue
+            blob = LocalBlob(self.root, path)
+            if blob.name.startswith(prefix):
+                yield blob
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self.root, self.root / name)
+
+    def get_blob(self, name: str) -> Optional[LocalBlob]:
+        """Blob existente com o nome informado (None se o arquivo não existir)"""
+        path = self.root / name
+        return LocalBlob(self.root, path) if path.is_file() else None
@@ -0,0 +1,241 @@
+"""
+Métricas por estágio do pipeline ETL
+Tempo de parede, throughput, percentis de latência, bytes e pico de memória
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+# Percentis de latência por registro incluídos nos relatórios
+LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+
+# Latências mantidas por estágio: os percentis refletem as execuções mais
+# recentes e a memória não cresce em processos de longa duração
+LATENCY_WINDOW = 10000
+
+
+class StageCall:
+    """Contadores de uma execução de estágio (preenchidos dentro do bloco with)"""
+
+    def __init__(self, records: int = 1, bytes_in: int = 0):
+        self.records = records
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+
+
+class StageMetrics:
+    """Acumulado de todas as execuções de um estágio"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.records = 0
+        self.wall_seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.peak_memory_bytes = 0
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, seconds: float, records: int, bytes_in: int, bytes_out: int,
+            peak_memory: int):
+        self.calls += 1
+        self.records += records
+        self.wall_seconds += seconds
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.peak_memory_bytes = max(self.peak_memory_bytes, peak_memory)
+        # Estágios em lote contribuem com a latência média por registro
+        self.latencies.append(seconds / max(records, 1))
+
+    def to_dict(self) -> Dict:
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            'calls': self.calls,
+            'records': self.records,
+            'wall_seconds': round(self.wall_seconds, 6),
+            'records_per_second': round(self.records / self.wall_seconds, 3)
+            if self.wall_seconds > 0 else 0.0,
+            'latency_seconds': {
+                f"p{int(q * 100)}": float(np.quantile(latencies, q))
+                for q in LATENCY_QUANTILES
+            },
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'peak_memory_bytes': self.peak_memory_bytes
+        }
+
+
+class PipelineMetrics:
+    """
+    Coletor de métricas por estágio
+
+    O pico de memória usa tracemalloc e só é medido com track_memory=True,
+    pois o rastreamento de alocações deixa o processamento mais lento. Em
+    estágios aninhados o pico do estágio interno também conta para o externo.
+    """
+
+    def __init__(self, track_memory: bool = False):
+        """
+        Args:
+            track_memory: Medir pico de memória com tracemalloc
+        """
+        self.track_memory = track_memory
+        self._stages: Dict[str, StageMetrics] = {}
+        self._frames: List[List[int]] = []
+        self._lock = threading.Lock()
+        self._started_tracing = False
+        self._started_at = None
+        self._finished_at = None
+
+    def start(self):
+        """Inicia a coleta (e o tracemalloc, se necessário)"""
+        self._started_at = time.perf_counter()
+        self._finished_at = None
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        """Encerra a coleta"""
+        self._finished_at = time.perf_counter()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+    @contextmanager
+    def stage(self, name: str, records: int = 1, bytes_in: int = 0) -> Iterator[StageCall]:
+        """
+        Mede uma execução de estágio
+
+        Args:
+            name: Nome do estágio
+            records: Registros processados (pode ser ajustado no bloco)
+            bytes_in: Bytes de entrada (pode ser ajustado no bloco)
+
+        Yields:
+            StageCall para registrar bytes_out e contagens conhecidas só ao final
+        """
+        call = StageCall(records, bytes_in)
+        frame = None
+        # Frames de memória só fazem sentido na thread que executa o pipeline
+        tracing = (self.track_memory and tracemalloc.is_tracing()
+                   and threading.current_thread() is threading.main_thread())
+
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._frames:
+                self._frames[-1][1] = max(self._frames[-1][1], peak)
+            tracemalloc.reset_peak()
+            frame = [current, current]
+            self._frames.append(frame)
+
+        start = time.perf_counter()
+        try:
+            yield call
+        finally:
+            elapsed = time.perf_counter() - start
+            peak_memory = 0
+            if frame is not None:
+                self._frames.pop()
+                peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+                peak_memory = peak - frame[0]
+                if self._frames:
+                    self._frames[-1][1] = max(self._frames[-1][1], peak)
+            self.record(name, elapsed, call.records, call.bytes_in, call.bytes_out, peak_memory)
+
+    def record(self, name: str, seconds: float, records: int = 1, bytes_in: int = 0,
+               bytes_out: int = 0, peak_memory: int = 0):
+        """Registra uma execução de estágio medida externamente"""
+        with self._lock:
+            if name not in self._stages:
+                self._stages[name] = StageMetrics(name)
+            self._stages[name].add(seconds, records, bytes_in, bytes_out, peak_memory)
+
+    def to_dict(self) -> Dict[str, Dict]:
+        """Métricas de cada estágio, na ordem em que apareceram"""
+        with self._lock:
+            return {name: stage.to_dict() for name, stage in self._stages.items()}
+
+    def to_prometheus(self, prefix: str = 'lyrics_etl') -> str:
+        """
+        Formata as métricas no formato texto do Prometheus (textfile collector)
+
+        Args:
+            prefix: Prefixo dos nomes das métricas
+
+        Returns:
+            Conteúdo do arquivo .prom
+        """
+        stages = self.to_dict()
+        series = [
+            ('stage_wall_seconds', 'gauge', 'Tempo de parede acumulado do estágio', 'wall_seconds'),
+            ('stage_records', 'gauge', 'Registros processados pelo estágio', 'records'),
+            ('stage_records_per_second', 'gauge', 'Throughput do estágio', 'records_per_second'),
+            ('stage_bytes_in', 'gauge', 'Bytes de entrada do estágio', 'bytes_in'),
+            ('stage_bytes_out', 'gauge', 'Bytes de saída do estágio', 'bytes_out'),
+            ('stage_peak_memory_bytes', 'gauge', 'Pico de memória do estágio (tracemalloc)',
+             'peak_memory_bytes'),
+        ]
+
+        lines = []
+        for metric, kind, help_text, key in series:
+            lines.append(f"# HELP {prefix}_{metric} {help_text}")
+            lines.append(f"# TYPE {prefix}_{metric} {kind}")
+            for name, values in stages.items():
+                lines.append(f'{prefix}_{metric}{{stage="{name}"}} {values[key]}')
+
+        metric = f"{prefix}_stage_record_latency_seconds"
+        lines.append(f"# HELP {metric} Latência por registro do estágio")
+        lines.append(f"# TYPE {metric} summary")
+        for name, values in stages.items():
+            for quantile in LATENCY_QUANTILES:
+                value = values['latency_seconds'][f"p{int(quantile * 100)}"]
+                lines.append(f'{metric}{{stage="{name}",quantile="{quantile}"}} {value}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {values["calls"]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, path: str, extra: Dict = None) -> str:
+        """
+        Grava o relatório em JSON ou, para arquivos .prom, no formato Prometheus
+
+        A escrita é atômica (arquivo temporário + rename), como exige o
+        textfile collector do node_exporter.
+
+        Args:
+            path: Arquivo de destino
+            extra: Campos adicionais do relatório JSON (ex.: estatísticas da execução)
+
+        Returns:
+            Caminho gravado
+        """
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        if target.suffix == '.prom':
+            content = self.to_prometheus()
+        else:
+            report = dict(extra or {})
+            if self._started_at is not None:
+                finished_at = self._finished_at or time.perf_counter()
+                report['wall_seconds'] = round(finished_at - self._started_at, 6)
+            report['stages'] = self.to_dict()
+            content = json.dumps(report, indent=2, default=str)
+
+        tmp_path = target.with_name(f".{target.name}.tmp")
+        tmp_path.write_text(content, encoding='utf-8')
+        os.replace(tmp_path, target)
+        return str(target)
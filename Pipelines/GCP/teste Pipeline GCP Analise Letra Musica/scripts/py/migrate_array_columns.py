@@ -0,0 +1,290 @@
+"""
+Migração das colunas de array entre JSON (STRING) e ARRAY<STRING> (REPEATED)
+
+Converte tokens, positive_words, negative_words e neutral_words das tabelas
+existentes, preservando particionamento (tipo, expiração e filtro
+obrigatório), clustering, rótulos e descrições da tabela e das colunas.
+Tabelas cujo layout o CREATE TABLE AS SELECT não reproduz (particionamento
+por tempo de ingestão, descrições em subcampos) não são migradas. Após migrar
+para 'repeated', as consultas podem usar UNNEST diretamente, por exemplo:
+
+    SELECT word, COUNT(*) AS songs
+    FROM `project.dataset.sentiment_analysis`, UNNEST(positive_words) AS word
+    GROUP BY word
+"""
+
+import json
+import logging
+from typing import Dict, List
+
+from google.cloud import bigquery
+from google.api_core.exceptions import NotFound
+
+from config import Config
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Truncamento da coluna de partição por tipo da coluna (DAY usa DATE() em TIMESTAMP/DATETIME)
+_PARTITION_TRUNC = {'TIMESTAMP': 'TIMESTAMP_TRUNC', 'DATETIME': 'DATETIME_TRUNC', 'DATE': 'DATE_TRUNC'}
+
+
+def _string_literal(value: str) -> str:
+    """Literal de string do BigQuery (aspas, barras e quebras de linha escapadas)"""
+    return json.dumps(value, ensure_ascii=False)
+
+
+class ArrayColumnMigrator:
+    """
+    Reescreve as tabelas do dataset convertendo as colunas de array
+    """
+
+    def __init__(self, project_id: str, dataset_id: str, client: bigquery.Client = None):
+        """
+        Inicializa o migrador
+
+        Args:
+            project_id: ID do projeto GCP
+            dataset_id: ID do dataset BigQuery
+            client: Cliente BigQuery (opcional)
+        """
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.client = client or bigquery.Client(project=project_id)
+
+    def _table_ref(self, table_name: str) -> str:
+        return f"{self.project_id}.{self.dataset_id}.{table_name}"
+
+    def _pending_columns(self, table: bigquery.Table, target_mode: str) -> List[str]:
+        """Retorna as colunas de array que ainda não estão no modo alvo"""
+        array_columns = Config.JSON_ARRAY_COLUMNS.get(table.table_id, [])
+        pending = []
+        for field in table.schema:
+            if field.name not in array_columns:
+                continue
+            is_repeated = field.mode == 'REPEATED'
+            if (target_mode == 'repeated') != is_repeated:
+                pending.append(field.name)
+        return pending
+
+    @staticmethod
+    def _column_expression(column: str, target_mode: str) -> str:
+        """Expressão SQL que converte uma coluna para o modo alvo"""
+        if target_mode == 'repeated':
+            return f"IFNULL(JSON_VALUE_ARRAY({column}), []) AS {column}"
+        return f"TO_JSON_STRING({column}) AS {column}"
+
+    def build_migration_sql(self, table: bigquery.Table, columns: List[str],
+                            target_mode: str) -> str:
+        """
+        Monta o CREATE OR REPLACE TABLE que reescreve a tabela no modo alvo
+
+        As descrições das colunas são reaplicadas em seguida com ALTER COLUMN,
+        no mesmo script.
+
+        Args:
+            table: Metadados da tabela atual
+            columns: Colunas a converter
+            target_mode: 'json' ou 'repeated'
+
+        Returns:
+            Script SQL de migração
+
+        Raises:
+            ValueError: Layout da tabela que a migração não reproduz fielmente
+        """
+        table_ref = self._table_ref(table.table_id)
+        replacements = ',\n  '.join(
+            self._column_expression(column, target_mode) for column in columns
+        )
+
+        clauses = []
+        partition_clause = self._partition_clause(table)
+        if partition_clause:
+            clauses.append(partition_clause)
+        if table.clustering_fields:
+            clauses.append(f"CLUSTER BY {', '.join(table.clustering_fields)}")
+        options = self._table_options(table)
+        if options:
+            separator = ',\n  '
+            clauses.append(f"OPTIONS (\n  {separator.join(options)}\n)")
+
+        statements = [
+            f"CREATE OR REPLACE TABLE `{table_ref}`\n"
+            + ''.join(f"{clause}\n" for clause in clauses)
+            + f"AS\nSELECT * REPLACE (\n  {replacements}\n)\nFROM `{table_ref}`"
+        ]
+        # CREATE TABLE AS SELECT não aceita descrições de colunas
+        statements += [
+            f"ALTER TABLE `{table_ref}` ALTER COLUMN {field.name} "
+            f"SET OPTIONS (description = {_string_literal(field.description)})"
+            for field in table.schema if field.description
+        ]
+        return ';\n'.join(statements)
+
+    @staticmethod
+    def _partition_clause(table: bigquery.Table) -> str:
+        """
+        PARTITION BY equivalente ao particionamento atual ('' sem particionamento)
+
+        Raises:
+            ValueError: Particionamento que o CREATE TABLE AS SELECT não reproduz
+        """
+        partitioning = table.time_partitioning
+        if table.range_partitioning is not None:
+            spec = table.range_partitioning
+            return (
+                f"PARTITION BY RANGE_BUCKET({spec.field}, GENERATE_ARRAY("
+                f"{spec.range_.start}, {spec.range_.end}, {spec.range_.interval}))"
+            )
+        if partitioning is None:
+            return ''
+        if not partitioning.field:
+            raise ValueError(
+                f"{table.table_id}: particionamento por tempo de ingestão não pode ser "
+                f"recriado com CREATE TABLE AS SELECT; migre a tabela manualmente"
+            )
+
+        field_type = next(
+            (field.field_type for field in table.schema if field.name == partitioning.field), None
+        )
+        if field_type not in _PARTITION_TRUNC:
+            raise ValueError(
+                f"{table.table_id}: coluna de partição {partitioning.field} com tipo "
+                f"desconhecido ({field_type})"
+            )
+
+        granularity = partitioning.type_ or bigquery.TimePartitioningType.DAY
+        if granularity == bigquery.TimePartitioningType.DAY:
+            if field_type == 'DATE':
+                return f"PARTITION BY {partitioning.field}"
+            return f"PARTITION BY DATE({partitioning.field})"
+        return f"PARTITION BY {_PARTITION_TRUNC[field_type]}({partitioning.field}, {granularity})"
+
+    @staticmethod
+    def _table_options(table: bigquery.Table) -> List[str]:
+        """
+        Opções da tabela atual no formato do OPTIONS (...) do DDL
+
+        Raises:
+            ValueError: Descrições em subcampos (não podem ser definidas via DDL)
+        """
+        for field in table.schema:
+            if any(subfield.description for subfield in field.fields):
+                raise ValueError(
+                    f"{table.table_id}: descrições nos subcampos de {field.name} não podem "
+                    f"ser recriadas; migre a tabela manualmente"
+                )
+
+        options = []
+        if table.description:
+            options.append(f"description = {_string_literal(table.description)}")
+        partitioning = table.time_partitioning
+        if partitioning is not None and partitioning.expiration_ms:
+            options.append(f"partition_expiration_days = {partitioning.expiration_ms / 86400000}")
+        if table.require_partition_filter:
+            options.append("require_partition_filter = TRUE")
+        if table.labels:
+            labels = ', '.join(
+                f"({_string_literal(key)}, {_string_literal(value)})"
+                for key, value in sorted(table.labels.items())
+            )
+            options.append(f"labels = [{labels}]")
+        return options
+
+    def plan(self, target_mode: str = 'repeated') -> Dict[str, str]:
+        """
+        Gera o plano de migração para todas as tabelas com colunas de array
+
+        Args:
+            target_mode: 'json' ou 'repeated'
+
+        Returns:
+            Dicionário tabela -> SQL (somente tabelas que precisam migrar)
+        """
+        if target_mode not in Config.ARRAY_COLUMN_MODES:
+            raise ValueError(f"Modo de array inválido: {target_mode}")
+
+        statements = {}
+        for table_name in Config.JSON_ARRAY_COLUMNS:
+            try:
+                table = self.client.get_table(self._table_ref(table_name))
+            except NotFound:
+                logger.warning(f"Tabela {table_name} não encontrada, ignorando")
+                continue
+
+            columns = self._pending_columns(table, target_mode)
+            if not columns:
+                logger.info(f"Tabela {table_name} já está no modo {target_mode}")
+                continue
+
+            statements[table_name] = self.build_migration_sql(table, columns, target_mode)
+
+        return statements
+
+    def migrate(self, target_mode: str = 'repeated', dry_run: bool = False,
+                backup: bool = True) -> Dict[str, str]:
+        """
+        Executa a migração
+
+        Args:
+            target_mode: 'json' ou 'repeated'
+            dry_run: Apenas exibe o SQL sem executar
+            backup: Copia cada tabela para <tabela>_backup antes de reescrever
+
+        Returns:
+            Plano executado (tabela -> SQL)
+        """
+        statements = self.plan(target_mode)
+
+        for table_name, sql in statements.items():
+            if dry_run:
+                print(f"-- {table_name}\n{sql};\n")
+                continue
+
+            if backup:
+                backup_ref = self._table_ref(f"{table_name}_backup")
+                copy_config = bigquery.CopyJobConfig(
+                    write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
+                )
+                self.client.copy_table(
+                    self._table_ref(table_name), backup_ref, job_config=copy_config
+                ).result()
+                logger.info(f"Backup de {table_name} criado em {backup_ref}")
+
+            self.client.query(sql).result()
+            logger.info(f"Tabela {table_name} migrada para o modo {target_mode}")
+
+        return statements
+
+
+def main():
+    """Função principal para execução da migração"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Migração das colunas de array do BigQuery')
+    parser.add_argument('--project-id', required=True, help='ID do projeto GCP')
+    parser.add_argument('--dataset-id', required=True, help='ID do dataset BigQuery')
+    parser.add_argument('--to', dest='target_mode', choices=Config.ARRAY_COLUMN_MODES,
+                        default='repeated', help='Modo de destino das colunas de array')
+    parser.add_argument('--dry-run', action='store_true', help='Apenas exibe o SQL gerado')
+    parser.add_argument('--no-backup', action='store_true', help='Não copia as tabelas antes')
+
+    args = parser.parse_args()
+
+    migrator = ArrayColumnMigrator(args.project_id, args.dataset_id)
+    statements = migrator.migrate(
+        target_mode=args.target_mode,
+        dry_run=args.dry_run,
+        backup=not args.no_backup
+    )
+
+    status = 'planejadas' if args.dry_run else 'migradas'
+    print(f"Tabelas {status}: {list(statements)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,495 @@
+"""
+Destinos de saída do pipeline ETL
+BigQuery, dataset Parquet particionado (hive) e arquivo DuckDB local
+"""
+
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from google.cloud import bigquery
+
+from config import Config
+from arrow_serializer import to_arrow_table, to_parquet_buffer
+from metrics import PipelineMetrics
+from rollups import build_refresh_query, build_refresh_sql
+
+logger = logging.getLogger(__name__)
+
+# Ordem de escrita das tabelas do pipeline
+TABLE_NAMES = ['raw_lyrics', 'processed_lyrics', 'word_frequency', 'sentiment_analysis']
+
+
+class OutputSink(ABC):
+    """
+    Interface comum dos destinos de saída
+
+    Cada destino recebe as quatro tabelas do pipeline e as grava com os
+    schemas de Config.SCHEMAS.
+    """
+
+    name = 'sink'
+
+    def __init__(self, array_mode: str = None):
+        self.array_mode = array_mode or Config.ARRAY_COLUMN_MODE
+
+    def write_tables(self, tables: Dict[str, pd.DataFrame],
+                     metrics: PipelineMetrics = None) -> Dict[str, int]:
+        """
+        Grava as tabelas do pipeline
+
+        Args:
+            tables: Dicionário nome da tabela -> DataFrame
+            metrics: Coletor de métricas (estágio load_<tabela>), opcional
+
+        Returns:
+            Dicionário nome da tabela -> linhas gravadas
+        """
+        rows_written = {}
+        for table_name in TABLE_NAMES:
+            df = tables.get(table_name)
+            if df is None or df.empty:
+                logger.warning(f"DataFrame vazio para tabela {table_name}")
+                rows_written[table_name] = 0
+                continue
+
+            if metrics is None:
+                self.write_table(df, table_name, tables)
+            else:
+                bytes_in = int(df.memory_usage(deep=True).sum())
+                with metrics.stage(f"load_{table_name}", records=len(df), bytes_in=bytes_in):
+                    self.write_table(df, table_name, tables)
+            rows_written[table_name] = len(df)
+            logger.info(f"Carregadas {len(df)} linhas na tabela {table_name} ({self.name})")
+
+        return rows_written
+
+    def write_rollups(self, rollups: Dict[str, pd.DataFrame],
+                      metrics: PipelineMetrics = None) -> Dict[str, int]:
+        """
+        Atualiza os rollups com um lote
+
+        Args:
+            rollups: Dicionário nome do rollup -> deltas do lote, uma linha por
+                chave tocada (ver rollups.compute_rollups)
+            metrics: Coletor de métricas (estágio rollup_<tabela>), opcional
+
+        Returns:
+            Dicionário nome do rollup -> chaves atualizadas
+        """
+        rows_written = {}
+        for table_name, df in rollups.items():
+            if df is None or df.empty:
+                rows_written[table_name] = 0
+                continue
+
+            if metrics is None:
+                self.write_rollup(df, table_name)
+            else:
+                with metrics.stage(f"rollup_{table_name}", records=len(df)):
+                    self.write_rollup(df, table_name)
+            rows_written[table_name] = len(df)
+
+        return rows_written
+
+    def write_rollup(self, df: pd.DataFrame, table_name: str):
+        """
+        Atualiza um rollup com os deltas do lote
+
+        Por padrão os deltas são anexados como linhas; leituras agregam por chave.
+        Destinos com as tabelas base consultáveis recalculam as chaves do lote.
+        """
+        self.write_table(df, table_name, {})
+
+    @abstractmethod
+    def write_table(self, df: pd.DataFrame, table_name: str,
+                    tables: Dict[str, pd.DataFrame]):
+        """
+        Grava uma tabela
+
+        Args:
+            df: Dados da tabela
+            table_name: Nome da tabela em Config.SCHEMAS
+            tables: Todas as tabelas do lote (para destinos que precisam de contexto)
+        """
+
+    def close(self):
+        """Libera recursos do destino"""
+
+
+class BigQuerySink(OutputSink):
+    """
+    Carrega as tabelas no BigQuery via Parquet tipado
+
+    No modo 'append' cada lote é anexado à tabela final. No modo 'merge' o
+    lote vai para uma tabela de staging temporária e é mesclado na tabela
+    final pelas chaves de Config.MERGE_KEYS, tornando as reexecuções
+    idempotentes. Tabelas de Config.REPLACE_KEYS têm as linhas de cada
+    música do lote substituídas em vez de mescladas. Colunas de analisadores
+    desligados no perfil de análise preservam o valor já carregado.
+    """
+
+    name = 'bigquery'
+
+    def __init__(self, client: bigquery.Client, project_id: str, dataset_id: str,
+                 array_mode: str = None, load_mode: str = None,
+                 analysis_profile: str = None):
+        """
+        Args:
+            client: Cliente BigQuery
+            project_id: ID do projeto GCP
+            dataset_id: ID do dataset BigQuery
+            array_mode: 'json' ou 'repeated' (padrão: Config.ARRAY_COLUMN_MODE)
+            load_mode: 'append' ou 'merge' (padrão: Config.LOAD_MODE)
+            analysis_profile: Perfil de análise que gerou os lotes
+                (padrão: Config.ANALYSIS_PROFILE)
+        """
+        super().__init__(array_mode)
+        self.client = client
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.load_mode = load_mode or Config.LOAD_MODE
+        if self.load_mode not in Config.LOAD_MODES:
+            raise ValueError(f"Modo de carga inválido: {self.load_mode}")
+        self.analyzers = Config.get_analyzers(analysis_profile)
+
+    def _table_id(self, table_name: str) -> str:
+        return f"{self.project_id}.{self.dataset_id}.{table_name}"
+
+    def _job_config(self, table_name: str) -> bigquery.LoadJobConfig:
+        """Configuração de job (list inference para colunas REPEATED em Parquet)"""
+        parquet_options = bigquery.ParquetOptions()
+        parquet_options.enable_list_inference = True
+
+        return bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.PARQUET,
+            parquet_options=parquet_options,
+            schema=self.bigquery_schema(table_name),
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+            create_disposition=bigquery.CreateDisposition.CREATE_IF_NEEDED
+        )
+
+    def bigquery_schema(self, table_name: str) -> List[bigquery.SchemaField]:
+        """Converte o schema declarado em Config.SCHEMAS para SchemaField"""
+        return [
+            bigquery.SchemaField(column['name'], column['type'], mode=column['mode'])
+            for column in Config.get_table_schema(table_name, self.array_mode)
+        ]
+
+    def write_table(self, df: pd.DataFrame, table_name: str,
+                    tables: Dict[str, pd.DataFrame]):
+        if self.load_mode == 'merge':
+            build_sql = self.build_replace_sql if table_name in Config.REPLACE_KEYS else None
+            self._merge_table(df, table_name, build_sql)
+        else:
+            self._load_parquet(df, table_name, self._table_id(table_name))
+
+    def _load_parquet(self, df: pd.DataFrame, table_name: str, table_id: str):
+        """Envia o DataFrame serializado em Parquet para a tabela indicada"""
+        # Serializar com tipos de Config.SCHEMAS (sem inferência nem mutação do df)
+        parquet_buffer = to_parquet_buffer(df, table_name, self.array_mode)
+
+        job = self.client.load_table_from_file(
+            parquet_buffer, table_id, job_config=self._job_config(table_name)
+        )
+        job.result()  # Aguardar conclusão
+
+    def write_rollup(self, df: pd.DataFrame, table_name: str):
+        """Recalcula as chaves do lote a partir das tabelas base (staging + MERGE de substituição)"""
+        self._merge_table(df, table_name, partial(build_refresh_sql, table_id=self._table_id))
+
+    def _merge_table(self, df: pd.DataFrame, table_name: str, build_sql=None):
+        """Carrega o lote em staging e mescla na tabela final pelas chaves de merge"""
+        build_sql = build_sql or self.build_merge_sql
+        schema = self.bigquery_schema(table_name)
+        target_id = self._table_id(table_name)
+        staging_id = self._table_id(f"{table_name}__staging_{uuid.uuid4().hex[:12]}")
+
+        # Tabela final precisa existir para o MERGE
+        self.client.create_table(bigquery.Table(target_id, schema=schema), exists_ok=True)
+
+        # Staging com expiração como rede de segurança caso a limpeza falhe
+        staging_table = bigquery.Table(staging_id, schema=schema)
+        staging_table.expires = datetime.now(timezone.utc) + timedelta(
+            hours=Config.STAGING_TABLE_TTL_HOURS
+        )
+        self.client.create_table(staging_table)
+
+        try:
+            self._load_parquet(df, table_name, staging_id)
+            self.client.query(build_sql(table_name, target_id, staging_id)).result()
+        finally:
+            self.client.delete_table(staging_id, not_found_ok=True)
+
+    def build_merge_sql(self, table_name: str, target_id: str, staging_id: str) -> str:
+        """
+        Monta o MERGE da tabela de staging na tabela final
+
+        Linhas repetidas dentro do próprio lote são descartadas antes do MERGE
+        (BigQuery rejeita MERGE com mais de uma linha de origem por chave),
+        mantendo a mais recente por Config.LOAD_TIMESTAMP_COLUMNS.
+        Linhas existentes só têm atualizadas as colunas que o perfil de
+        análise produz; as de analisadores desligados mantêm o valor atual.
+
+        Args:
+            table_name: Nome da tabela em Config.SCHEMAS
+            target_id: Tabela final
+            staging_id: Tabela de staging
+
+        Returns:
+            Instrução MERGE
+        """
+        keys = Config.MERGE_KEYS[table_name]
+        skipped = set(keys) | set(Config.get_skipped_columns(table_name, self.analyzers))
+        columns = [column['name'] for column in Config.get_table_schema(table_name, self.array_mode)]
+
+        on_clause = ' AND '.join(f"T.{key} = S.{key}" for key in keys)
+        update_clause = ',\n    '.join(
+            f"{column} = S.{column}" for column in columns if column not in skipped
+        )
+
+        return (
+            f"MERGE `{target_id}` T\n"
+            f"USING (\n"
+            f"  {self._latest_staging_rows(table_name, staging_id)}\n"
+            f") S\n"
+            f"ON {on_clause}\n"
+            f"WHEN MATCHED THEN UPDATE SET\n    {update_clause}\n"
+            f"WHEN NOT MATCHED THEN INSERT ROW"
+        )
+
+    @staticmethod
+    def _latest_staging_rows(table_name: str, staging_id: str) -> str:
+        """Linha mais recente de cada chave da staging (a ordem de um lote repetido não decide)"""
+        keys = ', '.join(Config.MERGE_KEYS[table_name])
+        order_column = Config.LOAD_TIMESTAMP_COLUMNS[table_name]
+        return (
+            f"SELECT * FROM `{staging_id}`\n"
+            f"  WHERE TRUE\n"
+            f"  QUALIFY ROW_NUMBER() OVER (PARTITION BY {keys} ORDER BY {order_column} DESC) = 1"
+        )
+
+    def build_replace_sql(self, table_name: str, target_id: str, staging_id: str) -> str:
+        """
+        Monta a substituição das linhas de cada música do lote na tabela final
+
+        Em uma única transação apaga as linhas das músicas presentes na
+        staging e insere as do lote (deduplicadas por Config.MERGE_KEYS, com a
+        linha mais recente de cada chave).
+        Colunas de analisadores desligados no perfil herdam o valor da linha
+        anterior de mesma chave.
+
+        Args:
+            table_name: Nome da tabela em Config.REPLACE_KEYS
+            target_id: Tabela final
+            staging_id: Tabela de staging
+
+        Returns:
+            Script SQL com a transação
+        """
+        parent_key = Config.REPLACE_KEYS[table_name]
+        keys = Config.MERGE_KEYS[table_name]
+        skipped = Config.get_skipped_columns(table_name, self.analyzers)
+        columns = ', '.join(
+            column['name'] for column in Config.get_table_schema(table_name, self.array_mode)
+        )
+
+        source = self._latest_staging_rows(table_name, staging_id)
+        if skipped:
+            replace_clause = ', '.join(f"T.{column} AS {column}" for column in skipped)
+            on_clause = ' AND '.join(f"T.{key} = S.{key}" for key in keys)
+            source = (
+                f"SELECT S.* REPLACE ({replace_clause})\n"
+                f"FROM (\n  {source}\n) S\n"
+                f"LEFT JOIN `{target_id}` T ON {on_clause}"
+            )
+
+        return (
+            f"BEGIN TRANSACTION;\n"
+            f"CREATE TEMP TABLE replacement_batch AS\n{source};\n"
+            f"DELETE FROM `{target_id}`\n"
+            f"WHERE {parent_key} IN (SELECT {parent_key} FROM replacement_batch);\n"
+            f"INSERT INTO `{target_id}` ({columns})\n"
+            f"SELECT {columns} FROM replacement_batch;\n"
+            f"COMMIT TRANSACTION;"
+        )
+
+
+class ParquetSink(OutputSink):
+    """
+    Grava as tabelas como dataset Parquet local particionado por year/genre
+
+    As tabelas derivadas herdam year/genre da música (via id/lyrics_id), de
+    modo que todas as tabelas podem ser podadas pelas mesmas partições.
+    """
+
+    name = 'parquet'
+    PARTITIONING = pa.schema([('year', pa.int64()), ('genre', pa.string())])
+
+    def __init__(self, output_dir: str, array_mode: str = None):
+        """
+        Args:
+            output_dir: Diretório raiz do dataset (uma subpasta por tabela)
+            array_mode: 'json' ou 'repeated' (padrão: Config.ARRAY_COLUMN_MODE)
+        """
+        super().__init__(array_mode)
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def _song_partitions(self, tables: Dict[str, pd.DataFrame]) -> pa.Table:
+        """Tabela id -> (year, genre) usada para particionar as tabelas derivadas"""
+        raw_df = tables.get('raw_lyrics')
+        if raw_df is None or raw_df.empty:
+            return pa.table({'id': pa.array([], pa.string()),
+                             'year': pa.array([], pa.int64()),
+                             'genre': pa.array([], pa.string())})
+
+        raw = to_arrow_table(raw_df, 'raw_lyrics', self.array_mode)
+        return raw.select(['id', 'year', 'genre'])
+
+    def write_table(self, df: pd.DataFrame, table_name: str,
+                    tables: Dict[str, pd.DataFrame]):
+        table = to_arrow_table(df, table_name, self.array_mode)
+
+        if table_name != 'raw_lyrics':
+            key = 'id' if 'id' in table.column_names else 'lyrics_id'
+            partitions = self._song_partitions(tables)
+            # Índice de cada linha na tabela de partições (join vetorizado)
+            positions = pc.index_in(table.column(key), value_set=partitions.column('id'))
+            table = table.append_column('year', partitions.column('year').take(positions))
+            table = table.append_column('genre', partitions.column('genre').take(positions))
+
+        self._write_dataset(table, self.output_dir / table_name, self.PARTITIONING)
+
+    def write_rollup(self, df: pd.DataFrame, table_name: str):
+        # Rollups são pequenos: deltas anexados sem particionamento
+        table = to_arrow_table(df, table_name, self.array_mode)
+        self._write_dataset(table, self.output_dir / table_name)
+
+    def _write_dataset(self, table: pa.Table, path: Path, partitioning: pa.Schema = None):
+        ds.write_dataset(
+            table,
+            path,
+            format='parquet',
+            partitioning=ds.partitioning(partitioning, flavor='hive') if partitioning else None,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+            file_options=ds.ParquetFileFormat().make_write_options(
+                compression=Config.PARQUET_COMPRESSION
+            )
+        )
+
+
+class DuckDBSink(OutputSink):
+    """
+    Grava as tabelas em um arquivo DuckDB local
+
+    As tabelas base são anexadas; os rollups têm as chaves de cada lote
+    recalculadas a partir delas (ver rollups.build_refresh_query).
+    """
+
+    name = 'duckdb'
+
+    def __init__(self, database_path: str, array_mode: str = None):
+        """
+        Args:
+            database_path: Caminho do arquivo .duckdb
+            array_mode: 'json' ou 'repeated' (padrão: Config.ARRAY_COLUMN_MODE)
+        """
+        super().__init__(array_mode)
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("DuckDBSink requer o pacote 'duckdb' (pip install duckdb)") from e
+
+        Path(database_path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = duckdb.connect(str(database_path))
+
+    def write_table(self, df: pd.DataFrame, table_name: str,
+                    tables: Dict[str, pd.DataFrame]):
+        batch = to_arrow_table(df, table_name, self.array_mode)
+
+        self.connection.register('batch_view', batch)
+        try:
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table_name} AS SELECT * FROM batch_view LIMIT 0"
+            )
+            self.connection.execute(f"INSERT INTO {table_name} SELECT * FROM batch_view")
+        finally:
+            self.connection.unregister('batch_view')
+
+    def _ensure_table(self, table_name: str):
+        """Cria a tabela vazia com o schema de Config.SCHEMAS se ainda não existir"""
+        columns = [column['name'] for column in Config.get_table_schema(table_name, self.array_mode)]
+        self.write_table(pd.DataFrame(columns=columns), table_name, {})
+
+    def write_rollup(self, df: pd.DataFrame, table_name: str):
+        """Substitui as linhas das chaves do lote pelos valores recalculados das tabelas base"""
+        from query_backends import to_duckdb_sql
+
+        # Perfis parciais podem não ter gravado todas as tabelas base
+        for base_table in TABLE_NAMES:
+            self._ensure_table(base_table)
+        self._ensure_table(table_name)
+
+        keys = Config.ROLLUP_KEYS[table_name]
+        touched = ' AND '.join(f"K.{key} IS NOT DISTINCT FROM {table_name}.{key}" for key in keys)
+        query = to_duckdb_sql(build_refresh_query(table_name, lambda name: name, 'rollup_keys'))
+
+        self.connection.register('rollup_keys', to_arrow_table(df, table_name, self.array_mode))
+        try:
+            self.connection.execute('BEGIN TRANSACTION')
+            try:
+                self.connection.execute(
+                    f"DELETE FROM {table_name} WHERE EXISTS (SELECT 1 FROM rollup_keys K WHERE {touched})"
+                )
+                self.connection.execute(f"INSERT INTO {table_name} {query}")
+                self.connection.execute('COMMIT')
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+        finally:
+            self.connection.unregister('rollup_keys')
+
+    def close(self):
+        self.connection.close()
+
+
+def create_sink(kind: str, output_path: str = None, bq_client: bigquery.Client = None,
+                project_id: str = None, dataset_id: str = None,
+                array_mode: str = None, load_mode: str = None,
+                analysis_profile: str = None) -> OutputSink:
+    """
+    Cria o destino de saída pelo nome
+
+    Args:
+        kind: 'bigquery', 'parquet' ou 'duckdb'
+        output_path: Diretório (parquet) ou arquivo (duckdb) de saída
+        bq_client: Cliente BigQuery (bigquery)
+        project_id: ID do projeto GCP (bigquery)
+        dataset_id: ID do dataset BigQuery (bigquery)
+        array_mode: 'json' ou 'repeated' (padrão: Config.ARRAY_COLUMN_MODE)
+        load_mode: 'append' ou 'merge' (bigquery, padrão: Config.LOAD_MODE)
+        analysis_profile: Perfil de análise dos lotes (bigquery, padrão: Config.ANALYSIS_PROFILE)
+
+    Returns:
+        Instância do destino
+    """
+    if kind == 'bigquery':
+        client = bq_client or bigquery.Client(project=project_id)
+        return BigQuerySink(client, project_id, dataset_id, array_mode, load_mode,
+                            analysis_profile)
+    if kind == 'parquet':
+        return ParquetSink(output_path or Config.LOCAL_OUTPUT_DIR, array_mode)
+    if kind == 'duckdb':
+        return DuckDBSink(output_path or f"{Config.LOCAL_OUTPUT_DIR}/lyrics.duckdb", array_mode)
+
+    raise ValueError(f"Destino de saída desconhecido: {kind}")
@@ -0,0 +1,256 @@
+"""
+Modo de profiling do pipeline ETL
+Profiler determinístico (cProfile) ou por amostragem, com relatório de
+hotspots por estágio e saída compatível com flamegraph
+"""
+
+import cProfile
+import logging
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('cprofile', 'sampling')
+
+# Funções do caminho quente de cada estágio do pipeline
+STAGE_FUNCTIONS = {
+    'extract': ['extract_from_storage', 'download_as_text', '_parse_file_content'],
+    'clean': ['_clean_text'],
+    'tokenize': ['_tokenize_text', 'word_tokenize'],
+    'readability': ['_calculate_readability', '_count_syllables', 'sent_tokenize'],
+    'tfidf': ['_fit_tfidf', 'fit_transform'],
+    'word_frequency': ['_extract_word_frequency'],
+    'pos': ['pos_tag'],
+    'sentiment': ['_analyze_sentiment', 'polarity_scores'],
+    'load': ['load_to_bigquery', 'write_tables', 'write_table'],
+}
+
+# Funções em que uma thread está bloqueada esperando (sem trabalho a amostrar)
+IDLE_FUNCTIONS = {'threading:wait', 'threading:_wait_for_tstate_lock', 'queue:get',
+                  'selectors:select'}
+
+# (chamadas, tempo próprio, tempo acumulado) por função
+FunctionStats = Dict[str, Tuple[int, float, float]]
+
+
+def _function_name(filename: str, function_name: str) -> str:
+    """Nome módulo:função (pacotes usam o diretório no lugar de __init__)"""
+    path = Path(filename)
+    module = path.parent.name if path.stem == '__init__' else path.stem
+    return f"{module}:{function_name}"
+
+
+# Sufixo numérico dos workers de um pool (ThreadPoolExecutor-0_3)
+_WORKER_SUFFIX = re.compile(r'_\d+$')
+
+
+def _thread_frame(thread_name: str) -> str:
+    """Frame raiz da thread; workers numerados de um mesmo pool viram o pool"""
+    return f"thread:{_WORKER_SUFFIX.sub('', thread_name or 'unknown')}"
+
+
+class SamplingProfiler:
+    """
+    Profiler por amostragem de todas as threads do processo
+
+    Uma thread auxiliar captura a pilha de cada thread (sys._current_frames)
+    a cada intervalo e conta as pilhas no formato "folded"
+    (thread;frame;frame contagem), aceito por flamegraph.pl, speedscope e
+    inferno. O primeiro frame identifica a thread (workers de um mesmo pool
+    são agrupados); threads paradas em espera não geram amostras, então as
+    contagens somam o tempo ativo de todas as threads.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        """
+        Args:
+            interval: Intervalo entre amostras em segundos
+        """
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        sampler_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_function_name(frame.f_code.co_filename, frame.f_code.co_name))
+                    frame = frame.f_back
+                if not stack or stack[0] in IDLE_FUNCTIONS:
+                    continue
+                stack.append(_thread_frame(names.get(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name='etl-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def function_stats(self) -> FunctionStats:
+        """Estatísticas por função estimadas a partir das amostras"""
+        own = Counter()
+        cumulative = Counter()
+        for stack, count in self.stacks.items():
+            # O primeiro frame é a thread, não uma função
+            frames = stack.split(';')[1:]
+            own[frames[-1]] += count
+            # Recursão conta uma vez por amostra
+            for name in set(frames):
+                cumulative[name] += count
+
+        return {
+            name: (samples, own[name] * self.interval, samples * self.interval)
+            for name, samples in cumulative.items()
+        }
+
+    def write_folded(self, path: Path):
+        lines = [f"{stack} {count}" for stack, count in sorted(self.stacks.items())]
+        path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+
+class PipelineProfiler:
+    """
+    Executa um bloco de código sob profiling e grava os relatórios
+
+    Saídas em output_dir:
+        hotspots.txt: tempo por estágio e funções mais custosas
+        profile.pstats (cprofile): abrir com pstats, snakeviz ou flameprof
+        profile.folded (sampling): pilhas para flamegraph.pl/speedscope
+
+    O cProfile só instrumenta a thread que entra no bloco; para o caminho
+    paralelo (workers em threads) use o modo sampling, que amostra todas.
+    """
+
+    def __init__(self, mode: str = 'sampling', output_dir: str = 'profiles',
+                 interval: float = 0.005):
+        """
+        Args:
+            mode: 'cprofile' (determinístico) ou 'sampling'
+            output_dir: Diretório dos relatórios
+            interval: Intervalo de amostragem em segundos (modo sampling)
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Modo de profiling inválido: {mode}")
+
+        self.mode = mode
+        self.output_dir = Path(output_dir)
+        self._profiler = cProfile.Profile() if mode == 'cprofile' else SamplingProfiler(interval)
+        self._wall_seconds = 0.0
+        self._started_at = None
+
+    def __enter__(self):
+        self._started_at = time.perf_counter()
+        if self.mode == 'cprofile':
+            self._profiler.enable()
+        else:
+            self._profiler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.mode == 'cprofile':
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+        self._wall_seconds = time.perf_counter() - self._started_at
+        return False
+
+    def function_stats(self) -> FunctionStats:
+        """Estatísticas por função no formato módulo:função"""
+        if self.mode == 'sampling':
+            return self._profiler.function_stats()
+
+        stats: FunctionStats = {}
+        raw = pstats.Stats(self._profiler).stats
+        for (filename, _, function_name), (_, calls, own, cumulative, _) in raw.items():
+            name = _function_name(filename, function_name)
+            previous = stats.get(name, (0, 0.0, 0.0))
+            stats[name] = (previous[0] + calls, previous[1] + own, previous[2] + cumulative)
+        return stats
+
+    def stage_hotspots(self) -> Dict[str, List[Tuple[str, int, float, float]]]:
+        """
+        Agrupa as funções do caminho quente por estágio
+
+        Returns:
+            Dicionário estágio -> [(função, chamadas/amostras, próprio, acumulado)]
+        """
+        stats = self.function_stats()
+        hotspots = {}
+        for stage, functions in STAGE_FUNCTIONS.items():
+            rows = [
+                (name, *values) for name, values in stats.items()
+                if name.split(':', 1)[1] in functions
+            ]
+            hotspots[stage] = sorted(rows, key=lambda row: row[3], reverse=True)
+        return hotspots
+
+    def format_report(self, top: int = 25) -> str:
+        """Relatório de hotspots por estágio e das funções de maior tempo próprio"""
+        count_label = 'chamadas' if self.mode == 'cprofile' else 'amostras'
+        lines = [
+            f"Profiling ({self.mode}) - tempo de parede {self._wall_seconds:.3f}s",
+            ''
+        ]
+
+        for stage, rows in self.stage_hotspots().items():
+            if not rows:
+                continue
+            lines.append(f"[{stage}]")
+            for name, count, own, cumulative in rows:
+                lines.append(
+                    f"  {name:<50} {count:>10} {count_label}  "
+                    f"próprio {own:9.4f}s  acumulado {cumulative:9.4f}s"
+                )
+            lines.append('')
+
+        lines.append(f"Top {top} funções por tempo próprio")
+        ranked = sorted(self.function_stats().items(), key=lambda item: item[1][1], reverse=True)
+        for name, (count, own, cumulative) in ranked[:top]:
+            lines.append(
+                f"  {name:<50} {count:>10} {count_label}  "
+                f"próprio {own:9.4f}s  acumulado {cumulative:9.4f}s"
+            )
+
+        return '\n'.join(lines) + '\n'
+
+    def write_reports(self) -> Dict[str, str]:
+        """
+        Grava o relatório de hotspots e o arquivo do profiler
+
+        Returns:
+            Dicionário tipo de saída -> caminho
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        paths = {'hotspots': self.output_dir / 'hotspots.txt'}
+        paths['hotspots'].write_text(self.format_report(), encoding='utf-8')
+
+        if self.mode == 'cprofile':
+            paths['pstats'] = self.output_dir / 'profile.pstats'
+            self._profiler.dump_stats(str(paths['pstats']))
+        else:
+            paths['folded'] = self.output_dir / 'profile.folded'
+            self._profiler.write_folded(paths['folded'])
+
+        for kind, path in paths.items():
+            logger.info(f"Profiling: {kind} gravado em {path}")
+        return {kind: str(path) for kind, path in paths.items()}
@@ -0,0 +1,212 @@
+"""
+Backends de consulta das visualizações
+BigQuery (padrão) e DuckDB local sobre Parquet exportado das tabelas
+
+O backend DuckDB executa as mesmas queries dos gráficos, escritas em SQL do
+BigQuery, depois de uma tradução mínima de dialeto (referências com crases,
+COUNTIF, STDDEV, SAFE_DIVIDE, parâmetros @nome e alguns tipos e funções).
+Serve para desenvolver gráficos, testes de snapshot e relatórios sem custo
+de scan no BigQuery.
+"""
+
+import re
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import pandas as pd
+from google.cloud import bigquery
+
+from config import Config
+
+# Referências `projeto.dataset.tabela` na SQL (mesma regra do query_cache), com o nome da tabela
+_TABLE_REFERENCE = re.compile(r'`[\w-]+\.[\w-]+\.([\w$-]+)`')
+
+# Tradução BigQuery -> DuckDB, aplicada em ordem. Atua sobre o texto da SQL:
+# literais com esses nomes também seriam alterados (não ocorre nos gráficos).
+_DIALECT_REWRITES = [
+    (re.compile(r'\bCOUNTIF\s*\(', re.IGNORECASE), 'count_if('),
+    (re.compile(r'\bSTDDEV\s*\(', re.IGNORECASE), 'stddev_samp('),
+    # REGEXP_REPLACE do BigQuery substitui todas as ocorrências (flag 'g' no DuckDB)
+    (re.compile(r'\bREGEXP_REPLACE\s*\(', re.IGNORECASE), 'bq_regexp_replace('),
+    # DuckDB só tem NFC: aproximação de NORMALIZE(x, NFKC)
+    (re.compile(r'\bNORMALIZE\s*\(', re.IGNORECASE), 'nfc_normalize('),
+    (re.compile(r',\s*NFKC\s*\)', re.IGNORECASE), ')'),
+    (re.compile(r'\bINT64\b', re.IGNORECASE), 'BIGINT'),
+    (re.compile(r'\bFLOAT64\b', re.IGNORECASE), 'DOUBLE'),
+    # Literais brutos r'...' viram literais comuns (o DuckDB não interpreta escapes)
+    (re.compile(r"\br'"), "'"),
+    (re.compile(r'\bIN\s+UNNEST\s*\(\s*@(\w+)\s*\)', re.IGNORECASE), r'IN (SELECT UNNEST($\1))'),
+    (re.compile(r'@(\w+)'), r'$\1'),
+]
+
+# Funções do BigQuery sem equivalente direto, criadas como macros no DuckDB
+_DUCKDB_MACROS = [
+    "CREATE OR REPLACE MACRO safe_divide(a, b) AS CASE WHEN b = 0 THEN NULL ELSE a / b END",
+    "CREATE OR REPLACE MACRO bq_regexp_replace(s, pattern, replacement) AS "
+    "regexp_replace(s, pattern, replacement, 'g')",
+]
+
+
+def to_duckdb_sql(query: str) -> str:
+    """
+    Traduz uma query dos gráficos do dialeto do BigQuery para o DuckDB
+
+    Args:
+        query: SQL do BigQuery
+
+    Returns:
+        SQL do DuckDB, com cada tabela `projeto.dataset.tabela` referenciada
+        pela view local de mesmo nome
+    """
+    sql = _TABLE_REFERENCE.sub(lambda match: f'"{match.group(1)}"', query)
+    for pattern, replacement in _DIALECT_REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def duckdb_parameters(params: Optional[Sequence]) -> Dict:
+    """Parâmetros do BigQuery (ScalarQueryParameter/ArrayQueryParameter) -> dicionário do DuckDB"""
+    values = {}
+    for param in params or []:
+        if isinstance(param, bigquery.ArrayQueryParameter):
+            values[param.name] = list(param.values)
+        else:
+            values[param.name] = param.value
+    return values
+
+
+class QueryBackend(ABC):
+    """Interface comum dos backends de consulta das visualizações"""
+
+    name = 'backend'
+
+    @abstractmethod
+    def query(self, query: str, params: Sequence = None) -> pd.DataFrame:
+        """
+        Executa a query (SQL do BigQuery) e retorna o resultado
+
+        Args:
+            query: SQL com tabelas `projeto.dataset.tabela`
+            params: Parâmetros da query (bigquery.ScalarQueryParameter/ArrayQueryParameter)
+
+        Returns:
+            DataFrame com os resultados
+        """
+
+    @abstractmethod
+    def table_version(self, table_id: str) -> Optional[str]:
+        """Versão atual da tabela (muda quando a tabela é modificada)"""
+
+
+class BigQueryBackend(QueryBackend):
+    """Consultas no BigQuery"""
+
+    name = 'bigquery'
+
+    def __init__(self, client: bigquery.Client):
+        self.client = client
+
+    def query(self, query: str, params: Sequence = None) -> pd.DataFrame:
+        job_config = bigquery.QueryJobConfig(query_parameters=params) if params else None
+        return self.client.query(query, job_config=job_config).to_dataframe()
+
+    def table_version(self, table_id: str) -> Optional[str]:
+        # Última modificação da tabela (metadados, sem custo de scan)
+        table = self.client.get_table(table_id)
+        return table.modified.isoformat() if table.modified else table.etag
+
+
+class DuckDBBackend(QueryBackend):
+    """
+    Consultas em DuckDB (em processo) sobre Parquet local
+
+    Cada tabela é uma pasta <data_dir>/<tabela>/ (layout do ParquetSink, com
+    partições hive year/genre) ou um arquivo <data_dir>/<tabela>.parquet
+    exportado do BigQuery. As views são criadas na primeira query que usa a
+    tabela.
+    """
+
+    name = 'duckdb'
+
+    def __init__(self, data_dir: str):
+        """
+        Args:
+            data_dir: Diretório com o Parquet das tabelas
+        """
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("DuckDBBackend requer o pacote 'duckdb' (pip install duckdb)") from e
+
+        self.data_dir = Path(data_dir)
+        self.connection = duckdb.connect()
+        for macro in _DUCKDB_MACROS:
+            self.connection.execute(macro)
+        self._views = set()
+        self._lock = threading.Lock()
+
+    def _table_path(self, table_name: str) -> Path:
+        directory = self.data_dir / table_name
+        if directory.is_dir():
+            return directory
+        return self.data_dir / f"{table_name}.parquet"
+
+    def _ensure_views(self, query: str):
+        """Cria as views das tabelas referenciadas pela query (uma vez por tabela)"""
+        with self._lock:
+            for table_name in dict.fromkeys(_TABLE_REFERENCE.findall(query)):
+                if table_name in self._views:
+                    continue
+                path = self._table_path(table_name)
+                if path.is_dir():
+                    source = (f"read_parquet('{(path / '**' / '*.parquet').as_posix()}', "
+                              f"hive_partitioning = true, union_by_name = true)")
+                elif path.exists():
+                    source = f"read_parquet('{path.as_posix()}')"
+                else:
+                    raise FileNotFoundError(f"Parquet da tabela {table_name} não encontrado em {self.data_dir}")
+                self.connection.execute(f'CREATE OR REPLACE VIEW "{table_name}" AS SELECT * FROM {source}')
+                self._views.add(table_name)
+
+    def query(self, query: str, params: Sequence = None) -> pd.DataFrame:
+        self._ensure_views(query)
+        # Cursor próprio por chamada: queries do relatório rodam em threads
+        cursor = self.connection.cursor()
+        try:
+            return cursor.execute(to_duckdb_sql(query), duckdb_parameters(params) or None).df()
+        finally:
+            cursor.close()
+
+    def table_version(self, table_id: str) -> Optional[str]:
+        # Última modificação dos arquivos Parquet da tabela
+        path = self._table_path(table_id.split('.')[-1])
+        files = list(path.rglob('*.parquet')) if path.is_dir() else [path]
+        mtimes = [file.stat().st_mtime for file in files if file.exists()]
+        if not mtimes:
+            return None
+        return f"{len(mtimes)}:{datetime.fromtimestamp(max(mtimes), timezone.utc).isoformat()}"
+
+
+def create_backend(kind: str, bq_client: bigquery.Client = None, project_id: str = None,
+                   data_dir: str = None) -> QueryBackend:
+    """
+    Cria o backend de consulta pelo nome
+
+    Args:
+        kind: 'bigquery' ou 'duckdb'
+        bq_client: Cliente BigQuery (bigquery)
+        project_id: ID do projeto GCP (bigquery)
+        data_dir: Diretório com o Parquet das tabelas (duckdb, padrão: Config.VIZ_LOCAL_DATA_DIR)
+
+    Returns:
+        Instância do backend
+    """
+    if kind == 'bigquery':
+        return BigQueryBackend(bq_client or bigquery.Client(project=project_id))
+    if kind == 'duckdb':
+        return DuckDBBackend(data_dir or Config.VIZ_LOCAL_DATA_DIR)
+
+    raise ValueError(f"Backend de consulta desconhecido: {kind}")
@@ -0,0 +1,199 @@
+"""
+Cache em disco dos resultados de queries das visualizações
+
+Resultados são gravados em Parquet, com chave pela SQL normalizada, pelos
+parâmetros e pelo estado de modificação das tabelas de origem: quando uma
+tabela referenciada muda, a chave muda e o resultado antigo deixa de ser
+usado; se a versão de alguma tabela não puder ser lida, o cache não é usado.
+Entradas expiram por TTL e as menos usadas são removidas quando o
+cache passa do tamanho máximo.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Referências `projeto.dataset.tabela` na SQL
+_TABLE_REFERENCE = re.compile(r'`([\w-]+\.[\w-]+\.[\w$-]+)`')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(query: str) -> str:
+    """SQL com espaços e quebras de linha colapsados (literais não são alterados)"""
+    return _WHITESPACE.sub(' ', query).strip()
+
+
+def referenced_tables(query: str) -> List[str]:
+    """Tabelas referenciadas com crases na SQL, em ordem e sem repetição"""
+    return list(dict.fromkeys(_TABLE_REFERENCE.findall(query)))
+
+
+def _params_repr(params: Optional[Sequence]) -> List:
+    """Representação estável dos parâmetros de query (objetos do BigQuery ou valores simples)"""
+    if not params:
+        return []
+    return [param.to_api_repr() if hasattr(param, 'to_api_repr') else param for param in params]
+
+
+def query_fingerprint(query: str, params: Sequence = None,
+                      versions: Dict[str, Optional[str]] = None) -> str:
+    """
+    Impressão digital de uma query: SQL normalizada, parâmetros e versões das tabelas
+
+    Args:
+        query: SQL
+        params: Parâmetros da query
+        versions: Tabela referenciada -> versão (ex.: última modificação)
+
+    Returns:
+        Hash SHA-256 em hexadecimal
+    """
+    payload = json.dumps({
+        'sql': normalize_sql(query),
+        'params': _params_repr(params),
+        'tables': versions or {}
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class QueryCache:
+    """Resultados de queries em Parquet com TTL, evicção por tamanho e invalidação por tabela"""
+
+    def __init__(self, cache_dir: str, ttl_seconds: float = 3600,
+                 max_bytes: int = 512 * 2**20,
+                 table_version: Callable[[str], Optional[str]] = None,
+                 version_ttl_seconds: float = 60):
+        """
+        Args:
+            cache_dir: Diretório do cache
+            ttl_seconds: Validade de uma entrada em segundos (0 = sem expiração)
+            max_bytes: Tamanho máximo do diretório (entradas menos usadas são removidas)
+            table_version: Função tabela -> versão (ex.: última modificação); None desliga
+                a invalidação por tabela
+            version_ttl_seconds: Por quanto tempo a versão de uma tabela é reaproveitada
+                antes de ser consultada de novo
+        """
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.table_version = table_version
+        self.version_ttl_seconds = version_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._versions: Dict[str, tuple] = {}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _version(self, table: str) -> Optional[str]:
+        cached = self._versions.get(table)
+        now = time.monotonic()
+        if cached and now - cached[0] < self.version_ttl_seconds:
+            return cached[1]
+        try:
+            version = self.table_version(table)
+        except Exception as e:
+            logger.warning(f"Versão da tabela {table} indisponível: {str(e)}")
+            version = None
+        self._versions[table] = (now, version)
+        return version
+
+    def table_versions(self, query: str) -> Dict[str, Optional[str]]:
+        """Versões das tabelas referenciadas pela query (vazio sem invalidação por tabela)"""
+        if self.table_version is None:
+            return {}
+        return {table: self._version(table) for table in referenced_tables(query)}
+
+    def key(self, query: str, params: Sequence = None) -> Optional[str]:
+        """
+        Chave da entrada: SQL normalizada, parâmetros e versões das tabelas de origem
+
+        None quando a versão de alguma tabela não pôde ser lida: sem ela uma
+        modificação da tabela não mudaria a chave, e a query não é cacheada.
+        """
+        versions = self.table_versions(query)
+        if any(version is None for version in versions.values()):
+            return None
+        return query_fingerprint(query, params, versions)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.parquet"
+
+    def get(self, query: str, params: Sequence = None) -> Optional[pd.DataFrame]:
+        """Resultado em cache ainda válido (None se ausente, expirado ou sem chave)"""
+        key = self.key(query, params)
+        if key is None:
+            self.misses += 1
+            return None
+        path = self._path(key)
+        try:
+            written_at = path.stat().st_mtime
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        if self.ttl_seconds and time.time() - written_at > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        try:
+            df = pd.read_parquet(path)
+        except Exception as e:
+            logger.warning(f"Entrada de cache ilegível removida ({path.name}): {str(e)}")
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        # Acesso conta para a evicção (menos usados recentemente saem primeiro)
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(path, (time.time(), written_at))
+        self.hits += 1
+        return df
+
+    def put(self, query: str, df: pd.DataFrame, params: Sequence = None):
+        """Grava o resultado (escrita atômica) e aplica o limite de tamanho"""
+        key = self.key(query, params)
+        if key is None:
+            return
+        path = self._path(key)
+        # Nome temporário por thread: queries iguais podem ser gravadas em paralelo
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            df.to_parquet(tmp_path, index=False)
+        except Exception as e:
+            # Tipos sem representação em Parquet: o resultado simplesmente não é cacheado
+            logger.warning(f"Resultado não cacheado: {str(e)}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self.cache_dir.glob('*.parquet'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for path in self.cache_dir.glob('*.parquet'):
+            path.unlink(missing_ok=True)
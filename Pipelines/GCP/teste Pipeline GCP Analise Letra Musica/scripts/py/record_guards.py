@@ -0,0 +1,199 @@
+"""
+Limites por registro para entradas patológicas do transform
+
+Letras enormes (álbum inteiro em um campo) ou lixo binário em um .txt podem
+prender sent_tokenize, o VADER palavra a palavra e o pos_tag por minutos.
+O guarda rejeita essas entradas antes do transform, interrompe registros que
+passam do tempo limite e mantém o relatório dos registros mais lentos.
+"""
+
+import contextlib
+import heapq
+import logging
+import signal
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Amostra usada para estimar a fração de caracteres binários
+_BINARY_SAMPLE_CHARS = 65536
+_TEXT_CONTROL_CHARS = frozenset('\n\r\t\f\v')
+
+
+class RecordRejected(Exception):
+    """Registro fora dos limites; vai para a quarentena (dead-letter)"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class RecordTimeout(RecordRejected):
+    """Registro que excedeu o tempo limite de processamento"""
+
+    def __init__(self, message: str):
+        super().__init__('timeout', message)
+
+
+def binary_fraction(text: str) -> float:
+    """Fração de caracteres de controle ou inválidos no início do texto"""
+    sample = text[:_BINARY_SAMPLE_CHARS]
+    if not sample:
+        return 0.0
+    binary = sum(
+        1 for char in sample
+        if char == '\ufffd' or (
+            char not in _TEXT_CONTROL_CHARS and unicodedata.category(char) == 'Cc'
+        )
+    )
+    return binary / len(sample)
+
+
+class RecordTimer:
+    """Tempo de um registro por estágio, com verificação do prazo entre estágios"""
+
+    def __init__(self, record_id: str, timeout: float):
+        self.record_id = record_id
+        self.timeout = timeout
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._last = self.started_at
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def checkpoint(self, stage: str):
+        """
+        Registra o tempo do estágio concluído e verifica o prazo do registro
+
+        Raises:
+            RecordTimeout: Prazo do registro excedido
+        """
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+        if self.timeout and now - self.started_at > self.timeout:
+            raise RecordTimeout(
+                f"Registro {self.record_id} excedeu {self.timeout:g}s (após o estágio {stage})"
+            )
+
+
+class RecordGuard:
+    """
+    Limites de tamanho e tempo por registro
+
+    O tempo limite é imposto por SIGALRM quando o transform roda na thread
+    principal (interrompe um estágio no meio); em outras threads (serviços)
+    o prazo é verificado entre estágios e o limite de tamanho limita o custo
+    de cada estágio.
+    """
+
+    def __init__(self, max_bytes: int = 0, max_binary_fraction: float = 0.0,
+                 timeout: float = 0.0, slow_seconds: float = 0.0, report_size: int = 20):
+        """
+        Args:
+            max_bytes: Tamanho máximo da letra em bytes UTF-8 (0 = sem limite)
+            max_binary_fraction: Fração máxima de caracteres binários (0 = sem limite)
+            timeout: Tempo máximo por registro em segundos (0 = sem limite)
+            slow_seconds: Registros acima deste tempo entram no relatório de lentos
+            report_size: Quantidade de registros mantidos no relatório
+        """
+        self.max_bytes = max_bytes
+        self.max_binary_fraction = max_binary_fraction
+        self.timeout = timeout
+        self.slow_seconds = slow_seconds
+        self.report_size = report_size
+        self.quarantined = 0
+        self._slow: List[tuple] = []
+
+    def check_input(self, record: Dict):
+        """
+        Verifica o tamanho e o conteúdo da letra antes do transform
+
+        Raises:
+            RecordRejected: Letra acima do tamanho máximo ou com conteúdo binário
+        """
+        lyrics = record.get('lyrics') or ''
+        if not isinstance(lyrics, str):
+            raise RecordRejected('type', f"Letra com tipo inválido: {type(lyrics).__name__}")
+
+        if self.max_bytes:
+            size = len(lyrics.encode('utf-8', errors='replace'))
+            if size > self.max_bytes:
+                raise RecordRejected('size', f"Letra com {size} bytes (limite {self.max_bytes})")
+
+        if self.max_binary_fraction:
+            fraction = binary_fraction(lyrics)
+            if fraction > self.max_binary_fraction:
+                raise RecordRejected(
+                    'binary',
+                    f"Letra com {fraction:.1%} de caracteres binários "
+                    f"(limite {self.max_binary_fraction:.1%})"
+                )
+
+    @contextlib.contextmanager
+    def track(self, record: Dict) -> Iterator[RecordTimer]:
+        """
+        Mede o processamento de um registro e impõe o tempo limite
+
+        Raises:
+            RecordTimeout: Prazo do registro excedido
+        """
+        timer = RecordTimer(record.get('id', 'unknown'), self.timeout)
+        use_alarm = (
+            self.timeout > 0
+            and hasattr(signal, 'setitimer')
+            and threading.current_thread() is threading.main_thread()
+        )
+
+        previous_handler = None
+        if use_alarm:
+            def on_alarm(signum, frame):
+                raise RecordTimeout(f"Registro {timer.record_id} excedeu {self.timeout:g}s")
+
+            previous_handler = signal.signal(signal.SIGALRM, on_alarm)
+            signal.setitimer(signal.ITIMER_REAL, self.timeout)
+
+        try:
+            yield timer
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous_handler)
+            self._record_duration(record, timer)
+
+    def _record_duration(self, record: Dict, timer: RecordTimer):
+        elapsed = timer.elapsed
+        if not self.slow_seconds or elapsed < self.slow_seconds:
+            return
+
+        slowest_stage = max(timer.stages, key=timer.stages.get) if timer.stages else None
+        logger.warning(
+            f"Letra lenta {timer.record_id}: {elapsed:.2f}s"
+            + (f" (estágio mais lento: {slowest_stage})" if slowest_stage else '')
+        )
+        entry = {
+            'id': timer.record_id,
+            'file_path': record.get('file_path'),
+            'seconds': round(elapsed, 3),
+            'lyrics_bytes': len((record.get('lyrics') or '').encode('utf-8', errors='replace')),
+            'stages': {stage: round(seconds, 3) for stage, seconds in timer.stages.items()}
+        }
+        # Min-heap por tempo: mantém apenas os report_size mais lentos
+        item = (elapsed, id(entry), entry)
+        if len(self._slow) < self.report_size:
+            heapq.heappush(self._slow, item)
+        else:
+            heapq.heappushpop(self._slow, item)
+
+    def slow_report(self) -> List[Dict]:
+        """Registros mais lentos da execução, do mais lento para o mais rápido"""
+        return [entry for _, _, entry in sorted(self._slow, reverse=True)]
+
+    def reset(self):
+        self.quarantined = 0
+        self._slow = []
@@ -0,0 +1,217 @@
+"""
+Detecção de limites de CPU e memória (cgroup v1/v2) e ajuste automático
+de workers e tamanho de lote do pipeline ETL
+"""
+
+import logging
+import math
+import os
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+# cgroup v1 reporta "sem limite" como um valor próximo de 2^63
+_UNLIMITED_THRESHOLD = 1 << 60
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        return path.read_text().strip()
+    except (OSError, ValueError):
+        return None
+
+
+def _read_int(path: Path) -> Optional[int]:
+    value = _read(path)
+    if value is None or value == 'max':
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    return None if number <= 0 or number >= _UNLIMITED_THRESHOLD else number
+
+
+class ResourceLimits:
+    """Limites efetivos de CPU e memória do processo"""
+
+    def __init__(self, cpus: float, memory_bytes: Optional[int],
+                 cgroup_root: str = CGROUP_ROOT):
+        """
+        Args:
+            cpus: CPUs disponíveis (fracionário quando há cota de cgroup)
+            memory_bytes: Memória disponível em bytes (None = desconhecida)
+            cgroup_root: Raiz do cgroup usada para ler o uso de memória
+        """
+        self.cpus = cpus
+        self.memory_bytes = memory_bytes
+        self.cgroup_root = Path(cgroup_root)
+
+    def __repr__(self) -> str:
+        memory = f"{self.memory_bytes / 2**20:.0f}MiB" if self.memory_bytes else 'desconhecida'
+        return f"ResourceLimits(cpus={self.cpus:g}, memory={memory})"
+
+    @classmethod
+    def detect(cls, cgroup_root: str = CGROUP_ROOT) -> 'ResourceLimits':
+        """
+        Detecta os limites do container, com fallback para os recursos do host
+
+        Args:
+            cgroup_root: Raiz do sistema de arquivos do cgroup
+
+        Returns:
+            Limites detectados
+        """
+        root = Path(cgroup_root)
+        host_cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+        host_cpus = host_cpus or 1
+
+        cpus = cls._cgroup_cpus(root)
+        memory = cls._cgroup_memory(root)
+        if memory is None:
+            memory = cls._host_memory()
+
+        return cls(min(cpus, host_cpus) if cpus else host_cpus, memory, cgroup_root)
+
+    @staticmethod
+    def _cgroup_cpus(root: Path) -> Optional[float]:
+        # cgroup v2: "cota período" ou "max período"
+        cpu_max = _read(root / 'cpu.max')
+        if cpu_max:
+            quota, _, period = cpu_max.partition(' ')
+            if quota != 'max' and period:
+                return int(quota) / int(period)
+            return None
+
+        # cgroup v1
+        quota = _read_int(root / 'cpu' / 'cpu.cfs_quota_us')
+        period = _read_int(root / 'cpu' / 'cpu.cfs_period_us')
+        if quota and period:
+            return quota / period
+        return None
+
+    @staticmethod
+    def _cgroup_memory(root: Path) -> Optional[int]:
+        limit = _read_int(root / 'memory.max')
+        if limit is None:
+            limit = _read_int(root / 'memory' / 'memory.limit_in_bytes')
+        return limit
+
+    @staticmethod
+    def _host_memory() -> Optional[int]:
+        try:
+            return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+        except (ValueError, OSError, AttributeError):
+            return None
+
+    def _inactive_file(self, stat_path: Path, key: str) -> int:
+        stat = _read(stat_path) or ''
+        for line in stat.splitlines():
+            name, _, value = line.partition(' ')
+            if name == key:
+                return int(value)
+        return 0
+
+    def memory_usage(self) -> Optional[int]:
+        """
+        Working set atual em bytes
+
+        Como no kubelet, desconta o cache de arquivos inativo (recuperável) do
+        uso do cgroup; sem cgroup, usa o RSS do processo.
+        """
+        usage = _read_int(self.cgroup_root / 'memory.current')
+        if usage is not None:
+            return usage - self._inactive_file(self.cgroup_root / 'memory.stat', 'inactive_file')
+
+        usage = _read_int(self.cgroup_root / 'memory' / 'memory.usage_in_bytes')
+        if usage is not None:
+            return usage - self._inactive_file(
+                self.cgroup_root / 'memory' / 'memory.stat', 'total_inactive_file'
+            )
+
+        statm = _read(Path('/proc/self/statm'))
+        if statm:
+            return int(statm.split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        return None
+
+    def memory_pressure(self) -> Optional[float]:
+        """Fração do limite de memória em uso (None se não mensurável)"""
+        usage = self.memory_usage()
+        if usage is None or not self.memory_bytes:
+            return None
+        return usage / self.memory_bytes
+
+
+def tune_workers(limits: ResourceLimits, max_workers: int = 32) -> int:
+    """
+    Workers de I/O para o limite de CPU
+
+    Downloads são limitados por rede, então usa duas threads por CPU.
+    """
+    return max(1, min(max_workers, math.ceil(limits.cpus * 2)))
+
+
+def tune_batch_size(limits: ResourceLimits, memory_per_file_mb: float,
+                    budget_fraction: float, min_size: int, max_size: int,
+                    default: int) -> int:
+    """
+    Tamanho de lote que cabe na fração do limite de memória reservada ao lote
+
+    Args:
+        limits: Limites detectados
+        memory_per_file_mb: Memória estimada por arquivo durante o transform
+        budget_fraction: Fração do limite de memória destinada ao lote
+        min_size: Limite inferior
+        max_size: Limite superior
+        default: Valor usado quando a memória é desconhecida
+
+    Returns:
+        Arquivos por lote
+    """
+    if not limits.memory_bytes or memory_per_file_mb <= 0:
+        return default
+    budget_mb = limits.memory_bytes / 2**20 * budget_fraction
+    return max(min_size, min(max_size, int(budget_mb / memory_per_file_mb)))
+
+
+class AdaptiveBatchSizer:
+    """
+    Ajusta o tamanho do lote conforme a pressão de memória entre lotes
+
+    Acima da marca alta o lote cai pela metade; abaixo da marca baixa volta
+    a crescer (x1.5) até o tamanho inicial.
+    """
+
+    def __init__(self, initial: int, min_size: int, limits: ResourceLimits = None,
+                 high_watermark: float = 0.85, low_watermark: float = 0.5):
+        """
+        Args:
+            initial: Tamanho inicial (e máximo) do lote
+            min_size: Menor tamanho permitido
+            limits: Limites usados para medir a pressão (None = tamanho fixo)
+            high_watermark: Fração de memória que dispara a redução
+            low_watermark: Fração de memória que permite voltar a crescer
+        """
+        self.initial = max(1, initial)
+        self.min_size = max(1, min(min_size, self.initial))
+        self.size = self.initial
+        self.limits = limits
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+
+    def adjust(self) -> int:
+        """Mede a pressão de memória e retorna o tamanho do próximo lote"""
+        pressure = self.limits.memory_pressure() if self.limits else None
+        if pressure is None:
+            return self.size
+
+        if pressure >= self.high_watermark and self.size > self.min_size:
+            self.size = max(self.min_size, self.size // 2)
+            logger.warning(f"Pressão de memória {pressure:.0%}: lote reduzido para {self.size}")
+        elif pressure <= self.low_watermark and self.size < self.initial:
+            self.size = min(self.initial, math.ceil(self.size * 1.5))
+            logger.info(f"Pressão de memória {pressure:.0%}: lote ampliado para {self.size}")
+        return self.size
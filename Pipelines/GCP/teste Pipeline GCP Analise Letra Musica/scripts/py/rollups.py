@@ -0,0 +1,336 @@
+"""
+Tabelas de rollup mantidas pelo ETL a cada lote
+
+Rollups guardam somas e contagens por chave: sentimento por ano e gênero,
+palavras por ano e sentimento e resumo por artista e gênero. Médias e
+desvios são sempre calculados na leitura a partir das somas, então o custo
+das visualizações e views não cresce com o número de músicas.
+
+No BigQuery e no DuckDB cada lote recalcula, a partir das tabelas base
+deduplicadas, somente as chaves que tocou e grava os valores como
+substituição (build_refresh_query). Reprocessar músicas (reset do pipeline,
+job diário, serviço de eventos, dead-letter ou retomada) não conta de novo,
+e como o resultado só depende do estado das tabelas base, cargas
+concorrentes (shards e serviço) convergem: a última atualização de uma
+chave reflete todas as cargas concluídas antes dela. No ParquetSink, que
+só anexa (inclusive as tabelas base), os deltas do lote (compute_rollups)
+são anexados e quem lê agrega por chave.
+
+O recálculo lê só as músicas das chaves tocadas (o filtro vem antes da
+deduplicação), então o custo por lote acompanha o tamanho dessas chaves, e
+não o das tabelas base. Uma recarga que muda o ano, o gênero, o artista ou
+o sentimento de uma música atualiza a chave nova, mas a chave antiga
+continua contando a música até a procedure rebuild_rollups
+(sql/create_tables.sql), que recalcula todas as chaves, como depois da
+limpeza de dados antigos.
+"""
+
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import pandas as pd
+
+from config import Config
+
+ROLLUP_TABLE_NAMES = list(Config.ROLLUP_KEYS)
+
+# Palavras mantidas no rollup (mesmo filtro das nuvens e views de palavras)
+MIN_WORD_LENGTH = 3
+
+_SONG_COLUMNS = ['id', 'artist', 'genre', 'year']
+_PROCESSED_COLUMNS = ['id', 'word_count', 'unique_words', 'avg_word_length', 'readability_score']
+_SENTIMENT_COLUMNS = ['lyrics_id', 'sentiment_score', 'sentiment_label', 'confidence']
+_WORD_COLUMNS = ['lyrics_id', 'word', 'frequency', 'tf_idf', 'is_stopword']
+
+
+def _select(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """Colunas do DataFrame (ausentes viram nulos; DataFrame vazio sem colunas é aceito)"""
+    if df is None:
+        df = pd.DataFrame()
+    return df.reindex(columns=columns)
+
+
+def _song_measures(raw_df: pd.DataFrame, processed_df: pd.DataFrame,
+                   sentiment_df: pd.DataFrame) -> pd.DataFrame:
+    """Uma linha por música com as medidas aditivas usadas pelos rollups"""
+    songs = _select(raw_df, _SONG_COLUMNS).drop_duplicates('id')
+
+    processed = _select(processed_df, _PROCESSED_COLUMNS).drop_duplicates('id')
+    # Só conta para as médias de texto a música em que text_stats rodou
+    processed['processed'] = processed['word_count'].notna().astype(int)
+    sentiment = (_select(sentiment_df, _SENTIMENT_COLUMNS)
+                 .drop_duplicates('lyrics_id')
+                 .rename(columns={'lyrics_id': 'id'}))
+    sentiment['analyzed'] = 1
+
+    songs = songs.merge(processed, on='id', how='left').merge(sentiment, on='id', how='left')
+    score = pd.to_numeric(songs['sentiment_score'], errors='coerce')
+    readability = pd.to_numeric(songs['readability_score'], errors='coerce')
+
+    return pd.DataFrame({
+        'artist': songs['artist'],
+        'genre': songs['genre'],
+        'year': songs['year'],
+        'sentiment_label': songs['sentiment_label'],
+        'song_count': 1,
+        'sentiment_count': songs['analyzed'].fillna(0).astype(int),
+        'sentiment_sum': score.fillna(0.0),
+        'sentiment_sq_sum': score.fillna(0.0) ** 2,
+        'positive_count': (songs['sentiment_label'] == 'positive').astype(int),
+        'negative_count': (songs['sentiment_label'] == 'negative').astype(int),
+        'neutral_count': (songs['sentiment_label'] == 'neutral').astype(int),
+        'confidence_sum': pd.to_numeric(songs['confidence'], errors='coerce').fillna(0.0),
+        'processed_count': songs['processed'].fillna(0).astype(int),
+        'word_count_sum': pd.to_numeric(songs['word_count'], errors='coerce').fillna(0).astype(int),
+        'unique_words_sum': pd.to_numeric(songs['unique_words'], errors='coerce').fillna(0).astype(int),
+        'avg_word_length_sum': pd.to_numeric(songs['avg_word_length'], errors='coerce').fillna(0.0),
+        'readability_count': readability.notna().astype(int),
+        'readability_sum': readability.fillna(0.0)
+    })
+
+
+def _sum_by(measures: pd.DataFrame, keys: List[str], columns: List[str]) -> pd.DataFrame:
+    return (measures.groupby(keys, dropna=False, sort=False)[columns]
+            .sum()
+            .reset_index())
+
+
+def compute_rollups(raw_df: pd.DataFrame, processed_df: pd.DataFrame,
+                    word_freq_df: pd.DataFrame, sentiment_df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Calcula os deltas de rollup de um lote
+
+    Args:
+        raw_df: Músicas do lote (raw_lyrics)
+        processed_df: Letras processadas do lote
+        word_freq_df: Frequência de palavras do lote
+        sentiment_df: Análise de sentimentos do lote
+
+    Returns:
+        Dicionário nome do rollup -> DataFrame com uma linha por chave
+    """
+    if raw_df is None or raw_df.empty:
+        return {name: pd.DataFrame() for name in ROLLUP_TABLE_NAMES}
+
+    updated_at = datetime.now(timezone.utc)
+    measures = _song_measures(raw_df, processed_df, sentiment_df)
+
+    sentiment_rollup = _sum_by(measures, Config.ROLLUP_KEYS['sentiment_rollup'], [
+        'song_count', 'sentiment_count', 'sentiment_sum', 'sentiment_sq_sum',
+        'positive_count', 'negative_count', 'neutral_count', 'confidence_sum',
+        'processed_count', 'word_count_sum', 'unique_words_sum',
+        'readability_count', 'readability_sum'
+    ])
+
+    artist_keys = Config.ROLLUP_KEYS['artist_rollup']
+    artist_rollup = _sum_by(measures, artist_keys, [
+        'song_count', 'sentiment_count', 'sentiment_sum',
+        'positive_count', 'negative_count', 'neutral_count',
+        'processed_count', 'word_count_sum', 'unique_words_sum', 'avg_word_length_sum',
+        'readability_count', 'readability_sum'
+    ])
+    years = (measures.groupby(artist_keys, dropna=False, sort=False)['year']
+             .agg(first_year='min', last_year='max')
+             .reset_index())
+    artist_rollup = artist_rollup.merge(years, on=artist_keys, how='left')
+
+    # Palavras de conteúdo, com ano e sentimento herdados da música
+    words = _select(word_freq_df, _WORD_COLUMNS)
+    words = words[~words['is_stopword'].fillna(False).astype(bool)
+                  & (words['word'].astype(str).str.len() >= MIN_WORD_LENGTH)]
+    song_keys = _select(raw_df, ['id', 'year']).drop_duplicates('id').merge(
+        _select(sentiment_df, ['lyrics_id', 'sentiment_label'])
+        .drop_duplicates('lyrics_id').rename(columns={'lyrics_id': 'id'}),
+        on='id', how='left'
+    ).rename(columns={'id': 'lyrics_id'})
+    words = words.merge(song_keys, on='lyrics_id', how='inner')
+    word_rollup = (words.groupby(Config.ROLLUP_KEYS['word_rollup'], dropna=False, sort=False)
+                   .agg(frequency_sum=('frequency', 'sum'),
+                        song_count=('lyrics_id', 'nunique'),
+                        tfidf_sum=('tf_idf', 'sum'),
+                        tfidf_count=('tf_idf', 'count'))
+                   .reset_index())
+
+    rollups = {
+        'sentiment_rollup': sentiment_rollup,
+        'word_rollup': word_rollup,
+        'artist_rollup': artist_rollup
+    }
+    for df in rollups.values():
+        df['updated_at'] = updated_at
+    return rollups
+
+
+# Medidas dos rollups de música em SQL (mesmas de _song_measures)
+_SONG_MEASURES = {
+    'song_count': "COUNT(*)",
+    'first_year': "MIN(year)",
+    'last_year': "MAX(year)",
+    'sentiment_count': "COUNTIF(analyzed)",
+    'sentiment_sum': "IFNULL(SUM(sentiment_score), 0)",
+    'sentiment_sq_sum': "IFNULL(SUM(POW(sentiment_score, 2)), 0)",
+    'positive_count': "COUNTIF(sentiment_label = 'positive')",
+    'negative_count': "COUNTIF(sentiment_label = 'negative')",
+    'neutral_count': "COUNTIF(sentiment_label = 'neutral')",
+    'confidence_sum': "IFNULL(SUM(confidence), 0)",
+    'processed_count': "COUNTIF(processed)",
+    'word_count_sum': "IFNULL(SUM(word_count), 0)",
+    'unique_words_sum': "IFNULL(SUM(unique_words), 0)",
+    'avg_word_length_sum': "IFNULL(SUM(avg_word_length), 0)",
+    'readability_count': "COUNT(readability_score)",
+    'readability_sum': "IFNULL(SUM(readability_score), 0)"
+}
+
+_WORD_MEASURES = {
+    'frequency_sum': "SUM(frequency)",
+    'song_count': "COUNT(DISTINCT lyrics_id)",
+    'tfidf_sum': "IFNULL(SUM(tf_idf), 0)",
+    'tfidf_count': "COUNT(tf_idf)"
+}
+
+
+def _latest(table_ref: str, columns: List[str], keys: List[str], order_column: str,
+            condition: str = 'TRUE') -> str:
+    """Linha mais recente de cada chave da tabela base (cargas append podem repetir linhas)"""
+    return (
+        f"SELECT {', '.join(columns)}\n"
+        f"    FROM {table_ref}\n"
+        f"    WHERE {condition}\n"
+        f"    QUALIFY ROW_NUMBER() OVER (PARTITION BY {', '.join(keys)} ORDER BY {order_column} DESC) = 1"
+    )
+
+
+def build_refresh_query(table_name: str, table_ref: Callable[[str], str], keys_ref: str) -> str:
+    """
+    Monta a consulta que recalcula as linhas do rollup nas chaves de um lote
+
+    As medidas vêm das tabelas base deduplicadas, como em rebuild_rollups,
+    mas só para as chaves presentes em keys_ref: as músicas com alguma linha
+    nessas chaves são selecionadas antes da deduplicação, e a versão mais
+    recente de cada uma ainda precisa casar com a chave. Chaves nulas (ano
+    ou gênero desconhecido) casam entre si via IS NOT DISTINCT FROM.
+
+    Args:
+        table_name: Nome do rollup em Config.ROLLUP_KEYS
+        table_ref: Função nome da tabela base -> referência na SQL
+        keys_ref: Tabela com as chaves do lote (colunas de Config.ROLLUP_KEYS)
+
+    Returns:
+        SELECT (SQL do BigQuery) com uma linha por chave, nas colunas do schema do rollup
+    """
+    keys = Config.ROLLUP_KEYS[table_name]
+    columns = [column['name'] for column in Config.get_table_schema(table_name)]
+    measures = _WORD_MEASURES if table_name == 'word_rollup' else _SONG_MEASURES
+
+    def select(column: str) -> str:
+        if column in keys:
+            return column
+        if column == 'updated_at':
+            return "CURRENT_TIMESTAMP AS updated_at"
+        return f"{measures[column]} AS {column}"
+
+    in_touched = "IN (SELECT id FROM touched_ids)"
+    if table_name == 'word_rollup':
+        word_filter = (
+            f"IFNULL(is_stopword, FALSE) = FALSE\n"
+            f"      AND LENGTH(word) >= {MIN_WORD_LENGTH}\n"
+            f"      AND word IN (SELECT word FROM {keys_ref})"
+        )
+        touched_ids = (
+            f"touched_ids AS (\n"
+            f"  SELECT DISTINCT lyrics_id AS id\n"
+            f"  FROM {table_ref('word_frequency')}\n"
+            f"  WHERE {word_filter}\n"
+            f")"
+        )
+    else:
+        key_match = ' AND '.join(f"K.{key} IS NOT DISTINCT FROM r.{key}" for key in keys)
+        touched_ids = (
+            f"touched_ids AS (\n"
+            f"  SELECT DISTINCT id\n"
+            f"  FROM {table_ref('raw_lyrics')} r\n"
+            f"  WHERE EXISTS (SELECT 1 FROM {keys_ref} K WHERE {key_match})\n"
+            f")"
+        )
+
+    songs = (
+        f"songs AS (\n"
+        f"  SELECT\n"
+        f"    r.id, r.artist, r.genre, r.year,\n"
+        f"    s.lyrics_id IS NOT NULL AS analyzed,\n"
+        f"    s.sentiment_score, s.sentiment_label, s.confidence,\n"
+        f"    p.word_count IS NOT NULL AS processed,\n"
+        f"    p.word_count, p.unique_words, p.avg_word_length, p.readability_score\n"
+        f"  FROM (\n"
+        f"    {_latest(table_ref('raw_lyrics'), _SONG_COLUMNS, ['id'], 'created_at', f'id {in_touched}')}\n"
+        f"  ) r\n"
+        f"  LEFT JOIN (\n"
+        f"    {_latest(table_ref('sentiment_analysis'), _SENTIMENT_COLUMNS, ['lyrics_id'], 'analyzed_at', f'lyrics_id {in_touched}')}\n"
+        f"  ) s ON r.id = s.lyrics_id\n"
+        f"  LEFT JOIN (\n"
+        f"    {_latest(table_ref('processed_lyrics'), _PROCESSED_COLUMNS, ['id'], 'processed_at', f'id {in_touched}')}\n"
+        f"  ) p ON r.id = p.id\n"
+        f")"
+    )
+
+    if table_name == 'word_rollup':
+        words = _latest(
+            table_ref('word_frequency'), ['lyrics_id', 'word', 'frequency', 'tf_idf'],
+            ['lyrics_id', 'word'], 'created_at', word_filter
+        )
+        source = (
+            f"{touched_ids},\n"
+            f"{songs},\n"
+            f"candidates AS (\n"
+            f"  SELECT s.year, s.sentiment_label, w.word, w.lyrics_id, w.frequency, w.tf_idf\n"
+            f"  FROM (\n"
+            f"    {words}\n"
+            f"  ) w\n"
+            f"  JOIN songs s ON w.lyrics_id = s.id\n"
+            f")"
+        )
+    else:
+        source = f"{touched_ids},\n{songs},\ncandidates AS (SELECT * FROM songs)"
+
+    touched = ' AND '.join(f"K.{key} IS NOT DISTINCT FROM candidates.{key}" for key in keys)
+    select_clause = ',\n  '.join(select(column) for column in columns)
+
+    return (
+        f"WITH {source}\n"
+        f"SELECT\n  {select_clause}\n"
+        f"FROM candidates\n"
+        f"WHERE EXISTS (SELECT 1 FROM {keys_ref} K WHERE {touched})\n"
+        f"GROUP BY {', '.join(keys)}"
+    )
+
+
+def build_refresh_sql(table_name: str, target_id: str, staging_id: str,
+                      table_id: Callable[[str], str]) -> str:
+    """
+    Monta o MERGE que substitui as linhas das chaves do lote pelos valores recalculados
+
+    Args:
+        table_name: Nome do rollup em Config.ROLLUP_KEYS
+        target_id: Tabela de rollup
+        staging_id: Tabela de staging com as chaves do lote
+        table_id: Função nome da tabela base -> ID completo no BigQuery
+
+    Returns:
+        Instrução MERGE
+    """
+    keys = Config.ROLLUP_KEYS[table_name]
+    columns = [column['name'] for column in Config.get_table_schema(table_name)]
+    query = build_refresh_query(table_name, lambda name: f"`{table_id(name)}`", f"`{staging_id}`")
+
+    on_clause = ' AND '.join(f"T.{key} IS NOT DISTINCT FROM S.{key}" for key in keys)
+    update_clause = ',\n    '.join(
+        f"{column} = S.{column}" for column in columns if column not in keys
+    )
+
+    return (
+        f"MERGE `{target_id}` T\n"
+        f"USING (\n{query}\n) S\n"
+        f"ON {on_clause}\n"
+        f"WHEN MATCHED THEN UPDATE SET\n    {update_clause}\n"
+        f"WHEN NOT MATCHED THEN INSERT ROW"
+    )
@@ -0,0 +1,157 @@
+"""
+Particionamento da listagem de arquivos entre tarefas de um Cloud Run job
+Cada tarefa recebe um shard determinístico e balanceado por tamanho,
+calculado sobre a listagem congelada da execução (manifesto)
+"""
+
+import hashlib
+import heapq
+import json
+import logging
+from collections import namedtuple
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+from google.api_core.exceptions import PreconditionFailed
+
+logger = logging.getLogger(__name__)
+
+# Arquivo da listagem congelada (mesmos atributos usados no balanceamento)
+ManifestEntry = namedtuple('ManifestEntry', ['name', 'size'])
+
+
+def assign_shards(blobs: Sequence, task_count: int) -> List[List]:
+    """
+    Distribui os blobs entre as tarefas balanceando o total de bytes
+
+    Usa a heurística LPT (maior arquivo primeiro para a tarefa menos
+    carregada). A ordenação por (tamanho desc, nome) e o desempate pelo
+    índice da tarefa tornam a atribuição uma função pura da listagem; para
+    que todas as tarefas e novas tentativas vejam a mesma listagem, ela é
+    congelada em um ShardManifest por execução.
+
+    Args:
+        blobs: Objetos com atributos name e size
+        task_count: Número de tarefas
+
+    Returns:
+        Lista com os blobs de cada tarefa, na ordem de nome
+    """
+    if task_count < 1:
+        raise ValueError(f"task_count deve ser >= 1: {task_count}")
+
+    shards = [[] for _ in range(task_count)]
+    # Heap de (bytes atribuídos, índice da tarefa)
+    loads = [(0, index) for index in range(task_count)]
+
+    for blob in sorted(blobs, key=lambda b: (-(b.size or 0), b.name)):
+        assigned_bytes, index = heapq.heappop(loads)
+        shards[index].append(blob)
+        heapq.heappush(loads, (assigned_bytes + (blob.size or 0), index))
+
+    return [sorted(shard, key=lambda b: b.name) for shard in shards]
+
+
+def select_shard(blobs: Sequence, task_index: int, task_count: int) -> List:
+    """
+    Retorna o shard da tarefa indicada
+
+    Args:
+        blobs: Listagem completa de blobs
+        task_index: Índice da tarefa (0..task_count-1)
+        task_count: Número de tarefas
+
+    Returns:
+        Blobs atribuídos à tarefa
+    """
+    if not 0 <= task_index < task_count:
+        raise ValueError(f"task_index {task_index} fora do intervalo [0, {task_count})")
+    if task_count == 1:
+        return list(blobs)
+
+    return assign_shards(blobs, task_count)[task_index]
+
+
+def shard_summary(blobs: Sequence) -> Tuple[int, int]:
+    """Retorna (quantidade de arquivos, total de bytes) de um shard"""
+    return len(blobs), sum(blob.size or 0 for blob in blobs)
+
+
+class ShardManifest:
+    """
+    Listagem de arquivos congelada para uma execução do job
+
+    A primeira tarefa a listar o prefixo grava o manifesto (criação
+    exclusiva: arquivo local com modo 'x' ou objeto gs:// com
+    if_generation_match=0); as demais tarefas, e as novas tentativas de
+    qualquer tarefa, leem o mesmo manifesto. Assim o balanceamento por
+    tamanho é calculado sempre sobre a mesma listagem, mesmo com arquivos
+    enviados ou alterados depois do início do job.
+    """
+
+    def __init__(self, location: str, storage_client=None):
+        """
+        Args:
+            location: Caminho local ou URI gs:// do manifesto
+            storage_client: Cliente Cloud Storage (obrigatório para gs://)
+        """
+        self.location = location
+        self._blob = None
+        if location.startswith('gs://'):
+            if storage_client is None:
+                from google.cloud import storage
+                storage_client = storage.Client()
+            bucket_name, _, object_name = location[len('gs://'):].partition('/')
+            self._blob = storage_client.bucket(bucket_name).blob(object_name)
+        else:
+            self._path = Path(location)
+
+    @staticmethod
+    def location_for(base: str, execution_id: str, prefix: str) -> str:
+        """Manifesto de uma execução e de um prefixo dentro do diretório base"""
+        digest = hashlib.blake2b(prefix.encode('utf-8'), digest_size=6).hexdigest()
+        return f"{base.rstrip('/')}/{execution_id}/{digest}.json"
+
+    def _create(self, content: str) -> bool:
+        """Grava o manifesto se ainda não existir (False se outra tarefa gravou antes)"""
+        if self._blob is not None:
+            try:
+                self._blob.upload_from_string(content, content_type='application/json',
+                                              if_generation_match=0)
+            except PreconditionFailed:
+                return False
+            return True
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with open(self._path, 'x', encoding='utf-8') as f:
+                f.write(content)
+        except FileExistsError:
+            return False
+        return True
+
+    def _read(self) -> str:
+        if self._blob is not None:
+            return self._blob.download_as_text()
+        return self._path.read_text(encoding='utf-8')
+
+    def freeze(self, blobs: Sequence) -> List[ManifestEntry]:
+        """
+        Congela a listagem na primeira chamada da execução e retorna a listagem congelada
+
+        Args:
+            blobs: Listagem atual (usada só se o manifesto ainda não existir)
+
+        Returns:
+            Entradas (name, size) do manifesto, na ordem de nome
+        """
+        entries = sorted((ManifestEntry(blob.name, blob.size or 0) for blob in blobs),
+                         key=lambda entry: entry.name)
+        content = json.dumps({'files': [entry._asdict() for entry in entries]})
+        if self._create(content):
+            logger.info(f"Manifesto de shards gravado em {self.location} ({len(entries)} arquivos)")
+            return entries
+
+        frozen = json.loads(self._read())['files']
+        logger.info(f"Manifesto de shards lido de {self.location} ({len(frozen)} arquivos)")
+        return [ManifestEntry(entry['name'], entry['size']) for entry in frozen]
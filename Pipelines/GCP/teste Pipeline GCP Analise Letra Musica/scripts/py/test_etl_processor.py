@@ -6,7 +6,9 @@ import unittest
 from unittest.mock import Mock, patch, MagicMock
 import pandas as pd
 import json
+import logging
 from datetime import datetime
+from types import SimpleNamespace
 import sys
 import os
 
@@ -294,6 +296,2411 @@ class TestDataTransformation(unittest.TestCase):
             self.assertIn(col, sentiment_df.columns)
 
 
+
+class TestArrowSerialization(unittest.TestCase):
+    """Testes para serialização tipada via Config.SCHEMAS"""
+    
+    def test_to_arrow_table_uses_declared_types(self):
+        """Testa tipos Arrow derivados do schema declarado"""
+        import pyarrow as pa
+        from arrow_serializer import to_arrow_table
+        
+        df = pd.DataFrame([
+            {'id': 'a', 'title': 'Song', 'year': 2020, 'created_at': '2024-01-01T10:00:00'},
+            {'id': 'b', 'title': 'Other', 'year': None, 'created_at': None}
+        ])
+        
+        table = to_arrow_table(df, 'raw_lyrics')
+        
+        # Verificações
+        self.assertEqual(table.schema.field('year').type, pa.int64())
+        self.assertTrue(pa.types.is_timestamp(table.schema.field('created_at').type))
+        self.assertFalse(table.schema.field('id').nullable)
+        self.assertEqual(table.column('year').to_pylist(), [2020, None])
+        # Colunas ausentes viram nulos
+        self.assertEqual(table.column('lyrics').null_count, 2)
+    
+    def test_json_array_columns_match_json_dumps(self):
+        """Testa serialização de listas como JSON sem mutar o DataFrame"""
+        from arrow_serializer import to_arrow_table
+        
+        tokens = [['love', 'say "hi"'], [], None]
+        df = pd.DataFrame({'id': ['1', '2', '3'], 'tokens': tokens})
+        
+        table = to_arrow_table(df, 'processed_lyrics')
+        
+        # Verificações
+        self.assertEqual(
+            table.column('tokens').to_pylist(),
+            [json.dumps(tokens[0]), '[]', None]
+        )
+        self.assertIsInstance(df['tokens'].iloc[0], list)
+
+    def test_json_array_columns_escape_control_characters(self):
+        """Testa escape de caracteres de controle além de \\n, \\r e \\t"""
+        from arrow_serializer import to_arrow_table
+
+        tokens = [['a\x00b', 'c\x0bd', 'e\x1ff\tg'], ['plain']]
+        df = pd.DataFrame({'id': ['1', '2'], 'tokens': tokens})
+
+        table = to_arrow_table(df, 'processed_lyrics')
+
+        # Verificações
+        encoded = table.column('tokens').to_pylist()
+        self.assertEqual([json.loads(value) for value in encoded], tokens)
+        self.assertEqual(encoded[1], json.dumps(tokens[1]))
+
+    def test_missing_required_column_raises(self):
+        """Testa erro quando coluna obrigatória está ausente"""
+        from arrow_serializer import to_arrow_table
+        
+        with self.assertRaises(ValueError):
+            to_arrow_table(pd.DataFrame({'title': ['x']}), 'raw_lyrics')
+    
+    def test_bigquery_sink_sends_parquet_with_schema(self):
+        """Testa carregamento via Parquet com schema explícito"""
+        with patch('etl_processor.storage.Client'), \
+             patch('etl_processor.bigquery.Client'), \
+             patch('etl_processor.cloud_logging.Client'):
+            processor = LyricsETLProcessor("test", "test", "test")
+        
+        df = pd.DataFrame({'lyrics_id': ['1'], 'sentiment_score': [0.5],
+                           'positive_words': [['love']]})
+        
+        processor.sink.write_tables({'sentiment_analysis': df})
+        
+        # Verificações
+        args, kwargs = processor.bq_client.load_table_from_file.call_args
+        self.assertEqual(args[1], 'test.test.sentiment_analysis')
+        schema_names = [field.name for field in kwargs['job_config'].schema]
+        self.assertIn('positive_words', schema_names)
+        self.assertIsInstance(df['positive_words'].iloc[0], list)
+
+
+class TestRepeatedArrayColumns(unittest.TestCase):
+    """Testes para o modo de colunas REPEATED"""
+    
+    def test_schema_repeated_mode(self):
+        """Testa conversão das colunas de array para REPEATED"""
+        from config import Config
+        
+        schema = {c['name']: c for c in Config.get_table_schema('sentiment_analysis', 'repeated')}
+        
+        # Verificações
+        self.assertEqual(schema['positive_words']['mode'], 'REPEATED')
+        self.assertEqual(schema['positive_words']['type'], 'STRING')
+        self.assertEqual(schema['lyrics_id']['mode'], 'REQUIRED')
+        # Schema declarado permanece inalterado
+        json_schema = {c['name']: c for c in Config.get_table_schema('sentiment_analysis', 'json')}
+        self.assertEqual(json_schema['positive_words']['mode'], 'NULLABLE')
+    
+    def test_to_arrow_table_native_lists(self):
+        """Testa serialização nativa de listas (nulos viram listas vazias)"""
+        import pyarrow as pa
+        from arrow_serializer import to_arrow_table
+        
+        df = pd.DataFrame({'id': ['1', '2'], 'tokens': [['love', 'joy'], None]})
+        
+        table = to_arrow_table(df, 'processed_lyrics', array_mode='repeated')
+        
+        # Verificações
+        self.assertTrue(pa.types.is_list(table.schema.field('tokens').type))
+        self.assertEqual(table.column('tokens').to_pylist(), [['love', 'joy'], []])
+    
+    def test_migration_sql_preserves_layout(self):
+        """Testa SQL de migração preservando particionamento e clustering"""
+        from google.cloud import bigquery
+        from migrate_array_columns import ArrayColumnMigrator
+        
+        table = bigquery.Table(
+            'p.d.processed_lyrics',
+            schema=[bigquery.SchemaField('id', 'STRING', mode='REQUIRED'),
+                    bigquery.SchemaField('tokens', 'STRING'),
+                    bigquery.SchemaField('processed_at', 'TIMESTAMP')]
+        )
+        table.time_partitioning = bigquery.TimePartitioning(field='processed_at')
+        table.clustering_fields = ['artist', 'language']
+        migrator = ArrayColumnMigrator('p', 'd', client=Mock())
+        
+        columns = migrator._pending_columns(table, 'repeated')
+        sql = migrator.build_migration_sql(table, columns, 'repeated')
+        
+        # Verificações
+        self.assertEqual(columns, ['tokens'])
+        self.assertIn('JSON_VALUE_ARRAY(tokens)', sql)
+        self.assertIn('PARTITION BY DATE(processed_at)', sql)
+        self.assertIn('CLUSTER BY artist, language', sql)
+    
+    def test_migration_sql_preserves_partition_options_and_descriptions(self):
+        """Testa tipo e expiração da partição, filtro obrigatório e descrições de colunas"""
+        from google.cloud import bigquery
+        from migrate_array_columns import ArrayColumnMigrator
+        
+        table = bigquery.Table(
+            'p.d.sentiment_analysis',
+            schema=[bigquery.SchemaField('lyrics_id', 'STRING', description='ID da letra'),
+                    bigquery.SchemaField('positive_words', 'STRING', description='Palavras "positivas"'),
+                    bigquery.SchemaField('analyzed_at', 'TIMESTAMP')]
+        )
+        table.time_partitioning = bigquery.TimePartitioning(
+            type_=bigquery.TimePartitioningType.MONTH, field='analyzed_at',
+            expiration_ms=30 * 86400000
+        )
+        table.require_partition_filter = True
+        migrator = ArrayColumnMigrator('p', 'd', client=Mock())
+        
+        sql = migrator.build_migration_sql(table, ['positive_words'], 'repeated')
+        
+        # Verificações
+        self.assertIn('PARTITION BY TIMESTAMP_TRUNC(analyzed_at, MONTH)', sql)
+        self.assertIn('partition_expiration_days = 30.0', sql)
+        self.assertIn('require_partition_filter = TRUE', sql)
+        self.assertIn('ALTER COLUMN lyrics_id SET OPTIONS (description = "ID da letra")', sql)
+        self.assertIn('ALTER COLUMN positive_words SET OPTIONS (description = "Palavras \\"positivas\\"")', sql)
+    
+    def test_migration_refuses_ingestion_time_partitioning(self):
+        """Testa recusa de tabelas particionadas por tempo de ingestão"""
+        from google.cloud import bigquery
+        from migrate_array_columns import ArrayColumnMigrator
+        
+        table = bigquery.Table('p.d.processed_lyrics',
+                               schema=[bigquery.SchemaField('tokens', 'STRING')])
+        table.time_partitioning = bigquery.TimePartitioning()
+        migrator = ArrayColumnMigrator('p', 'd', client=Mock())
+        migrator.client.get_table.return_value = table
+        
+        # Verificações
+        with self.assertRaises(ValueError):
+            migrator.plan('repeated')
+
+
+
+class TestOutputSinks(unittest.TestCase):
+    """Testes para os destinos de saída locais"""
+    
+    def setUp(self):
+        """Configuração inicial com diretórios temporários"""
+        import tempfile
+        self.tmp_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.tmp_dir, 'input')
+        os.makedirs(self.input_dir)
+        songs = [
+            {'title': 'Sunny', 'artist': 'A', 'genre': 'Pop', 'year': 2001,
+             'lyrics': 'sunny day love sunny morning dance'},
+            {'title': 'Rain', 'artist': 'B', 'genre': 'Rock/Metal', 'year': 1999,
+             'lyrics': 'cold rain falling love lost morning'},
+            {'title': 'Night', 'artist': 'C', 'genre': 'Pop', 'year': None,
+             'lyrics': 'night dance lights cold streets'}
+        ]
+        with open(os.path.join(self.input_dir, 'songs.json'), 'w') as f:
+            json.dump(songs, f)
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+    
+    def _run_offline(self, sink):
+        with patch('etl_processor.cloud_logging.Client') as logging_client:
+            processor = LyricsETLProcessor(
+                'test', 'test', 'test', sink=sink, input_dir=self.input_dir,
+                checkpoint_path=os.path.join(self.tmp_dir, 'checkpoint.jsonl'),
+                dead_letter_path=os.path.join(self.tmp_dir, 'dead_letter.jsonl')
+            )
+            result = processor.run_etl_pipeline('')
+            logging_client.assert_not_called()
+        sink.close()
+        return result
+    
+    def test_parquet_sink_partitions_all_tables(self):
+        """Testa dataset Parquet particionado por year/genre"""
+        import pyarrow.dataset as ds
+        from output_sinks import ParquetSink, TABLE_NAMES
+        
+        output_dir = os.path.join(self.tmp_dir, 'parquet')
+        result = self._run_offline(ParquetSink(output_dir))
+        
+        # Verificações
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['sink'], 'parquet')
+        for table_name in TABLE_NAMES:
+            self.assertTrue(os.path.isdir(os.path.join(output_dir, table_name, 'year=2001')))
+        sentiment = ds.dataset(os.path.join(output_dir, 'sentiment_analysis'),
+                               partitioning='hive').to_table().to_pandas()
+        self.assertEqual(len(sentiment), 3)
+        self.assertIn('Rock/Metal', set(sentiment['genre']))
+    
+    def test_duckdb_sink_writes_tables(self):
+        """Testa gravação das quatro tabelas em arquivo DuckDB"""
+        import duckdb
+        from output_sinks import DuckDBSink
+        
+        database_path = os.path.join(self.tmp_dir, 'lyrics.duckdb')
+        result = self._run_offline(DuckDBSink(database_path))
+        
+        # Verificações
+        self.assertEqual(result['status'], 'success')
+        with duckdb.connect(database_path) as connection:
+            count = connection.execute('SELECT COUNT(*) FROM raw_lyrics').fetchone()[0]
+            columns = [row[0] for row in connection.execute('DESCRIBE processed_lyrics').fetchall()]
+        self.assertEqual(count, 3)
+        self.assertIn('readability_score', columns)
+    
+    def test_rollups_are_idempotent_across_runs(self):
+        """Testa que reprocessar as mesmas músicas não conta de novo nos rollups"""
+        import duckdb
+        from output_sinks import DuckDBSink
+        
+        database_path = os.path.join(self.tmp_dir, 'lyrics.duckdb')
+        first = self._run_offline(DuckDBSink(database_path))
+        second = self._run_offline(DuckDBSink(database_path))
+        
+        # Verificações
+        self.assertIn('sentiment_rollup', first['tables_updated'])
+        self.assertEqual(second['status'], 'success')
+        with duckdb.connect(database_path) as connection:
+            songs, analyzed = connection.execute(
+                'SELECT SUM(song_count), SUM(sentiment_count) FROM sentiment_rollup'
+            ).fetchone()
+            pop = connection.execute(
+                "SELECT SUM(song_count) FROM artist_rollup WHERE genre = 'Pop'"
+            ).fetchone()[0]
+            love = connection.execute(
+                "SELECT SUM(song_count) FROM word_rollup WHERE word = 'love'"
+            ).fetchone()[0]
+            short_words = connection.execute(
+                'SELECT COUNT(*) FROM word_rollup WHERE LENGTH(word) < 3'
+            ).fetchone()[0]
+        self.assertEqual((songs, analyzed), (3, 3))
+        self.assertEqual(pop, 2)
+        self.assertEqual(love, 2)
+        self.assertEqual(short_words, 0)
+
+
+
+class TestMergeLoading(unittest.TestCase):
+    """Testes para a carga idempotente via staging + MERGE"""
+    
+    def setUp(self):
+        from output_sinks import BigQuerySink
+        self.client = MagicMock()
+        self.sink = BigQuerySink(self.client, 'p', 'd', load_mode='merge')
+    
+    def test_merge_sql_uses_table_keys(self):
+        """Testa chaves de MERGE e deduplicação do lote"""
+        sql = self.sink.build_merge_sql('processed_lyrics', 'p.d.processed_lyrics', 'p.d.stg')
+        
+        # Verificações
+        self.assertIn('ON T.id = S.id', sql)
+        self.assertIn('PARTITION BY id', sql)
+        self.assertIn('title = S.title', sql)
+        self.assertNotIn(' id = S.id,', sql)
+        self.assertIn('WHEN NOT MATCHED THEN INSERT ROW', sql)
+    
+    def test_word_frequency_is_replaced_per_song(self):
+        """Testa a substituição das palavras de cada música do lote em uma transação"""
+        self.sink.write_tables({'word_frequency': pd.DataFrame({'lyrics_id': ['1'], 'word': ['love']})})
+        sql = self.client.query.call_args[0][0]
+        
+        # Verificações
+        self.assertTrue(sql.startswith('BEGIN TRANSACTION;'))
+        self.assertIn('PARTITION BY lyrics_id, word', sql)
+        self.assertIn('DELETE FROM `p.d.word_frequency`\nWHERE lyrics_id IN', sql)
+        self.assertTrue(sql.endswith('COMMIT TRANSACTION;'))
+        self.assertNotIn('MERGE', sql)
+    
+    def _run_merge(self, sql, table_name, target_df, batch_df) -> pd.DataFrame:
+        """Executa no DuckDB o SQL de carga gerado para o BigQuery e retorna a tabela final"""
+        import duckdb
+        from query_backends import to_duckdb_sql
+        
+        sql = to_duckdb_sql(sql)
+        sql = sql.replace('MERGE ', 'MERGE INTO ', 1).replace('INSERT ROW', 'INSERT *')
+        with duckdb.connect() as connection:
+            connection.execute(f'CREATE TABLE "{table_name}" AS SELECT * FROM target_df')
+            connection.execute('CREATE TABLE "staging" AS SELECT * FROM batch_df')
+            connection.execute(sql)
+            return connection.execute(f'SELECT * FROM "{table_name}"').df()
+    
+    def test_partial_profile_merge_keeps_full_values(self):
+        """Testa MERGE de um lote sentiment-only sobre uma linha de execução completa"""
+        from output_sinks import BigQuerySink
+        
+        full_row = pd.DataFrame({
+            'id': ['1'], 'title': ['Song'], 'artist': ['A'],
+            'word_count': [10], 'unique_words': [8], 'avg_word_length': [4.5],
+            'readability_score': [70.0], 'language': ['en'],
+            'processed_text': ['love song'], 'tokens': ['["love", "song"]'],
+            'processed_at': ['2024-01-01T00:00:00']
+        })
+        partial_row = full_row.assign(
+            title='Song (Remaster)', word_count=None, unique_words=None, avg_word_length=None,
+            readability_score=None, processed_text=None, tokens=None,
+            processed_at='2024-02-01T00:00:00'
+        )
+        sink = BigQuerySink(self.client, 'p', 'd', load_mode='merge',
+                            analysis_profile='sentiment-only')
+        
+        sql = sink.build_merge_sql('processed_lyrics', 'p.d.processed_lyrics', 'p.d.staging')
+        merged = self._run_merge(sql, 'processed_lyrics', full_row, partial_row).iloc[0]
+        
+        # Verificações
+        self.assertNotIn('word_count = S.word_count', sql)
+        self.assertEqual(merged['title'], 'Song (Remaster)')
+        self.assertEqual(merged['processed_at'], '2024-02-01T00:00:00')
+        self.assertEqual(merged['word_count'], 10)
+        self.assertEqual(merged['readability_score'], 70.0)
+        self.assertEqual(merged['tokens'], '["love", "song"]')
+    
+    def test_replace_drops_stale_words_and_keeps_full_values(self):
+        """Testa lote stats-only substituindo as palavras de uma execução completa"""
+        from output_sinks import BigQuerySink
+        
+        full_rows = pd.DataFrame({
+            'lyrics_id': ['1', '1', '2'], 'word': ['love', 'baby', 'love'],
+            'frequency': [3, 2, 1], 'tf_idf': [0.4, 0.3, 0.2], 'pos_tag': ['NN', 'NN', 'NN'],
+            'is_stopword': [False, False, False], 'created_at': ['2024-01-01T00:00:00'] * 3
+        })
+        partial_rows = pd.DataFrame({
+            'lyrics_id': ['1', '1', '1'], 'word': ['love', 'fire', 'fire'],
+            'frequency': [5, 1, 1], 'tf_idf': [None, None, None], 'pos_tag': [None, None, None],
+            'is_stopword': [False, False, False], 'created_at': ['2024-02-01T00:00:00'] * 3
+        })
+        sink = BigQuerySink(self.client, 'p', 'd', load_mode='merge', analysis_profile='stats-only')
+        
+        sql = sink.build_replace_sql('word_frequency', 'p.d.word_frequency', 'p.d.staging')
+        merged = self._run_merge(sql, 'word_frequency', full_rows, partial_rows)
+        words = merged.set_index(['lyrics_id', 'word'])
+        
+        # Verificações
+        self.assertEqual(sorted(words.index), [('1', 'fire'), ('1', 'love'), ('2', 'love')])
+        self.assertEqual(words.loc[('1', 'love'), 'frequency'], 5)
+        self.assertEqual(words.loc[('1', 'love'), 'tf_idf'], 0.4)
+        self.assertEqual(words.loc[('1', 'love'), 'pos_tag'], 'NN')
+        self.assertTrue(pd.isna(words.loc[('1', 'fire'), 'tf_idf']))
+        self.assertEqual(words.loc[('2', 'love'), 'frequency'], 1)
+
+    def test_batch_duplicates_keep_latest_row(self):
+        """Testa que, entre linhas repetidas do lote, vence a de carga mais recente"""
+        from config import Config
+        
+        def rows(table_name, **values):
+            columns = [column['name'] for column in Config.get_table_schema(table_name)]
+            return pd.DataFrame([{column: values.get(column) for column in columns}])
+        
+        target = rows('processed_lyrics', id='0', title='Other', processed_at='2024-01-01T00:00:00')
+        older = rows('processed_lyrics', id='1', title='Old', processed_at='2024-01-01T00:00:00')
+        newer = older.assign(title='New', processed_at='2024-02-01T00:00:00')
+        words = rows('word_frequency', lyrics_id='1', word='love', frequency=1,
+                     created_at='2024-01-01T00:00:00')
+        newer_words = words.assign(frequency=7, created_at='2024-02-01T00:00:00')
+        merge_sql = self.sink.build_merge_sql('processed_lyrics', 'p.d.processed_lyrics', 'p.d.staging')
+        replace_sql = self.sink.build_replace_sql('word_frequency', 'p.d.word_frequency', 'p.d.staging')
+        
+        for batch in (pd.concat([older, newer]), pd.concat([newer, older])):
+            merged = self._run_merge(merge_sql, 'processed_lyrics', target, batch)
+            self.assertEqual(merged.set_index('id').loc['1', 'title'], 'New')
+        for batch in (pd.concat([words, newer_words]), pd.concat([newer_words, words])):
+            replaced = self._run_merge(replace_sql, 'word_frequency', words.iloc[:0], batch)
+            self.assertEqual(replaced['frequency'].tolist(), [7])
+        
+        # Verificações
+        self.assertIn('PARTITION BY id ORDER BY processed_at DESC', merge_sql)
+        self.assertIn('PARTITION BY lyrics_id, word ORDER BY created_at DESC', replace_sql)
+
+    def test_staging_table_is_dropped_on_failure(self):
+        """Testa remoção da staging mesmo quando o MERGE falha"""
+        self.client.query.side_effect = RuntimeError('merge failed')
+        df = pd.DataFrame({'id': ['1'], 'title': ['Song']})
+        
+        with self.assertRaises(RuntimeError):
+            self.sink.write_tables({'raw_lyrics': df})
+        
+        # Verificações
+        staging_table = self.client.create_table.call_args_list[-1][0][0]
+        self.assertIn('raw_lyrics__staging_', staging_table.table_id)
+        self.assertIsNotNone(staging_table.expires)
+        load_target = self.client.load_table_from_file.call_args[0][1]
+        self.assertEqual(load_target, f"p.d.{staging_table.table_id}")
+        self.client.delete_table.assert_called_once_with(load_target, not_found_ok=True)
+
+
+
+class TestRollups(unittest.TestCase):
+    """Testes para os deltas de rollup de cada lote"""
+    
+    def setUp(self):
+        self.raw_df = pd.DataFrame({
+            'id': ['1', '2', '3'],
+            'artist': ['A', 'A', 'B'],
+            'genre': ['Pop', 'Pop', 'Rock'],
+            'year': [2001, 2003, None]
+        })
+        self.processed_df = pd.DataFrame({
+            'id': ['1', '2'],
+            'word_count': [10, 20],
+            'unique_words': [8, 12],
+            'avg_word_length': [4.0, 5.0],
+            'readability_score': [60.0, None]
+        })
+        self.sentiment_df = pd.DataFrame({
+            'lyrics_id': ['1', '2', '3'],
+            'sentiment_score': [0.5, -0.3, 0.1],
+            'sentiment_label': ['positive', 'negative', 'neutral'],
+            'confidence': [0.5, 0.3, 0.1]
+        })
+        self.word_freq_df = pd.DataFrame({
+            'lyrics_id': ['1', '1', '2', '3'],
+            'word': ['love', 'the', 'love', 'oh'],
+            'frequency': [3, 9, 2, 5],
+            'tf_idf': [0.4, None, 0.2, 0.1],
+            'is_stopword': [False, True, False, False]
+        })
+    
+    def test_compute_rollups_additive_measures(self):
+        """Testa somas e contagens por chave, com chaves nulas preservadas"""
+        from rollups import compute_rollups
+        
+        rollups = compute_rollups(self.raw_df, self.processed_df,
+                                  self.word_freq_df, self.sentiment_df)
+        sentiment = rollups['sentiment_rollup'].set_index(['genre', 'year'])
+        artist = rollups['artist_rollup'].set_index(['artist', 'genre'])
+        words = rollups['word_rollup']
+        
+        # Verificações
+        self.assertEqual(len(sentiment), 3)
+        self.assertAlmostEqual(sentiment.loc[('Pop', 2001), 'sentiment_sq_sum'], 0.25)
+        self.assertEqual(sentiment['readability_count'].sum(), 1)
+        self.assertEqual(sentiment['processed_count'].sum(), 2)
+        self.assertEqual(artist.loc[('A', 'Pop'), 'song_count'], 2)
+        self.assertEqual(artist.loc[('A', 'Pop'), ['first_year', 'last_year']].tolist(), [2001, 2003])
+        self.assertEqual(artist.loc[('A', 'Pop'), 'word_count_sum'], 30)
+        self.assertEqual(sorted(words['word']), ['love', 'love'])
+        self.assertEqual(set(words['sentiment_label']), {'positive', 'negative'})
+        self.assertEqual(words['frequency_sum'].sum(), 5)
+        self.assertTrue(rollups['sentiment_rollup']['updated_at'].notna().all())
+    
+    def test_processed_count_only_counts_text_stats(self):
+        """Testa que linhas sem text_stats (perfil parcial) não diluem as médias de texto"""
+        from rollups import compute_rollups
+        
+        processed_df = self.processed_df.copy()
+        processed_df.loc[1, ['word_count', 'unique_words', 'avg_word_length']] = None
+        
+        rollups = compute_rollups(self.raw_df, processed_df, self.word_freq_df, self.sentiment_df)
+        artist = rollups['artist_rollup'].set_index(['artist', 'genre'])
+        
+        # Verificações
+        self.assertEqual(artist.loc[('A', 'Pop'), 'song_count'], 2)
+        self.assertEqual(artist.loc[('A', 'Pop'), 'processed_count'], 1)
+        self.assertEqual(artist.loc[('A', 'Pop'), 'word_count_sum'], 10)
+    
+    def test_empty_batch_has_no_deltas(self):
+        """Testa lote vazio sem deltas"""
+        from rollups import compute_rollups
+        
+        rollups = compute_rollups(pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame())
+        
+        # Verificações
+        self.assertTrue(all(df.empty for df in rollups.values()))
+    
+    def test_refresh_sql_replaces_touched_keys(self):
+        """Testa o MERGE que substitui as chaves do lote pelos valores recalculados"""
+        from rollups import build_refresh_sql
+        
+        sql = build_refresh_sql('artist_rollup', 'p.d.artist_rollup', 'p.d.stg',
+                                lambda name: f'p.d.{name}')
+        
+        # Verificações
+        self.assertIn('ON T.artist IS NOT DISTINCT FROM S.artist AND T.genre IS NOT DISTINCT FROM S.genre', sql)
+        self.assertIn('song_count = S.song_count', sql)
+        self.assertNotIn('IFNULL(T.', sql)
+        self.assertIn('MIN(year) AS first_year', sql)
+        self.assertIn('FROM `p.d.raw_lyrics`', sql)
+        self.assertIn('PARTITION BY id ORDER BY created_at DESC', sql)
+        # Músicas das chaves tocadas são filtradas antes da deduplicação
+        self.assertIn('WHERE id IN (SELECT id FROM touched_ids)\n    QUALIFY', sql)
+        self.assertIn('WHERE lyrics_id IN (SELECT id FROM touched_ids)\n    QUALIFY', sql)
+        self.assertIn('FROM `p.d.stg` K WHERE K.artist IS NOT DISTINCT FROM candidates.artist', sql)
+        self.assertNotIn('artist = ', sql)
+    
+    def test_refresh_query_uses_deduplicated_base_tables(self):
+        """Testa o recálculo no DuckDB com linhas repetidas e chaves fora do lote"""
+        import duckdb
+        from query_backends import to_duckdb_sql
+        from rollups import build_refresh_query
+        
+        raw_df = self.raw_df.assign(created_at=pd.Timestamp('2024-01-01'))
+        processed_df = self.processed_df.assign(processed_at=pd.Timestamp('2024-01-01'))
+        sentiment_df = self.sentiment_df.assign(analyzed_at=pd.Timestamp('2024-01-01'))
+        word_freq_df = self.word_freq_df.assign(created_at=pd.Timestamp('2024-01-01'))
+        # Reprocessamento anexado: músicas e palavras repetidas nas tabelas base,
+        # e uma música de A que saiu de Pop na versão mais recente
+        moved = pd.DataFrame({'id': ['4', '4'], 'artist': ['A', 'A'], 'genre': ['Pop', 'Rock'],
+                              'year': [2005, 2005],
+                              'created_at': [pd.Timestamp('2024-01-01'), pd.Timestamp('2024-02-01')]})
+        raw_lyrics = pd.concat([raw_df, raw_df, moved])
+        word_frequency = pd.concat([word_freq_df, word_freq_df])
+        keys = pd.DataFrame({'artist': ['A'], 'genre': ['Pop']})
+        word_keys = pd.DataFrame({'year': [2001], 'sentiment_label': ['positive'], 'word': ['love']})
+        
+        with duckdb.connect() as connection:
+            for name, df in [('raw_lyrics', raw_lyrics), ('processed_lyrics', processed_df),
+                             ('sentiment_analysis', sentiment_df), ('word_frequency', word_frequency),
+                             ('keys', keys), ('word_keys', word_keys)]:
+                connection.register(name, df)
+            artist = connection.execute(to_duckdb_sql(
+                build_refresh_query('artist_rollup', lambda name: name, 'keys')
+            )).df()
+            words = connection.execute(to_duckdb_sql(
+                build_refresh_query('word_rollup', lambda name: name, 'word_keys')
+            )).df()
+        
+        # Verificações
+        self.assertEqual(len(artist), 1)
+        self.assertEqual(artist.loc[0, 'song_count'], 2)
+        self.assertEqual(artist.loc[0, 'processed_count'], 2)
+        self.assertEqual(artist.loc[0, 'word_count_sum'], 30)
+        self.assertEqual(artist.loc[0, ['first_year', 'last_year']].tolist(), [2001, 2003])
+        self.assertEqual(words[['word', 'frequency_sum', 'song_count']].values.tolist(), [['love', 3, 1]])
+    
+    def test_bigquery_sink_merges_rollups(self):
+        """Testa rollups do BigQuery via staging e MERGE de substituição"""
+        from output_sinks import BigQuerySink
+        from rollups import compute_rollups
+        
+        client = MagicMock()
+        sink = BigQuerySink(client, 'p', 'd', load_mode='append')
+        rollups = compute_rollups(self.raw_df, self.processed_df,
+                                  self.word_freq_df, self.sentiment_df)
+        
+        rows = sink.write_rollups(rollups)
+        
+        # Verificações
+        self.assertEqual(rows, {'sentiment_rollup': 3, 'word_rollup': 2, 'artist_rollup': 2})
+        merges = [c[0][0] for c in client.query.call_args_list]
+        self.assertEqual(len(merges), 3)
+        self.assertTrue(all('IS NOT DISTINCT FROM' in sql for sql in merges))
+        self.assertEqual(client.delete_table.call_count, 3)
+
+
+class TestSharding(unittest.TestCase):
+    """Testes para particionamento dos arquivos entre tarefas"""
+    
+    def _blobs(self, sizes):
+        blobs = []
+        for i, size in enumerate(sizes):
+            blob = Mock(size=size)
+            blob.name = f"raw-data/file_{i:03d}.json"
+            blobs.append(blob)
+        return blobs
+    
+    def test_shards_cover_listing_and_balance_bytes(self):
+        """Testa cobertura completa e balanceamento por tamanho"""
+        from sharding import assign_shards
+        
+        blobs = self._blobs([100, 90, 80, 10, 10, 10, 5, 5, 1, 1])
+        shards = assign_shards(blobs, 3)
+        
+        # Verificações
+        names = sorted(b.name for shard in shards for b in shard)
+        self.assertEqual(names, sorted(b.name for b in blobs))
+        loads = [sum(b.size for b in shard) for shard in shards]
+        self.assertLessEqual(max(loads) - min(loads), 20)
+    
+    def test_manifest_freezes_listing_for_retries(self):
+        """Testa estabilidade da atribuição entre tentativas e após novos uploads"""
+        import tempfile
+        import shutil
+        from sharding import ShardManifest, select_shard
+        
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, True)
+        location = ShardManifest.location_for(tmp_dir, 'job-abc', 'raw-data/')
+        
+        blobs = self._blobs([7, 3, 9, 1, 4, 4, 6])
+        first = [e.name for e in select_shard(ShardManifest(location).freeze(blobs), 1, 3)]
+        
+        # Nova tentativa depois de novos uploads e com tamanhos diferentes
+        later = self._blobs([50, 1, 1, 80, 2, 2, 3, 90, 90, 90])
+        retry = [e.name for e in select_shard(ShardManifest(location).freeze(later), 1, 3)]
+        
+        # Verificações
+        self.assertEqual(first, retry)
+        self.assertEqual(first, [b.name for b in select_shard(blobs, 1, 3)])
+        self.assertNotEqual(location, ShardManifest.location_for(tmp_dir, 'job-def', 'raw-data/'))
+    
+    def test_processor_uses_task_env_vars(self):
+        """Testa shard escolhido pelas variáveis do Cloud Run em fonte local"""
+        import tempfile
+        import shutil
+        from output_sinks import ParquetSink
+        
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, True)
+        for i in range(4):
+            with open(os.path.join(tmp_dir, f"song_{i}.txt"), 'w') as f:
+                f.write(f"Song {i}\n" + "la " * (10 * (i + 1)))
+        
+        selected = []
+        for task_index in range(2):
+            env = {'CLOUD_RUN_TASK_INDEX': str(task_index), 'CLOUD_RUN_TASK_COUNT': '2'}
+            with patch.dict(os.environ, env):
+                processor = LyricsETLProcessor('t', 't', 't', input_dir=tmp_dir,
+                                               sink=ParquetSink(os.path.join(tmp_dir, 'out')))
+            selected.append({b.name for b in processor.list_input_blobs('')})
+        
+        # Verificações
+        self.assertEqual(processor.task_count, 2)
+        self.assertFalse(selected[0] & selected[1])
+        self.assertEqual(len(selected[0] | selected[1]), 4)
+    
+    def test_processor_shards_frozen_listing(self):
+        """Testa tarefas de uma execução usando o manifesto mesmo com uploads entre elas"""
+        import tempfile
+        import shutil
+        from config import Config
+        from output_sinks import ParquetSink
+        
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, True)
+        input_dir = os.path.join(tmp_dir, 'input')
+        os.makedirs(input_dir)
+        
+        def write_song(i, words):
+            with open(os.path.join(input_dir, f"song_{i}.txt"), 'w') as f:
+                f.write(f"Song {i}\n" + "la " * words)
+        
+        for i, words in enumerate([400, 10, 10, 10, 10]):
+            write_song(i, words)
+        
+        selected = []
+        for task_index in range(2):
+            env = {'CLOUD_RUN_TASK_INDEX': str(task_index), 'CLOUD_RUN_TASK_COUNT': '2',
+                   'CLOUD_RUN_EXECUTION': 'job-abc'}
+            with patch.dict(os.environ, env), \
+                    patch.object(Config, 'SHARD_MANIFEST_PATH', os.path.join(tmp_dir, 'manifests')):
+                processor = LyricsETLProcessor('t', 't', 't', input_dir=input_dir,
+                                               sink=ParquetSink(os.path.join(tmp_dir, 'out')))
+                selected.append({b.name for b in processor.list_input_blobs('')})
+            # Upload depois da primeira tarefa listar: fica para a próxima execução
+            write_song(9, 1000)
+        
+        # Verificações: o arquivo grande fica sozinho e o upload tardio não entra
+        self.assertFalse(selected[0] & selected[1])
+        self.assertEqual(selected[0] | selected[1], {f"song_{i}.txt" for i in range(5)})
+        self.assertIn({'song_0.txt'}, selected)
+
+
+
+class TestCheckpointResume(unittest.TestCase):
+    """Testes para checkpoint por lote, retomada e dead-letter"""
+    
+    def setUp(self):
+        """Diretório local com três arquivos válidos e um inválido"""
+        import tempfile
+        self.tmp_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.tmp_dir, 'input')
+        os.makedirs(self.input_dir)
+        for i in range(3):
+            with open(os.path.join(self.input_dir, f"song_{i}.txt"), 'w') as f:
+                f.write(f"Song {i}\nlove and rain in the morning number {i}")
+        with open(os.path.join(self.input_dir, 'broken.json'), 'w') as f:
+            f.write('{"title": "Broken"')
+        
+        self.sink = MagicMock()
+        self.sink.name = 'mock'
+        self.sink.write_tables.return_value = {}
+        with patch('etl_processor.cloud_logging.Client'):
+            self.processor = LyricsETLProcessor(
+                't', 't', 't', sink=self.sink, input_dir=self.input_dir,
+                checkpoint_path=os.path.join(self.tmp_dir, 'state', 'checkpoint.jsonl'),
+                dead_letter_path=os.path.join(self.tmp_dir, 'state', 'dead_letter.jsonl')
+            )
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+    
+    def test_resume_skips_committed_batches(self):
+        """Testa que a retomada processa apenas lotes não confirmados"""
+        self.sink.write_tables.side_effect = [{}, RuntimeError('OOM'), {}]
+        
+        with patch.object(self.processor.config, 'BATCH_SIZE', 2):
+            first = self.processor.run_etl_pipeline('')
+            resumed = self.processor.run_etl_pipeline('', resume=True)
+        
+        # Verificações
+        self.assertEqual(first['status'], 'error')
+        self.assertEqual(first['committed_batches'], 1)
+        self.assertEqual(first['processed_count'], 1)
+        self.assertEqual(resumed['status'], 'success')
+        self.assertEqual(resumed['skipped_files'], 2)
+        self.assertEqual(resumed['processed_count'], 2)
+    
+    def test_failed_files_go_to_dead_letter_and_reprocess(self):
+        """Testa envio de falhas para a dead-letter e reprocessamento isolado"""
+        result = self.processor.run_etl_pipeline('')
+        entries = self.processor.dead_letter.read()
+        
+        # Verificações
+        self.assertEqual(result['processed_count'], 3)
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['stage'], 'extract')
+        self.assertEqual(entries[0]['file_path'], 'broken.json')
+        
+        # Corrigir o arquivo e reprocessar apenas a dead-letter
+        with open(os.path.join(self.input_dir, 'broken.json'), 'w') as f:
+            f.write('{"title": "Fixed", "lyrics": "fixed lyrics of love"}')
+        self.sink.write_tables.reset_mock()
+        
+        reprocessed = self.processor.reprocess_dead_letter()
+        
+        self.assertEqual(reprocessed['processed_count'], 1)
+        self.assertEqual(reprocessed['still_failing'], 0)
+        self.assertEqual(self.processor.dead_letter.read(), [])
+        raw_df = self.sink.write_tables.call_args[0][0]['raw_lyrics']
+        self.assertEqual(list(raw_df['title']), ['Fixed'])
+    
+    def test_gcs_appends_write_one_object_per_batch(self):
+        """Testa appends no GCS sem reler/reescrever o objeto e sem perder escritores concorrentes"""
+        from checkpoint import JsonLinesFile
+        bucket = _FakeGCSBucket()
+        client = MagicMock()
+        client.bucket.return_value = bucket
+        
+        writer = JsonLinesFile('gs://state/checkpoints/etl.jsonl', client)
+        other = JsonLinesFile('gs://state/checkpoints/etl.jsonl', client)
+        for i in range(3):
+            writer.append([{'batch': i}])
+        other.append([{'batch': 'concurrent'}])
+        
+        # Verificações: uma parte por append, criada com precondição e nunca relida
+        self.assertEqual(len(bucket.objects), 4)
+        self.assertTrue(all(name.startswith('checkpoints/etl.jsonl/') for name in bucket.objects))
+        self.assertEqual(bucket.preconditions, [0, 0, 0, 0])
+        self.assertEqual(bucket.downloads, 0)
+        self.assertEqual(sorted(str(entry['batch']) for entry in writer.read()),
+                         ['0', '1', '2', 'concurrent'])
+        
+        writer.reset()
+        self.assertEqual(bucket.objects, {})
+    
+    def test_tfidf_is_fitted_per_batch_without_model(self):
+        """Testa TF-IDF por lote sem modelo persistido e comparável entre lotes com modelo"""
+        from config import TestingConfig
+        config = TestingConfig()
+        config.TFIDF_MIN_DF = 1
+        config.TFIDF_MAX_DF = 1.0
+        songs = ['sunshine love river', 'love rain storm', 'rain river night', 'night love dance']
+        input_dir = os.path.join(self.tmp_dir, 'tfidf')
+        os.makedirs(input_dir)
+        for i, lyrics in enumerate(songs):
+            with open(os.path.join(input_dir, f"song_{i}.txt"), 'w') as f:
+                f.write(f"Song {i}\n{lyrics}")
+        with patch('etl_processor.cloud_logging.Client'):
+            processor = LyricsETLProcessor(
+                't', 't', 't', sink=self.sink, input_dir=input_dir, config=config,
+                checkpoint_path=os.path.join(self.tmp_dir, 'state', 'tfidf.jsonl'),
+                dead_letter_path=os.path.join(self.tmp_dir, 'state', 'tfidf_dead.jsonl')
+            )
+        
+        def word_scores(batch_size):
+            self.sink.write_tables.reset_mock()
+            config.BATCH_SIZE = batch_size
+            processor.run_etl_pipeline('')
+            frames = [call[0][0]['word_frequency'] for call in self.sink.write_tables.call_args_list]
+            return pd.concat(frames).set_index(['lyrics_id', 'word'])['tf_idf'].sort_index()
+        
+        per_batch = word_scores(2)
+        shared = word_scores(10)
+        
+        # Verificações: sem modelo, o IDF vem de cada lote e os scores mudam com o lote
+        self.assertFalse(per_batch.round(6).equals(shared.round(6)))
+        
+        processor.fit_tfidf_model(songs)
+        pd.testing.assert_series_equal(word_scores(2), word_scores(10))
+
+
+class _FakeGCSBucket:
+    """Bucket do Cloud Storage em memória (list_blobs, upload com precondição, delete)"""
+    
+    def __init__(self):
+        self.objects = {}
+        self.preconditions = []
+        self.downloads = 0
+    
+    def blob(self, name):
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+        bucket = self
+        blob = MagicMock()
+        blob.name = name
+        
+        def upload_from_string(data, content_type=None, if_generation_match=None):
+            bucket.preconditions.append(if_generation_match)
+            if if_generation_match == 0 and name in bucket.objects:
+                raise PreconditionFailed(name)
+            bucket.objects[name] = data
+        
+        def download_as_text():
+            if name not in bucket.objects:
+                raise NotFound(name)
+            bucket.downloads += 1
+            return bucket.objects[name]
+        
+        def delete():
+            if bucket.objects.pop(name, None) is None:
+                raise NotFound(name)
+        
+        blob.upload_from_string.side_effect = upload_from_string
+        blob.download_as_text.side_effect = download_as_text
+        blob.delete.side_effect = delete
+        return blob
+    
+    def list_blobs(self, prefix='', start_offset=None):
+        return [self.blob(name) for name in sorted(self.objects)
+                if name.startswith(prefix) and (start_offset is None or name >= start_offset)]
+
+
+
+class TestPipelineMetrics(unittest.TestCase):
+    """Testes para as métricas por estágio"""
+    
+    def test_stage_aggregates_calls(self):
+        """Testa acumulado de tempo, registros, bytes e percentis"""
+        from metrics import PipelineMetrics
+        metrics = PipelineMetrics()
+        for seconds in (0.1, 0.2, 0.3):
+            metrics.record('clean', seconds, records=1, bytes_in=10, bytes_out=8)
+        metrics.record('tfidf', 2.0, records=4)
+        
+        stages = metrics.to_dict()
+        
+        # Verificações
+        self.assertEqual(stages['clean']['calls'], 3)
+        self.assertEqual(stages['clean']['bytes_in'], 30)
+        self.assertEqual(stages['clean']['bytes_out'], 24)
+        self.assertAlmostEqual(stages['clean']['records_per_second'], 5.0)
+        self.assertAlmostEqual(stages['clean']['latency_seconds']['p50'], 0.2)
+        # Estágios em lote registram a latência média por registro
+        self.assertAlmostEqual(stages['tfidf']['latency_seconds']['p99'], 0.5)
+    
+    def test_nested_stage_peak_memory(self):
+        """Testa que o pico de um estágio interno conta para o externo"""
+        from metrics import PipelineMetrics
+        metrics = PipelineMetrics(track_memory=True)
+        metrics.start()
+        try:
+            with metrics.stage('outer'):
+                with metrics.stage('inner'):
+                    buffer = bytearray(2_000_000)
+                    del buffer
+        finally:
+            metrics.stop()
+        
+        stages = metrics.to_dict()
+        
+        # Verificações
+        self.assertGreaterEqual(stages['inner']['peak_memory_bytes'], 2_000_000)
+        self.assertGreaterEqual(stages['outer']['peak_memory_bytes'],
+                                stages['inner']['peak_memory_bytes'])
+    
+    def test_reports(self):
+        """Testa relatórios JSON e Prometheus textfile"""
+        import tempfile
+        from metrics import PipelineMetrics
+        metrics = PipelineMetrics()
+        metrics.record('load_raw_lyrics', 0.5, records=10, bytes_in=100)
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_path = metrics.write_report(os.path.join(tmp_dir, 'etl.json'),
+                                             extra={'status': 'success'})
+            prom_path = metrics.write_report(os.path.join(tmp_dir, 'etl.prom'))
+            with open(json_path) as f:
+                report = json.load(f)
+            with open(prom_path) as f:
+                prom = f.read()
+        
+        # Verificações
+        self.assertEqual(report['status'], 'success')
+        self.assertEqual(report['stages']['load_raw_lyrics']['records'], 10)
+        self.assertIn('# TYPE lyrics_etl_stage_wall_seconds gauge', prom)
+        self.assertIn('lyrics_etl_stage_records{stage="load_raw_lyrics"} 10', prom)
+        self.assertIn('quantile="0.99"', prom)
+    
+    def test_latency_window_is_bounded(self):
+        """Testa que as latências guardadas por estágio têm tamanho limitado"""
+        from metrics import LATENCY_WINDOW, PipelineMetrics
+        metrics = PipelineMetrics()
+        for _ in range(LATENCY_WINDOW + 50):
+            metrics.record('clean', 0.001)
+        
+        # Verificações
+        self.assertEqual(len(metrics._stages['clean'].latencies), LATENCY_WINDOW)
+        self.assertEqual(metrics.to_dict()['clean']['calls'], LATENCY_WINDOW + 50)
+    
+    def test_pipeline_reports_stage_metrics(self):
+        """Testa que a execução retorna métricas de todos os estágios"""
+        import tempfile
+        from output_sinks import ParquetSink
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_dir = os.path.join(tmp_dir, 'input')
+            os.makedirs(input_dir)
+            for i in range(2):
+                with open(os.path.join(input_dir, f"song_{i}.txt"), 'w') as f:
+                    f.write(f"Song {i}\nHappy love songs make a sunny day number {i}.")
+            
+            with patch('etl_processor.cloud_logging.Client'):
+                processor = LyricsETLProcessor(
+                    't', 't', 't', sink=ParquetSink(os.path.join(tmp_dir, 'out')),
+                    input_dir=input_dir,
+                    checkpoint_path=os.path.join(tmp_dir, 'checkpoint.jsonl'),
+                    dead_letter_path=os.path.join(tmp_dir, 'dead_letter.jsonl')
+                )
+            result = processor.run_etl_pipeline('')
+        
+        stages = result['stage_metrics']
+        
+        # Verificações
+        self.assertEqual(result['status'], 'success')
+        for stage in ('extract', 'parse', 'clean', 'tokenize', 'readability', 'tfidf',
+                      'pos', 'sentiment', 'dataframe', 'load_raw_lyrics',
+                      'load_sentiment_analysis'):
+            self.assertIn(stage, stages)
+        self.assertEqual(stages['sentiment']['records'], 2)
+        self.assertGreater(stages['extract']['bytes_in'], 0)
+
+
+
+class TestProfiling(unittest.TestCase):
+    """Testes para o modo de profiling"""
+    
+    def setUp(self):
+        with patch('etl_processor.storage.Client'), \
+             patch('etl_processor.bigquery.Client'), \
+             patch('etl_processor.cloud_logging.Client'):
+            self.processor = LyricsETLProcessor('t', 't', 't')
+    
+    def _workload(self, processor):
+        for _ in range(30):
+            processor._count_syllables('syllables')
+            processor._analyze_sentiment('I love this happy song but hate the rain')
+    
+    def test_cprofile_stage_hotspots(self):
+        """Testa relatório por estágio e arquivo pstats no modo determinístico"""
+        import tempfile
+        from profiling import PipelineProfiler
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with PipelineProfiler('cprofile', tmp_dir) as profiler:
+                self._workload(self.processor)
+            paths = profiler.write_reports()
+            
+            with open(paths['hotspots']) as f:
+                report = f.read()
+            self.assertTrue(os.path.exists(paths['pstats']))
+        
+        hotspots = profiler.stage_hotspots()
+        
+        # Verificações
+        readability = dict((row[0], row[1]) for row in hotspots['readability'])
+        self.assertEqual(readability['etl_processor:_count_syllables'], 30)
+        self.assertTrue(hotspots['sentiment'])
+        self.assertIn('[sentiment]', report)
+    
+    def test_sampling_writes_folded_stacks(self):
+        """Testa saída folded (flamegraph) no modo por amostragem"""
+        import tempfile
+        import time
+        from profiling import PipelineProfiler
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with PipelineProfiler('sampling', tmp_dir, interval=0.001) as profiler:
+                deadline = time.perf_counter() + 0.2
+                while time.perf_counter() < deadline:
+                    self._workload(self.processor)
+            paths = profiler.write_reports()
+            
+            with open(paths['folded']) as f:
+                lines = f.read().splitlines()
+        
+        # Verificações
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertGreater(int(count), 0)
+        self.assertTrue(any('etl_processor:_analyze_sentiment' in line for line in lines))
+    
+    def test_sampling_covers_worker_threads(self):
+        """Testa amostragem das threads de um pool (caminho paralelo)"""
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from profiling import PipelineProfiler
+        
+        def work():
+            deadline = time.perf_counter() + 0.2
+            while time.perf_counter() < deadline:
+                self._workload(self.processor)
+        
+        with PipelineProfiler('sampling', interval=0.001) as profiler:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                list(pool.map(lambda _: work(), range(2)))
+        
+        stacks = profiler._profiler.stacks
+        
+        # Verificações
+        worker_stacks = [stack for stack in stacks if stack.startswith('thread:ThreadPoolExecutor')]
+        self.assertTrue(any('etl_processor:_analyze_sentiment' in stack for stack in worker_stacks))
+        # A thread principal só espera o pool: nenhuma amostra ociosa
+        self.assertFalse(any(stack.startswith('thread:MainThread') for stack in stacks))
+        self.assertTrue(profiler.stage_hotspots()['sentiment'])
+    
+    def test_invalid_mode(self):
+        """Testa validação do modo de profiling"""
+        from profiling import PipelineProfiler
+        
+        with self.assertRaises(ValueError):
+            PipelineProfiler('perf')
+
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    """Testes para o gerador de corpus sintético e a comparação de benchmarks"""
+    
+    def test_corpus_is_deterministic(self):
+        """Testa que a mesma semente gera o mesmo corpus"""
+        from benchmark_etl import generate_corpus
+        
+        first = generate_corpus(20, vocabulary_size=50, seed=7)
+        second = generate_corpus(20, vocabulary_size=50, seed=7)
+        other = generate_corpus(20, vocabulary_size=50, seed=8)
+        
+        # Verificações
+        self.assertEqual(first, second)
+        self.assertNotEqual(first[0]['lyrics'], other[0]['lyrics'])
+        self.assertEqual(len(first[0]['lyrics'].split('\n')), 20)
+    
+    def test_corpus_duplicate_ratio(self):
+        """Testa a fração de letras duplicadas"""
+        from benchmark_etl import generate_corpus
+        
+        corpus = generate_corpus(400, lines_per_song=2, vocabulary_size=200,
+                                 duplicate_ratio=0.5)
+        unique = len({item['lyrics'] for item in corpus})
+        
+        # Verificações
+        self.assertEqual(len({item['id'] for item in corpus}), 400)
+        self.assertTrue(150 < unique < 250)
+    
+    def test_compare_flags_regressions(self):
+        """Testa detecção de queda de throughput e aumento de memória"""
+        from benchmark_etl import compare_reports
+        
+        def report(songs_per_second, peak, sentiment_rate):
+            return {'results': {'1000': {
+                'songs_per_second': songs_per_second,
+                'peak_memory_bytes': peak,
+                'stages': {'sentiment': {'records_per_second': sentiment_rate,
+                                         'peak_memory_bytes': 0}}
+            }}}
+        
+        baseline = report(100.0, 1000, 500.0)
+        
+        # Verificações
+        self.assertEqual(compare_reports(baseline, report(95.0, 1100, 480.0)), [])
+        regressions = compare_reports(baseline, report(80.0, 1300, 300.0))
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(any('[sentiment]' in regression for regression in regressions))
+    
+    def test_run_size_reports_components(self):
+        """Testa execução do benchmark em um corpus pequeno"""
+        from benchmark_etl import TransformBenchmark
+        
+        with patch('etl_processor.storage.Client'), \
+             patch('etl_processor.bigquery.Client'), \
+             patch('etl_processor.cloud_logging.Client'):
+            processor = LyricsETLProcessor('t', 't', 't')
+        
+        result = TransformBenchmark(processor, lines_per_song=3, vocabulary_size=100).run_size(10)
+        
+        # Verificações
+        self.assertEqual(result['songs'], 10)
+        self.assertGreater(result['songs_per_second'], 0)
+        self.assertGreater(result['peak_memory_bytes'], 0)
+        self.assertEqual(result['stages']['sentiment']['records'], 10)
+
+
+
+class TestAnalysisProfiles(unittest.TestCase):
+    """Testes para os perfis de análise"""
+    
+    def setUp(self):
+        self.lyrics = [
+            {'id': f'song_{i}', 'title': f'Song {i}', 'artist': 'Artist',
+             'lyrics': f'I love the sunshine and I hate the rain. Dancing all night {i}.'}
+            for i in range(3)
+        ]
+    
+    def _processor(self, profile):
+        with patch('etl_processor.storage.Client'), \
+             patch('etl_processor.bigquery.Client'), \
+             patch('etl_processor.cloud_logging.Client'):
+            return LyricsETLProcessor('t', 't', 't', analysis_profile=profile)
+    
+    def test_invalid_profile(self):
+        """Testa validação do nome do perfil"""
+        with self.assertRaises(ValueError):
+            self._processor('everything')
+    
+    def test_sentiment_only_profile(self):
+        """Testa que o perfil sentiment-only pula estatísticas e frequência"""
+        processor = self._processor('sentiment-only')
+        
+        with patch.object(processor, '_calculate_readability') as readability, \
+             patch.object(processor, '_tokenize_text') as tokenize:
+            processed_df, word_freq_df, sentiment_df = processor.transform_lyrics(self.lyrics)
+        
+        # Verificações
+        readability.assert_not_called()
+        tokenize.assert_not_called()
+        self.assertTrue(word_freq_df.empty)
+        self.assertEqual(len(processed_df), 3)
+        self.assertTrue(processed_df['word_count'].isna().all())
+        self.assertTrue(processed_df['tokens'].isna().all())
+        self.assertEqual(len(sentiment_df), 3)
+        self.assertTrue(sentiment_df['positive_words'].isna().all())
+        self.assertNotEqual(sentiment_df['sentiment_score'].iloc[0], 0.0)
+    
+    def test_stats_only_profile(self):
+        """Testa que o perfil stats-only deixa TF-IDF e POS nulos e omite sentimentos"""
+        processor = self._processor('stats-only')
+        
+        processed_df, word_freq_df, sentiment_df = processor.transform_lyrics(self.lyrics)
+        
+        # Verificações
+        self.assertTrue(sentiment_df.empty)
+        self.assertFalse(word_freq_df.empty)
+        self.assertTrue(word_freq_df['tf_idf'].isna().all())
+        self.assertTrue(word_freq_df['pos_tag'].isna().all())
+        self.assertTrue((processed_df['word_count'] > 0).all())
+    
+    def test_standard_profile_uses_unigrams(self):
+        """Testa que o perfil standard desliga bigramas e palavras de sentimento"""
+        processor = self._processor('standard')
+        
+        _, word_freq_df, sentiment_df = processor.transform_lyrics(self.lyrics)
+        
+        # Verificações
+        self.assertEqual(processor.tfidf_vectorizer.ngram_range, (1, 1))
+        self.assertTrue(word_freq_df['pos_tag'].notna().all())
+        self.assertTrue(sentiment_df['negative_words'].isna().all())
+
+
+
+class TestResourceTuning(unittest.TestCase):
+    """Testes para detecção de limites do cgroup e ajuste automático"""
+    
+    def setUp(self):
+        import tempfile
+        self.tmp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+    
+    def _write(self, relative_path, content):
+        path = os.path.join(self.tmp_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+    
+    def test_detect_cgroup_v2(self):
+        """Testa leitura de cpu.max, memory.max e working set (cgroup v2)"""
+        from resources import ResourceLimits
+        self._write('cpu.max', '50000 100000\n')
+        self._write('memory.max', str(512 * 2**20))
+        self._write('memory.current', str(300 * 2**20))
+        self._write('memory.stat', f"anon 1\ninactive_file {44 * 2**20}\n")
+        
+        limits = ResourceLimits.detect(self.tmp_dir)
+        
+        # Verificações
+        self.assertEqual(limits.cpus, 0.5)
+        self.assertEqual(limits.memory_bytes, 512 * 2**20)
+        self.assertEqual(limits.memory_usage(), 256 * 2**20)
+        self.assertAlmostEqual(limits.memory_pressure(), 0.5)
+    
+    def test_detect_cgroup_v1_unlimited(self):
+        """Testa cgroup v1 sem cota de CPU e sem limite de memória"""
+        from resources import ResourceLimits
+        self._write('cpu/cpu.cfs_quota_us', '-1')
+        self._write('cpu/cpu.cfs_period_us', '100000')
+        self._write('memory/memory.limit_in_bytes', '9223372036854771712')
+        
+        limits = ResourceLimits.detect(self.tmp_dir)
+        
+        # Verificações: recursos do host
+        self.assertGreaterEqual(limits.cpus, 1)
+        self.assertNotEqual(limits.memory_bytes, 9223372036854771712)
+    
+    def test_get_config_tunes_from_limits(self):
+        """Testa BATCH_SIZE e MAX_WORKERS calculados a partir dos limites"""
+        from config import Config, get_config
+        from resources import ResourceLimits
+        limits = ResourceLimits(cpus=2, memory_bytes=2 * 2**30, cgroup_root=self.tmp_dir)
+        
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop('BATCH_SIZE', None)
+            os.environ.pop('MAX_WORKERS', None)
+            config = get_config('production', limits)
+            testing = get_config('testing', limits)
+        
+        # Verificações: 2048MiB * 0.5 / 4MiB por arquivo
+        self.assertEqual(config.BATCH_SIZE, 256)
+        self.assertEqual(config.MAX_WORKERS, 4)
+        self.assertEqual(testing.BATCH_SIZE, 5)
+        
+        # BATCH_SIZE explícito no ambiente mantém o valor lido na importação
+        with patch.dict(os.environ, {'BATCH_SIZE': '7'}):
+            self.assertEqual(get_config('production', limits).BATCH_SIZE, Config.BATCH_SIZE)
+    
+    def test_adaptive_batch_sizer(self):
+        """Testa redução sob pressão de memória e recuperação gradual"""
+        from resources import AdaptiveBatchSizer
+        limits = MagicMock()
+        limits.memory_pressure.side_effect = [0.9, 0.9, 0.9, 0.7, 0.3, 0.3]
+        sizer = AdaptiveBatchSizer(100, 20, limits)
+        
+        sizes = [sizer.adjust() for _ in range(6)]
+        
+        # Verificações
+        self.assertEqual(sizes, [50, 25, 20, 20, 30, 45])
+    
+    def test_nlp_settings_flow_into_processor(self):
+        """Testa que TF-IDF e tamanho mínimo de palavra vêm da configuração"""
+        from config import TestingConfig
+        config = TestingConfig()
+        config.TFIDF_MAX_FEATURES = 123
+        config.MIN_WORD_LENGTH = 5
+        
+        with patch('etl_processor.storage.Client'), \
+             patch('etl_processor.bigquery.Client'), \
+             patch('etl_processor.cloud_logging.Client'):
+            processor = LyricsETLProcessor('t', 't', 't', config=config)
+        
+        # Verificações
+        self.assertEqual(processor.tfidf_vectorizer.max_features, 123)
+        self.assertEqual(processor._tokenize_text('love songs forever'), ['songs', 'forever'])
+
+
+
+class TestAsyncLogging(unittest.TestCase):
+    """Testes para logging assíncrono, em lotes e amostrado"""
+    
+    class _Collector(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.records = []
+        
+        def emit(self, record):
+            self.records.append(record)
+    
+    def test_queue_handler_drops_instead_of_blocking(self):
+        """Testa descarte de registros com a fila cheia"""
+        import queue
+        from async_logging import NonBlockingQueueHandler
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=2))
+        
+        for i in range(5):
+            handler.handle(logging.makeLogRecord({'msg': f'item {i}'}))
+        
+        # Verificações
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+    
+    def test_batching_handler_flushes_by_capacity_and_level(self):
+        """Testa entrega em lotes e entrega imediata de erros"""
+        from async_logging import BatchingHandler
+        collector = self._Collector()
+        handler = BatchingHandler(collector, capacity=3, flush_interval=3600)
+        
+        for i in range(2):
+            handler.handle(logging.makeLogRecord({'msg': f'item {i}', 'levelno': logging.INFO}))
+        self.assertEqual(len(collector.records), 0)
+        
+        handler.handle(logging.makeLogRecord({'msg': 'falha', 'levelno': logging.ERROR}))
+        
+        # Verificações
+        self.assertEqual(len(collector.records), 3)
+    
+    def test_batching_handler_timer_flushes_idle_buffer(self):
+        """Testa entrega pelo timer sem novos registros (serviço ocioso)"""
+        import time
+        from async_logging import BatchingHandler
+        collector = self._Collector()
+        handler = BatchingHandler(collector, capacity=100, flush_interval=0.05)
+        
+        handler.handle(logging.makeLogRecord({'msg': 'parado', 'levelno': logging.INFO}))
+        deadline = time.monotonic() + 2
+        while not collector.records and time.monotonic() < deadline:
+            time.sleep(0.01)
+        handler.close()
+        
+        # Verificações
+        self.assertEqual([record.getMessage() for record in collector.records], ['parado'])
+    
+    def test_sigterm_delivers_pending_batch(self):
+        """Testa entrega do lote pendente no SIGTERM, mantendo o encerramento padrão"""
+        import signal
+        import subprocess
+        import sys
+        import tempfile
+        
+        script = (
+            "import logging, os, signal, sys\n"
+            "from async_logging import setup_async_logging\n"
+            "setup_async_logging(logging.FileHandler(sys.argv[1]), batch_size=100, flush_interval=3600)\n"
+            "logging.getLogger('etl').warning('antes do sigterm')\n"
+            "os.kill(os.getpid(), signal.SIGTERM)\n"
+            "signal.pause()\n"
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_path = os.path.join(tmp_dir, 'out.log')
+            result = subprocess.run([sys.executable, '-c', script, log_path], timeout=30,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)))
+            with open(log_path) as f:
+                content = f.read()
+        
+        # Verificações
+        self.assertEqual(result.returncode, -signal.SIGTERM)
+        self.assertIn('antes do sigterm', content)
+
+    def test_sigterm_exits_with_full_queue_and_stuck_target(self):
+        """Testa encerramento no SIGTERM com a fila cheia e o destino travado"""
+        import signal
+        import subprocess
+        import sys
+
+        script = (
+            "import logging, os, signal, threading, time\n"
+            "import async_logging\n"
+            "class Stuck(logging.Handler):\n"
+            "    def emit(self, record):\n"
+            "        threading.Event().wait()\n"
+            "async_logging.STOP_TIMEOUT = 0.1\n"
+            "async_logging.setup_async_logging(Stuck(), queue_size=2, batch_size=1, flush_interval=0)\n"
+            "for i in range(10):\n"
+            "    logging.getLogger('etl').warning('item %s', i)\n"
+            "time.sleep(0.2)\n"
+            "os.kill(os.getpid(), signal.SIGTERM)\n"
+            "signal.pause()\n"
+        )
+        result = subprocess.run([sys.executable, '-c', script], timeout=30,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+
+        # Verificações
+        self.assertEqual(result.returncode, -signal.SIGTERM)
+
+    def test_setup_routes_root_records_through_listener(self):
+        """Testa entrega ao destino pela thread de fundo e idempotência"""
+        from async_logging import setup_async_logging, shutdown_async_logging
+        shutdown_async_logging()
+        collector = self._Collector()
+        
+        listener = setup_async_logging(collector, batch_size=10, flush_interval=3600)
+        self.assertIs(setup_async_logging(self._Collector()), listener)
+        logging.getLogger('etl_processor').warning('mensagem de teste')
+        logging.getLogger('google.cloud.logging').warning('transporte')
+        shutdown_async_logging()
+        
+        # Verificações
+        messages = [record.getMessage() for record in collector.records]
+        self.assertIn('mensagem de teste', messages)
+        self.assertNotIn('transporte', messages)
+    
+    def test_item_sampler_summarizes_per_batch(self):
+        """Testa amostragem de mensagens por item e resumo por lote"""
+        from async_logging import ItemLogSampler
+        target = MagicMock()
+        target.isEnabledFor.return_value = True
+        sampler = ItemLogSampler(target, first=2, every=100)
+        
+        for i in range(250):
+            sampler.info("Processado arquivo: %s", i)
+        count = sampler.summarize('arquivos processados')
+        
+        # Verificações: 2 primeiras + itens 100 e 200 + resumo
+        self.assertEqual(count, 250)
+        self.assertEqual(target.info.call_count, 5)
+        self.assertIn('246 mensagens por item suprimidas', target.info.call_args[0][0])
+        self.assertEqual(sampler.count, 0)
+
+
+
+class TestAnalysisService(unittest.TestCase):
+    """Testes para o serviço de análise sob demanda"""
+    
+    @classmethod
+    def setUpClass(cls):
+        import tempfile
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.processor = LyricsETLProcessor.offline(cls.tmp_dir)
+    
+    @classmethod
+    def tearDownClass(cls):
+        import shutil
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+    
+    def test_micro_batcher_groups_concurrent_items(self):
+        """Testa agrupamento de itens concorrentes em um lote"""
+        import threading
+        from analysis_service import MicroBatcher
+        
+        release = threading.Event()
+        sizes = []
+        
+        def handler(items):
+            release.wait(5)
+            sizes.append(len(items))
+            return [item * 2 for item in items]
+        
+        batcher = MicroBatcher(handler, max_batch_size=10, max_wait=0.05)
+        futures = [batcher.submit(i) for i in range(25)]
+        release.set()
+        results = [future.result(timeout=5) for future in futures]
+        batcher.close()
+        
+        # Verificações
+        self.assertEqual(results, [i * 2 for i in range(25)])
+        self.assertEqual(sum(sizes), 25)
+        self.assertTrue(all(size <= 10 for size in sizes))
+    
+    def test_tfidf_model_roundtrip(self):
+        """Testa gravação e carga do modelo TF-IDF persistido"""
+        from benchmark_etl import generate_corpus
+        corpus = [song['lyrics'] for song in generate_corpus(30, lines_per_song=4,
+                                                             vocabulary_size=80)]
+        model_path = os.path.join(self.tmp_dir, 'models', 'tfidf.json')
+        
+        trainer = LyricsETLProcessor.offline(os.path.join(self.tmp_dir, 'trainer'))
+        trainer.fit_tfidf_model(corpus)
+        trainer.save_tfidf_model(model_path)
+        
+        loaded = LyricsETLProcessor.offline(os.path.join(self.tmp_dir, 'loaded'))
+        loaded.load_tfidf_model(model_path)
+        matrix, features = loaded._fit_tfidf(corpus[:1])
+        
+        # Verificações: um único documento usa o IDF do corpus de referência
+        self.assertTrue(loaded.tfidf_frozen)
+        self.assertEqual(list(features), list(trainer.tfidf_vectorizer.get_feature_names_out()))
+        self.assertGreater(matrix.nnz, 0)
+        expected = trainer.tfidf_vectorizer.transform(corpus[:1])
+        self.assertAlmostEqual(abs(matrix - expected).max(), 0.0)
+    
+    def test_tfidf_model_rejects_non_json(self):
+        """Testa que o modelo persistido é JSON e que pickle não é carregado"""
+        import pickle
+        model_path = os.path.join(self.tmp_dir, 'models', 'tfidf-pickle.json')
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        with open(model_path, 'wb') as f:
+            f.write(pickle.dumps({'format': 'tfidf-json'}))
+        
+        processor = LyricsETLProcessor.offline(os.path.join(self.tmp_dir, 'untrusted'))
+        
+        # Verificações
+        with self.assertRaises(ValueError):
+            processor.load_tfidf_model(model_path)
+        self.assertFalse(processor.tfidf_frozen)
+    
+    def test_metrics_reset_per_micro_batch(self):
+        """Testa que as métricas do processador não acumulam entre requisições"""
+        from analysis_service import LyricsAnalysisService
+        service = LyricsAnalysisService(self.processor, max_batch_size=1, max_wait_ms=0)
+        try:
+            for _ in range(3):
+                service.analyze({'title': 'T', 'artist': 'A', 'lyrics': 'I love the sun'})
+            stages = self.processor.metrics.to_dict()
+        finally:
+            service.close()
+        
+        # Verificações
+        self.assertEqual(stages['sentiment']['calls'], 1)
+    
+    def test_identical_requests_in_one_batch(self):
+        """Testa requisições anônimas ou repetidas no mesmo micro-lote"""
+        from concurrent.futures import ThreadPoolExecutor
+        from analysis_service import LyricsAnalysisService
+        
+        songs = [
+            {'lyrics': 'I love the happy sunshine today'},
+            {'lyrics': 'I hate the cold sad rain'},
+            {'id': 'same', 'lyrics': 'I love the happy sunshine today'},
+            {'id': 'same', 'lyrics': 'I hate the cold sad rain'}
+        ]
+        service = LyricsAnalysisService(self.processor, max_batch_size=len(songs), max_wait_ms=500)
+        try:
+            with ThreadPoolExecutor(len(songs)) as pool:
+                results = list(pool.map(service.analyze, songs))
+            batches = service.batcher.batches
+        finally:
+            service.close()
+        
+        # Verificações
+        self.assertEqual(batches, 1)
+        labels = [result['sentiment']['sentiment_label'] for result in results]
+        self.assertEqual(labels, ['positive', 'negative', 'positive', 'negative'])
+        self.assertEqual(results[0]['id'], results[1]['id'])
+        self.assertEqual([result['id'] for result in results[2:]], ['same', 'same'])
+    
+    def test_http_endpoints(self):
+        """Testa /analyze, /analyze/batch e validação via HTTP"""
+        import threading
+        import urllib.request
+        import urllib.error
+        from analysis_service import LyricsAnalysisService, create_server
+        
+        service = LyricsAnalysisService(self.processor, max_batch_size=8, max_wait_ms=5)
+        server = create_server(service, '127.0.0.1', 0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        
+        def post(path, payload):
+            request = urllib.request.Request(base_url + path, data=json.dumps(payload).encode())
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, json.loads(response.read())
+        
+        try:
+            status, single = post('/analyze', {'title': 'Sunny', 'artist': 'A',
+                                               'lyrics': 'I love the happy sunshine today'})
+            _, batch = post('/analyze/batch', {'songs': [
+                {'title': 'Rain', 'lyrics': 'I hate the cold sad rain'},
+                {'title': 'Road', 'lyrics': 'Driving down the long road home'}
+            ]})
+            with self.assertRaises(urllib.error.HTTPError) as error:
+                post('/analyze', {'title': 'Sem letra'})
+        finally:
+            server.shutdown()
+            server.server_close()
+            service.close()
+        
+        # Verificações
+        self.assertEqual(status, 200)
+        self.assertEqual(single['sentiment']['sentiment_label'], 'positive')
+        self.assertGreater(single['statistics']['word_count'], 0)
+        self.assertTrue(single['top_words'])
+        self.assertEqual([result['title'] for result in batch['results']], ['Rain', 'Road'])
+        self.assertEqual(batch['results'][0]['sentiment']['sentiment_label'], 'negative')
+        self.assertEqual(error.exception.code, 400)
+
+
+
+class TestEventIngestion(unittest.TestCase):
+    """Testes para a ingestão por eventos em micro-lotes"""
+    
+    def setUp(self):
+        import tempfile
+        self.tmp_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.tmp_dir, 'input')
+        os.makedirs(os.path.join(self.input_dir, 'raw-data'))
+        
+        self.sink = MagicMock()
+        self.sink.name = 'mock'
+        self.sink.write_tables.return_value = {}
+        with patch('etl_processor.cloud_logging.Client'):
+            self.processor = LyricsETLProcessor(
+                't', 't', 't', sink=self.sink, input_dir=self.input_dir,
+                checkpoint_path=os.path.join(self.tmp_dir, 'state', 'events.jsonl'),
+                dead_letter_path=os.path.join(self.tmp_dir, 'state', 'dead_letter.jsonl')
+            )
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+    
+    def _write_song(self, name, text):
+        with open(os.path.join(self.input_dir, name), 'w') as f:
+            f.write(text)
+    
+    def test_parse_pubsub_push(self):
+        """Testa a leitura de notificações do Cloud Storage entregues por push"""
+        import base64
+        from event_ingestion import parse_pubsub_push
+        
+        resource = {'name': 'raw-data/a.txt', 'bucket': 'b', 'size': '42',
+                    'updated': '2024-01-01T10:00:00.000Z'}
+        envelope = {'message': {
+            'attributes': {'eventType': 'OBJECT_FINALIZE', 'bucketId': 'b',
+                           'objectId': 'raw-data/a.txt', 'objectGeneration': '7'},
+            'data': base64.b64encode(json.dumps(resource).encode()).decode()
+        }}
+        deleted = {'message': {'attributes': {'eventType': 'OBJECT_DELETE',
+                                              'objectId': 'raw-data/a.txt'}}}
+        
+        event = parse_pubsub_push(envelope)
+        
+        # Verificações
+        self.assertEqual((event.name, event.size, event.generation, event.bucket),
+                         ('raw-data/a.txt', 42, '7', 'b'))
+        self.assertEqual(event.created_at.year, 2024)
+        self.assertIsNone(parse_pubsub_push(deleted))
+        with self.assertRaises(ValueError):
+            parse_pubsub_push({'subscription': 'x'})
+    
+    def test_coalescer_closes_window_by_size_and_time(self):
+        """Testa fechamento do micro-lote por quantidade e por janela de tempo"""
+        from event_ingestion import EventCoalescer, ObjectEvent
+        
+        batches = []
+        coalescer = EventCoalescer(lambda events: batches.append([e.name for e in events]) or {},
+                                   max_files=3, max_wait=0.05)
+        futures = [coalescer.submit(ObjectEvent(f"f{i}.txt", size=1)) for i in range(3)]
+        futures += [coalescer.submit(ObjectEvent('late.txt')), coalescer.submit(ObjectEvent('late.txt'))]
+        for future in futures:
+            future.result(timeout=5)
+        coalescer.close()
+        
+        # Verificações: 3 por tamanho, depois 1 pela janela (evento repetido deduplicado)
+        self.assertEqual(batches, [['f0.txt', 'f1.txt', 'f2.txt'], ['late.txt']])
+        self.assertEqual(coalescer.events, 5)
+    
+    def test_service_processes_only_notified_objects(self):
+        """Testa ETL apenas dos objetos notificados e descarte de reenvios"""
+        from event_ingestion import EventIngestionService, ObjectEvent
+        
+        self._write_song('raw-data/new.txt', 'New Song\nlove in the morning light')
+        self._write_song('raw-data/old.txt', 'Old Song\nrain on the window again')
+        service = EventIngestionService(self.processor, 'raw-data/', max_files=10, max_wait=0.01)
+        
+        try:
+            first = service.handle(ObjectEvent('raw-data/new.txt'))
+            redelivered = service.handle(ObjectEvent('raw-data/new.txt'))
+            ignored = service.handle(ObjectEvent('other/new.txt'))
+            missing = service.handle(ObjectEvent('raw-data/gone.txt'))
+        finally:
+            service.close()
+        
+        # Verificações
+        raw_data = self.sink.write_tables.call_args_list[0][0][0]['raw_lyrics']
+        self.assertEqual(list(raw_data['title']), ['New Song'])
+        self.assertEqual(first['files'], 1)
+        self.assertEqual(redelivered['duplicate_files'], 1)
+        self.assertIsNone(ignored)
+        self.assertEqual(missing['missing_files'], 1)
+        self.assertEqual(self.sink.write_tables.call_count, 1)
+    
+    def test_reuploaded_object_with_same_size_is_processed(self):
+        """Testa que uma nova geração do objeto (mesmo nome e tamanho) não é descartada"""
+        path = os.path.join(self.input_dir, 'raw-data', 'song.txt')
+        self._write_song('raw-data/song.txt', 'First Take\nlove in the morning')
+        first = self.processor.process_objects(['raw-data/song.txt'])
+        
+        self._write_song('raw-data/song.txt', 'Fixed Take\nrain in the evening')
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        second = self.processor.process_objects(['raw-data/song.txt'])
+        redelivered = self.processor.process_objects(['raw-data/song.txt'])
+        
+        # Verificações
+        self.assertEqual((first['files'], second['files']), (1, 1))
+        self.assertEqual(redelivered['duplicate_files'], 1)
+        raw_data = self.sink.write_tables.call_args_list[1][0][0]['raw_lyrics']
+        self.assertEqual(list(raw_data['title']), ['Fixed Take'])
+    
+    def test_checkpoint_reads_only_new_batches(self):
+        """Testa que cada consulta ao checkpoint lê só os lotes gravados desde a anterior"""
+        from checkpoint import CheckpointStore
+        bucket = _FakeGCSBucket()
+        client = MagicMock()
+        client.bucket.return_value = bucket
+        service = CheckpointStore('gs://state/checkpoints/events.jsonl', client)
+        other_instance = CheckpointStore('gs://state/checkpoints/events.jsonl', client)
+        blob = lambda name, generation: SimpleNamespace(name=name, generation=generation)
+        
+        downloads = []
+        for i in range(5):
+            service.record_batch(i, [blob(f"f{i}.txt", '1')], 1)
+            before = bucket.downloads
+            service.committed_keys()
+            downloads.append(bucket.downloads - before)
+        other_instance.record_batch(0, [blob('f0.txt', '2')], 1)
+        
+        # Verificações: uma leitura por lote novo, inclusive de outra instância
+        self.assertEqual(downloads, [1, 1, 1, 1, 1])
+        self.assertIn('f0.txt#2', service.committed_keys())
+        self.assertEqual(service.committed_batches(), 6)
+        self.assertEqual(bucket.downloads, 6)
+    
+    def test_directory_watcher_waits_for_stable_files(self):
+        """Testa que o observador só gera evento para arquivos novos e estáveis"""
+        from event_ingestion import DirectoryWatcher
+        
+        self._write_song('raw-data/existing.txt', 'Existing\nalready here')
+        watcher = DirectoryWatcher(self.input_dir, 'raw-data/')
+        self._write_song('raw-data/dropped.txt', 'Dropped\nnew file')
+        
+        first_scan = watcher.poll()
+        second_scan = watcher.poll()
+        third_scan = watcher.poll()
+        
+        # Verificações
+        self.assertEqual(first_scan, [])
+        self.assertEqual([event.name for event in second_scan], ['raw-data/dropped.txt'])
+        self.assertEqual(third_scan, [])
+
+
+
+class TestRecordGuards(unittest.TestCase):
+    """Testes para os limites de tamanho e tempo por letra"""
+    
+    def setUp(self):
+        import tempfile
+        self.tmp_dir = tempfile.mkdtemp()
+        self.processor = LyricsETLProcessor.offline(self.tmp_dir)
+        self.songs = [
+            {'id': 'ok', 'title': 'Fine', 'artist': 'A', 'file_path': 'ok.txt',
+             'lyrics': 'I love the morning sun'},
+            {'id': 'huge', 'title': 'Album', 'artist': 'A', 'file_path': 'album.txt',
+             'lyrics': 'la ' * 100000},
+            {'id': 'junk', 'title': 'Binary', 'artist': 'A', 'file_path': 'junk.txt',
+             'lyrics': 'PK\x03\x04\x00\x00\x08\x00' * 50}
+        ]
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+    
+    def test_oversized_and_binary_records_are_quarantined(self):
+        """Testa quarentena de letras grandes demais ou com conteúdo binário"""
+        self.processor.record_guard.max_bytes = 10000
+        
+        processed_df, _, sentiment_df = self.processor.transform_lyrics(self.songs)
+        quarantined = self.processor.dead_letter.drain()
+        
+        # Verificações
+        self.assertEqual(list(processed_df['id']), ['ok'])
+        self.assertEqual(list(sentiment_df['lyrics_id']), ['ok'])
+        self.assertEqual({entry['record']['id'] for entry in quarantined}, {'huge', 'junk'})
+        self.assertTrue(all(entry['stage'] == 'quarantine' for entry in quarantined))
+        self.assertEqual(self.processor.record_guard.quarantined, 2)
+    
+    def test_record_timeout_interrupts_slow_stage(self):
+        """Testa que uma letra lenta é interrompida sem deixar linhas parciais"""
+        import time
+        guard = self.processor.record_guard
+        guard.timeout = 0.2
+        original = self.processor._analyze_sentiment
+        
+        def slow_sentiment(text, include_words=True):
+            if 'stuck' in text:
+                time.sleep(5)
+            return original(text, include_words)
+        
+        songs = [self.songs[0], {'id': 'slow', 'title': 'Slow', 'artist': 'A',
+                                 'lyrics': 'a stuck record spinning'}]
+        start = time.perf_counter()
+        with patch.object(self.processor, '_analyze_sentiment', side_effect=slow_sentiment):
+            processed_df, word_freq_df, _ = self.processor.transform_lyrics(songs)
+        elapsed = time.perf_counter() - start
+        quarantined = self.processor.dead_letter.drain()
+        
+        # Verificações
+        self.assertLess(elapsed, 3)
+        self.assertEqual(list(processed_df['id']), ['ok'])
+        self.assertNotIn('slow', set(word_freq_df['lyrics_id']))
+        self.assertEqual([entry['record']['id'] for entry in quarantined], ['slow'])
+        self.assertIn('excedeu', quarantined[0]['reason'])
+    
+    def test_slow_record_report(self):
+        """Testa o relatório das letras mais lentas com tempo por estágio"""
+        import time
+        from record_guards import RecordGuard
+        guard = RecordGuard(slow_seconds=0.0001, report_size=2)
+        
+        for record_id, delay in (('a', 0.01), ('b', 0.03), ('c', 0.02)):
+            with guard.track({'id': record_id, 'lyrics': 'x'}) as timer:
+                time.sleep(delay)
+                timer.checkpoint('sentiment')
+        report = guard.slow_report()
+        
+        # Verificações: só os 2 mais lentos, em ordem decrescente
+        self.assertEqual([entry['id'] for entry in report], ['b', 'c'])
+        self.assertIn('sentiment', report[0]['stages'])
+
+
+
+class TestVisualizationQueryCache(unittest.TestCase):
+    """Testes para o cache de resultados das queries de visualização"""
+    
+    def setUp(self):
+        import tempfile
+        from datetime import timezone
+        self.tmp_dir = tempfile.mkdtemp()
+        self.modified = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        
+        with patch('visualization_generator.bigquery.Client') as client_class:
+            from visualization_generator import LyricsVisualizationGenerator
+            self.client = client_class.return_value
+            self.generator = LyricsVisualizationGenerator('p', 'd', cache_dir=self.tmp_dir)
+        self.client.query.return_value.to_dataframe.side_effect = (
+            lambda: pd.DataFrame({'year': [2000, 2001], 'song_count': [5, 7]})
+        )
+        self.client.get_table.side_effect = lambda table_id: MagicMock(modified=self.modified)
+        self.query = "SELECT year, COUNT(*) AS song_count\nFROM `p.d.raw_lyrics` GROUP BY year"
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+    
+    def test_repeated_query_is_served_from_cache(self):
+        """Testa que a mesma SQL (com outra formatação) não volta ao BigQuery"""
+        first = self.generator.query_data(self.query)
+        second = self.generator.query_data("  SELECT year, COUNT(*) AS song_count FROM `p.d.raw_lyrics`   GROUP BY year ")
+        
+        # Verificações
+        self.assertEqual(self.client.query.call_count, 1)
+        pd.testing.assert_frame_equal(first, second)
+        self.assertEqual(self.generator.cache.hits, 1)
+    
+    def test_table_modification_invalidates_cache(self):
+        """Testa invalidação quando a tabela de origem é modificada"""
+        from datetime import timedelta
+        self.generator.query_data(self.query)
+        
+        self.modified += timedelta(hours=1)
+        self.generator.cache._versions.clear()
+        self.generator.query_data(self.query)
+        
+        # Verificações
+        self.assertEqual(self.client.query.call_count, 2)
+        self.client.get_table.assert_called_with('p.d.raw_lyrics')
+    
+    def test_unknown_table_version_bypasses_cache(self):
+        """Testa que sem a versão da tabela a query não é cacheada nem servida do cache"""
+        self.client.get_table.side_effect = RuntimeError('metadados indisponíveis')
+        self.generator.query_data(self.query)
+        self.generator.query_data(self.query)
+        
+        # Verificações
+        self.assertEqual(self.client.query.call_count, 2)
+        self.assertEqual(self.generator.cache.hits, 0)
+        self.assertEqual(list(self.generator.cache.cache_dir.glob('*.parquet')), [])
+    
+    def test_ttl_and_size_eviction(self):
+        """Testa expiração por TTL e remoção das entradas menos usadas"""
+        import time
+        from query_cache import QueryCache
+        cache = QueryCache(self.tmp_dir, ttl_seconds=60, max_bytes=10**9)
+        df = pd.DataFrame({'x': range(100)})
+        
+        cache.put('SELECT 1', df)
+        cache.put('SELECT 2', df)
+        old_path = cache._path(cache.key('SELECT 1'))
+        past = time.time() - 120
+        os.utime(old_path, (past, past))
+        
+        expired = cache.get('SELECT 1')
+        cache.max_bytes = 1
+        cache.put('SELECT 3', df)
+        
+        # Verificações
+        self.assertIsNone(expired)
+        self.assertIsNone(cache.get('SELECT 2'))
+        self.assertLessEqual(len(list(cache.cache_dir.glob('*.parquet'))), 1)
+
+
+
+class TestVisualizationReport(unittest.TestCase):
+    """Testes para a montagem do relatório de visualizações"""
+    
+    def setUp(self):
+        import tempfile
+        self.tmp_dir = tempfile.mkdtemp()
+        with patch('visualization_generator.bigquery.Client'):
+            from visualization_generator import LyricsVisualizationGenerator
+            self.generator = LyricsVisualizationGenerator('p', 'd', cache_dir=None)
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+    
+    def test_report_queries_run_concurrently(self):
+        """Testa que o relatório espera pela query mais lenta, não pela soma"""
+        import threading
+        import time
+        active = []
+        peak = [0]
+        lock = threading.Lock()
+        
+        executed = []
+        
+        def slow_query(query, params=None):
+            with lock:
+                executed.append(query)
+                active.append(query)
+                peak[0] = max(peak[0], len(active))
+            time.sleep(0.2)
+            with lock:
+                active.remove(query)
+            return pd.DataFrame()
+        
+        renders = {}
+        chart_methods = ('create_sentiment_evolution_chart', 'create_genre_sentiment_comparison',
+                         'create_complexity_heatmap', 'create_word_trend_analysis',
+                         'create_wordcloud_visualization')
+        patches = [patch.object(self.generator, 'query_data', side_effect=slow_query),
+                   patch.object(self.generator, 'create_html_index')]
+        patches += [patch.object(self.generator, name,
+                                 side_effect=lambda *a, _name=name, **kw: renders.setdefault(_name, []).append(kw))
+                    for name in chart_methods]
+        for p in patches:
+            p.start()
+        try:
+            start = time.perf_counter()
+            self.generator.generate_summary_report(self.tmp_dir, max_workers=16)
+            elapsed = time.perf_counter() - start
+        finally:
+            for p in patches:
+                p.stop()
+        
+        # Verificações
+        self.assertLess(elapsed, 0.9)
+        self.assertGreater(peak[0], 1)
+        self.assertEqual(len(renders['create_wordcloud_visualization']), 3)
+        # Agregado compartilhado, nuvens de palavras e tendências: três queries no total
+        self.assertEqual(len(executed), 3)
+        self.assertEqual(sum('GROUPING SETS' in query for query in executed), 2)
+        self.assertTrue(any('UNNEST(@words)' in query for query in executed))
+    
+    def test_summary_slices_match_chart_queries(self):
+        """Testa os recortes do agregado compartilhado com os filtros de cada gráfico"""
+        aggregate = pd.DataFrame([
+            # grain, year, genre, decade, song_count, avg, stddev, pos, neg, read_count, read_avg
+            ('year', 1990, None, None, 10, 0.2, 0.1, 6, 2, 10, 60.0),
+            ('year', 1975, None, None, 50, 0.1, 0.1, 20, 10, 50, 55.0),
+            ('year', 2000, None, None, 3, 0.3, 0.1, 2, 1, 3, 50.0),
+            ('year', None, None, None, 40, 0.0, 0.1, 10, 10, 40, 50.0),
+            ('genre', None, 'Rock', None, 30, 0.1, 0.2, 15, 6, 30, 58.0),
+            ('genre', None, 'Pop', None, 25, 0.4, 0.3, 20, 2, 25, 70.0),
+            ('genre', None, 'Unknown', None, 90, 0.0, 0.1, 30, 30, 90, 50.0),
+            ('genre', None, 'Jazz', None, 5, 0.5, 0.1, 4, 0, 5, 40.0),
+            ('genre_decade', None, 'Rock', 1990, 8, 0.1, 0.1, 4, 2, 8, 61.0),
+            ('genre_decade', None, 'Rock', None, 20, 0.1, 0.1, 4, 2, 20, 61.0),
+            ('genre_decade', None, 'Pop', 2000, 9, 0.1, 0.1, 4, 2, 4, 61.0),
+        ], columns=['grain', 'year', 'genre', 'decade', 'song_count', 'avg_sentiment',
+                    'sentiment_stddev', 'positive_count', 'negative_count',
+                    'readability_count', 'avg_readability'])
+        
+        evolution = self.generator._summary_slice(aggregate, 'sentiment_evolution')
+        genres = self.generator._summary_slice(aggregate, 'genre_comparison')
+        heatmap = self.generator._summary_slice(aggregate, 'complexity_heatmap')
+        
+        # Verificações
+        self.assertEqual(evolution['year'].tolist(), [1990])
+        self.assertAlmostEqual(evolution['positive_pct'][0], 60.0)
+        self.assertAlmostEqual(evolution['negative_pct'][0], 20.0)
+        self.assertEqual(genres['genre'].tolist(), ['Pop', 'Rock'])
+        self.assertAlmostEqual(genres['positive_pct'][1], 50.0)
+        self.assertEqual(heatmap[['genre', 'decade', 'song_count']].values.tolist(), [['Rock', 1990.0, 8]])
+    
+    def test_wordcloud_slices_from_single_scan(self):
+        """Testa as nuvens geral e por sentimento a partir de uma única leitura"""
+        result = pd.DataFrame({
+            'all_sentiments': [True, True, False, False, False],
+            'sentiment_label': [None, None, 'positive', 'positive', 'negative'],
+            'word': ['love', 'pain', 'love', 'sun', 'pain'],
+            'total_frequency': [30, 40, 25, 12, 35]
+        })
+        
+        # Verificações
+        self.assertEqual(self.generator._wordcloud_slice(result)['word'].tolist(), ['pain', 'love'])
+        self.assertEqual(self.generator._wordcloud_slice(result, 'positive')['word'].tolist(), ['love', 'sun'])
+        self.assertEqual(self.generator._wordcloud_slice(result, 'negative')['total_frequency'].tolist(), [35])
+        self.assertTrue(self.generator._wordcloud_slice(result, 'neutral').empty)
+    
+    def test_headless_wordcloud_writes_final_and_preview(self):
+        """Testa nuvem headless (sem plt.show) com prévia em baixa resolução"""
+        from PIL import Image
+        words = pd.DataFrame({'word': ['love', 'night', 'dance'], 'total_frequency': [30, 20, 10]})
+        final_path = os.path.join(self.tmp_dir, 'cloud.png')
+        preview_path = os.path.join(self.tmp_dir, 'cloud_preview.png')
+        
+        with patch('visualization_generator.plt.show') as show, \
+             patch('visualization_generator.Config.VIZ_FINAL_DPI', 100):
+            wordcloud = self.generator.create_wordcloud_visualization(
+                save_path=final_path, df=words, preview_path=preview_path
+            )
+        
+        # Verificações
+        show.assert_not_called()
+        self.assertIsNotNone(wordcloud)
+        with Image.open(final_path) as final, Image.open(preview_path) as preview:
+            self.assertLess(preview.width * 2, final.width)
+    
+    def test_report_renders_wordclouds_in_process_pool(self):
+        """Testa renderização das nuvens no pool de processos com prévias no índice"""
+        clouds = pd.DataFrame({
+            'all_sentiments': [True, True, False, False],
+            'sentiment_label': [None, None, 'positive', 'negative'],
+            'word': ['love', 'night', 'love', 'night'],
+            'total_frequency': [30, 20, 25, 15]
+        })
+        
+        def fake_query(query, params=None):
+            return clouds if 'all_sentiments' in query else pd.DataFrame()
+        
+        with patch.object(self.generator, 'query_data', side_effect=fake_query), \
+             patch('visualization_generator.Config.VIZ_FINAL_DPI', 100):
+            self.generator.generate_summary_report(self.tmp_dir, render_workers=2, preview=True)
+        
+        # Verificações
+        for name in ('wordcloud_all', 'wordcloud_positive', 'wordcloud_negative'):
+            self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, f"{name}.png")))
+            self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, f"{name}_preview.png")))
+        with open(os.path.join(self.tmp_dir, 'index.html'), encoding='utf-8') as f:
+            self.assertIn('src="wordcloud_all_preview.png"', f.read())
+        self.assertIsNone(self.generator._render_pool)
+    
+    def test_word_trend_single_parameterized_query(self):
+        """Testa que todas as palavras saem de uma única query parametrizada"""
+        query, params = self.generator._word_trend_query(['Love', 'heart', 'love'])
+        _, same_params = self.generator._word_trend_query(['heart', 'love'])
+        result = pd.DataFrame({
+            'word': ['heart', 'love', 'love'],
+            'year': [2000, 2000, 2001],
+            'total_frequency': [5, 10, 12],
+            'song_count': [2, 3, 4]
+        })
+        
+        with patch.object(self.generator, 'query_data', return_value=result) as query_data:
+            fig = self.generator.create_word_trend_analysis(['love', 'heart', 'time'])
+        
+        # Verificações
+        self.assertNotIn('LOWER', query)
+        self.assertEqual(params[0].values, ['heart', 'love'])
+        self.assertEqual(params[0].to_api_repr(), same_params[0].to_api_repr())
+        query_data.assert_called_once()
+        self.assertEqual([trace.name for trace in fig.data], ['Love', 'Heart'])
+        self.assertEqual(list(fig.data[0].y), [10, 12])
+        self.assertEqual(list(fig.data[1].x), [2000])
+    
+    def test_lightweight_html_shares_plotlyjs(self):
+        """Testa HTML leve: plotly.js compartilhado e JSON sem o template inteiro"""
+        import plotly.graph_objects as go
+        from chart_rendering import write_figure_html
+        fig = go.Figure(go.Bar(x=['a', 'b'], y=[1, 2]))
+        fig.update_layout(template='plotly_white')
+        full_path = os.path.join(self.tmp_dir, 'full.html')
+        light_paths = [os.path.join(self.tmp_dir, f"light_{i}.html") for i in range(2)]
+        
+        write_figure_html(fig, full_path)
+        for path in light_paths:
+            write_figure_html(fig, path, lightweight=True)
+        with patch.object(self.generator, 'query_data', return_value=pd.DataFrame()):
+            self.generator.generate_summary_report(os.path.join(self.tmp_dir, 'report'),
+                                                   render_workers=0)
+        
+        # Verificações
+        with open(light_paths[0], encoding='utf-8') as f:
+            light_html = f.read()
+        self.assertIn('src="plotly.min.js"', light_html)
+        self.assertNotIn('"scatter3d"', light_html)
+        self.assertLess(os.path.getsize(light_paths[0]) * 100, os.path.getsize(full_path))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, 'plotly.min.js')))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, 'report', 'plotly.min.js')))
+        self.assertEqual(self.generator._html_options, {})
+    
+    def test_large_scatter_traces_switch_to_webgl(self):
+        """Testa troca automática de scatters grandes para Scattergl"""
+        import plotly.graph_objects as go
+        from chart_rendering import lightweight_figure
+        fig = go.Figure([
+            go.Scatter(x=list(range(50)), y=list(range(50)), mode='markers'),
+            go.Scatter(x=[1, 2], y=[3, 4]),
+            go.Scatter(x=list(range(50)), y=list(range(50)), line=dict(shape='spline'))
+        ])
+        
+        figure = lightweight_figure(fig, webgl_threshold=10)
+        
+        # Verificações
+        self.assertEqual([trace['type'] for trace in figure['data']],
+                         ['scattergl', 'scatter', 'scatter'])
+        self.assertEqual(set(figure['layout']['template']['data']), {'scatter', 'scattergl'})
+        self.assertEqual(lightweight_figure(fig)['data'][0]['type'], 'scatter')
+        self.assertEqual(fig.data[0].type, 'scatter')
+    
+    def test_incremental_report_skips_unchanged_charts(self):
+        """Testa que o relatório só refaz gráficos cujas tabelas de origem mudaram"""
+        aggregate = pd.DataFrame([
+            ('year', 1990, None, None, 10, 0.2, 0.1, 6, 2, 10, 60.0),
+            ('genre', None, 'Rock', None, 30, 0.1, 0.2, 15, 6, 30, 58.0),
+            ('genre_decade', None, 'Rock', 1990, 8, 0.1, 0.1, 4, 2, 8, 61.0),
+        ], columns=['grain', 'year', 'genre', 'decade', 'song_count', 'avg_sentiment',
+                    'sentiment_stddev', 'positive_count', 'negative_count',
+                    'readability_count', 'avg_readability'])
+        clouds = pd.DataFrame({
+            'all_sentiments': [True, False, False],
+            'sentiment_label': [None, 'positive', 'negative'],
+            'word': ['love', 'love', 'night'],
+            'total_frequency': [30, 25, 15]
+        })
+        trends = pd.DataFrame({'word': ['love'], 'year': [1990],
+                               'total_frequency': [5], 'song_count': [2]})
+        versions = {'p.d.sentiment_rollup': 'v1', 'p.d.word_rollup': 'v1'}
+        executed = []
+        
+        def fake_query(query, params=None):
+            executed.append(query)
+            if 'all_sentiments' in query:
+                return clouds
+            return aggregate if 'GROUPING SETS' in query else trends
+        
+        def run():
+            executed.clear()
+            with patch.object(self.generator, 'query_data', side_effect=fake_query), \
+                 patch.object(self.generator, '_table_version', side_effect=versions.get), \
+                 patch.object(self.generator, 'create_html_index',
+                              wraps=self.generator.create_html_index) as index, \
+                 patch('visualization_generator.Config.VIZ_FINAL_DPI', 50):
+                self.generator.generate_summary_report(self.tmp_dir, render_workers=0)
+            return len(executed), index.call_count
+        
+        first = run()
+        second = run()
+        versions['p.d.word_rollup'] = 'v2'
+        third = run()
+        os.remove(os.path.join(self.tmp_dir, 'genre_comparison.html'))
+        fourth = run()
+        
+        # Verificações
+        self.assertEqual(first, (3, 1))
+        self.assertEqual(second, (0, 0))
+        # Só nuvens e tendências leem word_rollup
+        self.assertEqual(third, (2, 1))
+        self.assertEqual(fourth, (1, 1))
+        with open(os.path.join(self.tmp_dir, 'report_manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.assertEqual(len(manifest['charts']), 7)
+
+
+
+class TestArtistDashboards(unittest.TestCase):
+    """Testes para a chave de artista e os dashboards agregados no BigQuery"""
+    
+    def setUp(self):
+        import tempfile
+        self.tmp_dir = tempfile.mkdtemp()
+        with patch('visualization_generator.bigquery.Client'):
+            from visualization_generator import LyricsVisualizationGenerator
+            self.generator = LyricsVisualizationGenerator('p', 'd', cache_dir=None)
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+    
+    def _aggregates(self, key, name):
+        rows = [
+            # grain, year, sentiment_label, title, song_count, sentiment, word_count, readability
+            ('year', 2001, None, None, 2, 0.5, 100.0, 60.0),
+            ('year', 1999, None, None, 1, -0.2, 80.0, 70.0),
+            ('sentiment', None, 'positive', None, 2, 0.6, 110.0, 58.0),
+            ('sentiment', None, 'negative', None, 1, -0.2, 80.0, 70.0),
+            ('sentiment', None, None, None, 4, None, 90.0, 65.0),
+            ('song', None, None, 'Song A', 1, 0.4, 120.0, 55.0),
+            ('song', None, None, 'Song B', 1, 0.8, 100.0, 61.0),
+        ]
+        df = pd.DataFrame(rows, columns=['grain', 'year', 'sentiment_label', 'title', 'song_count',
+                                         'avg_sentiment', 'avg_word_count', 'avg_readability'])
+        df.insert(0, 'artist_name', name)
+        df.insert(0, 'artist_key', key)
+        return df
+    
+    def test_artist_key_normalization(self):
+        """Testa a chave normalizada (espaços, maiúsculas e formas Unicode)"""
+        from artist_keys import artist_key, artist_key_series
+        
+        # Verificações
+        self.assertEqual(artist_key('  The\u00a0 BEATLES\t'), 'the beatles')
+        self.assertEqual(artist_key('ＡＢＢＡ'), 'abba')
+        self.assertIsNone(artist_key(None))
+        keys = artist_key_series(pd.Series(['AC/DC', None, 'ac/dc ']))
+        self.assertEqual(keys[[0, 2]].tolist(), ['ac/dc', 'ac/dc'])
+        self.assertTrue(pd.isna(keys[1]))
+    
+    def test_dashboard_query_filters_on_artist_key(self):
+        """Testa filtro por igualdade na chave (sem LOWER nem CTE não usada)"""
+        query, params = self.generator._artist_dashboard_query([' The Beatles', "O'Brien"])
+        batch_query, batch_params = self.generator._artist_dashboard_query(top_n=5)
+        
+        # Verificações
+        self.assertIn('r.artist_key IN UNNEST(@artist_keys)', query)
+        self.assertNotIn('LOWER(r.artist)', query)
+        self.assertNotIn('artist_words', query)
+        self.assertNotIn("O'Brien", query)
+        self.assertEqual(params[0].values, ["o'brien", 'the beatles'])
+        self.assertIn('GROUPING SETS', query)
+        self.assertIn('artist_rollup', batch_query)
+        self.assertEqual(batch_params[0].value, 5)
+    
+    def test_dashboard_built_from_sql_aggregates(self):
+        """Testa o dashboard montado a partir dos agregados, sem reagrupar em pandas"""
+        with patch.object(self.generator, 'query_data',
+                          return_value=self._aggregates('a', 'A')) as query_data:
+            fig = self.generator.create_artist_analysis_dashboard('A')
+        
+        # Verificações
+        query_data.assert_called_once()
+        self.assertEqual(list(fig.data[0].x), [1999, 2001])
+        self.assertEqual(list(fig.data[0].y), [-0.2, 0.5])
+        self.assertEqual(list(fig.data[1].labels), ['positive', 'negative'])
+        self.assertEqual(list(fig.data[2].text), ['Song A', 'Song B'])
+        self.assertEqual(list(fig.data[3].y), [80.0, 100.0])
+    
+    def test_top_artist_dashboards_single_query(self):
+        """Testa o modo em lote: uma query e um HTML por artista"""
+        df = pd.concat([self._aggregates('the beatles', 'The Beatles'),
+                        self._aggregates('ac/dc', 'AC/DC')], ignore_index=True)
+        
+        with patch.object(self.generator, 'query_data', return_value=df) as query_data:
+            dashboards = self.generator.create_top_artist_dashboards(
+                top_n=2, output_dir=self.tmp_dir, render_workers=0
+            )
+        
+        # Verificações
+        query_data.assert_called_once()
+        self.assertEqual(set(dashboards), {'The Beatles', 'AC/DC'})
+        self.assertTrue(all(os.path.exists(path) for path in dashboards.values()))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, 'artist_ac_dc.html')))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, 'plotly.min.js')))
+        self.assertIsNone(self.generator._render_pool)
+    
+    def test_load_adds_artist_key(self):
+        """Testa que o ETL grava a chave normalizada em raw_lyrics"""
+        sink = MagicMock()
+        sink.name = 'mock'
+        sink.write_tables.return_value = {}
+        sink.write_rollups.return_value = {}
+        with patch('etl_processor.cloud_logging.Client'):
+            processor = LyricsETLProcessor('t', 't', 't', sink=sink, input_dir=self.tmp_dir)
+        
+        processor.load_to_bigquery(
+            [{'id': '1', 'artist': ' Daft  Punk'}, {'id': '2', 'artist': None}],
+            pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+        )
+        
+        # Verificações
+        raw_df = sink.write_tables.call_args[0][0]['raw_lyrics']
+        self.assertEqual(raw_df['artist_key'].tolist()[0], 'daft punk')
+        self.assertTrue(pd.isna(raw_df['artist_key'].tolist()[1]))
+
+
+class TestDuckDBQueryBackend(unittest.TestCase):
+    """Testes para o backend DuckDB das visualizações sobre Parquet local"""
+    
+    def setUp(self):
+        import tempfile
+        from output_sinks import ParquetSink
+        from rollups import compute_rollups
+        from artist_keys import artist_key_series
+        self.tmp_dir = tempfile.mkdtemp()
+        
+        self.raw_df = pd.DataFrame({
+            'id': ['1', '2', '3', '4'],
+            'title': ['A', 'B', 'C', 'D'],
+            'artist': ['The Beatles', 'the  beatles', 'AC/DC', 'AC/DC'],
+            'genre': ['Rock', 'Rock', 'Rock', None],
+            'year': [1965, 1967, 1980, 1980],
+            'created_at': ['2024-01-01T00:00:00'] * 4
+        })
+        self.raw_df['artist_key'] = artist_key_series(self.raw_df['artist'])
+        processed_df = pd.DataFrame({
+            'id': ['1', '2', '3', '4'],
+            'word_count': [100, 120, 80, 90],
+            'readability_score': [60.0, 62.0, 55.0, 50.0]
+        })
+        sentiment_df = pd.DataFrame({
+            'lyrics_id': ['1', '2', '3', '4'],
+            'sentiment_score': [0.5, 0.3, -0.4, -0.2],
+            'sentiment_label': ['positive', 'positive', 'negative', 'negative']
+        })
+        word_freq_df = pd.DataFrame({
+            'lyrics_id': ['1', '2', '3', '4'],
+            'word': ['love', 'love', 'fire', 'fire'],
+            'frequency': [3, 4, 5, 1],
+            'tf_idf': [0.1, 0.2, 0.3, 0.4],
+            'is_stopword': [False, False, False, False]
+        })
+        self.sink = ParquetSink(self.tmp_dir)
+        self.sink.write_tables({
+            'raw_lyrics': self.raw_df,
+            'processed_lyrics': processed_df,
+            'word_frequency': word_freq_df,
+            'sentiment_analysis': sentiment_df
+        })
+        self.sink.write_rollups(compute_rollups(self.raw_df, processed_df, word_freq_df, sentiment_df))
+        
+        from query_backends import DuckDBBackend
+        from visualization_generator import LyricsVisualizationGenerator
+        self.generator = LyricsVisualizationGenerator(
+            'p', 'd', cache_dir=None, backend=DuckDBBackend(self.tmp_dir)
+        )
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+    
+    def test_dialect_shim(self):
+        """Testa a tradução de crases, COUNTIF, STDDEV, tipos e parâmetros"""
+        from query_backends import to_duckdb_sql
+        
+        sql = to_duckdb_sql(
+            "SELECT COUNTIF(x > 0), STDDEV(y), CAST(z AS INT64) FROM `my-proj.ds.word_rollup` "
+            "WHERE word IN UNNEST(@words) LIMIT @top_n"
+        )
+        
+        # Verificações
+        self.assertEqual(
+            sql,
+            'SELECT count_if(x > 0), stddev_samp(y), CAST(z AS BIGINT) FROM "word_rollup" '
+            'WHERE word IN (SELECT UNNEST($words)) LIMIT $top_n'
+        )
+    
+    def test_countif_and_stddev_match_pandas(self):
+        """Testa COUNTIF e STDDEV (amostral, como no BigQuery) sobre o Parquet local"""
+        df = self.generator.query_data(
+            "SELECT COUNTIF(year > 1966) AS recent, STDDEV(year) AS year_stddev "
+            "FROM `p.d.raw_lyrics`"
+        )
+        
+        # Verificações
+        self.assertEqual(df['recent'][0], 3)
+        self.assertAlmostEqual(df['year_stddev'][0], self.raw_df['year'].std())
+    
+    def test_chart_queries_run_on_duckdb(self):
+        """Testa as queries dos gráficos (com parâmetros) no backend local"""
+        summary = self.generator.query_data(self.generator._summary_aggregate_query())
+        trend = self.generator.query_data(*self.generator._word_trend_query(['love', 'fire']))
+        artist = self.generator.query_data(*self.generator._artist_dashboard_query(['THE BEATLES']))
+        top = self.generator.query_data(*self.generator._artist_dashboard_query(top_n=1))
+        
+        # Verificações
+        years = summary[summary['grain'] == 'year']
+        self.assertEqual(sorted(years['year'].tolist()), [1965, 1967, 1980])
+        # Tendências a partir de 1980: love (anos 60) fica de fora
+        self.assertEqual(trend[['word', 'year', 'total_frequency']].values.tolist(), [['fire', 1980, 6]])
+        self.assertEqual(set(artist['artist_key']), {'the beatles'})
+        self.assertEqual(len(artist[artist['grain'] == 'song']), 2)
+        self.assertEqual(len(top['artist_key'].unique()), 1)
+    
+    def test_table_version_follows_parquet_files(self):
+        """Testa a versão da tabela local (invalida cache e manifesto do relatório)"""
+        before = self.generator._table_version('p.d.word_rollup')
+        self.sink.write_rollup(pd.DataFrame({'word': ['new'], 'frequency_sum': [1]}), 'word_rollup')
+        
+        # Verificações
+        self.assertIsNotNone(before)
+        self.assertNotEqual(self.generator._table_version('p.d.word_rollup'), before)
+        self.assertIsNone(self.generator._table_version('p.d.missing_table'))
+
 if __name__ == '__main__':
     # Configurar logging para testes
     import logging
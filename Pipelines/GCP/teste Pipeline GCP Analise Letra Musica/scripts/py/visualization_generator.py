@@ -13,31 +13,85 @@ from plotly.subplots import make_subplots
 import plotly.figure_factory as ff
 from wordcloud import WordCloud
 from google.cloud import bigquery
+import contextlib
+import hashlib
 import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+from config import Config
+from artist_keys import ARTIST_KEY_SQL, artist_key
+from query_cache import QueryCache, normalize_sql, query_fingerprint, referenced_tables
+from query_backends import BigQueryBackend, QueryBackend, create_backend
+from chart_rendering import (WORDCLOUD_FIGSIZE, build_wordcloud, draw_wordcloud,
+                             ensure_plotlyjs_bundle, render_wordcloud_file, save_figure,
+                             write_figure_html)
+
 # Configuração de estilo
 plt.style.use('seaborn-v0_8')
 sns.set_palette("husl")
 
+# Desvio padrão amostral a partir das somas do rollup (n, soma e soma dos quadrados)
+ROLLUP_STDDEV = (
+    "SQRT(GREATEST(SAFE_DIVIDE(SUM(sentiment_sq_sum) - SAFE_DIVIDE(POW(SUM(sentiment_sum), 2), "
+    "SUM(sentiment_count)), SUM(sentiment_count) - 1), 0))"
+)
+
+# Impressões digitais dos gráficos da última execução do relatório
+REPORT_MANIFEST = 'report_manifest.json'
+
 class LyricsVisualizationGenerator:
     """
     Classe para gerar visualizações dos dados de análise de letras
     """
     
-    def __init__(self, project_id: str, dataset_id: str):
+    def __init__(self, project_id: str, dataset_id: str, cache_dir: str = Config.VIZ_CACHE_DIR,
+                 cache_ttl: float = Config.VIZ_CACHE_TTL_SECONDS,
+                 headless: bool = Config.VIZ_HEADLESS, backend: QueryBackend = None):
         """
         Inicializa o gerador de visualizações
         
         Args:
             project_id: ID do projeto GCP
             dataset_id: ID do dataset BigQuery
+            cache_dir: Diretório do cache de resultados (None ou vazio = sem cache)
+            cache_ttl: Validade dos resultados em cache em segundos
+            headless: Backend não interativo (Agg) e nenhuma janela aberta por plt.show()
+            backend: Backend de consulta (padrão: BigQuery no projeto; DuckDBBackend
+                executa as mesmas queries sobre Parquet local)
         """
         self.project_id = project_id
         self.dataset_id = dataset_id
-        self.client = bigquery.Client(project=project_id)
+        if backend is None:
+            backend = BigQueryBackend(bigquery.Client(project=project_id))
+        self.backend = backend
+        self.client = getattr(backend, 'client', None)
+        
+        self.headless = headless
+        if headless:
+            plt.switch_backend('Agg')
+        
+        # Pool de renderização ativo durante generate_summary_report
+        self._render_pool = None
+        self._render_futures = {}
+        # Opções de write_figure_html (modo leve ativo durante generate_summary_report)
+        self._html_options = {}
+        
+        # Cache de resultados: invalidado quando uma tabela de origem é modificada
+        self.cache = None
+        if cache_dir:
+            self.cache = QueryCache(
+                cache_dir,
+                ttl_seconds=cache_ttl,
+                max_bytes=Config.VIZ_CACHE_MAX_BYTES,
+                table_version=self._table_version
+            )
         
         # Configurações de cores
         self.colors = {
@@ -56,43 +110,66 @@ class LyricsVisualizationGenerator:
             'modeBarButtonsToRemove': ['pan2d', 'lasso2d']
         }
     
-    def query_data(self, query: str) -> pd.DataFrame:
+    def _table_version(self, table_id: str) -> str:
+        """Versão da tabela no backend (última modificação, sem custo de scan)"""
+        return self.backend.table_version(table_id)
+    
+    def query_data(self, query: str, params: list = None) -> pd.DataFrame:
         """
-        Executa query no BigQuery e retorna DataFrame
+        Executa query no backend (BigQuery por padrão) e retorna DataFrame
+        
+        Resultados ficam no cache em disco; uma query repetida sobre tabelas
+        não modificadas não vai ao backend.
         
         Args:
             query: Query SQL para executar
+            params: Parâmetros da query (bigquery.ScalarQueryParameter/ArrayQueryParameter)
             
         Returns:
             DataFrame com os resultados
         """
+        if self.cache is not None:
+            cached = self.cache.get(query, params)
+            if cached is not None:
+                return cached
+        
         try:
-            df = self.client.query(query).to_dataframe()
-            return df
+            df = self.backend.query(query, params)
         except Exception as e:
             print(f"Erro ao executar query: {str(e)}")
             return pd.DataFrame()
+        
+        if self.cache is not None:
+            self.cache.put(query, df, params)
+        return df
     
-    def create_sentiment_evolution_chart(self, save_path: str = None) -> go.Figure:
-        """
-        Cria gráfico de evolução do sentimento ao longo do tempo
-        """
-        query = f"""
+    def _sentiment_evolution_query(self) -> str:
+        """Query da evolução do sentimento por ano (rollup sentiment_rollup)"""
+        return f"""
         SELECT 
           year,
-          AVG(sentiment_score) as avg_sentiment,
-          COUNT(*) as song_count,
-          COUNTIF(sentiment_label = 'positive') / COUNT(*) * 100 as positive_pct,
-          COUNTIF(sentiment_label = 'negative') / COUNT(*) * 100 as negative_pct
-        FROM `{self.project_id}.{self.dataset_id}.raw_lyrics` r
-        JOIN `{self.project_id}.{self.dataset_id}.sentiment_analysis` s ON r.id = s.lyrics_id
+          SAFE_DIVIDE(SUM(sentiment_sum), SUM(sentiment_count)) as avg_sentiment,
+          SUM(sentiment_count) as song_count,
+          SAFE_DIVIDE(SUM(positive_count), SUM(sentiment_count)) * 100 as positive_pct,
+          SAFE_DIVIDE(SUM(negative_count), SUM(sentiment_count)) * 100 as negative_pct
+        FROM `{self.project_id}.{self.dataset_id}.sentiment_rollup`
         WHERE year IS NOT NULL AND year BETWEEN 1980 AND 2024
         GROUP BY year
         HAVING song_count >= 5
         ORDER BY year
         """
+    
+    def create_sentiment_evolution_chart(self, save_path: str = None,
+                                         df: pd.DataFrame = None) -> go.Figure:
+        """
+        Cria gráfico de evolução do sentimento ao longo do tempo
         
-        df = self.query_data(query)
+        Args:
+            save_path: Caminho para salvar o gráfico
+            df: Resultado já consultado (padrão: executa a query)
+        """
+        if df is None:
+            df = self.query_data(self._sentiment_evolution_query())
         
         if df.empty:
             print("Nenhum dado encontrado para evolução de sentimento")
@@ -157,30 +234,37 @@ class LyricsVisualizationGenerator:
         fig.update_yaxes(title_text="Percentual (%)", row=2, col=1)
         
         if save_path:
-            fig.write_html(save_path)
+            self._write_html(fig, save_path)
             
         return fig
     
-    def create_genre_sentiment_comparison(self, save_path: str = None) -> go.Figure:
-        """
-        Cria gráfico de comparação de sentimentos por gênero
-        """
-        query = f"""
+    def _genre_comparison_query(self) -> str:
+        """Query do sentimento por gênero (rollup sentiment_rollup)"""
+        return f"""
         SELECT 
           genre,
-          COUNT(*) as song_count,
-          AVG(sentiment_score) as avg_sentiment,
-          STDDEV(sentiment_score) as sentiment_stddev,
-          COUNTIF(sentiment_label = 'positive') / COUNT(*) * 100 as positive_pct
-        FROM `{self.project_id}.{self.dataset_id}.raw_lyrics` r
-        JOIN `{self.project_id}.{self.dataset_id}.sentiment_analysis` s ON r.id = s.lyrics_id
+          SUM(sentiment_count) as song_count,
+          SAFE_DIVIDE(SUM(sentiment_sum), SUM(sentiment_count)) as avg_sentiment,
+          {ROLLUP_STDDEV} as sentiment_stddev,
+          SAFE_DIVIDE(SUM(positive_count), SUM(sentiment_count)) * 100 as positive_pct
+        FROM `{self.project_id}.{self.dataset_id}.sentiment_rollup`
         WHERE genre != 'Unknown' AND genre IS NOT NULL
         GROUP BY genre
         HAVING song_count >= 20
         ORDER BY avg_sentiment DESC
         """
+    
+    def create_genre_sentiment_comparison(self, save_path: str = None,
+                                          df: pd.DataFrame = None) -> go.Figure:
+        """
+        Cria gráfico de comparação de sentimentos por gênero
         
-        df = self.query_data(query)
+        Args:
+            save_path: Caminho para salvar o gráfico
+            df: Resultado já consultado (padrão: executa a query)
+        """
+        if df is None:
+            df = self.query_data(self._genre_comparison_query())
         
         if df.empty:
             print("Nenhum dado encontrado para comparação por gênero")
@@ -221,50 +305,57 @@ class LyricsVisualizationGenerator:
                      annotation_text="Neutro")
         
         if save_path:
-            fig.write_html(save_path)
+            self._write_html(fig, save_path)
             
         return fig
     
-    def create_wordcloud_visualization(self, sentiment_filter: str = None, 
-                                     save_path: str = None) -> WordCloud:
+    def _wordcloud_query(self, sentiment_filter: str = None) -> str:
         """
-        Cria nuvem de palavras
+        Query das palavras mais frequentes (opcionalmente de um sentimento)
         
-        Args:
-            sentiment_filter: 'positive', 'negative', 'neutral' ou None para todos
-            save_path: Caminho para salvar a imagem
+        Lê word_rollup, que já contém somente palavras de conteúdo (sem
+        stopwords e com 3 ou mais letras).
         """
         # Query base
         base_query = f"""
         SELECT 
-          w.word,
-          SUM(w.frequency) as total_frequency
-        FROM `{self.project_id}.{self.dataset_id}.word_frequency` w
+          word,
+          SUM(frequency_sum) as total_frequency
+        FROM `{self.project_id}.{self.dataset_id}.word_rollup`
         """
         
         # Adicionar filtro de sentimento se especificado
         if sentiment_filter:
             base_query += f"""
-            JOIN `{self.project_id}.{self.dataset_id}.sentiment_analysis` s 
-              ON w.lyrics_id = s.lyrics_id
-            WHERE s.sentiment_label = '{sentiment_filter}'
-              AND w.is_stopword = FALSE 
-              AND LENGTH(w.word) >= 3
-            """
-        else:
-            base_query += """
-            WHERE w.is_stopword = FALSE 
-              AND LENGTH(w.word) >= 3
+            WHERE sentiment_label = '{sentiment_filter}'
             """
         
         base_query += """
-        GROUP BY w.word
+        GROUP BY word
         HAVING total_frequency >= 10
         ORDER BY total_frequency DESC
         LIMIT 200
         """
+        return base_query
+    
+    def create_wordcloud_visualization(self, sentiment_filter: str = None, 
+                                     save_path: str = None,
+                                     df: pd.DataFrame = None,
+                                     preview_path: str = None) -> WordCloud:
+        """
+        Cria nuvem de palavras
         
-        df = self.query_data(base_query)
+        Args:
+            sentiment_filter: 'positive', 'negative', 'neutral' ou None para todos
+            save_path: Caminho para salvar a imagem
+            df: Resultado já consultado (padrão: executa a query)
+            preview_path: Caminho da prévia em baixa resolução (opcional)
+            
+        Returns:
+            Nuvem de palavras (None quando renderizada no pool de processos do relatório)
+        """
+        if df is None:
+            df = self.query_data(self._wordcloud_query(sentiment_filter))
         
         if df.empty:
             print("Nenhum dado encontrado para nuvem de palavras")
@@ -273,77 +364,148 @@ class LyricsVisualizationGenerator:
         # Criar dicionário de frequências
         word_freq = dict(zip(df['word'], df['total_frequency']))
         
-        # Configurar WordCloud
-        wordcloud = WordCloud(
-            width=1200,
-            height=800,
-            background_color='white',
-            max_words=100,
-            colormap='viridis',
-            relative_scaling=0.5,
-            random_state=42
-        ).generate_from_frequencies(word_freq)
-        
-        # Plotar
-        plt.figure(figsize=(15, 10))
-        plt.imshow(wordcloud, interpolation='bilinear')
-        plt.axis('off')
-        
         title = f"Palavras Mais Frequentes"
         if sentiment_filter:
             title += f" - Sentimento {sentiment_filter.title()}"
-        plt.title(title, fontsize=20, fontweight='bold', pad=20)
+        
+        # No relatório, layout e gravação (as etapas caras) vão para o pool de processos
+        if self._render_pool is not None and save_path:
+            future = self._render_pool.submit(
+                render_wordcloud_file, word_freq, title, save_path,
+                Config.VIZ_FINAL_DPI, preview_path, Config.VIZ_PREVIEW_DPI
+            )
+            self._render_futures[future] = save_path
+            return None
+        
+        wordcloud = build_wordcloud(word_freq)
+        
+        if self.headless:
+            # Figura fora do pyplot: nada fica aberto entre gráficos
+            figure = draw_wordcloud(wordcloud, title)
+        else:
+            figure = draw_wordcloud(wordcloud, title, plt.figure(figsize=WORDCLOUD_FIGSIZE))
         
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            save_figure(figure, save_path, Config.VIZ_FINAL_DPI,
+                        preview_path, Config.VIZ_PREVIEW_DPI)
         
-        plt.show()
+        if not self.headless:
+            plt.show()
         return wordcloud
     
-    def create_artist_analysis_dashboard(self, artist_name: str, 
-                                       save_path: str = None) -> go.Figure:
+    def _artist_dashboard_query(self, artist_names: list = None, top_n: int = None) -> tuple:
         """
-        Cria dashboard de análise para um artista específico
+        Query única dos agregados dos dashboards de artista
+        
+        Uma leitura com GROUPING SETS devolve, por artista, as médias por ano,
+        a contagem por sentimento e um ponto por música (dispersão). Com
+        artist_names o filtro é igualdade em artist_key, o que poda o cluster
+        de raw_lyrics; com top_n os artistas são os de mais músicas no
+        artist_rollup (modo em lote).
+        
+        Args:
+            artist_names: Nomes dos artistas (comparados pela chave normalizada)
+            top_n: Quantidade de artistas com mais músicas
+            
+        Returns:
+            Tupla (SQL, parâmetros)
         """
-        # Query para dados do artista
+        table = f"{self.project_id}.{self.dataset_id}"
+        if artist_names:
+            keys = sorted({key for key in map(artist_key, artist_names) if key})
+            top_artists = ""
+            artist_filter = "r.artist_key IN UNNEST(@artist_keys)"
+            params = [bigquery.ArrayQueryParameter('artist_keys', 'STRING', keys)]
+        else:
+            top_artists = f"""
+        top_artists AS (
+          SELECT {ARTIST_KEY_SQL.format(column='artist')} as artist_key
+          FROM `{table}.artist_rollup`
+          WHERE artist IS NOT NULL AND artist != 'Unknown'
+          GROUP BY artist_key
+          ORDER BY SUM(song_count) DESC
+          LIMIT @top_n
+        ),"""
+            artist_filter = "r.artist_key IN (SELECT artist_key FROM top_artists)"
+            params = [bigquery.ScalarQueryParameter('top_n', 'INT64', top_n)]
+        
         query = f"""
-        WITH artist_data AS (
+        WITH{top_artists}
+        songs AS (
           SELECT 
-            r.year,
+            r.artist_key,
+            MIN(r.artist) OVER (PARTITION BY r.artist_key) as artist_name,
+            r.id,
             r.title,
+            r.year,
             p.word_count,
             p.readability_score,
             s.sentiment_score,
             s.sentiment_label
-          FROM `{self.project_id}.{self.dataset_id}.raw_lyrics` r
-          JOIN `{self.project_id}.{self.dataset_id}.processed_lyrics` p ON r.id = p.id
-          JOIN `{self.project_id}.{self.dataset_id}.sentiment_analysis` s ON r.id = s.lyrics_id
-          WHERE LOWER(r.artist) = LOWER('{artist_name}')
+          FROM `{table}.raw_lyrics` r
+          JOIN `{table}.processed_lyrics` p ON r.id = p.id
+          JOIN `{table}.sentiment_analysis` s ON r.id = s.lyrics_id
+          WHERE {artist_filter}
             AND r.year IS NOT NULL
-        ),
-        artist_words AS (
-          SELECT 
-            w.word,
-            SUM(w.frequency) as frequency,
-            AVG(w.tf_idf) as avg_tfidf
-          FROM `{self.project_id}.{self.dataset_id}.word_frequency` w
-          JOIN `{self.project_id}.{self.dataset_id}.raw_lyrics` r ON w.lyrics_id = r.id
-          WHERE LOWER(r.artist) = LOWER('{artist_name}')
-            AND w.is_stopword = FALSE
-            AND LENGTH(w.word) >= 3
-          GROUP BY w.word
-          ORDER BY frequency DESC
-          LIMIT 20
         )
-        SELECT * FROM artist_data
+        SELECT 
+          artist_key,
+          ANY_VALUE(artist_name) as artist_name,
+          CASE
+            WHEN GROUPING(year) = 0 THEN 'year'
+            WHEN GROUPING(sentiment_label) = 0 THEN 'sentiment'
+            ELSE 'song'
+          END as grain,
+          year,
+          sentiment_label,
+          title,
+          COUNT(*) as song_count,
+          AVG(sentiment_score) as avg_sentiment,
+          AVG(word_count) as avg_word_count,
+          AVG(readability_score) as avg_readability
+        FROM songs
+        GROUP BY GROUPING SETS (
+          (artist_key, year),
+          (artist_key, sentiment_label),
+          (artist_key, id, title)
+        )
+        ORDER BY artist_key, grain, year
+        """
+        return query, params
+    
+    def create_artist_analysis_dashboard(self, artist_name: str, 
+                                       save_path: str = None,
+                                       df: pd.DataFrame = None) -> go.Figure:
         """
+        Cria dashboard de análise para um artista específico
         
-        df = self.query_data(query)
+        Args:
+            artist_name: Nome do artista (maiúsculas e espaços não importam)
+            save_path: Caminho para salvar o HTML
+            df: Agregados já consultados (_artist_dashboard_query); None consulta o BigQuery
+        """
+        if df is None:
+            query, params = self._artist_dashboard_query([artist_name])
+            df = self.query_data(query, params)
         
         if df.empty:
             print(f"Nenhum dado encontrado para o artista: {artist_name}")
             return go.Figure()
         
+        fig = self._artist_dashboard_figure(artist_name, df)
+        
+        if save_path:
+            self._write_html(fig, save_path)
+            
+        return fig
+    
+    def _artist_dashboard_figure(self, artist_name: str, df: pd.DataFrame) -> go.Figure:
+        """Monta o dashboard de um artista a partir dos agregados do artista"""
+        yearly = df[df['grain'] == 'year'].sort_values('year')
+        sentiment_counts = (df[(df['grain'] == 'sentiment') & df['sentiment_label'].notna()]
+                            .sort_values('song_count', ascending=False))
+        songs = df[df['grain'] == 'song']
+        
         # Criar subplots
         fig = make_subplots(
             rows=2, cols=2,
@@ -358,11 +520,10 @@ class LyricsVisualizationGenerator:
         )
         
         # Gráfico 1: Evolução do sentimento
-        yearly_sentiment = df.groupby('year')['sentiment_score'].mean().reset_index()
         fig.add_trace(
             go.Scatter(
-                x=yearly_sentiment['year'],
-                y=yearly_sentiment['sentiment_score'],
+                x=yearly['year'],
+                y=yearly['avg_sentiment'],
                 mode='lines+markers',
                 name='Sentimento',
                 line=dict(color=self.colors['primary'])
@@ -371,46 +532,40 @@ class LyricsVisualizationGenerator:
         )
         
         # Gráfico 2: Distribuição de sentimentos
-        sentiment_counts = df['sentiment_label'].value_counts()
         fig.add_trace(
             go.Pie(
-                labels=sentiment_counts.index,
-                values=sentiment_counts.values,
+                labels=sentiment_counts['sentiment_label'],
+                values=sentiment_counts['song_count'],
                 name="Sentimentos",
                 marker_colors=[self.colors.get(label, '#999999') 
-                             for label in sentiment_counts.index]
+                             for label in sentiment_counts['sentiment_label']]
             ),
             row=1, col=2
         )
         
-        # Gráfico 3: Scatter plot
+        # Gráfico 3: Scatter plot (um ponto por música)
         fig.add_trace(
             go.Scatter(
-                x=df['word_count'],
-                y=df['readability_score'],
+                x=songs['avg_word_count'],
+                y=songs['avg_readability'],
                 mode='markers',
                 marker=dict(
-                    color=df['sentiment_score'],
+                    color=songs['avg_sentiment'],
                     colorscale='RdYlGn',
                     size=8,
                     colorbar=dict(title="Sentimento")
                 ),
-                text=df['title'],
+                text=songs['title'],
                 name='Músicas'
             ),
             row=2, col=1
         )
         
         # Gráfico 4: Evolução da complexidade
-        yearly_complexity = df.groupby('year').agg({
-            'word_count': 'mean',
-            'readability_score': 'mean'
-        }).reset_index()
-        
         fig.add_trace(
             go.Scatter(
-                x=yearly_complexity['year'],
-                y=yearly_complexity['word_count'],
+                x=yearly['year'],
+                y=yearly['avg_word_count'],
                 mode='lines',
                 name='Palavras/Música',
                 line=dict(color=self.colors['accent'])
@@ -425,34 +580,83 @@ class LyricsVisualizationGenerator:
             showlegend=True,
             template='plotly_white'
         )
-        
-        if save_path:
-            fig.write_html(save_path)
-            
         return fig
     
-    def create_complexity_heatmap(self, save_path: str = None) -> go.Figure:
+    def create_top_artist_dashboards(self, top_n: int = 10,
+                                     output_dir: str = "./visualizations/",
+                                     render_workers: int = None,
+                                     lightweight: bool = Config.VIZ_LIGHTWEIGHT_HTML,
+                                     plotlyjs: str = Config.VIZ_PLOTLYJS,
+                                     webgl_threshold: int = Config.VIZ_WEBGL_THRESHOLD) -> dict:
         """
-        Cria heatmap de complexidade por gênero e década
+        Gera os dashboards dos top-N artistas com uma query e uma renderização em lote
+        
+        Args:
+            top_n: Quantidade de artistas com mais músicas
+            output_dir: Diretório para salvar os dashboards (artist_<chave>.html)
+            render_workers: Processos de renderização (padrão: Config.VIZ_RENDER_WORKERS;
+                0 renderiza no processo atual)
+            lightweight: HTML leve (plotly.js compartilhado), como no relatório
+            plotlyjs: Origem do plotly.js no modo leve ('directory' ou 'cdn')
+            webgl_threshold: Pontos a partir dos quais scatters viram Scattergl (0 = nunca)
+            
+        Returns:
+            Dicionário nome do artista -> arquivo HTML
         """
-        query = f"""
+        os.makedirs(output_dir, exist_ok=True)
+        
+        query, params = self._artist_dashboard_query(top_n=top_n)
+        df = self.query_data(query, params)
+        if df.empty:
+            print("Nenhum dado encontrado para os dashboards de artistas")
+            return {}
+        
+        dashboards = {}
+        html_options = self._report_html_options(output_dir, lightweight, plotlyjs, webgl_threshold)
+        with self._rendering(render_workers, html_options):
+            for key, artist_df in df.groupby('artist_key', sort=False):
+                artist_name = artist_df['artist_name'].iloc[0]
+                slug = re.sub(r'[^\w-]+', '_', key)
+                save_path = os.path.join(output_dir, f"artist_{slug}.html")
+                print(f"🎤 Criando dashboard: {artist_name}")
+                self.create_artist_analysis_dashboard(artist_name, save_path=save_path, df=artist_df)
+                dashboards[artist_name] = save_path
+            failed = self._wait_renders()
+        
+        if failed:
+            print(f"⚠️ {len(failed)} dashboard(s) não puderam ser renderizados")
+        print(f"✅ {len(dashboards) - len(failed)} dashboards de artistas gerados em: {output_dir}")
+        return dashboards
+    
+    def _complexity_heatmap_query(self) -> str:
+        """Query da legibilidade por gênero e década (rollup sentiment_rollup)"""
+        return f"""
         SELECT 
-          r.genre,
-          FLOOR(r.year / 10) * 10 as decade,
-          AVG(p.readability_score) as avg_readability,
-          COUNT(*) as song_count
-        FROM `{self.project_id}.{self.dataset_id}.raw_lyrics` r
-        JOIN `{self.project_id}.{self.dataset_id}.processed_lyrics` p ON r.id = p.id
-        WHERE r.year IS NOT NULL 
-          AND r.year BETWEEN 1970 AND 2020
-          AND r.genre != 'Unknown'
-          AND r.genre IS NOT NULL
-        GROUP BY r.genre, decade
+          genre,
+          FLOOR(year / 10) * 10 as decade,
+          SAFE_DIVIDE(SUM(readability_sum), SUM(readability_count)) as avg_readability,
+          SUM(processed_count) as song_count
+        FROM `{self.project_id}.{self.dataset_id}.sentiment_rollup`
+        WHERE year IS NOT NULL 
+          AND year BETWEEN 1970 AND 2020
+          AND genre != 'Unknown'
+          AND genre IS NOT NULL
+        GROUP BY genre, decade
         HAVING song_count >= 5
-        ORDER BY r.genre, decade
+        ORDER BY genre, decade
+        """
+    
+    def create_complexity_heatmap(self, save_path: str = None,
+                                  df: pd.DataFrame = None) -> go.Figure:
         """
+        Cria heatmap de complexidade por gênero e década
         
-        df = self.query_data(query)
+        Args:
+            save_path: Caminho para salvar o gráfico
+            df: Resultado já consultado (padrão: executa a query)
+        """
+        if df is None:
+            df = self.query_data(self._complexity_heatmap_query())
         
         if df.empty:
             print("Nenhum dado encontrado para heatmap de complexidade")
@@ -482,47 +686,74 @@ class LyricsVisualizationGenerator:
         )
         
         if save_path:
-            fig.write_html(save_path)
+            self._write_html(fig, save_path)
             
         return fig
     
-    def create_word_trend_analysis(self, words: list, save_path: str = None) -> go.Figure:
+    def _word_trend_query(self, words: list) -> tuple:
+        """
+        Query única da frequência anual de várias palavras
+        
+        As palavras vão como parâmetro de array (sem interpolação na SQL) e
+        o filtro direto em word aproveita o clustering de word_rollup: o
+        custo é o mesmo para uma ou cinquenta palavras, e a SQL idêntica
+        entre execuções aproveita o cache de resultados do BigQuery. O
+        rollup contém somente palavras de conteúdo (sem stopwords).
+        
+        Returns:
+            Tupla (SQL, parâmetros)
+        """
+        query = f"""
+        SELECT 
+          word,
+          year,
+          SUM(frequency_sum) as total_frequency,
+          SUM(song_count) as song_count
+        FROM `{self.project_id}.{self.dataset_id}.word_rollup`
+        WHERE word IN UNNEST(@words)
+          AND year IS NOT NULL
+          AND year BETWEEN 1980 AND 2024
+        GROUP BY word, year
+        HAVING song_count >= 2
+        ORDER BY word, year
+        """
+        # Palavras são gravadas em minúsculas; a ordem fixa mantém a query idêntica
+        params = [bigquery.ArrayQueryParameter(
+            'words', 'STRING', sorted({word.lower() for word in words})
+        )]
+        return query, params
+    
+    def create_word_trend_analysis(self, words: list, save_path: str = None,
+                                   df: pd.DataFrame = None) -> go.Figure:
         """
         Analisa tendência de palavras específicas ao longo do tempo
         
         Args:
             words: Lista de palavras para analisar
             save_path: Caminho para salvar o gráfico
+            df: Resultado já consultado (word, year, total_frequency; padrão: executa a query)
         """
         if not words:
             print("Lista de palavras não pode estar vazia")
             return go.Figure()
         
+        if df is None:
+            df = self.query_data(*self._word_trend_query(words))
+        
         fig = go.Figure()
         
+        # Pivot no cliente: uma coluna por palavra, anos sem ocorrência ficam sem ponto
+        pivot_df = pd.DataFrame()
+        if not df.empty:
+            pivot_df = df.pivot(index='year', columns='word', values='total_frequency').sort_index()
+        
         for word in words:
-            query = f"""
-            SELECT 
-              r.year,
-              SUM(w.frequency) as total_frequency,
-              COUNT(DISTINCT w.lyrics_id) as song_count
-            FROM `{self.project_id}.{self.dataset_id}.word_frequency` w
-            JOIN `{self.project_id}.{self.dataset_id}.raw_lyrics` r ON w.lyrics_id = r.id
-            WHERE LOWER(w.word) = LOWER('{word}')
-              AND r.year IS NOT NULL
-              AND r.year BETWEEN 1980 AND 2024
-            GROUP BY r.year
-            HAVING song_count >= 2
-            ORDER BY r.year
-            """
-            
-            df = self.query_data(query)
-            
-            if not df.empty:
+            if word.lower() in pivot_df.columns:
+                series = pivot_df[word.lower()].dropna()
                 fig.add_trace(
                     go.Scatter(
-                        x=df['year'],
-                        y=df['total_frequency'],
+                        x=series.index,
+                        y=series.values,
                         mode='lines+markers',
                         name=word.title(),
                         line=dict(width=2),
@@ -540,72 +771,493 @@ class LyricsVisualizationGenerator:
         )
         
         if save_path:
-            fig.write_html(save_path)
+            self._write_html(fig, save_path)
             
         return fig
     
-    def generate_summary_report(self, output_dir: str = "./visualizations/"):
+    def _write_html(self, fig: go.Figure, save_path: str):
+        """Grava o HTML do gráfico (no pool de processos do relatório, quando ativo)"""
+        if self._render_pool is None:
+            write_figure_html(fig, save_path, **self._html_options)
+            return
+        future = self._render_pool.submit(write_figure_html, fig, save_path, **self._html_options)
+        self._render_futures[future] = save_path
+    
+    def _report_html_options(self, output_dir: str, lightweight: bool, plotlyjs: str,
+                             webgl_threshold: int) -> dict:
+        """
+        Opções de write_figure_html para uma geração em lote
+        
+        No modo leve com plotly.js em 'directory' o bundle é gravado uma vez
+        em output_dir antes dos gráficos, que apenas o referenciam.
+        """
+        if not lightweight:
+            return {}
+        if plotlyjs == 'directory':
+            ensure_plotlyjs_bundle(output_dir)
+        return {
+            'include_plotlyjs': plotlyjs,
+            'lightweight': True,
+            'webgl_threshold': webgl_threshold
+        }
+    
+    @contextlib.contextmanager
+    def _rendering(self, render_workers: int = None, html_options: dict = None):
+        """
+        Pool de processos e opções de HTML ativos durante uma geração em lote
+        
+        Args:
+            render_workers: Processos de renderização (padrão: Config.VIZ_RENDER_WORKERS;
+                0 renderiza no processo atual)
+            html_options: Opções de write_figure_html
+        """
+        if render_workers is None:
+            render_workers = Config.VIZ_RENDER_WORKERS
+        # spawn: os processos filhos não herdam as threads das queries em andamento
+        pool = ProcessPoolExecutor(
+            max_workers=render_workers, mp_context=multiprocessing.get_context('spawn')
+        ) if render_workers > 0 else None
+        
+        self._render_pool = pool
+        self._html_options = html_options or {}
+        try:
+            yield
+        finally:
+            self._render_pool = None
+            self._html_options = {}
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+    
+    def _wait_renders(self) -> list:
+        """
+        Aguarda as renderizações pendentes do pool
+        
+        Returns:
+            Arquivos cujas renderizações falharam
+        """
+        failures = []
+        for future in as_completed(self._render_futures):
+            try:
+                future.result()
+            except Exception as e:
+                failures.append(self._render_futures[future])
+                print(f"Erro ao renderizar {self._render_futures[future]}: {str(e)}")
+        self._render_futures = {}
+        return failures
+    
+    def _chart_fingerprints(self, charts: dict, outputs: dict, settings: dict) -> dict:
+        """
+        Impressão digital das entradas de cada gráfico do relatório
+        
+        Args:
+            charts: Nome -> (mensagem, queries, renderização), como em _render_concurrently
+            outputs: Nome -> arquivos gerados pelo gráfico
+            settings: Opções de renderização que também mudam os arquivos
+            
+        Returns:
+            Nome -> hash (None quando a versão de alguma tabela não pôde ser lida,
+            e o gráfico é sempre refeito)
+        """
+        queries = {}
+        for name, (_, chart_queries, _) in charts.items():
+            queries[name] = [query if isinstance(query, tuple) else (query, None)
+                             for query in chart_queries]
+        
+        # Versão de cada tabela lida uma vez (metadados, sem custo de scan)
+        tables = {table for chart_queries in queries.values()
+                  for sql, _ in chart_queries for table in referenced_tables(sql)}
+        versions = {}
+        for table in sorted(tables):
+            try:
+                versions[table] = self._table_version(table)
+            except Exception as e:
+                print(f"Versão da tabela {table} indisponível: {str(e)}")
+                versions[table] = None
+        
+        fingerprints = {}
+        for name, chart_queries in queries.items():
+            parts = []
+            for sql, params in chart_queries:
+                sql_versions = {table: versions[table] for table in referenced_tables(sql)}
+                if any(version is None for version in sql_versions.values()):
+                    parts = None
+                    break
+                parts.append(query_fingerprint(sql, params, sql_versions))
+            if parts is None:
+                fingerprints[name] = None
+                continue
+            payload = json.dumps({
+                'chart': name,
+                'queries': parts,
+                'outputs': outputs[name],
+                'settings': settings
+            }, sort_keys=True, default=str)
+            fingerprints[name] = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        return fingerprints
+    
+    def _load_manifest(self, path: str) -> dict:
+        """Manifesto da última execução do relatório (vazio se ausente ou ilegível)"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Manifesto do relatório ignorado ({path}): {str(e)}")
+            return {}
+        return manifest if isinstance(manifest, dict) else {}
+    
+    def _save_manifest(self, path: str, manifest: dict):
+        """Grava o manifesto do relatório (escrita atômica)"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    
+    def _summary_aggregate_query(self) -> str:
+        """
+        Query única de agregados para os gráficos de sentimento e complexidade
+        
+        Uma só leitura do rollup sentiment_rollup com GROUPING SETS nas
+        granularidades ano, gênero e gênero x década; a coluna grain
+        identifica a granularidade de cada linha. Os filtros específicos de
+        cada gráfico (faixa de anos, gênero válido, mínimo de músicas) são
+        aplicados no cliente por _summary_slice sobre o resultado compacto.
+        """
+        return f"""
+        WITH base AS (
+          SELECT 
+            *,
+            IF(year BETWEEN 1970 AND 2020, CAST(FLOOR(year / 10) * 10 AS INT64), NULL) as decade
+          FROM `{self.project_id}.{self.dataset_id}.sentiment_rollup`
+        )
+        SELECT 
+          CASE
+            WHEN GROUPING(year) = 0 THEN 'year'
+            WHEN GROUPING(decade) = 1 THEN 'genre'
+            ELSE 'genre_decade'
+          END as grain,
+          year,
+          genre,
+          decade,
+          SUM(sentiment_count) as song_count,
+          SAFE_DIVIDE(SUM(sentiment_sum), SUM(sentiment_count)) as avg_sentiment,
+          {ROLLUP_STDDEV} as sentiment_stddev,
+          SUM(positive_count) as positive_count,
+          SUM(negative_count) as negative_count,
+          SUM(processed_count) as readability_count,
+          SAFE_DIVIDE(SUM(readability_sum), SUM(readability_count)) as avg_readability
+        FROM base
+        GROUP BY GROUPING SETS ((year), (genre), (genre, decade))
+        """
+    
+    def _summary_slice(self, df: pd.DataFrame, chart: str) -> pd.DataFrame:
+        """
+        Recorte do agregado compartilhado no formato da query própria do gráfico
+        
+        Args:
+            df: Resultado de _summary_aggregate_query
+            chart: 'sentiment_evolution', 'genre_comparison' ou 'complexity_heatmap'
+        """
+        if df.empty:
+            return df
+        
+        valid_genre = df['genre'].notna() & (df['genre'] != 'Unknown')
+        
+        if chart == 'sentiment_evolution':
+            rows = df[(df['grain'] == 'year') & df['year'].between(1980, 2024) & (df['song_count'] >= 5)]
+            rows = rows.assign(
+                positive_pct=rows['positive_count'] / rows['song_count'] * 100,
+                negative_pct=rows['negative_count'] / rows['song_count'] * 100
+            )
+            columns = ['year', 'avg_sentiment', 'song_count', 'positive_pct', 'negative_pct']
+            return rows[columns].sort_values('year').reset_index(drop=True)
+        
+        if chart == 'genre_comparison':
+            rows = df[(df['grain'] == 'genre') & valid_genre & (df['song_count'] >= 20)]
+            rows = rows.assign(positive_pct=rows['positive_count'] / rows['song_count'] * 100)
+            columns = ['genre', 'song_count', 'avg_sentiment', 'sentiment_stddev', 'positive_pct']
+            return rows[columns].sort_values('avg_sentiment', ascending=False).reset_index(drop=True)
+        
+        if chart == 'complexity_heatmap':
+            rows = df[(df['grain'] == 'genre_decade') & valid_genre & df['decade'].notna()
+                      & (df['readability_count'] >= 5)]
+            rows = rows.drop(columns='song_count').rename(columns={'readability_count': 'song_count'})
+            columns = ['genre', 'decade', 'avg_readability', 'song_count']
+            return rows[columns].sort_values(['genre', 'decade']).reset_index(drop=True)
+        
+        raise ValueError(f"Gráfico sem recorte no agregado compartilhado: {chart}")
+    
+    def _wordcloud_all_query(self) -> str:
+        """
+        Query única das nuvens de palavras (geral e por sentimento)
+        
+        Uma leitura de word_rollup com GROUPING SETS (palavra) e (palavra,
+        sentimento); all_sentiments marca as linhas da nuvem geral. Cada nuvem
+        mantém as 200 palavras mais frequentes, como _wordcloud_query.
+        """
+        return f"""
+        SELECT 
+          all_sentiments,
+          sentiment_label,
+          word,
+          total_frequency
+        FROM (
+          SELECT 
+            GROUPING(sentiment_label) = 1 as all_sentiments,
+            sentiment_label,
+            word,
+            SUM(frequency_sum) as total_frequency
+          FROM `{self.project_id}.{self.dataset_id}.word_rollup`
+          GROUP BY GROUPING SETS ((word), (word, sentiment_label))
+          HAVING total_frequency >= 10
+        )
+        WHERE all_sentiments OR sentiment_label IS NOT NULL
+        QUALIFY ROW_NUMBER() OVER (
+          PARTITION BY all_sentiments, sentiment_label ORDER BY total_frequency DESC
+        ) <= 200
+        """
+    
+    def _wordcloud_slice(self, df: pd.DataFrame, sentiment_filter: str = None) -> pd.DataFrame:
+        """Palavras de uma nuvem a partir do resultado de _wordcloud_all_query"""
+        if df.empty:
+            return df
+        if sentiment_filter:
+            rows = df[~df['all_sentiments'].astype(bool) & (df['sentiment_label'] == sentiment_filter)]
+        else:
+            rows = df[df['all_sentiments'].astype(bool)]
+        return (rows[['word', 'total_frequency']]
+                .sort_values('total_frequency', ascending=False)
+                .reset_index(drop=True))
+    
+    def generate_summary_report(self, output_dir: str = "./visualizations/",
+                                max_workers: int = None, render_workers: int = None,
+                                preview: bool = False,
+                                lightweight: bool = Config.VIZ_LIGHTWEIGHT_HTML,
+                                plotlyjs: str = Config.VIZ_PLOTLYJS,
+                                webgl_threshold: int = Config.VIZ_WEBGL_THRESHOLD,
+                                incremental: bool = Config.VIZ_INCREMENTAL_REPORT):
         """
         Gera relatório completo com todas as visualizações
         
+        Todas as queries do relatório são submetidas juntas no início e cada
+        gráfico é renderizado assim que os seus resultados chegam: o tempo
+        total se aproxima da query mais lenta, e não da soma de todas. Os
+        gráficos de sentimento e complexidade saem de um único agregado
+        (GROUPING SETS) sobre sentiment_rollup e as nuvens de palavras de uma
+        única leitura de word_rollup; os rollups mantidos pelo ETL deixam o
+        custo do relatório estável conforme as tabelas de músicas crescem.
+        
+        A renderização é headless: nuvens de palavras (layout e PNG) e a
+        gravação dos HTML rodam em um pool de processos enquanto as demais
+        queries ainda estão em andamento.
+        
+        No modo leve os HTML compartilham um único plotly.js (em vez de
+        ~3,5 MB embutidos em cada gráfico), levam só a parte do template
+        usada e scatters grandes são desenhados em WebGL (Scattergl).
+        
+        No modo incremental cada gráfico grava no manifesto do relatório
+        (report_manifest.json) a impressão digital das suas queries, das
+        versões das tabelas de origem e das opções de renderização; gráficos
+        com a mesma impressão digital e arquivos presentes não são refeitos e
+        o índice só é regravado quando algum gráfico mudou. Mudanças no código
+        dos gráficos não alteram a impressão digital (use incremental=False).
+        
         Args:
             output_dir: Diretório para salvar as visualizações
+            max_workers: Queries simultâneas (padrão: Config.VIZ_QUERY_WORKERS)
+            render_workers: Processos de renderização (padrão: Config.VIZ_RENDER_WORKERS;
+                0 renderiza no processo atual)
+            preview: Gravar também prévias em baixa resolução (<nome>_preview.png),
+                usadas como miniaturas no índice
+            lightweight: HTML leve (False embute o plotly.js em cada gráfico)
+            plotlyjs: Origem do plotly.js no modo leve ('directory' ou 'cdn')
+            webgl_threshold: Pontos a partir dos quais scatters viram Scattergl (0 = nunca)
+            incremental: Pular gráficos cujas entradas não mudaram desde a última execução
         """
-        import os
         os.makedirs(output_dir, exist_ok=True)
         
         print("🎨 Gerando visualizações...")
+        start = time.perf_counter()
+        trend_words = ['love', 'heart', 'time', 'life', 'world']
+        summary_query = self._summary_aggregate_query()
+        wordcloud_query = self._wordcloud_all_query()
         
-        # 1. Evolução do sentimento
-        print("📈 Criando gráfico de evolução do sentimento...")
-        sentiment_fig = self.create_sentiment_evolution_chart(
-            save_path=f"{output_dir}/sentiment_evolution.html"
-        )
+        # Gráfico -> (mensagem, queries, renderização a partir dos resultados)
+        charts = {
+            'sentiment_evolution': (
+                "📈 Criando gráfico de evolução do sentimento...",
+                [summary_query],
+                lambda frames: self.create_sentiment_evolution_chart(
+                    save_path=f"{output_dir}/sentiment_evolution.html",
+                    df=self._summary_slice(frames[0], 'sentiment_evolution')
+                )
+            ),
+            'genre_comparison': (
+                "🎵 Criando comparação por gênero...",
+                [summary_query],
+                lambda frames: self.create_genre_sentiment_comparison(
+                    save_path=f"{output_dir}/genre_comparison.html",
+                    df=self._summary_slice(frames[0], 'genre_comparison')
+                )
+            ),
+            'complexity_heatmap': (
+                "🔥 Criando heatmap de complexidade...",
+                [summary_query],
+                lambda frames: self.create_complexity_heatmap(
+                    save_path=f"{output_dir}/complexity_heatmap.html",
+                    df=self._summary_slice(frames[0], 'complexity_heatmap')
+                )
+            ),
+            'word_trends': (
+                "📊 Criando análise de tendências...",
+                [self._word_trend_query(trend_words)],
+                lambda frames: self.create_word_trend_analysis(
+                    words=trend_words,
+                    save_path=f"{output_dir}/word_trends.html",
+                    df=frames[0]
+                )
+            )
+        }
+        for sentiment in (None, 'positive', 'negative'):
+            # Argumento padrão fixa o sentimento de cada lambda
+            charts[f"wordcloud_{sentiment or 'all'}"] = (
+                f"☁️ Criando nuvem de palavras ({sentiment or 'geral'})...",
+                [wordcloud_query],
+                lambda frames, sentiment=sentiment: self.create_wordcloud_visualization(
+                    sentiment_filter=sentiment,
+                    save_path=f"{output_dir}/wordcloud_{sentiment or 'all'}.png",
+                    df=self._wordcloud_slice(frames[0], sentiment),
+                    preview_path=(f"{output_dir}/wordcloud_{sentiment or 'all'}_preview.png"
+                                  if preview else None)
+                )
+            )
         
-        # 2. Comparação por gênero
-        print("🎵 Criando comparação por gênero...")
-        genre_fig = self.create_genre_sentiment_comparison(
-            save_path=f"{output_dir}/genre_comparison.html"
-        )
+        html_options = self._report_html_options(output_dir, lightweight, plotlyjs, webgl_threshold)
         
-        # 3. Nuvens de palavras
-        print("☁️ Criando nuvens de palavras...")
-        self.create_wordcloud_visualization(
-            save_path=f"{output_dir}/wordcloud_all.png"
-        )
-        self.create_wordcloud_visualization(
-            sentiment_filter='positive',
-            save_path=f"{output_dir}/wordcloud_positive.png"
-        )
-        self.create_wordcloud_visualization(
-            sentiment_filter='negative',
-            save_path=f"{output_dir}/wordcloud_negative.png"
-        )
+        # Arquivos gerados por gráfico: nuvens em PNG (e prévia), demais em HTML
+        outputs = {}
+        for name in charts:
+            if name.startswith('wordcloud_'):
+                outputs[name] = [f"{name}.png"] + ([f"{name}_preview.png"] if preview else [])
+            else:
+                outputs[name] = [f"{name}.html"]
         
-        # 4. Heatmap de complexidade
-        print("🔥 Criando heatmap de complexidade...")
-        complexity_fig = self.create_complexity_heatmap(
-            save_path=f"{output_dir}/complexity_heatmap.html"
-        )
+        manifest_path = os.path.join(output_dir, REPORT_MANIFEST)
+        manifest = self._load_manifest(manifest_path) if incremental else {}
+        recorded = manifest.setdefault('charts', {})
+        settings = {
+            'preview': preview,
+            'html': html_options,
+            'dpi': [Config.VIZ_FINAL_DPI, Config.VIZ_PREVIEW_DPI]
+        }
+        fingerprints = self._chart_fingerprints(charts, outputs, settings)
         
-        # 5. Análise de tendências de palavras
-        print("📊 Criando análise de tendências...")
-        trend_words = ['love', 'heart', 'time', 'life', 'world']
-        trend_fig = self.create_word_trend_analysis(
-            words=trend_words,
-            save_path=f"{output_dir}/word_trends.html"
-        )
+        def unchanged(name: str) -> bool:
+            return (
+                fingerprints[name] is not None
+                and recorded.get(name, {}).get('fingerprint') == fingerprints[name]
+                and all(os.path.exists(os.path.join(output_dir, path)) for path in outputs[name])
+            )
+        
+        skipped = [name for name in charts if incremental and unchanged(name)]
+        pending = {name: chart for name, chart in charts.items() if name not in skipped}
+        if skipped:
+            print(f"⏭️ Sem alterações nas tabelas de origem: {', '.join(skipped)}")
         
-        # Criar índice HTML
-        self.create_html_index(output_dir)
+        failed = []
+        if pending:
+            with self._rendering(render_workers, html_options):
+                self._render_concurrently(pending, max_workers)
+                failed = self._wait_renders()
+            if failed:
+                print(f"⚠️ {len(failed)} gráfico(s) não puderam ser renderizados")
         
+        # Só entram no manifesto gráficos com todos os arquivos gravados: um
+        # gráfico sem dados ou com falha é tentado de novo na próxima execução
+        failed_paths = {os.path.normpath(path) for path in failed}
+        generated_at = datetime.now().isoformat()
+        for name in pending:
+            paths = [os.path.normpath(os.path.join(output_dir, path)) for path in outputs[name]]
+            if (fingerprints[name] is not None and all(os.path.exists(path) for path in paths)
+                    and not failed_paths.intersection(paths)):
+                recorded[name] = {'fingerprint': fingerprints[name], 'generated_at': generated_at}
+            else:
+                recorded.pop(name, None)
+        
+        # Criar índice HTML (apenas quando algum gráfico mudou)
+        index_settings = {'preview': preview}
+        if (pending or manifest.get('index') != index_settings
+                or not os.path.exists(os.path.join(output_dir, 'index.html'))):
+            self.create_html_index(output_dir, preview=preview)
+            manifest['index'] = index_settings
+        self._save_manifest(manifest_path, manifest)
+        
+        if self.cache is not None:
+            print(f"🗄️ Cache de queries: {self.cache.hits} acertos, {self.cache.misses} consultas ao {self.backend.name}")
+        print(f"⏱️ Relatório gerado em {time.perf_counter() - start:.1f}s")
         print(f"✅ Relatório completo gerado em: {output_dir}")
         print(f"📄 Abra o arquivo {output_dir}/index.html para ver todas as visualizações")
     
-    def create_html_index(self, output_dir: str):
+    def _render_concurrently(self, charts: dict, max_workers: int = None):
+        """
+        Executa as queries de todos os gráficos em paralelo e renderiza cada
+        gráfico (na thread atual) quando todas as suas queries terminam
+        
+        Queries idênticas em gráficos diferentes são executadas uma só vez e o
+        resultado é entregue a todos os gráficos que dependem dela.
+        
+        Args:
+            charts: Nome -> (mensagem, lista de queries (SQL ou tupla SQL e parâmetros),
+                função de renderização que recebe a lista de DataFrames na ordem das queries)
+            max_workers: Queries simultâneas (padrão: Config.VIZ_QUERY_WORKERS)
+        """
+        # Query distinta -> (sql, parâmetros) e gráficos/posições que usam o resultado
+        unique_queries = {}
+        consumers = {}
+        for name, (_, queries, _) in charts.items():
+            for position, query in enumerate(queries):
+                sql, params = query if isinstance(query, tuple) else (query, None)
+                key = (normalize_sql(sql), repr(params))
+                unique_queries.setdefault(key, (sql, params))
+                consumers.setdefault(key, []).append((name, position))
+        if not unique_queries:
+            return
+        
+        results = {name: [None] * len(queries) for name, (_, queries, _) in charts.items()}
+        remaining = {name: len(queries) for name, (_, queries, _) in charts.items()}
+        
+        with ThreadPoolExecutor(max_workers=min(len(unique_queries), max_workers or Config.VIZ_QUERY_WORKERS),
+                                thread_name_prefix='viz-query') as pool:
+            futures = {
+                pool.submit(self.query_data, sql, params): key
+                for key, (sql, params) in unique_queries.items()
+            }
+            
+            for future in as_completed(futures):
+                df = future.result()
+                for name, position in consumers[futures[future]]:
+                    results[name][position] = df
+                    remaining[name] -= 1
+                    if remaining[name] == 0:
+                        message, _, render = charts[name]
+                        print(message)
+                        render(results.pop(name))
+    
+    def create_html_index(self, output_dir: str, preview: bool = False):
         """
         Cria página HTML índice com todas as visualizações
+        
+        Args:
+            output_dir: Diretório das visualizações
+            preview: Usar as prévias em baixa resolução como miniaturas (com link
+                para a imagem final)
         """
+        def image(name: str, alt: str) -> str:
+            if preview:
+                return f'<a href="{name}.png"><img src="{name}_preview.png" alt="{alt}"></a>'
+            return f'<img src="{name}.png" alt="{alt}">'
+        
         html_content = f"""
         <!DOCTYPE html>
         <html lang="pt-BR">
@@ -703,17 +1355,17 @@ class LyricsVisualizationGenerator:
                     
                     <div class="card">
                         <h3>☁️ Nuvem de Palavras - Geral</h3>
-                        <img src="wordcloud_all.png" alt="Nuvem de Palavras Geral">
+                        {image('wordcloud_all', 'Nuvem de Palavras Geral')}
                     </div>
                     
                     <div class="card">
                         <h3>😊 Palavras Positivas</h3>
-                        <img src="wordcloud_positive.png" alt="Palavras Positivas">
+                        {image('wordcloud_positive', 'Palavras Positivas')}
                     </div>
                     
                     <div class="card">
                         <h3>😔 Palavras Negativas</h3>
-                        <img src="wordcloud_negative.png" alt="Palavras Negativas">
+                        {image('wordcloud_negative', 'Palavras Negativas')}
                     </div>
                     
                     <div class="card">
@@ -748,26 +1400,79 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Gerador de Visualizações - Análise de Letras')
-    parser.add_argument('--project-id', required=True, help='ID do projeto GCP')
+    parser.add_argument('--project-id', help='ID do projeto GCP (obrigatório no backend bigquery)')
     parser.add_argument('--dataset-id', default='lyrics_analysis', help='ID do dataset BigQuery')
     parser.add_argument('--output-dir', default='./visualizations/', help='Diretório de saída')
     parser.add_argument('--artist', help='Nome do artista para análise específica')
+    parser.add_argument('--top-artists', type=int,
+                        help='Gerar os dashboards dos N artistas com mais músicas')
+    parser.add_argument('--backend', choices=Config.VIZ_BACKENDS, default=Config.VIZ_BACKEND,
+                        help='Backend de consulta (duckdb: Parquet local, sem custo no BigQuery)')
+    parser.add_argument('--data-dir', default=Config.VIZ_LOCAL_DATA_DIR,
+                        help='Diretório com o Parquet das tabelas (backend duckdb)')
+    parser.add_argument('--cache-dir', default=Config.VIZ_CACHE_DIR,
+                        help='Diretório do cache de resultados das queries')
+    parser.add_argument('--cache-ttl', type=float, default=Config.VIZ_CACHE_TTL_SECONDS,
+                        help='Validade do cache em segundos')
+    parser.add_argument('--no-cache', action='store_true', help='Consultar sempre o BigQuery')
+    parser.add_argument('--render-workers', type=int, default=Config.VIZ_RENDER_WORKERS,
+                        help='Processos de renderização do relatório (0 = processo atual)')
+    parser.add_argument('--preview', action='store_true',
+                        help='Gerar também prévias em baixa resolução das imagens')
+    parser.add_argument('--interactive', action='store_true',
+                        help='Abrir as figuras do matplotlib em janela (plt.show)')
+    parser.add_argument('--full-html', action='store_true',
+                        help='Embutir o plotly.js em cada HTML do relatório (sem modo leve)')
+    parser.add_argument('--plotlyjs', choices=['directory', 'cdn'], default=Config.VIZ_PLOTLYJS,
+                        help='Origem do plotly.js compartilhado pelos HTML do relatório')
+    parser.add_argument('--force', action='store_true',
+                        help='Refazer todos os gráficos, mesmo sem alterações nas tabelas')
+    parser.add_argument('--webgl-threshold', type=int, default=Config.VIZ_WEBGL_THRESHOLD,
+                        help='Pontos a partir dos quais scatters usam WebGL (0 = nunca)')
     
     args = parser.parse_args()
+    if args.backend == 'bigquery' and not args.project_id:
+        parser.error('--project-id é obrigatório com o backend bigquery')
+    # No DuckDB o projeto só compõe as referências `projeto.dataset.tabela` das queries
+    args.project_id = args.project_id or 'local'
     
     # Inicializar gerador
-    generator = LyricsVisualizationGenerator(args.project_id, args.dataset_id)
+    generator = LyricsVisualizationGenerator(
+        args.project_id, args.dataset_id,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        cache_ttl=args.cache_ttl,
+        headless=not args.interactive,
+        backend=create_backend(args.backend, project_id=args.project_id, data_dir=args.data_dir)
+    )
     
-    if args.artist:
+    if args.top_artists:
+        # Dashboards em lote: uma query e uma renderização para os top-N artistas
+        print(f"🎤 Gerando dashboards dos {args.top_artists} artistas com mais músicas")
+        generator.create_top_artist_dashboards(
+            top_n=args.top_artists, output_dir=args.output_dir,
+            render_workers=args.render_workers, lightweight=not args.full_html,
+            plotlyjs=args.plotlyjs, webgl_threshold=args.webgl_threshold
+        )
+    elif args.artist:
         # Análise específica de artista
         print(f"🎤 Gerando análise para o artista: {args.artist}")
-        fig = generator.create_artist_analysis_dashboard(
-            artist_name=args.artist,
-            save_path=f"{args.output_dir}/artist_{args.artist.replace(' ', '_').lower()}.html"
+        os.makedirs(args.output_dir, exist_ok=True)
+        # Mesmo HTML leve/WebGL do relatório e do modo top-N
+        html_options = generator._report_html_options(
+            args.output_dir, not args.full_html, args.plotlyjs, args.webgl_threshold
         )
+        with generator._rendering(0, html_options):
+            generator.create_artist_analysis_dashboard(
+                artist_name=args.artist,
+                save_path=f"{args.output_dir}/artist_{args.artist.replace(' ', '_').lower()}.html"
+            )
     else:
         # Relatório completo
-        generator.generate_summary_report(args.output_dir)
+        generator.generate_summary_report(
+            args.output_dir, render_workers=args.render_workers, preview=args.preview,
+            lightweight=not args.full_html, plotlyjs=args.plotlyjs,
+            webgl_threshold=args.webgl_threshold, incremental=not args.force
+        )
 
 
 if __name__ == "__main__":
@@ -12,6 +12,7 @@ CREATE OR REPLACE TABLE `${PROJECT_ID}.lyrics_analysis.raw_lyrics` (
   id STRING NOT NULL,
   title STRING,
   artist STRING,
+  artist_key STRING,
   album STRING,
   genre STRING,
   year INT64,
@@ -21,7 +22,8 @@ CREATE OR REPLACE TABLE `${PROJECT_ID}.lyrics_analysis.raw_lyrics` (
   file_path STRING
 )
 PARTITION BY DATE(created_at)
-CLUSTER BY artist, genre
+-- artist_key (nome normalizado pelo ETL) permite podar o cluster nas buscas por artista
+CLUSTER BY artist_key, genre
 OPTIONS (
   description = "Dados brutos de letras de música",
   partition_expiration_days = 365
@@ -38,7 +40,7 @@ CREATE OR REPLACE TABLE `${PROJECT_ID}.lyrics_analysis.processed_lyrics` (
   readability_score FLOAT64,
   language STRING,
   processed_text STRING,
-  tokens STRING, -- JSON array as string
+  tokens STRING, -- JSON array as string (ARRAY<STRING> com ARRAY_COLUMN_MODE=repeated)
   processed_at TIMESTAMP
 )
 PARTITION BY DATE(processed_at)
@@ -69,9 +71,9 @@ CREATE OR REPLACE TABLE `${PROJECT_ID}.lyrics_analysis.sentiment_analysis` (
   sentiment_score FLOAT64,
   sentiment_label STRING,
   confidence FLOAT64,
-  positive_words STRING, -- JSON array
-  negative_words STRING, -- JSON array
-  neutral_words STRING,  -- JSON array
+  positive_words STRING, -- JSON array (ARRAY<STRING> com ARRAY_COLUMN_MODE=repeated)
+  negative_words STRING, -- JSON array (ARRAY<STRING> com ARRAY_COLUMN_MODE=repeated)
+  neutral_words STRING,  -- JSON array (ARRAY<STRING> com ARRAY_COLUMN_MODE=repeated)
   analyzed_at TIMESTAMP
 )
 PARTITION BY DATE(analyzed_at)
@@ -80,23 +82,96 @@ OPTIONS (
   description = "Análise de sentimentos das letras"
 );
 
+-- Rollups mantidos pelo ETL (scripts/py/rollups.py): as chaves tocadas por
+-- cada lote são recalculadas a partir das tabelas base e substituídas por
+-- MERGE. Guardam somas e contagens; médias e desvios são calculados na
+-- leitura. Reconstrução completa: CALL rebuild_rollups().
+
+-- Rollup: sentimento e métricas de texto por ano e gênero
+CREATE OR REPLACE TABLE `${PROJECT_ID}.lyrics_analysis.sentiment_rollup` (
+  year INT64,
+  genre STRING,
+  song_count INT64,
+  sentiment_count INT64,
+  sentiment_sum FLOAT64,
+  sentiment_sq_sum FLOAT64,
+  positive_count INT64,
+  negative_count INT64,
+  neutral_count INT64,
+  confidence_sum FLOAT64,
+  processed_count INT64,
+  word_count_sum INT64,
+  unique_words_sum INT64,
+  readability_count INT64,
+  readability_sum FLOAT64,
+  updated_at TIMESTAMP
+)
+CLUSTER BY year, genre
+OPTIONS (
+  description = "Rollup de sentimento por ano e gênero (mantido pelo ETL)"
+);
+
+-- Rollup: palavras de conteúdo por ano e sentimento
+CREATE OR REPLACE TABLE `${PROJECT_ID}.lyrics_analysis.word_rollup` (
+  year INT64,
+  sentiment_label STRING,
+  word STRING NOT NULL,
+  frequency_sum INT64,
+  song_count INT64,
+  tfidf_sum FLOAT64,
+  tfidf_count INT64,
+  updated_at TIMESTAMP
+)
+CLUSTER BY word, sentiment_label, year
+OPTIONS (
+  description = "Rollup de palavras (sem stopwords, 3+ letras) por ano e sentimento (mantido pelo ETL)"
+);
+
+-- Rollup: resumo por artista e gênero
+CREATE OR REPLACE TABLE `${PROJECT_ID}.lyrics_analysis.artist_rollup` (
+  artist STRING,
+  genre STRING,
+  song_count INT64,
+  first_year INT64,
+  last_year INT64,
+  sentiment_count INT64,
+  sentiment_sum FLOAT64,
+  positive_count INT64,
+  negative_count INT64,
+  neutral_count INT64,
+  processed_count INT64,
+  word_count_sum INT64,
+  unique_words_sum INT64,
+  avg_word_length_sum FLOAT64,
+  readability_count INT64,
+  readability_sum FLOAT64,
+  updated_at TIMESTAMP
+)
+CLUSTER BY artist, genre
+OPTIONS (
+  description = "Rollup por artista e gênero (mantido pelo ETL)"
+);
+
 -- Views para análises
 
 -- View: Estatísticas por artista
 CREATE OR REPLACE VIEW `${PROJECT_ID}.lyrics_analysis.artist_stats` AS
 SELECT 
-  p.artist,
-  COUNT(*) as total_songs,
-  AVG(p.word_count) as avg_word_count,
-  AVG(p.unique_words) as avg_unique_words,
-  AVG(p.readability_score) as avg_readability,
-  AVG(s.sentiment_score) as avg_sentiment,
-  MODE(s.sentiment_label) as dominant_sentiment
-FROM `${PROJECT_ID}.lyrics_analysis.processed_lyrics` p
-LEFT JOIN `${PROJECT_ID}.lyrics_analysis.sentiment_analysis` s
-  ON p.id = s.lyrics_id
-WHERE p.artist != 'Unknown'
-GROUP BY p.artist
+  artist,
+  SUM(processed_count) as total_songs,
+  SAFE_DIVIDE(SUM(word_count_sum), SUM(processed_count)) as avg_word_count,
+  SAFE_DIVIDE(SUM(unique_words_sum), SUM(processed_count)) as avg_unique_words,
+  SAFE_DIVIDE(SUM(readability_sum), SUM(readability_count)) as avg_readability,
+  SAFE_DIVIDE(SUM(sentiment_sum), SUM(sentiment_count)) as avg_sentiment,
+  CASE GREATEST(SUM(positive_count), SUM(negative_count), SUM(neutral_count))
+    WHEN 0 THEN NULL
+    WHEN SUM(positive_count) THEN 'positive'
+    WHEN SUM(negative_count) THEN 'negative'
+    ELSE 'neutral'
+  END as dominant_sentiment
+FROM `${PROJECT_ID}.lyrics_analysis.artist_rollup`
+WHERE artist != 'Unknown'
+GROUP BY artist
 HAVING total_songs >= 3
 ORDER BY total_songs DESC;
 
@@ -104,13 +179,10 @@ ORDER BY total_songs DESC;
 CREATE OR REPLACE VIEW `${PROJECT_ID}.lyrics_analysis.top_words_global` AS
 SELECT 
   word,
-  SUM(frequency) as total_frequency,
-  COUNT(DISTINCT lyrics_id) as songs_count,
-  AVG(tf_idf) as avg_tfidf,
-  MODE(pos_tag) as common_pos_tag
-FROM `${PROJECT_ID}.lyrics_analysis.word_frequency`
-WHERE is_stopword = FALSE
-  AND LENGTH(word) >= 3
+  SUM(frequency_sum) as total_frequency,
+  SUM(song_count) as songs_count,
+  SAFE_DIVIDE(SUM(tfidf_sum), SUM(tfidf_count)) as avg_tfidf
+FROM `${PROJECT_ID}.lyrics_analysis.word_rollup`
 GROUP BY word
 HAVING songs_count >= 5
 ORDER BY total_frequency DESC
@@ -119,22 +191,20 @@ LIMIT 1000;
 -- View: Evolução temporal dos sentimentos
 CREATE OR REPLACE VIEW `${PROJECT_ID}.lyrics_analysis.sentiment_trends` AS
 SELECT 
-  r.year,
-  r.genre,
-  COUNT(*) as songs_count,
-  AVG(s.sentiment_score) as avg_sentiment,
-  COUNTIF(s.sentiment_label = 'positive') / COUNT(*) as positive_ratio,
-  COUNTIF(s.sentiment_label = 'negative') / COUNT(*) as negative_ratio,
-  COUNTIF(s.sentiment_label = 'neutral') / COUNT(*) as neutral_ratio
-FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r
-JOIN `${PROJECT_ID}.lyrics_analysis.sentiment_analysis` s
-  ON r.id = s.lyrics_id
-WHERE r.year IS NOT NULL 
-  AND r.year BETWEEN 1950 AND 2024
-  AND r.genre != 'Unknown'
-GROUP BY r.year, r.genre
+  year,
+  genre,
+  SUM(sentiment_count) as songs_count,
+  SAFE_DIVIDE(SUM(sentiment_sum), SUM(sentiment_count)) as avg_sentiment,
+  SAFE_DIVIDE(SUM(positive_count), SUM(sentiment_count)) as positive_ratio,
+  SAFE_DIVIDE(SUM(negative_count), SUM(sentiment_count)) as negative_ratio,
+  SAFE_DIVIDE(SUM(neutral_count), SUM(sentiment_count)) as neutral_ratio
+FROM `${PROJECT_ID}.lyrics_analysis.sentiment_rollup`
+WHERE year IS NOT NULL 
+  AND year BETWEEN 1950 AND 2024
+  AND genre != 'Unknown'
+GROUP BY year, genre
 HAVING songs_count >= 10
-ORDER BY r.year DESC, r.genre;
+ORDER BY year DESC, genre;
 
 -- View: Análise de complexidade por gênero
 CREATE OR REPLACE VIEW `${PROJECT_ID}.lyrics_analysis.genre_complexity` AS
@@ -166,6 +236,153 @@ LANGUAGE js AS """
   return 0.5; // Placeholder - implementação real seria mais complexa
 """;
 
+-- Chave normalizada de artista (mesma regra de scripts/py/artist_keys.py):
+-- NFKC, espaços colapsados e minúsculas
+CREATE OR REPLACE FUNCTION `${PROJECT_ID}.lyrics_analysis.normalize_artist`(
+  artist STRING
+)
+RETURNS STRING
+AS (
+  LOWER(TRIM(REGEXP_REPLACE(NORMALIZE(artist, NFKC), r'[ \t\n\r\f]+', ' ')))
+);
+
+-- Procedimento para preencher artist_key em tabelas criadas antes da coluna.
+-- O clustering de uma tabela existente é alterado pela API, por exemplo:
+-- bq update --clustering_fields=artist_key,genre lyrics_analysis.raw_lyrics
+CREATE OR REPLACE PROCEDURE `${PROJECT_ID}.lyrics_analysis.backfill_artist_key`()
+BEGIN
+  ALTER TABLE `${PROJECT_ID}.lyrics_analysis.raw_lyrics`
+  ADD COLUMN IF NOT EXISTS artist_key STRING;
+  
+  UPDATE `${PROJECT_ID}.lyrics_analysis.raw_lyrics`
+  SET artist_key = `${PROJECT_ID}.lyrics_analysis.normalize_artist`(artist)
+  WHERE artist_key IS NULL AND artist IS NOT NULL;
+END;
+
+-- Procedimento para reconstruir os rollups a partir das tabelas base
+-- (carga inicial, após limpeza ou após recargas que mudam ano, gênero,
+-- artista ou sentimento de músicas já carregadas: o ETL só recalcula as
+-- chaves novas). Linhas repetidas nas tabelas base (modo de carga append)
+-- contam uma vez, pela versão mais recente.
+CREATE OR REPLACE PROCEDURE `${PROJECT_ID}.lyrics_analysis.rebuild_rollups`()
+BEGIN
+  DECLARE rebuilt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP();
+  
+  -- Uma linha por música com as medidas de rollups.compute_rollups
+  CREATE TEMP TABLE songs AS
+  SELECT 
+    r.id,
+    r.artist,
+    r.genre,
+    r.year,
+    s.lyrics_id IS NOT NULL as analyzed,
+    s.sentiment_score,
+    s.sentiment_label,
+    s.confidence,
+    -- Perfis sem text_stats gravam word_count NULL e não entram nas médias de texto
+    p.word_count IS NOT NULL as processed,
+    p.word_count,
+    p.unique_words,
+    p.avg_word_length,
+    p.readability_score
+  FROM (
+    SELECT id, artist, genre, year
+    FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics`
+    WHERE TRUE
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY created_at DESC) = 1
+  ) r
+  LEFT JOIN (
+    SELECT lyrics_id, sentiment_score, sentiment_label, confidence
+    FROM `${PROJECT_ID}.lyrics_analysis.sentiment_analysis`
+    WHERE TRUE
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY lyrics_id ORDER BY analyzed_at DESC) = 1
+  ) s ON r.id = s.lyrics_id
+  LEFT JOIN (
+    SELECT id, word_count, unique_words, avg_word_length, readability_score
+    FROM `${PROJECT_ID}.lyrics_analysis.processed_lyrics`
+    WHERE TRUE
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY processed_at DESC) = 1
+  ) p ON r.id = p.id;
+  
+  TRUNCATE TABLE `${PROJECT_ID}.lyrics_analysis.sentiment_rollup`;
+  INSERT INTO `${PROJECT_ID}.lyrics_analysis.sentiment_rollup` (
+    year, genre, song_count, sentiment_count, sentiment_sum, sentiment_sq_sum,
+    positive_count, negative_count, neutral_count, confidence_sum, processed_count,
+    word_count_sum, unique_words_sum, readability_count, readability_sum, updated_at
+  )
+  SELECT 
+    year,
+    genre,
+    COUNT(*),
+    COUNTIF(analyzed),
+    IFNULL(SUM(sentiment_score), 0),
+    IFNULL(SUM(POW(sentiment_score, 2)), 0),
+    COUNTIF(sentiment_label = 'positive'),
+    COUNTIF(sentiment_label = 'negative'),
+    COUNTIF(sentiment_label = 'neutral'),
+    IFNULL(SUM(confidence), 0),
+    COUNTIF(processed),
+    IFNULL(SUM(word_count), 0),
+    IFNULL(SUM(unique_words), 0),
+    COUNT(readability_score),
+    IFNULL(SUM(readability_score), 0),
+    rebuilt_at
+  FROM songs
+  GROUP BY year, genre;
+  
+  TRUNCATE TABLE `${PROJECT_ID}.lyrics_analysis.artist_rollup`;
+  INSERT INTO `${PROJECT_ID}.lyrics_analysis.artist_rollup` (
+    artist, genre, song_count, first_year, last_year, sentiment_count, sentiment_sum,
+    positive_count, negative_count, neutral_count, processed_count, word_count_sum,
+    unique_words_sum, avg_word_length_sum, readability_count, readability_sum, updated_at
+  )
+  SELECT 
+    artist,
+    genre,
+    COUNT(*),
+    MIN(year),
+    MAX(year),
+    COUNTIF(analyzed),
+    IFNULL(SUM(sentiment_score), 0),
+    COUNTIF(sentiment_label = 'positive'),
+    COUNTIF(sentiment_label = 'negative'),
+    COUNTIF(sentiment_label = 'neutral'),
+    COUNTIF(processed),
+    IFNULL(SUM(word_count), 0),
+    IFNULL(SUM(unique_words), 0),
+    IFNULL(SUM(avg_word_length), 0),
+    COUNT(readability_score),
+    IFNULL(SUM(readability_score), 0),
+    rebuilt_at
+  FROM songs
+  GROUP BY artist, genre;
+  
+  TRUNCATE TABLE `${PROJECT_ID}.lyrics_analysis.word_rollup`;
+  INSERT INTO `${PROJECT_ID}.lyrics_analysis.word_rollup` (
+    year, sentiment_label, word, frequency_sum, song_count, tfidf_sum, tfidf_count, updated_at
+  )
+  SELECT 
+    s.year,
+    s.sentiment_label,
+    w.word,
+    SUM(w.frequency),
+    COUNT(DISTINCT w.lyrics_id),
+    IFNULL(SUM(w.tf_idf), 0),
+    COUNT(w.tf_idf),
+    rebuilt_at
+  FROM (
+    SELECT lyrics_id, word, frequency, tf_idf
+    FROM `${PROJECT_ID}.lyrics_analysis.word_frequency`
+    WHERE IFNULL(is_stopword, FALSE) = FALSE
+      AND LENGTH(word) >= 3
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY lyrics_id, word ORDER BY created_at DESC) = 1
+  ) w
+  JOIN songs s ON w.lyrics_id = s.id
+  GROUP BY s.year, s.sentiment_label, w.word;
+  
+  SELECT FORMAT("Rollups reconstruídos em %t", rebuilt_at) as message;
+END;
+
 -- Procedimento para limpeza de dados antigos
 CREATE OR REPLACE PROCEDURE `${PROJECT_ID}.lyrics_analysis.cleanup_old_data`(
   days_to_keep INT64
@@ -186,6 +403,8 @@ BEGIN
   DELETE FROM `${PROJECT_ID}.lyrics_analysis.sentiment_analysis`
   WHERE DATE(analyzed_at) < cutoff_date;
   
+  -- Rollups voltam a refletir somente os dados mantidos
+  CALL `${PROJECT_ID}.lyrics_analysis.rebuild_rollups`();
+  
   SELECT FORMAT("Dados anteriores a %s foram removidos", cutoff_date) as message;
 END;
-
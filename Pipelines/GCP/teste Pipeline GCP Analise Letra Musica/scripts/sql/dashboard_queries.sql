@@ -1,5 +1,9 @@
 -- Queries SQL para Dashboards e Análises
 -- Pipeline de Análise de Letras de Música
+--
+-- Métricas agregadas por ano, gênero, artista e palavra leem as tabelas de
+-- rollup mantidas pelo ETL (sentiment_rollup, word_rollup, artist_rollup,
+-- ver create_tables.sql). Análises por música continuam nas tabelas base.
 
 -- =====================================================
 -- MÉTRICAS E KPIs PRINCIPAIS
@@ -7,36 +11,53 @@
 
 -- 1. Visão Geral do Dataset
 CREATE OR REPLACE VIEW `${PROJECT_ID}.lyrics_analysis.dataset_overview` AS
+WITH songs AS (
+  SELECT 
+    SUM(song_count) as total_songs,
+    COUNT(DISTINCT genre) as total_genres,
+    COUNT(DISTINCT year) as years_span,
+    MIN(year) as earliest_year,
+    MAX(year) as latest_year,
+    SAFE_DIVIDE(SUM(word_count_sum), SUM(processed_count)) as avg_words_per_song,
+    SAFE_DIVIDE(SUM(readability_sum), SUM(readability_count)) as avg_readability,
+    SAFE_DIVIDE(SUM(sentiment_sum), SUM(sentiment_count)) as avg_sentiment
+  FROM `${PROJECT_ID}.lyrics_analysis.sentiment_rollup`
+),
+artists AS (
+  SELECT COUNT(DISTINCT artist) as total_artists
+  FROM `${PROJECT_ID}.lyrics_analysis.artist_rollup`
+)
 SELECT 
-  COUNT(DISTINCT r.id) as total_songs,
-  COUNT(DISTINCT r.artist) as total_artists,
-  COUNT(DISTINCT r.genre) as total_genres,
-  COUNT(DISTINCT r.year) as years_span,
-  MIN(r.year) as earliest_year,
-  MAX(r.year) as latest_year,
-  AVG(p.word_count) as avg_words_per_song,
-  AVG(p.readability_score) as avg_readability,
-  AVG(s.sentiment_score) as avg_sentiment
-FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r
-LEFT JOIN `${PROJECT_ID}.lyrics_analysis.processed_lyrics` p ON r.id = p.id
-LEFT JOIN `${PROJECT_ID}.lyrics_analysis.sentiment_analysis` s ON r.id = s.lyrics_id
-WHERE r.lyrics IS NOT NULL AND r.lyrics != '';
+  songs.total_songs,
+  artists.total_artists,
+  songs.total_genres,
+  songs.years_span,
+  songs.earliest_year,
+  songs.latest_year,
+  songs.avg_words_per_song,
+  songs.avg_readability,
+  songs.avg_sentiment
+FROM songs
+CROSS JOIN artists;
 
 -- 2. Top Artistas por Volume de Músicas
 CREATE OR REPLACE VIEW `${PROJECT_ID}.lyrics_analysis.top_artists_by_volume` AS
 SELECT 
-  r.artist,
-  COUNT(*) as song_count,
-  AVG(p.word_count) as avg_word_count,
-  AVG(p.readability_score) as avg_readability,
-  AVG(s.sentiment_score) as avg_sentiment,
-  MODE(s.sentiment_label) as dominant_sentiment,
-  STRING_AGG(DISTINCT r.genre, ', ' ORDER BY r.genre) as genres
-FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r
-LEFT JOIN `${PROJECT_ID}.lyrics_analysis.processed_lyrics` p ON r.id = p.id
-LEFT JOIN `${PROJECT_ID}.lyrics_analysis.sentiment_analysis` s ON r.id = s.lyrics_id
-WHERE r.artist != 'Unknown' AND r.artist IS NOT NULL
-GROUP BY r.artist
+  artist,
+  SUM(song_count) as song_count,
+  SAFE_DIVIDE(SUM(word_count_sum), SUM(processed_count)) as avg_word_count,
+  SAFE_DIVIDE(SUM(readability_sum), SUM(readability_count)) as avg_readability,
+  SAFE_DIVIDE(SUM(sentiment_sum), SUM(sentiment_count)) as avg_sentiment,
+  CASE GREATEST(SUM(positive_count), SUM(negative_count), SUM(neutral_count))
+    WHEN 0 THEN NULL
+    WHEN SUM(positive_count) THEN 'positive'
+    WHEN SUM(negative_count) THEN 'negative'
+    ELSE 'neutral'
+  END as dominant_sentiment,
+  STRING_AGG(DISTINCT genre, ', ' ORDER BY genre) as genres
+FROM `${PROJECT_ID}.lyrics_analysis.artist_rollup`
+WHERE artist != 'Unknown' AND artist IS NOT NULL
+GROUP BY artist
 HAVING song_count >= 3
 ORDER BY song_count DESC, avg_sentiment DESC
 LIMIT 50;
@@ -44,55 +65,50 @@ LIMIT 50;
 -- 3. Análise de Sentimentos por Gênero
 CREATE OR REPLACE VIEW `${PROJECT_ID}.lyrics_analysis.sentiment_by_genre` AS
 SELECT 
-  r.genre,
-  COUNT(*) as song_count,
-  AVG(s.sentiment_score) as avg_sentiment_score,
-  STDDEV(s.sentiment_score) as sentiment_stddev,
-  COUNTIF(s.sentiment_label = 'positive') / COUNT(*) * 100 as positive_percentage,
-  COUNTIF(s.sentiment_label = 'negative') / COUNT(*) * 100 as negative_percentage,
-  COUNTIF(s.sentiment_label = 'neutral') / COUNT(*) * 100 as neutral_percentage,
-  AVG(s.confidence) as avg_confidence
-FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r
-JOIN `${PROJECT_ID}.lyrics_analysis.sentiment_analysis` s ON r.id = s.lyrics_id
-WHERE r.genre != 'Unknown' AND r.genre IS NOT NULL
-GROUP BY r.genre
+  genre,
+  SUM(sentiment_count) as song_count,
+  SAFE_DIVIDE(SUM(sentiment_sum), SUM(sentiment_count)) as avg_sentiment_score,
+  SQRT(GREATEST(SAFE_DIVIDE(SUM(sentiment_sq_sum) - SAFE_DIVIDE(POW(SUM(sentiment_sum), 2), SUM(sentiment_count)),
+                            SUM(sentiment_count) - 1), 0)) as sentiment_stddev,
+  SAFE_DIVIDE(SUM(positive_count), SUM(sentiment_count)) * 100 as positive_percentage,
+  SAFE_DIVIDE(SUM(negative_count), SUM(sentiment_count)) * 100 as negative_percentage,
+  SAFE_DIVIDE(SUM(neutral_count), SUM(sentiment_count)) * 100 as neutral_percentage,
+  SAFE_DIVIDE(SUM(confidence_sum), SUM(sentiment_count)) as avg_confidence
+FROM `${PROJECT_ID}.lyrics_analysis.sentiment_rollup`
+WHERE genre != 'Unknown' AND genre IS NOT NULL
+GROUP BY genre
 HAVING song_count >= 10
 ORDER BY avg_sentiment_score DESC;
 
 -- 4. Evolução Temporal dos Sentimentos
 CREATE OR REPLACE VIEW `${PROJECT_ID}.lyrics_analysis.sentiment_evolution` AS
 SELECT 
-  r.year,
-  COUNT(*) as song_count,
-  AVG(s.sentiment_score) as avg_sentiment,
-  COUNTIF(s.sentiment_label = 'positive') / COUNT(*) * 100 as positive_pct,
-  COUNTIF(s.sentiment_label = 'negative') / COUNT(*) * 100 as negative_pct,
-  COUNTIF(s.sentiment_label = 'neutral') / COUNT(*) * 100 as neutral_pct,
-  AVG(p.readability_score) as avg_readability,
-  AVG(p.word_count) as avg_word_count
-FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r
-JOIN `${PROJECT_ID}.lyrics_analysis.sentiment_analysis` s ON r.id = s.lyrics_id
-JOIN `${PROJECT_ID}.lyrics_analysis.processed_lyrics` p ON r.id = p.id
-WHERE r.year IS NOT NULL 
-  AND r.year BETWEEN 1950 AND 2024
-GROUP BY r.year
+  year,
+  SUM(sentiment_count) as song_count,
+  SAFE_DIVIDE(SUM(sentiment_sum), SUM(sentiment_count)) as avg_sentiment,
+  SAFE_DIVIDE(SUM(positive_count), SUM(sentiment_count)) * 100 as positive_pct,
+  SAFE_DIVIDE(SUM(negative_count), SUM(sentiment_count)) * 100 as negative_pct,
+  SAFE_DIVIDE(SUM(neutral_count), SUM(sentiment_count)) * 100 as neutral_pct,
+  SAFE_DIVIDE(SUM(readability_sum), SUM(readability_count)) as avg_readability,
+  SAFE_DIVIDE(SUM(word_count_sum), SUM(processed_count)) as avg_word_count
+FROM `${PROJECT_ID}.lyrics_analysis.sentiment_rollup`
+WHERE year IS NOT NULL 
+  AND year BETWEEN 1950 AND 2024
+GROUP BY year
 HAVING song_count >= 5
-ORDER BY r.year;
+ORDER BY year;
 
 -- 5. Palavras Mais Frequentes Globalmente
 CREATE OR REPLACE VIEW `${PROJECT_ID}.lyrics_analysis.global_word_frequency` AS
 SELECT 
-  w.word,
-  SUM(w.frequency) as total_frequency,
-  COUNT(DISTINCT w.lyrics_id) as songs_with_word,
-  AVG(w.tf_idf) as avg_tfidf,
-  MODE(w.pos_tag) as common_pos_tag,
-  SUM(w.frequency) / COUNT(DISTINCT w.lyrics_id) as avg_frequency_per_song
-FROM `${PROJECT_ID}.lyrics_analysis.word_frequency` w
-WHERE w.is_stopword = FALSE 
-  AND LENGTH(w.word) >= 3
-  AND w.word NOT IN ('yeah', 'ohh', 'ahh', 'mmm', 'hmm')
-GROUP BY w.word
+  word,
+  SUM(frequency_sum) as total_frequency,
+  SUM(song_count) as songs_with_word,
+  SAFE_DIVIDE(SUM(tfidf_sum), SUM(tfidf_count)) as avg_tfidf,
+  SAFE_DIVIDE(SUM(frequency_sum), SUM(song_count)) as avg_frequency_per_song
+FROM `${PROJECT_ID}.lyrics_analysis.word_rollup`
+WHERE word NOT IN ('yeah', 'ohh', 'ahh', 'mmm', 'hmm')
+GROUP BY word
 HAVING songs_with_word >= 10
 ORDER BY total_frequency DESC
 LIMIT 100;
@@ -121,17 +137,14 @@ ORDER BY decade;
 CREATE OR REPLACE VIEW `${PROJECT_ID}.lyrics_analysis.words_by_sentiment` AS
 WITH sentiment_words AS (
   SELECT 
-    w.word,
-    s.sentiment_label,
-    SUM(w.frequency) as total_frequency,
-    COUNT(DISTINCT w.lyrics_id) as song_count,
-    AVG(w.tf_idf) as avg_tfidf
-  FROM `${PROJECT_ID}.lyrics_analysis.word_frequency` w
-  JOIN `${PROJECT_ID}.lyrics_analysis.sentiment_analysis` s ON w.lyrics_id = s.lyrics_id
-  WHERE w.is_stopword = FALSE 
-    AND LENGTH(w.word) >= 3
-    AND s.sentiment_label IN ('positive', 'negative')
-  GROUP BY w.word, s.sentiment_label
+    word,
+    sentiment_label,
+    SUM(frequency_sum) as total_frequency,
+    SUM(song_count) as song_count,
+    SAFE_DIVIDE(SUM(tfidf_sum), SUM(tfidf_count)) as avg_tfidf
+  FROM `${PROJECT_ID}.lyrics_analysis.word_rollup`
+  WHERE sentiment_label IN ('positive', 'negative')
+  GROUP BY word, sentiment_label
   HAVING song_count >= 5
 )
 SELECT 
@@ -220,36 +233,33 @@ CREATE OR REPLACE FUNCTION `${PROJECT_ID}.lyrics_analysis.get_word_trend`(target
 RETURNS TABLE<year INT64, frequency INT64, song_count INT64, avg_tfidf FLOAT64>
 AS (
   SELECT 
-    r.year,
-    SUM(w.frequency) as frequency,
-    COUNT(DISTINCT w.lyrics_id) as song_count,
-    AVG(w.tf_idf) as avg_tfidf
-  FROM `${PROJECT_ID}.lyrics_analysis.word_frequency` w
-  JOIN `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r ON w.lyrics_id = r.id
-  WHERE LOWER(w.word) = LOWER(target_word)
-    AND r.year IS NOT NULL
-    AND r.year BETWEEN 1950 AND 2024
-  GROUP BY r.year
+    year,
+    SUM(frequency_sum) as frequency,
+    SUM(song_count) as song_count,
+    SAFE_DIVIDE(SUM(tfidf_sum), SUM(tfidf_count)) as avg_tfidf
+  FROM `${PROJECT_ID}.lyrics_analysis.word_rollup`
+  WHERE word = LOWER(target_word)
+    AND year IS NOT NULL
+    AND year BETWEEN 1950 AND 2024
+  GROUP BY year
   HAVING song_count >= 2
-  ORDER BY r.year
+  ORDER BY year
 );
 
 -- 12. Comparação de Artistas Similares
 CREATE OR REPLACE VIEW `${PROJECT_ID}.lyrics_analysis.artist_similarity_metrics` AS
 WITH artist_metrics AS (
   SELECT 
-    r.artist,
-    AVG(p.word_count) as avg_word_count,
-    AVG(p.unique_words) as avg_unique_words,
-    AVG(p.readability_score) as avg_readability,
-    AVG(s.sentiment_score) as avg_sentiment,
-    AVG(p.avg_word_length) as avg_word_length,
-    COUNT(*) as song_count
-  FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r
-  JOIN `${PROJECT_ID}.lyrics_analysis.processed_lyrics` p ON r.id = p.id
-  JOIN `${PROJECT_ID}.lyrics_analysis.sentiment_analysis` s ON r.id = s.lyrics_id
-  WHERE r.artist != 'Unknown' AND r.artist IS NOT NULL
-  GROUP BY r.artist
+    artist,
+    SAFE_DIVIDE(SUM(word_count_sum), SUM(processed_count)) as avg_word_count,
+    SAFE_DIVIDE(SUM(unique_words_sum), SUM(processed_count)) as avg_unique_words,
+    SAFE_DIVIDE(SUM(readability_sum), SUM(readability_count)) as avg_readability,
+    SAFE_DIVIDE(SUM(sentiment_sum), SUM(sentiment_count)) as avg_sentiment,
+    SAFE_DIVIDE(SUM(avg_word_length_sum), SUM(processed_count)) as avg_word_length,
+    SUM(processed_count) as song_count
+  FROM `${PROJECT_ID}.lyrics_analysis.artist_rollup`
+  WHERE artist != 'Unknown' AND artist IS NOT NULL
+  GROUP BY artist
   HAVING song_count >= 5
 )
 SELECT 
@@ -276,96 +286,89 @@ LIMIT 100;
 CREATE OR REPLACE VIEW `${PROJECT_ID}.lyrics_analysis.dashboard_main_metrics` AS
 SELECT 
   'total_songs' as metric_name,
-  COUNT(DISTINCT r.id) as metric_value,
+  SUM(song_count) as metric_value,
   'count' as metric_type,
   CURRENT_TIMESTAMP() as last_updated
-FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r
-WHERE r.lyrics IS NOT NULL
+FROM `${PROJECT_ID}.lyrics_analysis.sentiment_rollup`
 
 UNION ALL
 
 SELECT 
   'total_artists' as metric_name,
-  COUNT(DISTINCT r.artist) as metric_value,
+  COUNT(DISTINCT artist) as metric_value,
   'count' as metric_type,
   CURRENT_TIMESTAMP() as last_updated
-FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r
-WHERE r.artist != 'Unknown' AND r.artist IS NOT NULL
+FROM `${PROJECT_ID}.lyrics_analysis.artist_rollup`
+WHERE artist != 'Unknown' AND artist IS NOT NULL
 
 UNION ALL
 
 SELECT 
   'avg_sentiment' as metric_name,
-  ROUND(AVG(s.sentiment_score), 3) as metric_value,
+  ROUND(SAFE_DIVIDE(SUM(sentiment_sum), SUM(sentiment_count)), 3) as metric_value,
   'average' as metric_type,
   CURRENT_TIMESTAMP() as last_updated
-FROM `${PROJECT_ID}.lyrics_analysis.sentiment_analysis` s
+FROM `${PROJECT_ID}.lyrics_analysis.sentiment_rollup`
 
 UNION ALL
 
 SELECT 
   'avg_readability' as metric_name,
-  ROUND(AVG(p.readability_score), 1) as metric_value,
+  ROUND(SAFE_DIVIDE(SUM(readability_sum), SUM(readability_count)), 1) as metric_value,
   'average' as metric_type,
   CURRENT_TIMESTAMP() as last_updated
-FROM `${PROJECT_ID}.lyrics_analysis.processed_lyrics` p
-WHERE p.readability_score IS NOT NULL;
+FROM `${PROJECT_ID}.lyrics_analysis.sentiment_rollup`;
 
 -- 14. Dashboard de Tendências - Dados para Gráficos
 CREATE OR REPLACE VIEW `${PROJECT_ID}.lyrics_analysis.dashboard_trends` AS
 SELECT 
   'sentiment_by_year' as chart_type,
-  CAST(r.year AS STRING) as dimension,
-  AVG(s.sentiment_score) as value,
-  COUNT(*) as count
-FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r
-JOIN `${PROJECT_ID}.lyrics_analysis.sentiment_analysis` s ON r.id = s.lyrics_id
-WHERE r.year IS NOT NULL AND r.year BETWEEN 1980 AND 2024
-GROUP BY r.year
+  CAST(year AS STRING) as dimension,
+  SAFE_DIVIDE(SUM(sentiment_sum), SUM(sentiment_count)) as value,
+  SUM(sentiment_count) as count
+FROM `${PROJECT_ID}.lyrics_analysis.sentiment_rollup`
+WHERE year IS NOT NULL AND year BETWEEN 1980 AND 2024
+GROUP BY year
 HAVING count >= 5
 
 UNION ALL
 
 SELECT 
   'readability_by_year' as chart_type,
-  CAST(r.year AS STRING) as dimension,
-  AVG(p.readability_score) as value,
-  COUNT(*) as count
-FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r
-JOIN `${PROJECT_ID}.lyrics_analysis.processed_lyrics` p ON r.id = p.id
-WHERE r.year IS NOT NULL AND r.year BETWEEN 1980 AND 2024
-GROUP BY r.year
+  CAST(year AS STRING) as dimension,
+  SAFE_DIVIDE(SUM(readability_sum), SUM(readability_count)) as value,
+  SUM(processed_count) as count
+FROM `${PROJECT_ID}.lyrics_analysis.sentiment_rollup`
+WHERE year IS NOT NULL AND year BETWEEN 1980 AND 2024
+GROUP BY year
 HAVING count >= 5
 
 UNION ALL
 
 SELECT 
   'word_count_by_year' as chart_type,
-  CAST(r.year AS STRING) as dimension,
-  AVG(p.word_count) as value,
-  COUNT(*) as count
-FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r
-JOIN `${PROJECT_ID}.lyrics_analysis.processed_lyrics` p ON r.id = p.id
-WHERE r.year IS NOT NULL AND r.year BETWEEN 1980 AND 2024
-GROUP BY r.year
+  CAST(year AS STRING) as dimension,
+  SAFE_DIVIDE(SUM(word_count_sum), SUM(processed_count)) as value,
+  SUM(processed_count) as count
+FROM `${PROJECT_ID}.lyrics_analysis.sentiment_rollup`
+WHERE year IS NOT NULL AND year BETWEEN 1980 AND 2024
+GROUP BY year
 HAVING count >= 5;
 
 -- 15. Dashboard de Gêneros - Comparação
 CREATE OR REPLACE VIEW `${PROJECT_ID}.lyrics_analysis.dashboard_genre_comparison` AS
 SELECT 
-  r.genre,
-  COUNT(*) as song_count,
-  AVG(s.sentiment_score) as avg_sentiment,
-  AVG(p.readability_score) as avg_readability,
-  AVG(p.word_count) as avg_word_count,
-  AVG(p.unique_words) as avg_unique_words,
-  COUNTIF(s.sentiment_label = 'positive') / COUNT(*) * 100 as positive_percentage,
-  COUNTIF(s.sentiment_label = 'negative') / COUNT(*) * 100 as negative_percentage
-FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r
-JOIN `${PROJECT_ID}.lyrics_analysis.processed_lyrics` p ON r.id = p.id
-JOIN `${PROJECT_ID}.lyrics_analysis.sentiment_analysis` s ON r.id = s.lyrics_id
-WHERE r.genre != 'Unknown' AND r.genre IS NOT NULL
-GROUP BY r.genre
+  genre,
+  SUM(song_count) as song_count,
+  SAFE_DIVIDE(SUM(sentiment_sum), SUM(sentiment_count)) as avg_sentiment,
+  SAFE_DIVIDE(SUM(readability_sum), SUM(readability_count)) as avg_readability,
+  SAFE_DIVIDE(SUM(word_count_sum), SUM(processed_count)) as avg_word_count,
+  SAFE_DIVIDE(SUM(unique_words_sum), SUM(processed_count)) as avg_unique_words,
+  SAFE_DIVIDE(SUM(positive_count), SUM(sentiment_count)) * 100 as positive_percentage,
+  SAFE_DIVIDE(SUM(negative_count), SUM(sentiment_count)) * 100 as negative_percentage
+FROM `${PROJECT_ID}.lyrics_analysis.sentiment_rollup`
+WHERE genre != 'Unknown' AND genre IS NOT NULL
+GROUP BY genre
 HAVING song_count >= 20
 ORDER BY song_count DESC;
 
@@ -379,11 +382,12 @@ CREATE OR REPLACE PROCEDURE `${PROJECT_ID}.lyrics_analysis.analyze_artist`(
 )
 BEGIN
   DECLARE song_count INT64;
+  DECLARE target_key STRING DEFAULT `${PROJECT_ID}.lyrics_analysis.normalize_artist`(artist_name);
   
-  -- Verificar se artista existe
+  -- Verificar se artista existe (igualdade em artist_key poda o cluster)
   SELECT COUNT(*) INTO song_count
   FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics`
-  WHERE LOWER(artist) = LOWER(artist_name);
+  WHERE artist_key = target_key;
   
   IF song_count = 0 THEN
     SELECT "Artista não encontrado" as message;
@@ -405,7 +409,7 @@ BEGIN
   FROM `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r
   JOIN `${PROJECT_ID}.lyrics_analysis.processed_lyrics` p ON r.id = p.id
   JOIN `${PROJECT_ID}.lyrics_analysis.sentiment_analysis` s ON r.id = s.lyrics_id
-  WHERE LOWER(r.artist) = LOWER(artist_name)
+  WHERE r.artist_key = target_key
   GROUP BY r.artist;
   
   -- Top palavras do artista
@@ -415,7 +419,7 @@ BEGIN
     AVG(w.tf_idf) as avg_tfidf
   FROM `${PROJECT_ID}.lyrics_analysis.word_frequency` w
   JOIN `${PROJECT_ID}.lyrics_analysis.raw_lyrics` r ON w.lyrics_id = r.id
-  WHERE LOWER(r.artist) = LOWER(artist_name)
+  WHERE r.artist_key = target_key
     AND w.is_stopword = FALSE
     AND LENGTH(w.word) >= 3
   GROUP BY w.word